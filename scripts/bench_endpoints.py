@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Load-test the storage manager's hot endpoints on the local storage backend.
+
+For each catalog size the script seeds a temporary local bucket (shader
+index with N entries plus a few videos), serves the app under uvicorn and
+drives a weighted mix of requests with concurrent clients:
+
+    list   GET  /api/shaders?limit=50&sort_by=<random>
+    meta   GET  /api/shaders/{id}
+    play   POST /api/shaders/{id}/play
+    rate   POST /api/shaders/{id}/rate
+    media  GET  /api/videos/{id} with a random Range
+
+Every storage backend call can be slowed down by a fixed latency (plus
+jitter) to approximate a remote bucket.  The report is JSON with req/s and
+p50/p95/p99 latency per endpoint and per catalog size.  Pass an earlier
+report with --compare to print relative changes and, with
+--fail-on-regression, exit non-zero when any endpoint got slower than the
+threshold.
+
+Usage:
+    python scripts/bench_endpoints.py --catalog 1000,10000,100000 --duration 10
+    python scripts/bench_endpoints.py --latency-ms 20 --mix list=50,meta=30,media=20 --output bench.json
+    python scripts/bench_endpoints.py --compare baseline.json --fail-on-regression
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench_media_proxy import ROOT, _configure_env, _percentiles
+
+OPS = ("list", "meta", "play", "rate", "media")
+DEFAULT_MIX = "list=30,meta=30,play=15,rate=10,media=15"
+SORTS = ("rating", "date", "name", "plays")
+# Storage operations that pay the injected latency (iter_bytes pays it per chunk).
+SLOW_OPS = (
+    "read_json", "read_json_generation", "write_json", "write_json_generation", "exists", "stat",
+    "delete", "download_bytes", "download_text", "read_range", "upload_bytes", "upload_file", "list_prefix",
+)
+
+
+def _parse_mix(spec):
+    mix = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        op, _, weight = item.partition("=")
+        op = op.strip()
+        if op not in OPS:
+            raise SystemExit(f"unknown op {op!r} in --mix (choose from {', '.join(OPS)})")
+        mix[op] = float(weight or 1)
+    if not any(mix.values()):
+        raise SystemExit("--mix needs at least one op with a positive weight")
+    return mix
+
+
+def _seed(storage_root, catalog, videos, video_kb, seed):
+    rng = random.Random(seed)
+    tags = ["generative", "distortion", "audio", "organic", "glitch"]
+    shaders = [
+        {
+            "id": f"shader-{n:06d}",
+            "name": f"Shader {n}",
+            "author": "bench",
+            "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "type": "shader",
+            "description": "",
+            "tags": rng.sample(tags, 2),
+            "filename": f"shader-{n:06d}.wgsl",
+            "coordinate": n,
+            "stars": round(rng.uniform(0, 5), 2),
+            "rating_count": rng.randint(0, 50),
+            "play_count": rng.randint(0, 5000),
+        }
+        for n in range(catalog)
+    ]
+    os.makedirs(os.path.join(storage_root, "shaders"), exist_ok=True)
+    with open(os.path.join(storage_root, "shaders", "_shaders.json"), "w") as fh:
+        json.dump(shaders, fh)
+
+    os.makedirs(os.path.join(storage_root, "videos"), exist_ok=True)
+    entries = []
+    for n in range(videos):
+        name = f"bench-{n}.mp4"
+        with open(os.path.join(storage_root, "videos", name), "wb") as fh:
+            fh.write(os.urandom(video_kb * 1024))
+        entries.append({"id": f"video-{n}", "filename": name, "name": name, "type": "video"})
+    with open(os.path.join(storage_root, "videos", "_videos.json"), "w") as fh:
+        json.dump(entries, fh)
+    return [s["id"] for s in shaders], [v["id"] for v in entries]
+
+
+def _install_latency(latency_ms, jitter_ms, seed):
+    """Make every LocalBackend created from now on sleep before each storage call."""
+    from storage_manager import backends
+
+    if latency_ms <= 0 and jitter_ms <= 0:
+        return
+    rng = random.Random(seed)
+
+    def pause():
+        delay = latency_ms + rng.uniform(-jitter_ms, jitter_ms)
+        return asyncio.sleep(max(0.0, delay) / 1000)
+
+    def slowed(op):
+        inner = getattr(backends.LocalBackend, op)
+
+        async def call(self, *args, **kwargs):
+            await pause()
+            return await inner(self, *args, **kwargs)
+
+        call.__name__ = op
+        return call
+
+    class SlowLocalBackend(backends.LocalBackend):
+        async def iter_bytes(self, *args, **kwargs):
+            async for chunk in super().iter_bytes(*args, **kwargs):
+                await pause()
+                yield chunk
+
+    for op in SLOW_OPS:
+        setattr(SlowLocalBackend, op, slowed(op))
+    # backends.configure() looks the class up at startup.
+    backends.LocalBackend = SlowLocalBackend
+
+
+class Workload:
+    def __init__(self, mix, shader_ids, video_ids, video_kb, range_kb, seed):
+        self.ops = list(mix)
+        self.weights = [mix[op] for op in self.ops]
+        self.shader_ids = shader_ids
+        self.video_ids = video_ids
+        self.video_bytes = video_kb * 1024
+        self.range_bytes = max(1, min(range_kb * 1024, self.video_bytes))
+        self.rng = random.Random(seed)
+
+    def next(self):
+        """``(op, method, path, kwargs)`` for the next request."""
+        op = self.rng.choices(self.ops, self.weights)[0]
+        shader_id = self.rng.choice(self.shader_ids)
+        if op == "list":
+            return op, "GET", "/api/shaders", {"params": {"limit": 50, "sort_by": self.rng.choice(SORTS)}}
+        if op == "meta":
+            return op, "GET", f"/api/shaders/{shader_id}", {}
+        if op == "play":
+            return op, "POST", f"/api/shaders/{shader_id}/play", {}
+        if op == "rate":
+            return op, "POST", f"/api/shaders/{shader_id}/rate", {"data": {"stars": self.rng.randint(1, 5)}}
+        start = self.rng.randrange(0, self.video_bytes - self.range_bytes + 1)
+        headers = {"Range": f"bytes={start}-{start + self.range_bytes - 1}"}
+        return op, "GET", f"/api/videos/{self.rng.choice(self.video_ids)}", {"headers": headers}
+
+
+async def _drive(base_url, workload, duration, warmup, concurrency):
+    import httpx
+
+    latencies = {op: [] for op in workload.ops}
+    errors = {op: 0 for op in workload.ops}
+    recording = False
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker(stop_at):
+            while time.perf_counter() < stop_at:
+                op, method, path, kwargs = workload.next()
+                t0 = time.perf_counter()
+                try:
+                    async with client.stream(method, path, **kwargs) as response:
+                        async for _ in response.aiter_raw():
+                            pass
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                elapsed = time.perf_counter() - t0
+                if recording:
+                    latencies[op].append(elapsed)
+                    errors[op] += failed
+
+        # Warm-up loads the resident index and listing views and opens connections.
+        await asyncio.gather(*(worker(time.perf_counter() + warmup) for _ in range(concurrency)))
+        recording = True
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(t0 + duration) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+
+    endpoints = {}
+    for op in workload.ops:
+        samples = latencies[op]
+        endpoints[op] = {
+            "requests": len(samples),
+            "errors": errors[op],
+            "requests_per_second": round(len(samples) / elapsed, 1),
+            "latency_ms": {**_percentiles(samples), "max": round(max(samples) * 1000, 2) if samples else None},
+        }
+    everything = [value for samples in latencies.values() for value in samples]
+    total = {
+        "requests": len(everything),
+        "errors": sum(errors.values()),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(everything) / elapsed, 1),
+        "latency_ms": _percentiles(everything),
+    }
+    return endpoints, total
+
+
+def _run_catalog(app, catalog, args, mix):
+    import uvicorn
+    from storage_manager import config
+
+    with tempfile.TemporaryDirectory() as storage_root:
+        t0 = time.perf_counter()
+        shader_ids, video_ids = _seed(storage_root, catalog, args.videos, args.video_kb, args.seed)
+        seed_seconds = time.perf_counter() - t0
+        # Startup re-reads the root and resets the resident indexes.
+        config.LOCAL_STORAGE_ROOT = storage_root
+
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+        try:
+            workload = Workload(mix, shader_ids, video_ids, args.video_kb, args.range_kb, args.seed + catalog)
+            endpoints, total = asyncio.run(
+                _drive(f"http://127.0.0.1:{args.port}", workload, args.duration, args.warmup, args.concurrency)
+            )
+        finally:
+            server.should_exit = True
+            thread.join()
+
+    return {"catalog": catalog, "seed_seconds": round(seed_seconds, 2), "endpoints": endpoints, "total": total}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(report, baseline, threshold):
+    """Relative change per catalog/endpoint; returns (rows, regressions)."""
+    previous = {run["catalog"]: run for run in baseline.get("runs", [])}
+    rows, regressions = [], []
+    for run in report["runs"]:
+        old_run = previous.get(run["catalog"])
+        if old_run is None:
+            continue
+        for op, new in run["endpoints"].items():
+            old = old_run["endpoints"].get(op)
+            if not old or not old["requests"] or not new["requests"]:
+                continue
+            row = {"catalog": run["catalog"], "endpoint": op}
+            for key in ("p50", "p95", "p99"):
+                before, after = old["latency_ms"][key], new["latency_ms"][key]
+                row[f"{key}_change"] = round(after / before - 1, 3) if before else None
+            before, after = old["requests_per_second"], new["requests_per_second"]
+            row["rps_change"] = round(after / before - 1, 3) if before else None
+            rows.append(row)
+            if (row["p95_change"] or 0) > threshold or (row["rps_change"] or 0) < -threshold:
+                regressions.append(row)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test storage manager endpoints on the local backend")
+    parser.add_argument("--catalog", default="1000,10000", help="comma-separated shader catalog sizes")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"weighted ops (default {DEFAULT_MIX})")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per catalog size")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before each run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every storage call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform +/- jitter on the added latency")
+    parser.add_argument("--videos", type=int, default=4)
+    parser.add_argument("--video-kb", type=int, default=4096)
+    parser.add_argument("--range-kb", type=int, default=256, help="size of each media Range request")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--label", help="free-form run label (defaults to the git revision)")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    mix = _parse_mix(args.mix)
+    catalogs = [int(size) for size in args.catalog.split(",") if size.strip()]
+
+    with tempfile.TemporaryDirectory() as placeholder_root:
+        _configure_env(placeholder_root)
+        _install_latency(args.latency_ms, args.jitter_ms, args.seed)
+        from storage_manager.app import app
+
+        revision = _git_revision()
+        report = {
+            "label": args.label or revision,
+            "git_revision": revision,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "settings": {
+                "mix": mix,
+                "duration": args.duration,
+                "concurrency": args.concurrency,
+                "latency_ms": args.latency_ms,
+                "jitter_ms": args.jitter_ms,
+                "video_kb": args.video_kb,
+                "range_kb": args.range_kb,
+            },
+            "runs": [_run_catalog(app, catalog, args, mix) for catalog in catalogs],
+        }
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        report["comparison"], regressions = _compare(report, baseline, args.threshold)
+        report["regressions"] = regressions
+        if baseline.get("settings") != report["settings"]:
+            report["comparison_warning"] = "baseline was recorded with different settings"
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Benchmark GET /api/videos/{id} through the storage manager media proxy.
+
+Compares the pure-ASGI RateLimitMiddleware ("asgi") with the previous
+BaseHTTPMiddleware implementation ("base").  Each mode serves the app under
+uvicorn on the local storage backend and streams the same video with
+concurrent clients.  The script prints requests/sec, throughput and
+time-to-first-byte / total latency percentiles as JSON.
+
+Usage:
+    python scripts/bench_media_proxy.py --requests 200 --concurrency 16 --size-mb 8
+    python scripts/bench_media_proxy.py --range bytes=0-1048575 --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _configure_env(storage_root):
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["LOCAL_STORAGE_ROOT"] = storage_root
+    os.environ.setdefault("GCP_CREDENTIALS", "")
+    # Measure middleware overhead, not 429s.
+    os.environ["RATE_LIMIT_REQUESTS"] = str(10 ** 9)
+    os.environ["RATE_LIMIT_RULES"] = ""
+
+
+def _seed(storage_root, size_mb):
+    videos = os.path.join(storage_root, "videos")
+    os.makedirs(videos, exist_ok=True)
+    with open(os.path.join(videos, "bench.mp4"), "wb") as fh:
+        block = os.urandom(1024 * 1024)
+        for _ in range(size_mb):
+            fh.write(block)
+    entry = {"id": "bench", "filename": "bench.mp4", "name": "bench.mp4", "type": "video"}
+    with open(os.path.join(videos, "_videos.json"), "w") as fh:
+        json.dump([entry], fh)
+
+
+def _baseline_middleware():
+    """The BaseHTTPMiddleware rate limiter this benchmark compares against."""
+    from starlette.middleware.base import BaseHTTPMiddleware
+    from starlette.responses import PlainTextResponse
+    from storage_manager.middleware import RateLimitMiddleware
+
+    class BaseHTTPRateLimitMiddleware(BaseHTTPMiddleware):
+        def __init__(self, app):
+            super().__init__(app)
+            self.inner = RateLimitMiddleware(None)
+
+        async def dispatch(self, request, call_next):
+            rule = self.inner.rules.match(request.url.path)
+            if rule is None:
+                return await call_next(request)
+            key = f"{self.inner._client_ip(request.scope)}:{request.method}:{rule.prefix or 'api'}"
+            decision = await self.inner.limiter.hit(key, rule)
+            if not decision.allowed:
+                return PlainTextResponse("Too many requests", status_code=429)
+            response = await call_next(request)
+            response.headers["X-RateLimit-Limit"] = str(decision.limit)
+            response.headers["X-RateLimit-Remaining"] = str(decision.remaining)
+            response.headers["X-RateLimit-Reset"] = str(int(decision.reset))
+            return response
+
+    return BaseHTTPRateLimitMiddleware
+
+
+def _use_middleware(app, mode):
+    from starlette.middleware import Middleware
+    from storage_manager.middleware import RateLimitMiddleware
+
+    replacement = RateLimitMiddleware if mode == "asgi" else _baseline_middleware()
+    limiters = ("RateLimitMiddleware", "BaseHTTPRateLimitMiddleware")
+    app.user_middleware = [
+        Middleware(replacement) if m.cls.__name__ in limiters else m
+        for m in app.user_middleware
+    ]
+    app.middleware_stack = None
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+async def _drive(url, total, concurrency, headers):
+    import httpx
+
+    ttfb, latency = [], []
+    received = 0
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        async def one():
+            nonlocal received, errors
+            async with semaphore:
+                t0 = time.perf_counter()
+                first = None
+                async with client.stream("GET", url, headers=headers) as response:
+                    if response.status_code not in (200, 206):
+                        errors += 1
+                    async for chunk in response.aiter_raw():
+                        if first is None:
+                            first = time.perf_counter() - t0
+                        received += len(chunk)
+                latency.append(time.perf_counter() - t0)
+                ttfb.append(first if first is not None else latency[-1])
+
+        # Warm up connections, the resident index and the page cache.
+        await asyncio.gather(*(one() for _ in range(min(concurrency, total))))
+        ttfb.clear()
+        latency.clear()
+        received = 0
+        errors = 0
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - t0
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(total / elapsed, 1),
+        "mib_per_second": round(received / elapsed / (1024 * 1024), 1),
+        "ttfb_ms": _percentiles(ttfb),
+        "latency_ms": _percentiles(latency),
+    }
+
+
+def _run_mode(app, mode, args):
+    import uvicorn
+
+    _use_middleware(app, mode)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        headers = {"Range": args.range} if args.range else {}
+        url = f"http://127.0.0.1:{args.port}/api/videos/bench"
+        return asyncio.run(_drive(url, args.requests, args.concurrency, headers))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the /api/videos/{id} media proxy")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--size-mb", type=int, default=8, help="size of the streamed video")
+    parser.add_argument("--range", default="", help='optional Range header, e.g. "bytes=0-1048575"')
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--modes", default="base,asgi", help="comma-separated: base, asgi")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as storage_root:
+        _configure_env(storage_root)
+        _seed(storage_root, args.size_mb)
+        from storage_manager.app import app
+
+        report = {
+            "endpoint": "/api/videos/{id}",
+            "size_mb": args.size_mb,
+            "range": args.range or None,
+            "concurrency": args.concurrency,
+            "results": {},
+        }
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            report["results"][mode] = _run_mode(app, mode, args)
+
+    results = report["results"]
+    if "base" in results and "asgi" in results:
+        report["speedup_requests_per_second"] = round(
+            results["asgi"]["requests_per_second"] / results["base"]["requests_per_second"], 2
+        )
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
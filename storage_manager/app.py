@@ -10,13 +10,14 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 
-from . import config, state, models, middleware, intents, utils
+from . import config, state, models, middleware, intents, utils, indexes, counters, gcs_io, backends, media_cache, locks, backups, ftp_pool, health, metrics
 from .routes import system, locations, shaders, preset_packs, library, media, sync, ftp
 
 
 @asynccontextmanager
 async def lifespan(app_instance: FastAPI):
-    if config.CREDENTIALS_JSON or config.BUCKET_NAME:
+    storage = backends.configure()
+    if storage.name == "gcs" and (config.CREDENTIALS_JSON or config.BUCKET_NAME):
         try:
             state.gcs_client = state.get_gcs_client()
             if config.BUCKET_NAME:
@@ -35,7 +36,25 @@ async def lifespan(app_instance: FastAPI):
         state._has_signing_creds = False
 
     state._media_semaphore = asyncio.Semaphore(config.MEDIA_STREAM_MAX_CONCURRENT)
+    await gcs_io.start()
+    media_cache.configure()
+    intents.configure()
+    locks.configure()
+    health.storage_probe.reset()
+    indexes.index_store.reset()
+    indexes.index_store.start()
+    counters.counter_aggregator.start()
+    backups.backup_pruner.start()
+    intents.start()
     yield
+    await intents.stop()
+    await backups.backup_pruner.stop()
+    await counters.counter_aggregator.stop()
+    await indexes.index_store.stop()
+    await indexes.index_store.flush_all()
+    await media_cache.media_cache.stop()
+    await gcs_io.stop()
+    await state.run_io(ftp_pool.pool.close_all)
 
 
 app = FastAPI(title="Storage Manager API", lifespan=lifespan)
@@ -69,7 +88,10 @@ app.include_router(media.router)
 app.include_router(sync.router)
 app.include_router(ftp.router)
 
-_delegate_modules = (state, intents, config, utils, models, middleware)
+_delegate_modules = (state, intents, indexes, counters, config, utils, models, middleware)
+# Where a delegated attribute lived before it was deleted, so that mock.patch's
+# delete-then-set restore puts it back on the owning module.
+_deleted_from = {}
 
 
 class _AppModule(types.ModuleType):
@@ -80,6 +102,10 @@ class _AppModule(types.ModuleType):
         raise AttributeError(f"module '{self.__name__}' has no attribute '{name}'")
 
     def __setattr__(self, name: str, value):
+        owner = _deleted_from.pop(name, None)
+        if owner is not None:
+            setattr(owner, name, value)
+            return
         for target in _delegate_modules:
             if hasattr(target, name):
                 setattr(target, name, value)
@@ -88,7 +114,7 @@ class _AppModule(types.ModuleType):
                 elif name == "INTENT_STORE":
                     intents.intent_store = value
                 return
-        if name in ("bucket", "gcs_client", "io_executor", "_has_signing_creds", "_media_semaphore", "cache", "RESOURCE_LOCKS"):
+        if name in ("bucket", "gcs_client", "io_executor", "media_executor", "_has_signing_creds", "_media_semaphore", "cache", "RESOURCE_LOCKS"):
             setattr(state, name, value)
         elif name in ("INTENT_STORE", "intent_store"):
             setattr(intents, name, value)
@@ -106,6 +132,7 @@ class _AppModule(types.ModuleType):
             if hasattr(target, name):
                 try:
                     delattr(target, name)
+                    _deleted_from[name] = target
                 except AttributeError:
                     pass
                 return
@@ -0,0 +1,439 @@
+# storage_manager/backends.py
+import os
+import json
+import base64
+import hashlib
+import logging
+import mimetypes
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Tuple
+
+from . import config, state, gcs_io, metrics
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class PreconditionFailed(Exception):
+    """A conditional write lost a generation race (HTTP 412, like GCS)."""
+
+    code = 412
+
+
+@dataclass
+class ObjectInfo:
+    """Metadata for one stored object, shaped like the GCS blob fields we use."""
+
+    name: str
+    size: Optional[int] = None
+    content_type: Optional[str] = None
+    md5_hash: Optional[str] = None  # base64, as GCS reports it
+    updated: Optional[datetime] = None
+    generation: int = 0
+    public_url: Optional[str] = None
+
+
+class StorageBackend:
+    """Object storage operations used by the routes and the index store.
+
+    Paths are bucket-relative object names (``shaders/_shaders.json``).
+    JSON reads of a missing object return ``[]`` like the index helpers in
+    ``utils``; conditional writes raise an exception with ``code == 412``
+    when the generation no longer matches.
+    """
+
+    name = "abstract"
+
+    async def read_json(self, path: str) -> Any:
+        data, _ = await self.read_json_generation(path)
+        return data
+
+    async def read_json_generation(self, path: str) -> Tuple[Any, int]:
+        raise NotImplementedError
+
+    async def write_json(self, path: str, data: Any) -> None:
+        await self.upload_bytes(path, json.dumps(data).encode(), content_type="application/json")
+
+    async def write_json_generation(self, path: str, payload: bytes, if_generation_match) -> int:
+        raise NotImplementedError
+
+    async def exists(self, path: str) -> bool:
+        return await self.stat(path) is not None
+
+    async def stat(self, path: str, checksum: bool = True) -> Optional[ObjectInfo]:
+        """Object metadata, or None if *path* does not exist.
+
+        With ``checksum=False`` backends that have to compute ``md5_hash``
+        may leave it unset.
+        """
+        raise NotImplementedError
+
+    async def delete(self, path: str) -> bool:
+        raise NotImplementedError
+
+    async def download_bytes(self, path: str) -> bytes:
+        raise NotImplementedError
+
+    async def download_text(self, path: str) -> str:
+        return (await self.download_bytes(path)).decode("utf-8")
+
+    async def read_range(self, path: str, start: int, end: int) -> bytes:
+        """Bytes ``start..end`` of *path*, both inclusive."""
+        raise NotImplementedError
+
+    async def iter_bytes(
+        self, path: str, start: int = 0, end: Optional[int] = None, chunk_size: int = _CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        """Yield *path* (or the inclusive ``start..end`` slice) in chunks."""
+        raise NotImplementedError
+        yield b""  # pragma: no cover
+
+    async def upload_bytes(self, path: str, data, content_type: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    async def upload_file(self, path: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    async def list_prefix(self, prefix: str, delimiter: Optional[str] = None) -> List[ObjectInfo]:
+        """Objects whose name starts with *prefix*; with ``delimiter="/"`` only direct children."""
+        raise NotImplementedError
+
+    def can_sign(self) -> bool:
+        """Whether ``signed_url`` can currently produce a URL."""
+        return False
+
+    async def signed_url(self, path: str, expires_seconds: int) -> Optional[str]:
+        """A time-limited download URL, or None when the backend cannot sign."""
+        return None
+
+    def public_url(self, path: str) -> str:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+def _blob_info(blob) -> ObjectInfo:
+    size = getattr(blob, "size", None)
+    md5 = getattr(blob, "md5_hash", None)
+    updated = getattr(blob, "updated", None)
+    generation = getattr(blob, "generation", None)
+    content_type = getattr(blob, "content_type", None)
+    public_url = getattr(blob, "public_url", None)
+    return ObjectInfo(
+        name=blob.name,
+        size=size if isinstance(size, int) else None,
+        content_type=content_type if isinstance(content_type, str) else None,
+        md5_hash=md5 if isinstance(md5, str) else None,
+        updated=updated if isinstance(updated, datetime) else None,
+        generation=generation if isinstance(generation, int) else 0,
+        public_url=public_url if isinstance(public_url, str) else None,
+    )
+
+
+@metrics.timed_backend
+class GcsBackend(StorageBackend):
+    """``state.bucket`` through :mod:`gcs_io` (async JSON API or sync client)."""
+
+    name = "gcs"
+
+    async def read_json(self, path: str) -> Any:
+        return await gcs_io.current().read_json(path)
+
+    async def read_json_generation(self, path: str) -> Tuple[Any, int]:
+        return await gcs_io.current().read_json_generation(path)
+
+    async def write_json(self, path: str, data: Any) -> None:
+        await gcs_io.current().write_json(path, data)
+
+    async def write_json_generation(self, path: str, payload: bytes, if_generation_match) -> int:
+        return await gcs_io.current().write_json_generation(path, payload, if_generation_match)
+
+    async def exists(self, path: str) -> bool:
+        return await gcs_io.current().exists(path)
+
+    async def stat(self, path: str, checksum: bool = True) -> Optional[ObjectInfo]:
+        # One metadata request both checks existence and returns the fields.
+        blob = await gcs_io.current().stat(path)
+        return _blob_info(blob) if blob is not None else None
+
+    async def delete(self, path: str) -> bool:
+        return await gcs_io.current().delete(path)
+
+    async def download_bytes(self, path: str) -> bytes:
+        return await gcs_io.current().download_bytes(path)
+
+    async def download_text(self, path: str) -> str:
+        return await gcs_io.current().download_text(path)
+
+    async def read_range(self, path: str, start: int, end: int) -> bytes:
+        return await gcs_io.current().read_range(path, start, end)
+
+    async def iter_bytes(
+        self, path: str, start: int = 0, end: Optional[int] = None, chunk_size: int = _CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        io = gcs_io.current()
+        offset = start
+        while end is None or offset <= end:
+            requested = chunk_size if end is None else min(chunk_size, end - offset + 1)
+            try:
+                chunk = await io.read_range(path, offset, offset + requested - 1)
+            except Exception as exc:
+                # Without a known end, reading from exactly the object size is EOF.
+                if end is None and offset > start and getattr(exc, "code", None) == 416:
+                    break
+                raise
+            if chunk:
+                yield chunk
+            if len(chunk) < requested:
+                # End of the object (or it is shorter than expected after a replace).
+                break
+            offset += requested
+
+    async def upload_bytes(self, path: str, data, content_type: Optional[str] = None) -> None:
+        await gcs_io.current().upload_bytes(path, data, content_type=content_type)
+
+    async def upload_file(self, path: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> None:
+        await gcs_io.current().upload_file(path, fileobj, content_type=content_type)
+
+    async def list_prefix(self, prefix: str, delimiter: Optional[str] = None) -> List[ObjectInfo]:
+        blobs = await gcs_io.current().list_prefix(prefix, delimiter=delimiter)
+        return [_blob_info(blob) for blob in blobs]
+
+    def can_sign(self) -> bool:
+        return bool(state._has_signing_creds)
+
+    async def signed_url(self, path: str, expires_seconds: int) -> Optional[str]:
+        if not self.can_sign():
+            return None
+        blob = state.bucket.blob(path)
+        return await state.run_io(
+            blob.generate_signed_url,
+            version="v4",
+            expiration=timedelta(seconds=expires_seconds),
+            method="GET",
+        )
+
+    def public_url(self, path: str) -> str:
+        return state.bucket.blob(path).public_url
+
+
+@metrics.timed_backend
+class LocalBackend(StorageBackend):
+    """Objects stored as files under *root*, for offline development and benchmarks.
+
+    Writes go to a temporary file first and are published with ``os.replace``,
+    so readers never see a partial object and need no lock.  The generation
+    of an object is its ``st_mtime_ns``, bumped if needed so every write
+    produces a larger one; the generation check and the rename happen under
+    a process-wide lock.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str = config.LOCAL_STORAGE_ROOT, base_url: str = config.LOCAL_STORAGE_BASE_URL) -> None:
+        self.root = Path(root).resolve()
+        self.base_url = base_url.rstrip("/")
+        self._write_lock = threading.Lock()
+        # path -> (mtime_ns, size, md5); rewriting an object replaces its entry.
+        self._md5_cache: Dict[str, Tuple[int, int, str]] = {}
+
+    def _file(self, path: str) -> Path:
+        target = (self.root / path).resolve()
+        if target != self.root and self.root not in target.parents:
+            raise ValueError(f"Object path escapes storage root: {path}")
+        return target
+
+    @staticmethod
+    def _generation(target: Path) -> int:
+        try:
+            return target.stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _write_sync(self, path: str, source, if_generation_match=None) -> int:
+        """Write *source* (bytes or a binary file object) to *path*; returns the new generation."""
+        target = self._file(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                if isinstance(source, (bytes, bytearray, memoryview)):
+                    fh.write(source)
+                else:
+                    shutil.copyfileobj(source, fh, _CHUNK_SIZE)
+            with self._write_lock:
+                previous = self._generation(target)
+                if if_generation_match is not None and int(if_generation_match) != previous:
+                    raise PreconditionFailed(f"generation mismatch for {path}")
+                generation = os.stat(tmp).st_mtime_ns
+                if generation <= previous:
+                    generation = previous + 1
+                    os.utime(tmp, ns=(generation, generation))
+                os.replace(tmp, target)
+            return generation
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _read_sync(self, path: str) -> Tuple[Optional[bytes], int]:
+        try:
+            with open(self._file(path), "rb") as fh:
+                # The generation of the file actually opened, even if it is replaced meanwhile.
+                return fh.read(), os.fstat(fh.fileno()).st_mtime_ns
+        except FileNotFoundError:
+            return None, 0
+
+    def _md5(self, path: str, target: Path, st: os.stat_result) -> str:
+        cached = self._md5_cache.get(path)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2]
+        digest = hashlib.md5()
+        with open(target, "rb") as fh:
+            for block in iter(lambda: fh.read(_CHUNK_SIZE), b""):
+                digest.update(block)
+        md5 = base64.b64encode(digest.digest()).decode()
+        self._md5_cache[path] = (st.st_mtime_ns, st.st_size, md5)
+        return md5
+
+    def _stat_sync(self, path: str, checksum: bool = True) -> Optional[ObjectInfo]:
+        target = self._file(path)
+        try:
+            st = target.stat()
+        except FileNotFoundError:
+            return None
+        if not target.is_file():
+            return None
+        return ObjectInfo(
+            name=path,
+            size=st.st_size,
+            content_type=mimetypes.guess_type(path)[0],
+            md5_hash=self._md5(path, target, st) if checksum else None,
+            updated=datetime.fromtimestamp(st.st_mtime, tz=timezone.utc),
+            generation=st.st_mtime_ns,
+            public_url=self.public_url(path),
+        )
+
+    def _range_sync(self, path: str, start: int, end: int) -> bytes:
+        with open(self._file(path), "rb") as fh:
+            fh.seek(start)
+            return fh.read(end - start + 1)
+
+    def _list_sync(self, prefix: str, delimiter: Optional[str]) -> List[ObjectInfo]:
+        # Only walk the directory the prefix points into, not the whole root.
+        base = prefix.rsplit("/", 1)[0] if "/" in prefix else ""
+        start = self._file(base) if base else self.root
+        if not start.is_dir():
+            return []
+        results = []
+        for dirpath, dirnames, filenames in os.walk(start):
+            if delimiter == "/":
+                dirnames[:] = []
+            for filename in filenames:
+                if filename.startswith(".tmp-"):
+                    continue
+                name = Path(dirpath, filename).relative_to(self.root).as_posix()
+                if not name.startswith(prefix):
+                    continue
+                if delimiter and delimiter in name[len(prefix):]:
+                    continue
+                results.append(self._stat_sync(name, checksum=False))
+        return sorted((info for info in results if info is not None), key=lambda info: info.name)
+
+    async def read_json_generation(self, path: str) -> Tuple[Any, int]:
+        data, generation = await state.run_io(self._read_sync, path)
+        if data is None:
+            return [], 0
+        return json.loads(data), generation
+
+    async def write_json_generation(self, path: str, payload: bytes, if_generation_match) -> int:
+        return await state.run_io(self._write_sync, path, payload, if_generation_match)
+
+    async def stat(self, path: str, checksum: bool = True) -> Optional[ObjectInfo]:
+        return await state.run_io(self._stat_sync, path, checksum)
+
+    async def exists(self, path: str) -> bool:
+        return await state.run_io(self._file(path).is_file)
+
+    async def delete(self, path: str) -> bool:
+        def _delete():
+            try:
+                self._file(path).unlink()
+                self._md5_cache.pop(path, None)
+                return True
+            except FileNotFoundError:
+                return False
+
+        return await state.run_io(_delete)
+
+    async def download_bytes(self, path: str) -> bytes:
+        data, _ = await state.run_media_io(self._read_sync, path)
+        if data is None:
+            raise FileNotFoundError(path)
+        return data
+
+    async def read_range(self, path: str, start: int, end: int) -> bytes:
+        return await state.run_media_io(self._range_sync, path, start, end)
+
+    async def iter_bytes(
+        self, path: str, start: int = 0, end: Optional[int] = None, chunk_size: int = _CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        fh = await state.run_media_io(open, self._file(path), "rb")
+        try:
+            if start:
+                await state.run_media_io(fh.seek, start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = chunk_size if remaining is None else min(chunk_size, remaining)
+                chunk = await state.run_media_io(fh.read, size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            await state.run_media_io(fh.close)
+
+    async def upload_bytes(self, path: str, data, content_type: Optional[str] = None) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        await state.run_media_io(self._write_sync, path, data)
+
+    async def upload_file(self, path: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> None:
+        await state.run_media_io(self._write_sync, path, fileobj)
+
+    async def list_prefix(self, prefix: str, delimiter: Optional[str] = None) -> List[ObjectInfo]:
+        return await state.run_io(self._list_sync, prefix, delimiter)
+
+    def public_url(self, path: str) -> str:
+        if self.base_url:
+            return f"{self.base_url}/{path}"
+        return self._file(path).as_uri()
+
+
+gcs_backend: GcsBackend = GcsBackend()
+local_backend: Optional[LocalBackend] = None
+
+
+def current() -> StorageBackend:
+    """The backend selected by ``config.STORAGE_BACKEND``."""
+    if local_backend is not None:
+        return local_backend
+    return gcs_backend
+
+
+def configure(kind: Optional[str] = None) -> StorageBackend:
+    """(Re)select the backend; called at startup."""
+    global local_backend
+    kind = (kind or config.STORAGE_BACKEND).lower()
+    if kind == "local":
+        local_backend = LocalBackend(config.LOCAL_STORAGE_ROOT, config.LOCAL_STORAGE_BASE_URL)
+        logging.info(f"Using local storage backend at {local_backend.root}")
+    else:
+        local_backend = None
+    return current()
@@ -0,0 +1,111 @@
+# storage_manager/backups.py
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Set, Tuple
+
+from . import config, state
+
+_TS_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+def backup_path(index_path: str, ts: Optional[datetime] = None) -> str:
+    """Where the pre-write copy of *index_path* goes, outside the media folders."""
+    stamp = (ts or datetime.utcnow()).strftime(_TS_FORMAT)
+    return f"{config.BACKUP_PREFIX}{index_path}.backup.{stamp}"
+
+
+def _list_backups_sync(index_path: str) -> List[Tuple[datetime, str]]:
+    """Backups of *index_path*, newest first, including legacy ones next to the index."""
+    found = []
+    for prefix in (f"{config.BACKUP_PREFIX}{index_path}.backup.", f"{index_path}.backup."):
+        for blob in state.bucket.list_blobs(prefix=prefix, fields="items(name),nextPageToken"):
+            try:
+                ts = datetime.strptime(blob.name.rsplit(".backup.", 1)[-1], _TS_FORMAT)
+            except ValueError:
+                continue
+            found.append((ts, blob.name))
+    return sorted(found, reverse=True)
+
+
+def _prune_backups_sync(
+    index_path: str,
+    keep_last: int = config.BACKUP_KEEP_LAST,
+    keep_days: float = config.BACKUP_KEEP_DAYS,
+    now: Optional[datetime] = None,
+) -> List[str]:
+    """Delete backups of *index_path* outside the retention policy; returns the deleted paths.
+
+    A backup is kept while it is among the newest *keep_last* or younger than
+    *keep_days*; a limit of 0 disables that rule, and with both disabled
+    nothing is deleted.
+    """
+    if keep_last <= 0 and keep_days <= 0:
+        return []
+    cutoff = (now or datetime.utcnow()) - timedelta(days=keep_days) if keep_days > 0 else None
+    deleted = []
+    for n, (ts, name) in enumerate(_list_backups_sync(index_path)):
+        if keep_last > 0 and n < keep_last:
+            continue
+        if cutoff is not None and ts >= cutoff:
+            continue
+        try:
+            state.bucket.blob(name).delete()
+            deleted.append(name)
+        except Exception as exc:
+            logging.warning(f"Could not delete backup {name}: {exc}")
+    return deleted
+
+
+class BackupPruner:
+    """Applies the backup retention policy after each sync apply and on a timer."""
+
+    def __init__(self, interval: float = config.BACKUP_PRUNE_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    async def prune(self, index_path: Optional[str] = None) -> int:
+        """Prune one index's backups, or every index's when *index_path* is None."""
+        if state.bucket is None:
+            return 0
+        paths = [index_path] if index_path else sorted({cfg["index"] for cfg in config.STORAGE_MAP.values()})
+        total = 0
+        for path in paths:
+            deleted = await state.run_io(_prune_backups_sync, path, config.BACKUP_KEEP_LAST, config.BACKUP_KEEP_DAYS)
+            if deleted:
+                total += len(deleted)
+                state._log_event("backups_pruned", index=path, deleted=len(deleted))
+        return total
+
+    async def _prune_quietly(self, index_path: Optional[str] = None) -> None:
+        try:
+            await self.prune(index_path)
+        except Exception as exc:
+            logging.error(f"Backup pruning failed: {exc}")
+
+    def schedule(self, index_path: str) -> None:
+        """Prune *index_path* in the background (after a new backup was written)."""
+        task = asyncio.get_running_loop().create_task(self._prune_quietly(index_path))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._prune_quietly()
+
+    def start(self) -> None:
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = list(self._pending) + ([self._task] if self._task is not None else [])
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+
+backup_pruner: BackupPruner = BackupPruner()
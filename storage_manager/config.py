@@ -11,6 +11,18 @@ FTP_USER = os.environ.get("FTP_USER", "")
 FTP_PASS = os.environ.get("FTP_PASS", "")
 FTP_DIR = os.environ.get("FTP_DIR", "/shaders")
 FTP_ENABLED = bool(FTP_HOST)
+# Logged-in sessions are pooled; idle ones are NOOP-checked before reuse and
+# closed after FTP_MAX_IDLE_SECONDS.
+FTP_POOL_SIZE = int(os.environ.get("FTP_POOL_SIZE", "4"))
+FTP_NOOP_AFTER_SECONDS = float(os.environ.get("FTP_NOOP_AFTER_SECONDS", "15"))
+FTP_MAX_IDLE_SECONDS = float(os.environ.get("FTP_MAX_IDLE_SECONDS", "120"))
+FTP_TIMEOUT_SECONDS = float(os.environ.get("FTP_TIMEOUT_SECONDS", "30"))
+# Concurrent fetch+upload pipelines in /api/admin/sync-ftp-to-gcs (capped by FTP_POOL_SIZE).
+FTP_IMPORT_CONCURRENCY = int(os.environ.get("FTP_IMPORT_CONCURRENCY", "4"))
+
+# --- BULK UPLOAD CONFIGURATION ---
+# Concurrent blob uploads in /api/admin/bulk-upload-shaders.
+BULK_UPLOAD_CONCURRENCY = int(os.environ.get("BULK_UPLOAD_CONCURRENCY", "8"))
 
 # --- STORAGE MAP ---
 STORAGE_MAP = {
@@ -39,11 +51,83 @@ REDIS_PORT = int(os.environ.get("REDIS_PORT", "6379"))
 REDIS_DB = int(os.environ.get("REDIS_DB", "0"))
 REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD")
 
+# --- INTENT STORE CONFIGURATION ---
+# memory: per-process (single worker only); sqlite: shared by workers on one
+# host; redis: shared by every worker and replica (uses the REDIS_* settings).
+INTENT_STORE_BACKEND: str = os.environ.get("INTENT_STORE_BACKEND", "memory")
+INTENT_STORE_SQLITE_PATH: str = os.environ.get("INTENT_STORE_SQLITE_PATH", "./intents.sqlite3")
+# Expired intents are swept this often in the background (0 disables).
+INTENT_CLEANUP_INTERVAL_SECONDS: float = float(os.environ.get("INTENT_CLEANUP_INTERVAL_SECONDS", "300"))
+
+# --- LOCK CONFIGURATION ---
+# local: per-process asyncio locks (single worker); redis: leased keys;
+# gcs: lock objects under LOCK_PREFIX written with generation preconditions
+# on the configured storage backend.  Locks reduce index write conflicts; the
+# index store's generation-checked writes are what keep indexes consistent.
+LOCK_BACKEND: str = os.environ.get("LOCK_BACKEND", "local")
+LOCK_LEASE_SECONDS: float = float(os.environ.get("LOCK_LEASE_SECONDS", "30"))
+LOCK_ACQUIRE_TIMEOUT_SECONDS: float = float(os.environ.get("LOCK_ACQUIRE_TIMEOUT_SECONDS", "30"))
+LOCK_PREFIX: str = os.environ.get("LOCK_PREFIX", "_locks/")
+
+# --- BACKUP CONFIGURATION ---
+# Sync apply copies the previous index to BACKUP_PREFIX<index>.backup.<ts>.
+# Backups are kept while among the newest BACKUP_KEEP_LAST or younger than
+# BACKUP_KEEP_DAYS (0 disables a rule); the rest are pruned after each apply
+# and every BACKUP_PRUNE_INTERVAL_SECONDS.
+BACKUP_PREFIX: str = os.environ.get("BACKUP_PREFIX", "_backups/")
+BACKUP_KEEP_LAST: int = int(os.environ.get("BACKUP_KEEP_LAST", "20"))
+BACKUP_KEEP_DAYS: float = float(os.environ.get("BACKUP_KEEP_DAYS", "30"))
+BACKUP_PRUNE_INTERVAL_SECONDS: float = float(os.environ.get("BACKUP_PRUNE_INTERVAL_SECONDS", "3600"))
+
 # --- RATE LIMIT CONFIGURATION ---
 RATE_LIMIT_REQUESTS = int(os.environ.get("RATE_LIMIT_REQUESTS", "120"))
 RATE_LIMIT_WINDOW = int(os.environ.get("RATE_LIMIT_WINDOW", "60"))
 RATE_LIMIT_PATHS = [path.strip() for path in os.environ.get("RATE_LIMIT_PATHS", "/api").split(",") if path.strip()]
 RATE_LIMIT_IP_HEADER = os.environ.get("RATE_LIMIT_IP_HEADER", "X-Forwarded-For")
+# Per-route budgets as "prefix=requests/window_seconds", longest prefix wins;
+# other RATE_LIMIT_PATHS use RATE_LIMIT_REQUESTS per RATE_LIMIT_WINDOW.
+RATE_LIMIT_RULES = os.environ.get(
+    "RATE_LIMIT_RULES",
+    "/api/admin/sync=20/60,/api/videos/=600/60,/api/images/=600/60,/api/music/=600/60,/api/samples/=600/60",
+)
+# memory: token buckets per worker; redis: sliding windows shared by all workers.
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# --- HEALTH CHECK CONFIGURATION ---
+# /api/health/ready probes storage with one metadata read, shared by
+# concurrent probes and cached for HEALTH_READY_CACHE_SECONDS.  A worker whose
+# event loop lags or whose executor backlog exceeds these limits reports
+# itself not ready (liveness only reports them).
+HEALTH_READY_CACHE_SECONDS: float = float(os.environ.get("HEALTH_READY_CACHE_SECONDS", "10"))
+HEALTH_CHECK_TIMEOUT_SECONDS: float = float(os.environ.get("HEALTH_CHECK_TIMEOUT_SECONDS", "5"))
+HEALTH_MAX_LOOP_LAG_SECONDS: float = float(os.environ.get("HEALTH_MAX_LOOP_LAG_SECONDS", "0.5"))
+HEALTH_MAX_EXECUTOR_QUEUE: int = int(os.environ.get("HEALTH_MAX_EXECUTOR_QUEUE", "100"))
+
+# --- METRICS CONFIGURATION ---
+# Prometheus text exposition at /metrics (per worker process).
+METRICS_ENABLED: bool = os.environ.get("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# --- GCS I/O CONFIGURATION ---
+# "auto" uses the aiohttp JSON API client when aiohttp is installed and
+# credentials resolve, "aiohttp" requires it, "thread" always uses the
+# synchronous client on the worker pools below.
+GCS_IO_BACKEND = os.environ.get("GCS_IO_BACKEND", "auto").lower()
+# Worker threads for the synchronous client: index/metadata calls vs media transfers.
+IO_METADATA_WORKERS: int = int(os.environ.get("IO_METADATA_WORKERS", "20"))
+IO_MEDIA_WORKERS: int = int(os.environ.get("IO_MEDIA_WORKERS", "8"))
+# Connection pool sizes for the aiohttp client, per operation class.
+GCS_METADATA_POOL_SIZE: int = int(os.environ.get("GCS_METADATA_POOL_SIZE", "64"))
+GCS_MEDIA_POOL_SIZE: int = int(os.environ.get("GCS_MEDIA_POOL_SIZE", "16"))
+GCS_HTTP_TIMEOUT_SECONDS: float = float(os.environ.get("GCS_HTTP_TIMEOUT_SECONDS", "60"))
+
+# --- STORAGE BACKEND CONFIGURATION ---
+# "gcs" serves objects from GCP_BUCKET_NAME; "local" stores them as files
+# under LOCAL_STORAGE_ROOT (offline development and benchmarks).
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "gcs").lower()
+LOCAL_STORAGE_ROOT = os.environ.get("LOCAL_STORAGE_ROOT", "./local_bucket")
+# Base URL that serves LOCAL_STORAGE_ROOT, used for public/thumbnail URLs (file:// when empty).
+LOCAL_STORAGE_BASE_URL = os.environ.get("LOCAL_STORAGE_BASE_URL", "")
 
 # --- MEDIA STREAMING CONFIGURATION ---
 GCS_SIGNED_URL_MAX_SECONDS = 604800
@@ -52,6 +136,62 @@ GCS_SIGNED_URL_EXPIRATION_SECONDS: int = min(
     GCS_SIGNED_URL_MAX_SECONDS,
 )
 MEDIA_STREAM_MAX_CONCURRENT: int = int(os.environ.get("MEDIA_STREAM_MAX_CONCURRENT", "10"))
+# Proxied media is read and sent in ranged chunks of this size, so memory per
+# stream stays bounded regardless of file size.
+MEDIA_STREAM_CHUNK_BYTES: int = int(os.environ.get("MEDIA_STREAM_CHUNK_BYTES", str(1024 * 1024)))
+# Signed redirect URLs are reused until this fraction of their lifetime has
+# passed, then re-signed.
+SIGNED_URL_REFRESH_FRACTION: float = float(os.environ.get("SIGNED_URL_REFRESH_FRACTION", "0.5"))
+SIGNED_URL_CACHE_MAX_ENTRIES: int = int(os.environ.get("SIGNED_URL_CACHE_MAX_ENTRIES", "10000"))
+
+# --- MEDIA DISK CACHE CONFIGURATION ---
+# Proxied media that is requested repeatedly is kept on local disk, keyed by
+# object generation.  Disabled while MEDIA_CACHE_DIR is empty.
+MEDIA_CACHE_DIR: str = os.environ.get("MEDIA_CACHE_DIR", "")
+MEDIA_CACHE_MAX_BYTES: int = int(os.environ.get("MEDIA_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+MEDIA_CACHE_MAX_OBJECT_BYTES: int = int(os.environ.get("MEDIA_CACHE_MAX_OBJECT_BYTES", str(512 * 1024 ** 2)))
+MEDIA_CACHE_ADMIT_AFTER: int = int(os.environ.get("MEDIA_CACHE_ADMIT_AFTER", "2"))
+MEDIA_CACHE_MAX_FILLS: int = int(os.environ.get("MEDIA_CACHE_MAX_FILLS", "2"))
+
+# --- INDEX STORE CONFIGURATION ---
+# Mutations to resident indexes are flushed to GCS once no further writes have
+# arrived for INDEX_FLUSH_DELAY_SECONDS, and never later than
+# INDEX_FLUSH_MAX_DELAY_SECONDS after the first unflushed write.
+INDEX_FLUSH_DELAY_SECONDS: float = float(os.environ.get("INDEX_FLUSH_DELAY_SECONDS", "2.0"))
+INDEX_FLUSH_MAX_DELAY_SECONDS: float = float(os.environ.get("INDEX_FLUSH_MAX_DELAY_SECONDS", "10.0"))
+INDEX_FLUSH_MAX_RETRIES: int = int(os.environ.get("INDEX_FLUSH_MAX_RETRIES", "3"))
+# A resident index older than this re-checks the remote generation (one
+# metadata call) before it is served and merges in other workers' writes.
+# 0 disables revalidation.
+INDEX_REVALIDATE_SECONDS: float = float(os.environ.get("INDEX_REVALIDATE_SECONDS", "5.0"))
+# snapshot: every flush rewrites the whole _xxx.json index.  eventlog: flushes
+# append the changed entries to JSON-lines segments under INDEX_LOG_PREFIX and
+# a compactor folds them into the index every INDEX_LOG_COMPACT_INTERVAL_SECONDS
+# or after INDEX_LOG_COMPACT_SEGMENTS segments.
+INDEX_STORAGE_MODE: str = os.environ.get("INDEX_STORAGE_MODE", "snapshot").lower()
+INDEX_LOG_PREFIX: str = os.environ.get("INDEX_LOG_PREFIX", "_index_log/")
+INDEX_LOG_COMPACT_SEGMENTS: int = int(os.environ.get("INDEX_LOG_COMPACT_SEGMENTS", "50"))
+INDEX_LOG_COMPACT_INTERVAL_SECONDS: float = float(os.environ.get("INDEX_LOG_COMPACT_INTERVAL_SECONDS", "300"))
+
+# --- COUNTER AGGREGATION CONFIGURATION ---
+# Play/rating increments are coalesced in memory and folded into the resident
+# indexes every COUNTER_FOLD_INTERVAL_SECONDS or after COUNTER_FOLD_MAX_PENDING
+# events.  Increments are journalled per process under COUNTER_LOG_DIR so a
+# crash can replay them; set it to an empty string to keep them in memory only.
+COUNTER_LOG_DIR = os.environ.get("COUNTER_LOG_DIR", "./counter_journal")
+COUNTER_LOG_FSYNC = os.environ.get("COUNTER_LOG_FSYNC", "0").lower() in ("1", "true", "yes")
+COUNTER_FOLD_INTERVAL_SECONDS: float = float(os.environ.get("COUNTER_FOLD_INTERVAL_SECONDS", "5.0"))
+COUNTER_FOLD_MAX_PENDING: int = int(os.environ.get("COUNTER_FOLD_MAX_PENDING", "1000"))
+
+# --- HTTP CACHING CONFIGURATION ---
+# Cache-Control sent with ETag-validated index listings and WGSL source.
+HTTP_INDEX_CACHE_CONTROL = os.environ.get("HTTP_INDEX_CACHE_CONTROL", "no-cache")
+HTTP_WGSL_CACHE_CONTROL = os.environ.get("HTTP_WGSL_CACHE_CONTROL", "public, max-age=300")
+
+# Serialised (and gzip/brotli-compressed) listing bodies kept in memory.
+RESPONSE_CACHE_MAX_BYTES: int = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_SECONDS: float = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "300"))
+RESPONSE_COMPRESS_MIN_BYTES: int = int(os.environ.get("RESPONSE_COMPRESS_MIN_BYTES", "1000"))
 
 # --- CORS & EXTENSIONS ---
 ALLOWED_ORIGINS = [
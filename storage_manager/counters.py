@@ -0,0 +1,435 @@
+# storage_manager/counters.py
+import os
+import glob
+import json
+import time
+import uuid
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from . import config, state, indexes
+
+# Journal files are per process: counters.<owner>.live.log is appended to,
+# counters.<owner>.<ms>.<seq>.folded.log are rotated segments and
+# counters.<owner>.lock is held with flock for as long as the owner runs.
+_LIVE_SUFFIX = ".live.log"
+_SEGMENT_SUFFIX = ".folded.log"
+_LOCK_SUFFIX = ".lock"
+# Journals written before they were per process (single shared file).
+_LEGACY_LOG = "counters.log"
+
+
+@dataclass
+class CounterDelta:
+    """Coalesced play/rating increments for one index entry."""
+
+    plays: int = 0
+    rating_count: int = 0
+    rating_sum: float = 0.0
+    last_played: Optional[str] = None
+
+    def merge(self, other: "CounterDelta") -> None:
+        self.plays += other.plays
+        self.rating_count += other.rating_count
+        self.rating_sum += other.rating_sum
+        if other.last_played is not None and (self.last_played is None or other.last_played > self.last_played):
+            self.last_played = other.last_played
+
+    def apply(self, entry: dict) -> None:
+        """Fold this delta into an index entry in place."""
+        if self.plays:
+            entry["play_count"] = (entry.get("play_count") or 0) + self.plays
+        if self.last_played is not None:
+            entry["last_played"] = self.last_played
+        if self.rating_count:
+            count = entry.get("rating_count") or 0
+            stars = entry.get("stars") or 0.0
+            new_count = count + self.rating_count
+            entry["stars"] = round(((stars * count) + self.rating_sum) / new_count, 2)
+            entry["rating_count"] = new_count
+
+    def to_record(self, resource_type: str, item_id: str) -> dict:
+        return {
+            "t": resource_type,
+            "id": item_id,
+            "p": self.plays,
+            "rc": self.rating_count,
+            "rs": self.rating_sum,
+            "lp": self.last_played,
+        }
+
+    @classmethod
+    def from_record(cls, record: dict) -> Tuple[str, str, "CounterDelta"]:
+        delta = cls(
+            plays=int(record.get("p") or 0),
+            rating_count=int(record.get("rc") or 0),
+            rating_sum=float(record.get("rs") or 0.0),
+            last_played=record.get("lp"),
+        )
+        return record["t"], record["id"], delta
+
+
+class CounterAggregator:
+    """Coalesce play/rating hits per id and fold them into resident indexes.
+
+    Hot routes call :meth:`record`, which only touches memory (plus one
+    buffered append to the local journal when ``log_dir`` is set).  A
+    background task folds pending deltas into ``indexes.index_store`` on an
+    interval or once ``fold_max_pending`` events have accumulated, flushes the
+    touched indexes and then discards the journal segment that covered them.
+
+    Every process writes its own journal, so workers sharing ``log_dir``
+    never rotate each other's files.  At startup a process adopts and
+    replays the journals of owners that are gone (their lock is free), so
+    increments are delivered at least once.
+    """
+
+    def __init__(
+        self,
+        log_dir: str = config.COUNTER_LOG_DIR,
+        fold_interval: float = config.COUNTER_FOLD_INTERVAL_SECONDS,
+        fold_max_pending: int = config.COUNTER_FOLD_MAX_PENDING,
+        fsync: bool = config.COUNTER_LOG_FSYNC,
+    ) -> None:
+        self.log_dir = log_dir
+        self.fold_interval = fold_interval
+        self.fold_max_pending = fold_max_pending
+        self.fsync = fsync
+        self._pending: Dict[Tuple[str, str], CounterDelta] = {}
+        self._events = 0
+        # Bumped on every recorded hit so response caches can key on it.
+        self.epoch = 0
+        self._log_file = None
+        self._owner: Optional[str] = None
+        self._owner_pid: Optional[int] = None
+        self._lock_fd: Optional[int] = None
+        self._segments: List[Tuple[str, Set[str]]] = []
+        self._segment_seq = 0
+        self._fold_lock: Optional[asyncio.Lock] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # --- journal -------------------------------------------------------------
+
+    def _log_path(self, name: str) -> str:
+        return os.path.join(self.log_dir, name)
+
+    def _own(self, suffix: str, owner: Optional[str] = None) -> str:
+        return self._log_path(f"counters.{owner or self._owner}{suffix}")
+
+    def _ensure_owner(self) -> None:
+        """Claim a journal owner id for this process and hold its lock."""
+        if self._owner is not None and self._owner_pid == os.getpid():
+            return
+        # A forked child must not write to (or unlock) its parent's journal.
+        self._log_file = None
+        self._lock_fd = None
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._owner_pid = os.getpid()
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._lock_fd = os.open(self._own(_LOCK_SUFFIX), os.O_CREAT | os.O_RDWR, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _release_owner(self) -> None:
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+        if self._lock_fd is not None and self._owner_pid == os.getpid():
+            try:
+                os.remove(self._own(_LOCK_SUFFIX))
+            except FileNotFoundError:
+                pass
+            os.close(self._lock_fd)
+        self._lock_fd = None
+        self._owner = None
+
+    def _append_log(self, resource_type: str, item_id: str, delta: CounterDelta) -> None:
+        if not self.log_dir:
+            return
+        self._ensure_owner()
+        if self._log_file is None:
+            self._log_file = open(self._own(_LIVE_SUFFIX), "a", encoding="utf-8")
+        self._log_file.write(json.dumps(delta.to_record(resource_type, item_id)) + "\n")
+        self._log_file.flush()
+        if self.fsync:
+            os.fsync(self._log_file.fileno())
+
+    def _next_segment(self) -> str:
+        self._segment_seq += 1
+        return self._own(f".{int(time.time() * 1000)}.{self._segment_seq}{_SEGMENT_SUFFIX}")
+
+    def _rotate_log(self) -> Optional[str]:
+        """Close this process's live journal and rename it to a numbered segment."""
+        if not self.log_dir or self._owner is None:
+            return None
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+        current = self._own(_LIVE_SUFFIX)
+        if not os.path.exists(current):
+            return None
+        segment = self._next_segment()
+        os.replace(current, segment)
+        return segment
+
+    def _claim_orphan(self, owner: str) -> Tuple[bool, Optional[int]]:
+        """``(gone, fd)``: whether *owner*'s process is gone, and its lock fd if now held by us."""
+        try:
+            fd = os.open(self._own(_LOCK_SUFFIX, owner), os.O_RDWR)
+        except FileNotFoundError:
+            # Cleanly stopped owners remove their lock; what they left is orphaned.
+            return True, None
+        if fcntl is None:
+            os.close(fd)
+            try:
+                os.kill(int(owner.split("-", 1)[0]), 0)
+            except (ProcessLookupError, ValueError):
+                return True, None
+            except PermissionError:
+                pass
+            return False, None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False, None
+        return True, fd
+
+    def _adopt_orphans(self) -> None:
+        """Rename journals of dead owners (and legacy ones) into this owner's segments."""
+        by_owner: Dict[str, List[str]] = {}
+        for path in glob.glob(self._log_path("counters.*")):
+            name = os.path.basename(path)
+            owner = name.split(".")[1] if name.count(".") >= 2 else ""
+            if owner == self._owner:
+                continue
+            if "-" not in owner:
+                # Pre-upgrade layout (counters.log, counters.<ms>.<seq>.folded.log).
+                owner = ""
+            by_owner.setdefault(owner, []).append(path)
+        for owner, paths in by_owner.items():
+            gone, fd = self._claim_orphan(owner) if owner else (True, None)
+            if not gone:
+                continue
+            for path in sorted(paths):
+                if path.endswith(_LOCK_SUFFIX):
+                    continue
+                try:
+                    os.replace(path, self._next_segment())
+                except FileNotFoundError:
+                    # Another process adopted it first.
+                    continue
+            if owner:
+                try:
+                    os.remove(self._own(_LOCK_SUFFIX, owner))
+                except FileNotFoundError:
+                    pass
+            if fd is not None:
+                os.close(fd)
+
+    def replay(self) -> int:
+        """Adopt journals left by processes that are gone and load their increments.
+
+        Returns the event count.  Journals of owners that still run are left
+        alone; they fold their own increments.
+        """
+        if not self.log_dir or not os.path.isdir(self.log_dir):
+            return 0
+        self._ensure_owner()
+        self._rotate_log()
+        self._adopt_orphans()
+        tracked = {path for path, _ in self._segments}
+        paths = sorted(
+            path for path in glob.glob(self._own(f".*{_SEGMENT_SUFFIX}")) if path not in tracked
+        )
+        events = 0
+        for path in paths:
+            types: Set[str] = set()
+            try:
+                with open(path, "r", encoding="utf-8") as fh:
+                    for line in fh:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            resource_type, item_id, delta = CounterDelta.from_record(json.loads(line))
+                        except (ValueError, KeyError, TypeError):
+                            # A torn final line from a crash mid-write is expected.
+                            continue
+                        self._merge_pending(resource_type, item_id, delta)
+                        types.add(resource_type)
+                        events += 1
+            except OSError as exc:
+                logging.error("Failed to replay counter journal %s: %s", path, exc)
+                continue
+            self._segments.append((path, types))
+        if events:
+            state._log_event("counters_replayed", events=events, segments=len(paths))
+        return events
+
+    # --- recording -----------------------------------------------------------
+
+    def _merge_pending(self, resource_type: str, item_id: str, delta: CounterDelta) -> None:
+        key = (resource_type, item_id)
+        existing = self._pending.get(key)
+        if existing is None:
+            self._pending[key] = CounterDelta(
+                delta.plays, delta.rating_count, delta.rating_sum, delta.last_played
+            )
+        else:
+            existing.merge(delta)
+
+    def pending(self, resource_type: str, item_id: str) -> Optional[CounterDelta]:
+        return self._pending.get((resource_type, item_id))
+
+    def overlay(self, resource_type: str, entry: dict) -> dict:
+        """Return a copy of *entry* with not-yet-folded increments applied."""
+        view = dict(entry)
+        delta = self._pending.get((resource_type, entry.get("id")))
+        if delta is not None:
+            delta.apply(view)
+        return view
+
+    def overlay_many(self, resource_type: str, entries: List[dict]) -> List[dict]:
+        """:meth:`overlay` for a list; entries without pending increments are returned as is."""
+        if not self._pending:
+            return entries
+        return [
+            self.overlay(resource_type, entry) if (resource_type, entry.get("id")) in self._pending else entry
+            for entry in entries
+        ]
+
+    def record(
+        self,
+        resource_type: str,
+        entry: dict,
+        plays: int = 0,
+        rating: Optional[float] = None,
+        last_played: Optional[str] = None,
+    ) -> dict:
+        """Record one hit against *entry* and return its projected values."""
+        delta = CounterDelta(
+            plays=plays,
+            rating_count=1 if rating is not None else 0,
+            rating_sum=float(rating) if rating is not None else 0.0,
+            last_played=last_played,
+        )
+        item_id = entry["id"]
+        self._append_log(resource_type, item_id, delta)
+        self._merge_pending(resource_type, item_id, delta)
+        self._events += 1
+        self.epoch += 1
+        if self._events >= self.fold_max_pending and self._wake is not None:
+            self._wake.set()
+        return self.overlay(resource_type, entry)
+
+    # --- folding -------------------------------------------------------------
+
+    async def fold(self) -> int:
+        """Apply pending deltas to the resident indexes and flush them. Returns ids folded."""
+        if self._fold_lock is None:
+            self._fold_lock = asyncio.Lock()
+        async with self._fold_lock:
+            if not self._pending and not self._segments:
+                return 0
+
+            # Load every index first so pending deltas never vanish from view
+            # between being taken off the queue and landing in an index.
+            resident: Dict[str, indexes.ResidentIndex] = {}
+            for resource_type in {key[0] for key in self._pending}:
+                try:
+                    resident[resource_type] = await indexes.index_store.get(resource_type)
+                except Exception as exc:
+                    logging.error("Counter fold could not load %s index: %s", resource_type, exc)
+
+            pending = {k: v for k, v in self._pending.items() if k[0] in resident}
+            self._pending = {k: v for k, v in self._pending.items() if k[0] not in resident}
+            self._events = len(self._pending)
+            segment = self._rotate_log()
+
+            touched: Set[str] = set()
+            for (resource_type, item_id), delta in pending.items():
+                if resident[resource_type].apply(item_id, delta.apply) is not None:
+                    touched.add(resource_type)
+
+            if segment is not None:
+                self._segments.append((segment, {key[0] for key in pending} | {key[0] for key in self._pending}))
+            for resource_type in touched:
+                try:
+                    await indexes.index_store.flush(resource_type)
+                except Exception as exc:
+                    # The index stays dirty; its debounced flush will retry.
+                    logging.error("Counter fold could not flush %s index: %s", resource_type, exc)
+            await self._confirm_segments()
+            return len(pending)
+
+    async def _confirm_segments(self) -> None:
+        """Delete journal segments whose increments are durable in GCS."""
+        remaining: List[Tuple[str, Set[str]]] = []
+        for path, types in self._segments:
+            try:
+                for resource_type in types:
+                    if any(key[0] == resource_type for key in self._pending):
+                        raise RuntimeError(f"{resource_type} increments not folded yet")
+                    await indexes.index_store.flush(resource_type)
+            except Exception as exc:
+                logging.warning("Keeping counter journal %s: %s", path, exc)
+                remaining.append((path, types))
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._segments = remaining
+
+    # --- lifecycle -----------------------------------------------------------
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.fold_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.fold()
+            except Exception as exc:
+                logging.error("Counter fold failed: %s", exc)
+                state._log_event("counter_fold_failed", error=str(exc))
+
+    def start(self) -> None:
+        """Replay any journal left by a crash and start the periodic folder."""
+        self._pending.clear()
+        self._segments.clear()
+        self._events = 0
+        self._fold_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self.replay()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic folder and fold whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        try:
+            await self.fold()
+        except Exception as exc:
+            logging.error("Final counter fold failed: %s", exc)
+        # Unflushed segments stay on disk and are adopted by the next process.
+        self._release_owner()
+
+
+counter_aggregator: CounterAggregator = CounterAggregator()
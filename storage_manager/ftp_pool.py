@@ -0,0 +1,156 @@
+# storage_manager/ftp_pool.py
+import io
+import time
+import ftplib
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Iterator, List, Tuple, TypeVar
+
+from . import config
+
+T = TypeVar("T")
+
+# Errors that mean the control connection is unusable, not that the command failed.
+_CONNECTION_ERRORS = (EOFError, OSError, ftplib.error_temp, ftplib.error_reply, ftplib.error_proto)
+
+
+class FtpPool:
+    """Bounded pool of logged-in FTP sessions, already in ``FTP_DIR``.
+
+    Used from executor threads.  At most *max_size* sessions exist at once;
+    borrowers block until one is free.  A session idle for longer than
+    *noop_after* is checked with ``NOOP`` before reuse, and one idle for
+    longer than *max_idle* is closed instead, since servers drop idle
+    control connections.  A session that fails with a connection error is
+    discarded, and the call is retried once on a fresh session.
+    """
+
+    def __init__(
+        self,
+        host: str = config.FTP_HOST,
+        user: str = config.FTP_USER,
+        password: str = config.FTP_PASS,
+        directory: str = config.FTP_DIR,
+        max_size: int = config.FTP_POOL_SIZE,
+        noop_after: float = config.FTP_NOOP_AFTER_SECONDS,
+        max_idle: float = config.FTP_MAX_IDLE_SECONDS,
+        timeout: float = config.FTP_TIMEOUT_SECONDS,
+        factory: Callable[..., ftplib.FTP] = ftplib.FTP,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.host = host
+        self.user = user
+        self.password = password
+        self.directory = directory
+        self.max_size = max(1, max_size)
+        self.noop_after = noop_after
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._factory = factory
+        self._clock = clock
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._lock = threading.Lock()
+        self._idle: Deque[Tuple[ftplib.FTP, float]] = deque()
+        self.connects = 0
+
+    def _connect(self) -> ftplib.FTP:
+        ftp = self._factory(self.host, timeout=self.timeout)
+        try:
+            ftp.login(self.user, self.password)
+            ftp.cwd(self.directory)
+        except BaseException:
+            self._close(ftp)
+            raise
+        with self._lock:
+            self.connects += 1
+        return ftp
+
+    @staticmethod
+    def _close(ftp: ftplib.FTP) -> None:
+        try:
+            ftp.quit()
+        except Exception:
+            try:
+                ftp.close()
+            except Exception:
+                pass
+
+    def _take_idle(self) -> ftplib.FTP:
+        # The caller already holds a slot, so connecting outside the lock
+        # cannot exceed max_size; it only keeps other borrowers from waiting
+        # on this login to return or take idle sessions.
+        while True:
+            with self._lock:
+                # Most recently used first: it is the least likely to have timed out.
+                ftp, returned_at = self._idle.pop() if self._idle else (None, 0.0)
+            if ftp is None:
+                return self._connect()
+            idle_for = self._clock() - returned_at
+            if idle_for > self.max_idle:
+                self._close(ftp)
+                continue
+            if idle_for > self.noop_after:
+                try:
+                    ftp.voidcmd("NOOP")
+                except Exception:
+                    self._close(ftp)
+                    continue
+            return ftp
+
+    @contextmanager
+    def session(self) -> Iterator[ftplib.FTP]:
+        """Borrow a session; it goes back to the pool unless the connection broke."""
+        self._slots.acquire()
+        ftp = None
+        try:
+            ftp = self._take_idle()
+            yield ftp
+        except _CONNECTION_ERRORS:
+            if ftp is not None:
+                self._close(ftp)
+                ftp = None
+            raise
+        finally:
+            if ftp is not None:
+                with self._lock:
+                    self._idle.append((ftp, self._clock()))
+            self._slots.release()
+
+    def run(self, fn: Callable[[ftplib.FTP], T]) -> T:
+        """Call *fn* with a pooled session, retrying once if the session was dead."""
+        try:
+            with self.session() as ftp:
+                return fn(ftp)
+        except _CONNECTION_ERRORS as exc:
+            logging.info(f"FTP session failed ({exc}); retrying on a new connection")
+            with self.session() as ftp:
+                return fn(ftp)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for ftp, _ in idle:
+            self._close(ftp)
+
+    def __len__(self) -> int:
+        return len(self._idle)
+
+
+def _retr_text(ftp: ftplib.FTP, filename: str) -> str:
+    buffer = io.BytesIO()
+    ftp.retrbinary(f"RETR {filename}", buffer.write)
+    return buffer.getvalue().decode("utf-8")
+
+
+def fetch_text(filename: str) -> str:
+    """Download *filename* from ``FTP_DIR`` as UTF-8 over a pooled session."""
+    return pool.run(lambda ftp: _retr_text(ftp, filename))
+
+
+def list_names() -> List[str]:
+    return pool.run(lambda ftp: ftp.nlst())
+
+
+pool: FtpPool = FtpPool()
@@ -0,0 +1,373 @@
+# storage_manager/gcs_io.py
+import json
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, BinaryIO, List, Optional, Tuple
+from urllib.parse import quote
+
+from . import config, state, utils
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+_API_ROOT = "https://storage.googleapis.com/storage/v1"
+_UPLOAD_ROOT = "https://storage.googleapis.com/upload/storage/v1"
+_SCOPES = ["https://www.googleapis.com/auth/devstorage.read_write"]
+# Idempotent reads are retried on these statuses and on connection errors,
+# matching what google-cloud-storage's DEFAULT_RETRY covers for the sync client.
+_RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+_READ_ATTEMPTS = 4
+_RETRY_BASE_DELAY = 0.25
+# Object metadata requested by stat/list_prefix; the fields ObjectInfo carries.
+_OBJECT_FIELDS = "name,size,contentType,md5Hash,updated,generation"
+_TRANSIENT_ERRORS = (asyncio.TimeoutError,) + ((aiohttp.ClientError,) if aiohttp is not None else ())
+
+
+class GcsError(Exception):
+    """Error response from the GCS JSON API; ``code`` is the HTTP status.
+
+    ``code`` matches the attribute google.api_core exceptions carry, so
+    callers such as the index store recognise 412 the same way for both
+    clients.
+    """
+
+    def __init__(self, code: int, message: str = "") -> None:
+        super().__init__(f"GCS request failed ({code}): {message}")
+        self.code = code
+
+
+class ObjectResource:
+    """A JSON API object resource with the attribute names of a ``Blob``.
+
+    ``backends._blob_info`` reads either this or a google-cloud-storage
+    blob, so both clients hand back metadata in the same shape.
+    """
+
+    def __init__(self, resource: dict, bucket_name: str) -> None:
+        self.name = resource["name"]
+        self.size = int(resource["size"]) if "size" in resource else None
+        self.content_type = resource.get("contentType")
+        self.md5_hash = resource.get("md5Hash")
+        self.generation = int(resource.get("generation") or 0)
+        updated = resource.get("updated")
+        self.updated = datetime.fromisoformat(updated.replace("Z", "+00:00")) if updated else None
+        self.public_url = f"https://storage.googleapis.com/{bucket_name}/{quote(self.name, safe='/~')}"
+
+
+class GcsIO:
+    """Blob operations used by routes and the index store.
+
+    This implementation drives the synchronous google-cloud-storage client:
+    JSON and existence checks run on ``state.io_executor``, media transfers
+    on ``state.media_executor``.  It always targets the current
+    ``state.bucket`` and is the fallback whenever the async client is
+    unavailable.
+    """
+
+    name = "thread"
+
+    async def read_json(self, path: str) -> Any:
+        """Parsed JSON at *path*, or ``[]`` when the object does not exist."""
+        return await state.run_io(utils._read_json_sync, path)
+
+    async def read_json_generation(self, path: str) -> Tuple[Any, int]:
+        """``(data, generation)`` for *path*; ``([], 0)`` when it does not exist."""
+        return await state.run_io(utils._read_json_generation_sync, path)
+
+    async def write_json(self, path: str, data: Any) -> None:
+        await state.run_io(utils._write_json_sync, path, data)
+
+    async def write_json_generation(self, path: str, payload: bytes, if_generation_match) -> int:
+        """Upload *payload* only if the live generation matches; returns the new generation."""
+        return await state.run_io(utils._write_json_generation_sync, path, payload, if_generation_match)
+
+    async def exists(self, path: str) -> bool:
+        return await state.run_io(state.bucket.blob(path).exists)
+
+    async def stat(self, path: str):
+        """The blob (metadata loaded) at *path*, or None when it does not exist."""
+        return await state.run_io(state.bucket.get_blob, path)
+
+    async def list_prefix(self, prefix: str, delimiter: Optional[str] = None) -> list:
+        """Blobs under *prefix*; with *delimiter* only direct children."""
+        kwargs = {"prefix": prefix}
+        if delimiter:
+            kwargs["delimiter"] = delimiter
+        return await state.run_io(lambda: list(state.bucket.list_blobs(**kwargs)))
+
+    async def delete(self, path: str) -> bool:
+        """Delete *path*; returns False if it did not exist."""
+        blob = state.bucket.blob(path)
+        if not await state.run_io(blob.exists):
+            return False
+        await state.run_io(blob.delete)
+        return True
+
+    async def download_bytes(self, path: str) -> bytes:
+        return await state.run_media_io(state.bucket.blob(path).download_as_bytes)
+
+    async def download_text(self, path: str) -> str:
+        return await state.run_media_io(state.bucket.blob(path).download_as_text)
+
+    async def read_range(self, path: str, start: int, end: int) -> bytes:
+        """Bytes ``start..end`` (inclusive) of *path*."""
+        from google.cloud.storage.retry import DEFAULT_RETRY
+
+        blob = state.bucket.blob(path)
+        # GCS download_as_bytes end is *exclusive*
+        return await state.run_media_io(blob.download_as_bytes, start=start, end=end + 1, retry=DEFAULT_RETRY)
+
+    async def upload_bytes(self, path: str, data, content_type: Optional[str] = None) -> None:
+        blob = state.bucket.blob(path)
+        await state.run_media_io(blob.upload_from_string, data, content_type=content_type)
+
+    async def upload_file(self, path: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> None:
+        blob = state.bucket.blob(path)
+        await state.run_media_io(blob.upload_from_file, fileobj, content_type=content_type)
+
+    async def close(self) -> None:
+        pass
+
+
+class AiohttpGcsIO(GcsIO):
+    """GCS JSON API client on aiohttp, with one connection pool per operation class.
+
+    Index and metadata calls share a pool of ``metadata_pool`` connections;
+    uploads and downloads use a separate pool of ``media_pool``, so neither
+    class of traffic occupies a worker thread while waiting on the network.
+    """
+
+    name = "aiohttp"
+
+    def __init__(
+        self,
+        bucket,
+        credentials,
+        metadata_pool: int = config.GCS_METADATA_POOL_SIZE,
+        media_pool: int = config.GCS_MEDIA_POOL_SIZE,
+        timeout: float = config.GCS_HTTP_TIMEOUT_SECONDS,
+    ) -> None:
+        self.bucket = bucket
+        self.bucket_name = bucket.name
+        self.credentials = credentials
+        self.metadata_pool = metadata_pool
+        self.media_pool = media_pool
+        self.timeout = timeout
+        self._sessions = {}
+        self._token_lock: Optional[asyncio.Lock] = None
+
+    # --- plumbing ------------------------------------------------------------
+
+    def _session(self, pool: str):
+        session = self._sessions.get(pool)
+        if session is None or session.closed:
+            limit = self.media_pool if pool == "media" else self.metadata_pool
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=limit),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._sessions[pool] = session
+        return session
+
+    async def _token(self) -> str:
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        async with self._token_lock:
+            if not self.credentials.valid:
+                from google.auth.transport.requests import Request as AuthRequest
+                await state.run_io(self.credentials.refresh, AuthRequest())
+        return self.credentials.token
+
+    def _object_url(self, path: str) -> str:
+        return f"{_API_ROOT}/b/{quote(self.bucket_name, safe='')}/o/{quote(path, safe='')}"
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        pool: str = "metadata",
+        params: Optional[dict] = None,
+        data=None,
+        headers: Optional[dict] = None,
+        allow_missing: bool = False,
+    ) -> Tuple[int, dict, bytes]:
+        request_headers = {"Authorization": f"Bearer {await self._token()}"}
+        request_headers.update(headers or {})
+        async with self._session(pool).request(
+            method, url, params=params, data=data, headers=request_headers
+        ) as resp:
+            body = await resp.read()
+            if resp.status == 404 and allow_missing:
+                return resp.status, dict(resp.headers), body
+            if resp.status >= 400:
+                raise GcsError(resp.status, body[:200].decode("utf-8", "replace"))
+            return resp.status, dict(resp.headers), body
+
+    async def _read_with_retry(self, url: str, params: dict, headers: Optional[dict] = None) -> bytes:
+        """GET on the media pool, retrying transient failures with exponential backoff."""
+        for attempt in range(_READ_ATTEMPTS):
+            try:
+                _, _, body = await self._request("GET", url, pool="media", params=params, headers=headers)
+                return body
+            except GcsError as exc:
+                if exc.code not in _RETRY_STATUSES or attempt == _READ_ATTEMPTS - 1:
+                    raise
+            except _TRANSIENT_ERRORS:
+                if attempt == _READ_ATTEMPTS - 1:
+                    raise
+            await asyncio.sleep(_RETRY_BASE_DELAY * (2 ** attempt))
+
+    async def _upload(self, path: str, data, content_type: Optional[str], pool: str, params: Optional[dict] = None) -> dict:
+        query = {"uploadType": "media", "name": path}
+        query.update(params or {})
+        _, _, body = await self._request(
+            "POST",
+            f"{_UPLOAD_ROOT}/b/{quote(self.bucket_name, safe='')}/o",
+            pool=pool,
+            params=query,
+            data=data,
+            headers={"Content-Type": content_type or "application/octet-stream"},
+        )
+        return json.loads(body) if body else {}
+
+    # --- operations ----------------------------------------------------------
+
+    async def read_json(self, path: str) -> Any:
+        data, _ = await self.read_json_generation(path)
+        return data
+
+    async def read_json_generation(self, path: str) -> Tuple[Any, int]:
+        status, headers, body = await self._request(
+            "GET", self._object_url(path), params={"alt": "media"}, allow_missing=True
+        )
+        if status == 404:
+            return [], 0
+        return json.loads(body), int(headers.get("x-goog-generation") or 0)
+
+    async def write_json(self, path: str, data: Any) -> None:
+        await self._upload(path, json.dumps(data).encode(), "application/json", pool="metadata")
+
+    async def write_json_generation(self, path: str, payload: bytes, if_generation_match) -> int:
+        params = {}
+        if if_generation_match is not None:
+            params["ifGenerationMatch"] = str(if_generation_match)
+        resource = await self._upload(path, payload, "application/json", pool="metadata", params=params)
+        return int(resource.get("generation") or 0)
+
+    async def exists(self, path: str) -> bool:
+        status, _, _ = await self._request(
+            "GET", self._object_url(path), params={"fields": "name"}, allow_missing=True
+        )
+        return status != 404
+
+    async def stat(self, path: str) -> Optional[ObjectResource]:
+        status, _, body = await self._request(
+            "GET", self._object_url(path), params={"fields": _OBJECT_FIELDS}, allow_missing=True
+        )
+        if status == 404:
+            return None
+        return ObjectResource(json.loads(body), self.bucket_name)
+
+    async def list_prefix(self, prefix: str, delimiter: Optional[str] = None) -> List[ObjectResource]:
+        url = f"{_API_ROOT}/b/{quote(self.bucket_name, safe='')}/o"
+        params = {"prefix": prefix, "fields": f"items({_OBJECT_FIELDS}),nextPageToken"}
+        if delimiter:
+            params["delimiter"] = delimiter
+        objects = []
+        while True:
+            _, _, body = await self._request("GET", url, params=params)
+            page = json.loads(body) if body else {}
+            objects.extend(ObjectResource(item, self.bucket_name) for item in page.get("items", ()))
+            token = page.get("nextPageToken")
+            if not token:
+                return objects
+            params = {**params, "pageToken": token}
+
+    async def delete(self, path: str) -> bool:
+        status, _, _ = await self._request("DELETE", self._object_url(path), allow_missing=True)
+        return status != 404
+
+    async def download_bytes(self, path: str) -> bytes:
+        return await self._read_with_retry(self._object_url(path), {"alt": "media"})
+
+    async def download_text(self, path: str) -> str:
+        return (await self.download_bytes(path)).decode("utf-8")
+
+    async def read_range(self, path: str, start: int, end: int) -> bytes:
+        return await self._read_with_retry(
+            self._object_url(path), {"alt": "media"}, headers={"Range": f"bytes={start}-{end}"}
+        )
+
+    async def upload_bytes(self, path: str, data, content_type: Optional[str] = None) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        await self._upload(path, data, content_type, pool="media")
+
+    async def upload_file(self, path: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> None:
+        # aiohttp streams file objects in chunks from its own executor.
+        await self._upload(path, fileobj, content_type, pool="media")
+
+    async def close(self) -> None:
+        for session in self._sessions.values():
+            if not session.closed:
+                await session.close()
+        self._sessions.clear()
+
+
+def _load_credentials():
+    from google.oauth2 import service_account
+
+    if config.CREDENTIALS_JSON:
+        info = json.loads(config.CREDENTIALS_JSON)
+        return service_account.Credentials.from_service_account_info(info, scopes=_SCOPES)
+    import google.auth
+
+    credentials, _ = google.auth.default(scopes=_SCOPES)
+    return credentials
+
+
+thread_io: GcsIO = GcsIO()
+async_io: Optional[AiohttpGcsIO] = None
+
+
+def current() -> GcsIO:
+    """The client to use for ``state.bucket``.
+
+    The async client is only returned while ``state.bucket`` is still the
+    bucket it was opened for, so swapping the bucket (as tests do) falls back
+    to the synchronous client automatically.
+    """
+    if async_io is not None and async_io.bucket is state.bucket:
+        return async_io
+    return thread_io
+
+
+async def start() -> GcsIO:
+    """Select the client according to ``config.GCS_IO_BACKEND``."""
+    global async_io
+    await stop()
+    mode = config.GCS_IO_BACKEND
+    if mode == "thread" or state.bucket is None:
+        return current()
+    if aiohttp is None:
+        if mode == "aiohttp":
+            logging.warning("GCS_IO_BACKEND=aiohttp but aiohttp is not installed; using the sync client")
+        return current()
+    try:
+        credentials = await state.run_io(_load_credentials)
+    except Exception as exc:
+        logging.warning(f"Async GCS client unavailable, using the sync client: {exc}")
+        return current()
+    async_io = AiohttpGcsIO(state.bucket, credentials)
+    state._log_event("gcs_io_started", backend=async_io.name)
+    return async_io
+
+
+async def stop() -> None:
+    global async_io
+    if async_io is not None:
+        await async_io.close()
+        async_io = None
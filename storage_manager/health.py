@@ -0,0 +1,137 @@
+# storage_manager/health.py
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from . import config, state, backends, indexes
+
+
+async def loop_lag() -> float:
+    """Seconds a callback scheduled now waits for the event loop to run it."""
+    loop = asyncio.get_running_loop()
+    ran = loop.create_future()
+    t0 = loop.time()
+    loop.call_soon(ran.set_result, None)
+    await ran
+    return loop.time() - t0
+
+
+def executor_stats(executor: ThreadPoolExecutor) -> dict:
+    return {
+        "max_workers": executor._max_workers,
+        "threads": len(executor._threads),
+        "queued": executor._work_queue.qsize(),
+    }
+
+
+def executors() -> Dict[str, dict]:
+    return {"io": executor_stats(state.io_executor), "media": executor_stats(state.media_executor)}
+
+
+async def liveness() -> dict:
+    """Process-local signals only; never touches storage."""
+    lag = await loop_lag()
+    pools = executors()
+    saturated = lag > config.HEALTH_MAX_LOOP_LAG_SECONDS or any(
+        pool["queued"] > config.HEALTH_MAX_EXECUTOR_QUEUE for pool in pools.values()
+    )
+    return {
+        "status": "saturated" if saturated else "ok",
+        "loop_lag_ms": round(lag * 1000, 2),
+        "executors": pools,
+    }
+
+
+class StorageProbe:
+    """Cached storage connectivity check.
+
+    One metadata read of the shader index (missing is fine: the request
+    still reached the bucket).  Concurrent callers share the in-flight
+    probe, and its result is reused for *ttl* seconds, so load balancer
+    probes cost at most one storage request per worker per *ttl*.
+    """
+
+    def __init__(
+        self,
+        ttl: float = config.HEALTH_READY_CACHE_SECONDS,
+        timeout: float = config.HEALTH_CHECK_TIMEOUT_SECONDS,
+        clock=time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.timeout = timeout
+        self._clock = clock
+        self._result: Optional[dict] = None
+        self._checked_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+        self.probes = 0
+
+    def reset(self) -> None:
+        self._result = None
+        self._inflight = None
+
+    async def _probe(self) -> dict:
+        self.probes += 1
+        t0 = time.monotonic()
+        try:
+            await asyncio.wait_for(
+                backends.current().stat(config.STORAGE_MAP["shader"]["index"], checksum=False), self.timeout
+            )
+            result = {"ok": True}
+        except asyncio.TimeoutError:
+            result = {"ok": False, "error": f"storage probe timed out after {self.timeout}s"}
+        except Exception as e:
+            result = {"ok": False, "error": str(e)}
+        result["latency_ms"] = round((time.monotonic() - t0) * 1000, 1)
+        result["backend"] = backends.current().name
+        return result
+
+    async def _run(self) -> dict:
+        try:
+            result = await self._probe()
+            self._result, self._checked_at = result, self._clock()
+            return result
+        finally:
+            self._inflight = None
+
+    async def check(self) -> dict:
+        now = self._clock()
+        if self._result is not None and now - self._checked_at < self.ttl:
+            return {**self._result, "age_seconds": round(now - self._checked_at, 1)}
+        if self._inflight is None or self._inflight.get_loop() is not asyncio.get_running_loop():
+            self._inflight = asyncio.ensure_future(self._run())
+        # Shielded: a probe client disconnecting must not cancel the shared check.
+        result = await asyncio.shield(self._inflight)
+        return {**result, "age_seconds": 0.0}
+
+
+storage_probe = StorageProbe()
+
+
+async def readiness() -> dict:
+    live = await liveness()
+    storage = await storage_probe.check()
+    ready = storage["ok"] and live["status"] == "ok"
+    return {
+        "status": "ready" if ready else "not_ready",
+        "storage": storage,
+        "loop_lag_ms": live["loop_lag_ms"],
+        "executors": live["executors"],
+    }
+
+
+def index_stats() -> Dict[str, dict]:
+    """Counts from the resident indexes; types not loaded yet are not fetched."""
+    report = {}
+    for item_type in config.STORAGE_MAP:
+        idx = indexes.index_store.resident(item_type)
+        if idx is None:
+            report[item_type] = {"count": None, "status": "not_loaded"}
+        else:
+            report[item_type] = {
+                "count": len(idx),
+                "status": "loaded",
+                "dirty": idx.dirty,
+                "age_seconds": round(time.time() - idx.loaded_at, 1),
+            }
+    return report
@@ -0,0 +1,314 @@
+# storage_manager/http_cache.py
+import gzip
+import json
+import time
+import base64
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from email.utils import formatdate, parsedate_to_datetime
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+from . import config, metrics
+
+
+_CODING_SUFFIXES = ('-br"', '-gzip"')
+
+
+def _etag_values(header: str):
+    for value in header.split(","):
+        value = value.strip()
+        if value.startswith("W/"):
+            value = value[2:]
+        # Encoded variants carry the identity ETag plus a coding suffix.
+        for suffix in _CODING_SUFFIXES:
+            if value.endswith(suffix):
+                value = value[: -len(suffix)] + '"'
+                break
+        if value:
+            yield value
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match names *etag* (weak comparison, RFC 9110)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return any(value == "*" or value == etag for value in _etag_values(header))
+
+
+def http_date(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return formatdate(timestamp, usegmt=True)
+
+
+def not_modified_since(request: Request, timestamp: Optional[float]) -> bool:
+    """True if If-Modified-Since covers *timestamp*; ignored when If-None-Match is sent."""
+    header = request.headers.get("if-modified-since")
+    if not header or timestamp is None or request.headers.get("if-none-match"):
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    return int(timestamp) <= since.timestamp()
+
+
+def validator_headers(etag: str, cache_control: str, last_modified: Optional[str] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    return headers
+
+
+def not_modified(etag: str, cache_control: str, last_modified: Optional[str] = None) -> Response:
+    return Response(status_code=304, headers=validator_headers(etag, cache_control, last_modified))
+
+
+def serialize_json(payload: Any) -> bytes:
+    """Serialise *payload* the way JSONResponse does."""
+    return json.dumps(
+        jsonable_encoder(payload),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+@lru_cache(maxsize=None)
+def _adapter(model) -> TypeAdapter:
+    return TypeAdapter(model)
+
+
+def apply_response_model(request: Request, payload: Any) -> Any:
+    """Filter *payload* through the matched route's ``response_model``, if any.
+
+    Returning a Response directly bypasses FastAPI's own response_model
+    handling, so routes that do so call this to keep their declared shape.
+    """
+    model = getattr(request.scope.get("route"), "response_model", None)
+    if model is None:
+        return payload
+    adapter = _adapter(model)
+    return adapter.dump_python(adapter.validate_python(payload), mode="json", by_alias=True)
+
+
+def body_etag(body: bytes) -> str:
+    """Strong ETag for a response body."""
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def md5_etag(blob) -> Optional[str]:
+    """Strong ETag from a GCS blob's base64 ``md5_hash`` (None for composite objects)."""
+    md5 = getattr(blob, "md5_hash", None)
+    if not isinstance(md5, str):
+        return None
+    try:
+        return f'"{base64.b64decode(md5).hex()}"'
+    except (ValueError, TypeError):
+        return None
+
+
+def conditional_json(
+    request: Request,
+    payload: Any,
+    cache_control: str = config.HTTP_INDEX_CACHE_CONTROL,
+) -> Response:
+    """Serve *payload* as JSON with a content-hash ETag, or 304 if the client has it.
+
+    The ETag is derived from the serialised body rather than from index
+    generations, so two workers holding different unflushed changes can never
+    hand out the same validator for different bodies.
+    """
+    body = serialize_json(apply_response_model(request, payload))
+    etag = body_etag(body)
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers=validator_headers(etag, cache_control),
+    )
+
+
+# --- pre-encoded response bodies ---------------------------------------------
+
+def _compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def supported_codings() -> List[str]:
+    """Content-codings we can produce, most preferred first."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best supported coding from an Accept-Encoding header, or None for identity."""
+    if not accept_encoding:
+        return None
+    qualities: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            qualities[coding] = q
+    best, best_q = None, 0.0
+    for coding in supported_codings():
+        q = qualities.get(coding, qualities.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class EncodedBody:
+    """One serialised JSON body plus its compressed variants, built on demand."""
+
+    def __init__(self, body: bytes, expires_at: float) -> None:
+        self.body = body
+        self.etag = body_etag(body)
+        self.expires_at = expires_at
+        self.variants: Dict[str, bytes] = {}
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(v) for v in self.variants.values())
+
+    def encoded(self, coding: str) -> bytes:
+        data = self.variants.get(coding)
+        if data is None:
+            data = self.variants[coding] = _compress(self.body, coding)
+        return data
+
+
+class ResponseBodyCache:
+    """Byte-bounded LRU of serialised listing bodies.
+
+    Keys must identify the exact content (e.g. include ``ResidentIndex.token``),
+    so entries never need explicit invalidation; the TTL only bounds how long
+    an unused body lingers before its bytes are reclaimed.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = config.RESPONSE_CACHE_MAX_BYTES,
+        ttl: float = config.RESPONSE_CACHE_TTL_SECONDS,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, EncodedBody]" = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: str) -> Optional[EncodedBody]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, body: bytes) -> EncodedBody:
+        self._discard(key)
+        entry = EncodedBody(body, time.monotonic() + self.ttl)
+        if self.max_bytes > 0 and len(body) <= self.max_bytes:
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict()
+        return entry
+
+    def encoded(self, key: str, entry: EncodedBody, coding: str) -> bytes:
+        """Return *entry* encoded with *coding*, accounting the new variant's bytes."""
+        before = entry.size
+        data = entry.encoded(coding)
+        if self._entries.get(key) is entry:
+            self._bytes += entry.size - before
+            self._evict(keep=key)
+        return data
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            if oldest == keep and len(self._entries) == 1:
+                break
+            self._discard(oldest)
+
+
+body_cache: ResponseBodyCache = ResponseBodyCache()
+
+
+def cached_json(
+    request: Request,
+    key: str,
+    build: Callable[[], Any],
+    cache_control: str = config.HTTP_INDEX_CACHE_CONTROL,
+) -> Response:
+    """Like :func:`conditional_json`, but serialise ``build()`` once per *key*.
+
+    The body is stored with gzip (and brotli, when installed) variants that
+    are served directly to clients advertising them; GZipMiddleware passes
+    responses that already carry a Content-Encoding through untouched.
+    *key* must change whenever the payload would, and is scoped to the
+    request path so routes with different response models never share one.
+    """
+    key = f"{request.url.path}|{key}"
+    entry = body_cache.get(key)
+    metrics.CACHE_REQUESTS.inc(cache="response_body", result="miss" if entry is None else "hit")
+    if entry is None:
+        entry = body_cache.put(key, serialize_json(apply_response_model(request, build())))
+
+    coding = None
+    if len(entry.body) >= config.RESPONSE_COMPRESS_MIN_BYTES:
+        coding = negotiate_encoding(request.headers.get("accept-encoding"))
+    etag = entry.etag if coding is None else f'{entry.etag[:-1]}-{coding}"'
+    headers = validator_headers(etag, cache_control)
+    headers["Vary"] = "Accept-Encoding"
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+
+    if coding is None:
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+    headers["Content-Encoding"] = coding
+    return Response(
+        content=body_cache.encoded(key, entry, coding),
+        media_type="application/json",
+        headers=headers,
+    )
@@ -0,0 +1,144 @@
+# storage_manager/index_log.py
+import json
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Tuple
+
+from . import config, state, backends
+
+_LOAD_ATTEMPTS = 3
+
+
+def encode_events(events: Iterable[dict]) -> bytes:
+    return "".join(json.dumps(event, separators=(",", ":")) + "\n" for event in events).encode()
+
+
+def decode_events(payload: bytes) -> List[dict]:
+    return [json.loads(line) for line in payload.decode("utf-8").splitlines() if line.strip()]
+
+
+def apply_events(entries: List[Any], events: Iterable[dict]) -> List[Any]:
+    """Replay ``put``/``del``/``reset`` events on top of *entries*.
+
+    Events carry whole entries, so replaying one that a snapshot already
+    contains is harmless.  Existing entries keep their position; new ones go
+    on top, newest first, like ``ResidentIndex.upsert``.
+    """
+    def keyed(items: List[Any]) -> "OrderedDict[Any, Any]":
+        out: "OrderedDict[Any, Any]" = OrderedDict()
+        for n, entry in enumerate(items):
+            item_id = entry.get("id") if isinstance(entry, dict) else None
+            out[item_id if item_id is not None else ("#", n)] = entry
+        return out
+
+    base = keyed(entries)
+    head: "OrderedDict[Any, Any]" = OrderedDict()
+    for event in events:
+        op = event.get("op")
+        if op == "reset":
+            base, head = keyed(event.get("entries") or []), OrderedDict()
+        elif op == "put":
+            item_id = event["id"]
+            if item_id in base:
+                base[item_id] = event["entry"]
+            else:
+                head.pop(item_id, None)
+                head[item_id] = event["entry"]
+        elif op == "del":
+            base.pop(event["id"], None)
+            head.pop(event["id"], None)
+    return list(reversed(head.values())) + list(base.values())
+
+
+class IndexEventLog:
+    """Append-only log of index mutations next to each ``_xxx.json`` snapshot.
+
+    Each flush writes one JSON-lines segment ``<prefix><type>/<seq>.jsonl``
+    with ``if_generation_match=0``, so two writers can never take the same
+    sequence number; the loser reloads and retries.  ``cursor.json`` records
+    the last segment folded into the snapshot (the ordinary index blob).
+    Compaction rewrites the snapshot conditionally on its generation, moves
+    the cursor and deletes folded segments except the newest one.
+    """
+
+    def __init__(self, prefix: str = config.INDEX_LOG_PREFIX) -> None:
+        self.prefix = prefix
+
+    def _dir(self, resource_type: str) -> str:
+        return f"{self.prefix}{resource_type}/"
+
+    def _segment(self, resource_type: str, seq: int) -> str:
+        return f"{self._dir(resource_type)}{seq:012d}.jsonl"
+
+    def _cursor(self, resource_type: str) -> str:
+        return f"{self._dir(resource_type)}cursor.json"
+
+    async def read_cursor(self, resource_type: str) -> int:
+        data, _ = await backends.current().read_json_generation(self._cursor(resource_type))
+        return int(data.get("through", 0)) if isinstance(data, dict) else 0
+
+    async def segments(self, resource_type: str) -> List[int]:
+        seqs = []
+        for info in await backends.current().list_prefix(self._dir(resource_type)):
+            name = info.name.rsplit("/", 1)[-1]
+            if name.endswith(".jsonl") and name[:-6].isdigit():
+                seqs.append(int(name[:-6]))
+        return sorted(seqs)
+
+    async def _read_segments(self, resource_type: str, seqs: List[int]) -> List[dict]:
+        payloads = await asyncio.gather(
+            *(backends.current().download_bytes(self._segment(resource_type, seq)) for seq in seqs)
+        )
+        events: List[dict] = []
+        for payload in payloads:
+            events.extend(decode_events(payload))
+        return events
+
+    async def load(self, path: str, resource_type: str) -> Tuple[Any, int, int]:
+        """``(entries, last_seq, cursor)``: the snapshot at *path* with the log tail applied."""
+        for attempt in range(_LOAD_ATTEMPTS):
+            # Cursor before snapshot: a compaction in between only causes
+            # harmless replays, never skipped segments.
+            through = await self.read_cursor(resource_type)
+            entries, _ = await backends.current().read_json_generation(path)
+            tail = [seq for seq in await self.segments(resource_type) if seq > through]
+            try:
+                events = await self._read_segments(resource_type, tail)
+            except Exception:
+                # A segment was folded and deleted while we listed; reread the cursor.
+                if attempt == _LOAD_ATTEMPTS - 1:
+                    raise
+                continue
+            if isinstance(entries, list) and events:
+                entries = apply_events(entries, events)
+            return entries, (tail[-1] if tail else through), through
+        raise RuntimeError("unreachable")
+
+    async def append(self, resource_type: str, seq: int, payload: bytes) -> int:
+        """Write segment *seq*; raises a 412-coded error if it is taken or already folded."""
+        await backends.current().write_json_generation(self._segment(resource_type, seq), payload, 0)
+        # Slots below the cursor may have been deleted by a compaction; a
+        # segment created there is ignored by readers, so report a conflict.
+        if await self.read_cursor(resource_type) >= seq:
+            raise backends.PreconditionFailed(f"{resource_type} log segment {seq} is behind the snapshot")
+        return seq
+
+    async def compact(self, path: str, resource_type: str) -> Tuple[int, int]:
+        """Fold the tail into the snapshot at *path*. Returns ``(cursor, segments_folded)``."""
+        through = await self.read_cursor(resource_type)
+        entries, generation = await backends.current().read_json_generation(path)
+        existing = await self.segments(resource_type)
+        tail = [seq for seq in existing if seq > through]
+        if not tail:
+            return through, 0
+        events = await self._read_segments(resource_type, tail)
+        if isinstance(entries, list):
+            entries = apply_events(entries, events)
+        await backends.current().write_json_generation(path, json.dumps(entries).encode(), generation)
+        await backends.current().write_json(self._cursor(resource_type), {"through": tail[-1]})
+        # Keep the newest folded segment so its slot cannot be written again.
+        for seq in existing:
+            if seq < tail[-1]:
+                await backends.current().delete(self._segment(resource_type, seq))
+        state._log_event("index_log_compacted", resource_type=resource_type, through=tail[-1], segments=len(tail))
+        return tail[-1], len(tail)
@@ -0,0 +1,604 @@
+# storage_manager/indexes.py
+import json
+import time
+import asyncio
+import logging
+import itertools
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from . import config, state, backends, index_log
+
+
+class IndexCorruptedError(ValueError):
+    """Raised when a STORAGE_MAP index blob does not contain a JSON list."""
+
+
+def _is_precondition_failure(exc: Exception) -> bool:
+    """True for GCS ``PreconditionFailed`` (HTTP 412) without importing google.api_core."""
+    return getattr(exc, "code", None) == 412
+
+
+_index_serials = itertools.count(1)
+
+
+def _current_binding() -> Tuple[Any, Any]:
+    return state.bucket, backends.current()
+
+
+def _same_binding(a: Tuple[Any, Any], b: Tuple[Any, Any]) -> bool:
+    return a[0] is b[0] and a[1] is b[1]
+
+
+class ResidentIndex:
+    """In-memory copy of one ``_xxx.json`` index with id and filename maps.
+
+    Mutations bump ``version`` and record which ids changed so that a flush
+    that loses a generation race can be replayed on top of the remote copy.
+    Callers must report in-place edits of an entry through :meth:`touch`, or
+    use :meth:`apply` for commutative updates such as counter increments,
+    which are re-run against the remote entry instead of overwriting it.
+    """
+
+    def __init__(self, resource_type: str, path: str, entries: List[dict], generation: Any) -> None:
+        self.resource_type = resource_type
+        self.path = path
+        self.entries: List[dict] = entries
+        self.generation = generation
+        self.version = 0
+        self.flushed_version = 0
+        # Bumped on every change to ``entries`` (including conflict merges),
+        # unlike ``version`` which only tracks local mutations for flushing.
+        self.serial = next(_index_serials)
+        self.revision = 0
+        self.loaded_at = time.time()
+        # Monotonic time the generation was last known to match the remote copy.
+        self.checked_at = time.monotonic()
+        self.revalidate_task: Optional[asyncio.Task] = None
+        self.dirty_since: Optional[float] = None
+        self.last_mutation = 0.0
+        self.full_rewrite = False
+        self.flush_task: Optional[asyncio.Task] = None
+        self.flush_lock = asyncio.Lock()
+        # Event-log mode: last segment folded into the snapshot when loaded/compacted.
+        self.log_base = 0
+        self.compact_task: Optional[asyncio.Task] = None
+        self._dirty_ids: Dict[str, int] = {}
+        self._removed_ids: Dict[str, int] = {}
+        # Ids this process created; only these survive a remote copy that lacks them.
+        self._inserted_ids: Dict[str, int] = {}
+        self._updates: Dict[str, List[Tuple[int, Callable[[dict], None]]]] = {}
+        self._by_id: Dict[str, dict] = {}
+        self._by_filename: Dict[str, dict] = {}
+        self._filename_of: Dict[str, str] = {}
+        self._derived: Dict[str, Tuple[int, Any]] = {}
+        self._on_change = None
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self._by_id = {}
+        self._by_filename = {}
+        self._filename_of = {}
+        # Walk oldest-first so earlier (newer) entries win on id/filename collisions.
+        for entry in reversed(self.entries):
+            if isinstance(entry, dict) and entry.get("id") is not None:
+                self._by_id[entry["id"]] = entry
+                self._map_filename(entry)
+
+    def _unmap_filename(self, entry: dict) -> None:
+        name = self._filename_of.pop(entry.get("id"), None)
+        if name is not None and self._by_filename.get(name) is entry:
+            del self._by_filename[name]
+
+    def _map_filename(self, entry: dict) -> None:
+        self._unmap_filename(entry)
+        name = entry.get("filename")
+        if name:
+            self._by_filename[name] = entry
+            self._filename_of[entry["id"]] = name
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def dirty(self) -> bool:
+        return self.version != self.flushed_version
+
+    def get(self, item_id: str) -> Optional[dict]:
+        return self._by_id.get(item_id)
+
+    def get_by_filename(self, filename: str) -> Optional[dict]:
+        return self._by_filename.get(filename)
+
+    @property
+    def token(self) -> str:
+        """Identifies this exact content of the index within the process."""
+        return f"{self.serial}.{self.revision}"
+
+    def derived(self, name: str, build: Callable[["ResidentIndex"], Any]) -> Any:
+        """Return ``build(self)``, memoised until the index next changes."""
+        cached = self._derived.get(name)
+        if cached is not None and cached[0] == self.revision:
+            return cached[1]
+        value = build(self)
+        self._derived[name] = (self.revision, value)
+        return value
+
+    def _changed(self) -> None:
+        self.version += 1
+        self.revision += 1
+        if self._on_change is not None:
+            self._on_change(self)
+
+    def touch(self, item_id: str) -> None:
+        """Record that the entry for *item_id* was modified in place."""
+        entry = self._by_id.get(item_id)
+        if entry is not None and self._filename_of.get(item_id) != entry.get("filename"):
+            self._map_filename(entry)
+        self._dirty_ids[item_id] = self.version + 1
+        self._changed()
+
+    def apply(self, item_id: str, update: Callable[[dict], None]) -> Optional[dict]:
+        """Run *update* on the entry for *item_id* and keep it for conflict replay."""
+        entry = self._by_id.get(item_id)
+        if entry is None:
+            return None
+        update(entry)
+        self._updates.setdefault(item_id, []).append((self.version + 1, update))
+        self._changed()
+        return entry
+
+    def upsert(self, entry: dict, front: bool = True) -> bool:
+        """Insert *entry* (replacing any entry with the same id). Returns True if it existed."""
+        item_id = entry["id"]
+        existing = self._by_id.get(item_id)
+        if existing is not None:
+            self.entries.remove(existing)
+            self._unmap_filename(existing)
+        if front:
+            self.entries.insert(0, entry)
+        else:
+            self.entries.append(entry)
+        self._by_id[item_id] = entry
+        self._map_filename(entry)
+        self._removed_ids.pop(item_id, None)
+        self._dirty_ids[item_id] = self.version + 1
+        if existing is None or self._inserted_ids.pop(item_id, None) is not None:
+            self._inserted_ids[item_id] = self.version + 1
+        self._changed()
+        return existing is not None
+
+    def upsert_many(self, entries: List[dict]) -> List[bool]:
+        """Upsert *entries* as if one at a time at the front, in a single pass.
+
+        Returns, per entry, whether its id already existed.  Rebuilds
+        ``entries`` once instead of a list removal per replaced entry.
+        """
+        if not entries:
+            return []
+        batch: Dict[str, dict] = {}
+        existed = []
+        for entry in entries:
+            item_id = entry["id"]
+            existed.append(item_id in self._by_id or item_id in batch)
+            # Re-inserting moves a repeated id to the newest position.
+            batch.pop(item_id, None)
+            batch[item_id] = entry
+        replaced = {id(self._by_id[item_id]) for item_id in batch if item_id in self._by_id}
+        self.entries = list(reversed(batch.values())) + [e for e in self.entries if id(e) not in replaced]
+        stamp = self.version + 1
+        for item_id, entry in batch.items():
+            existing = self._by_id.get(item_id)
+            if existing is not None:
+                self._unmap_filename(existing)
+            self._by_id[item_id] = entry
+            self._map_filename(entry)
+            self._removed_ids.pop(item_id, None)
+            self._dirty_ids[item_id] = stamp
+            if existing is None or self._inserted_ids.pop(item_id, None) is not None:
+                self._inserted_ids[item_id] = stamp
+        self._changed()
+        return existed
+
+    def remove(self, item_id: str) -> Optional[dict]:
+        existing = self._by_id.pop(item_id, None)
+        if existing is None:
+            return None
+        self.entries.remove(existing)
+        self._unmap_filename(existing)
+        self._dirty_ids.pop(item_id, None)
+        self._inserted_ids.pop(item_id, None)
+        self._removed_ids[item_id] = self.version + 1
+        self._changed()
+        return existing
+
+    def replace_all(self, entries: List[dict]) -> None:
+        """Replace the whole index; the next flush overwrites the remote copy."""
+        self.entries = entries
+        self._reindex()
+        self.full_rewrite = True
+        self._changed()
+
+    def merge_remote(self, remote: List[dict], generation: Any) -> None:
+        """Rebase unflushed local changes on top of a newer remote index."""
+        self.generation = generation
+        if self.full_rewrite:
+            return
+        merged: List[dict] = []
+        seen = set()
+        for entry in remote:
+            item_id = entry.get("id") if isinstance(entry, dict) else None
+            if item_id in self._removed_ids:
+                continue
+            if item_id in self._dirty_ids and item_id in self._by_id:
+                merged.append(self._by_id[item_id])
+                seen.add(item_id)
+            elif item_id in self._updates:
+                rebased = dict(entry)
+                for _, update in self._updates[item_id]:
+                    update(rebased)
+                merged.append(rebased)
+            else:
+                merged.append(entry)
+        # Locally inserted entries the remote has never seen go on top, newest first.
+        # Entries only edited here that the remote no longer has were deleted by
+        # another writer and stay deleted.
+        inserted = [
+            self._by_id[item_id] for item_id in reversed(list(self._inserted_ids))
+            if item_id in self._by_id and item_id not in seen
+        ]
+        self.entries = inserted + merged
+        self._reindex()
+        self.revision += 1
+
+    def pending_events(self) -> List[dict]:
+        """Unflushed changes as event-log records (whole entries, oldest first)."""
+        if self.full_rewrite:
+            return [{"op": "reset", "entries": self.entries}]
+        changed: Dict[str, int] = {}
+        for source in (self._dirty_ids, self._inserted_ids):
+            for item_id, version in source.items():
+                changed[item_id] = max(changed.get(item_id, 0), version)
+        for item_id, updates in self._updates.items():
+            changed[item_id] = max(changed.get(item_id, 0), updates[-1][0])
+        events = [{"op": "del", "id": item_id} for item_id in self._removed_ids]
+        for item_id, _ in sorted(changed.items(), key=lambda kv: kv[1]):
+            entry = self._by_id.get(item_id)
+            if entry is not None:
+                events.append({"op": "put", "id": item_id, "entry": entry})
+        return events
+
+    def mark_flushed(self, snapshot_version: int, generation: Any) -> None:
+        self.generation = generation
+        self.flushed_version = snapshot_version
+        self._dirty_ids = {k: v for k, v in self._dirty_ids.items() if v > snapshot_version}
+        self._removed_ids = {k: v for k, v in self._removed_ids.items() if v > snapshot_version}
+        self._inserted_ids = {k: v for k, v in self._inserted_ids.items() if v > snapshot_version}
+        self._updates = {
+            k: kept for k, kept in (
+                (k, [u for u in v if u[0] > snapshot_version]) for k, v in self._updates.items()
+            ) if kept
+        }
+        if not self.dirty:
+            self.full_rewrite = False
+            self.dirty_since = None
+        else:
+            self.dirty_since = time.monotonic()
+
+
+class IndexStore:
+    """Process-resident cache of STORAGE_MAP indexes with debounced write-behind.
+
+    Each index is downloaded once and served from memory.  Mutations mark it
+    dirty and schedule a flush that uploads the whole list with an
+    ``if_generation_match`` precondition; a 412 reloads the remote copy,
+    replays local changes and retries.  A resident copy not confirmed
+    current for ``revalidate_interval`` seconds re-checks the remote
+    generation before it is served and merges in writes from other workers
+    the same way.  The store is bound to the current
+    ``state.bucket`` and storage backend and drops everything if either is
+    swapped.
+
+    With ``INDEX_STORAGE_MODE=eventlog`` a flush appends only the changed
+    entries to an :class:`index_log.IndexEventLog` segment instead, loads
+    apply the log tail to the snapshot, and a compactor folds the tail back
+    into the snapshot every ``compact_interval`` seconds or ``compact_segments``
+    segments.
+    """
+
+    def __init__(
+        self,
+        flush_delay: float = config.INDEX_FLUSH_DELAY_SECONDS,
+        max_flush_delay: float = config.INDEX_FLUSH_MAX_DELAY_SECONDS,
+        max_retries: int = config.INDEX_FLUSH_MAX_RETRIES,
+        mode: str = config.INDEX_STORAGE_MODE,
+        compact_segments: int = config.INDEX_LOG_COMPACT_SEGMENTS,
+        compact_interval: float = config.INDEX_LOG_COMPACT_INTERVAL_SECONDS,
+        revalidate_interval: float = config.INDEX_REVALIDATE_SECONDS,
+    ) -> None:
+        self.flush_delay = flush_delay
+        self.max_flush_delay = max_flush_delay
+        self.max_retries = max_retries
+        self.log: Optional[index_log.IndexEventLog] = index_log.IndexEventLog() if mode == "eventlog" else None
+        self.compact_segments = compact_segments
+        self.compact_interval = compact_interval
+        self.revalidate_interval = revalidate_interval
+        self._compactor: Optional[asyncio.Task] = None
+        self._indexes: Dict[str, ResidentIndex] = {}
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+        self._binding: Tuple[Any, Any] = (None, None)
+
+    def reset(self) -> None:
+        """Forget every resident index without flushing (used at startup)."""
+        for idx in self._indexes.values():
+            for task in (idx.flush_task, idx.revalidate_task):
+                if task is not None and not task.done():
+                    task.cancel()
+        self._indexes.clear()
+        self._load_locks.clear()
+        self._binding = _current_binding()
+
+    def _is_bound(self) -> bool:
+        return _same_binding(self._binding, _current_binding())
+
+    def _check_binding(self) -> None:
+        if not self._is_bound():
+            self.reset()
+
+    def resident(self, resource_type: str) -> Optional[ResidentIndex]:
+        """Return the resident index for *resource_type* if already loaded."""
+        self._check_binding()
+        return self._indexes.get(resource_type)
+
+    async def get(self, resource_type: str) -> ResidentIndex:
+        """Return the resident index for *resource_type*, loading it on first use.
+
+        Raises ``KeyError`` for types not in ``config.STORAGE_MAP`` so arbitrary
+        names cannot each pin another resident copy.
+        """
+        self._check_binding()
+        idx = self._indexes.get(resource_type)
+        if idx is not None:
+            if self.revalidate_interval > 0 and time.monotonic() - idx.checked_at >= self.revalidate_interval:
+                await self._revalidate(idx)
+            return idx
+
+        if resource_type not in config.STORAGE_MAP:
+            raise KeyError(resource_type)
+        lock = self._load_locks.setdefault(resource_type, asyncio.Lock())
+        async with lock:
+            idx = self._indexes.get(resource_type)
+            if idx is not None:
+                return idx
+            cfg = config.STORAGE_MAP[resource_type]
+            binding = _current_binding()
+            data, generation, base = await self._read(resource_type, cfg["index"])
+            if not isinstance(data, list):
+                raise IndexCorruptedError(f"{resource_type} index corrupted")
+            idx = ResidentIndex(resource_type, cfg["index"], data, generation)
+            idx.log_base = base
+            idx._on_change = self._schedule_flush
+            if _same_binding(binding, _current_binding()):
+                self._indexes[resource_type] = idx
+            return idx
+
+    async def _read(self, resource_type: str, path: str) -> Tuple[Any, Any, int]:
+        """``(entries, generation, log_base)``; in event-log mode the generation is the last segment."""
+        if self.log is not None:
+            return await self.log.load(path, resource_type)
+        data, generation = await backends.current().read_json_generation(path)
+        return data, generation, 0
+
+    async def _remote_generation(self, idx: ResidentIndex) -> Any:
+        """The generation a reload would see, from one metadata call."""
+        if self.log is not None:
+            seqs = await self.log.segments(idx.resource_type)
+            return seqs[-1] if seqs else await self.log.read_cursor(idx.resource_type)
+        info = await backends.current().stat(idx.path, checksum=False)
+        return info.generation if info is not None else 0
+
+    async def refresh(self, resource_type: str) -> ResidentIndex:
+        """Return the resident index after confirming it is at the remote generation.
+
+        For writers that compare or rebuild the whole index (admin sync);
+        errors propagate instead of serving the resident copy.
+        """
+        idx = await self.get(resource_type)
+        await self._revalidate(idx, strict=True)
+        return idx
+
+    async def _revalidate(self, idx: ResidentIndex, strict: bool = False) -> None:
+        """Bring *idx* up to the remote generation; concurrent callers share one check."""
+        task = idx.revalidate_task
+        if task is None or task.done():
+            task = idx.revalidate_task = asyncio.get_running_loop().create_task(self._revalidate_now(idx))
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            if strict:
+                raise
+            # Serve the resident copy; the next check is one interval away.
+            logging.warning("Index revalidation failed for %s: %s", idx.resource_type, exc)
+
+    async def _revalidate_now(self, idx: ResidentIndex) -> None:
+        try:
+            # Under the flush lock so a flush cannot move the generation mid-check.
+            async with idx.flush_lock:
+                if await self._remote_generation(idx) == idx.generation:
+                    return
+                remote, remote_generation, base = await self._read(idx.resource_type, idx.path)
+                if not isinstance(remote, list):
+                    raise IndexCorruptedError(f"{idx.resource_type} index corrupted")
+                idx.merge_remote(remote, remote_generation)
+                idx.log_base = base
+                state._log_event("index_revalidated", resource_type=idx.resource_type, dirty=idx.dirty)
+        finally:
+            idx.checked_at = time.monotonic()
+
+    def invalidate(self, resource_type: str) -> None:
+        """Drop the resident copy so the next read reloads it from GCS.
+
+        Unflushed changes are discarded, including counter folds; writers
+        should change the resident index and :meth:`flush` it instead.
+        """
+        idx = self._indexes.pop(resource_type, None)
+        if idx is not None:
+            for task in (idx.flush_task, idx.revalidate_task):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def _schedule_flush(self, idx: ResidentIndex) -> None:
+        now = time.monotonic()
+        idx.last_mutation = now
+        if idx.dirty_since is None:
+            idx.dirty_since = now
+        if idx.flush_task is None or idx.flush_task.done():
+            idx.flush_task = asyncio.get_running_loop().create_task(self._flush_later(idx))
+
+    async def _flush_later(self, idx: ResidentIndex) -> None:
+        while idx.dirty and self._indexes.get(idx.resource_type) is idx:
+            due = min(idx.last_mutation + self.flush_delay, (idx.dirty_since or 0.0) + self.max_flush_delay)
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            try:
+                await self._flush_index(idx)
+            except Exception as exc:
+                logging.error("Index flush failed for %s: %s", idx.resource_type, exc)
+                state._log_event("index_flush_failed", resource_type=idx.resource_type, error=str(exc))
+                await asyncio.sleep(self.flush_delay)
+
+    async def flush(self, resource_type: str, compact: bool = False) -> bool:
+        """Upload pending changes for *resource_type* now. Returns True if a write happened.
+
+        With *compact*, also fold the event log so the index blob itself is
+        current; callers that read or rewrite the blob directly need this.
+        """
+        idx = self._indexes.get(resource_type)
+        wrote = False
+        if idx is not None and self._is_bound():
+            wrote = await self._flush_index(idx)
+        if compact and self.log is not None:
+            await self.compact(resource_type)
+        return wrote
+
+    async def _flush_index(self, idx: ResidentIndex) -> bool:
+        async with idx.flush_lock:
+            for attempt in range(self.max_retries + 1):
+                if not idx.dirty:
+                    return False
+                snapshot_version = idx.version
+                # Serialised on the event loop so no mutation can interleave.
+                if self.log is not None:
+                    payload = index_log.encode_events(idx.pending_events())
+                else:
+                    payload = json.dumps(idx.entries).encode()
+                try:
+                    if self.log is not None:
+                        generation = await self.log.append(idx.resource_type, idx.generation + 1, payload)
+                    else:
+                        generation = await backends.current().write_json_generation(
+                            idx.path, payload, idx.generation
+                        )
+                except Exception as exc:
+                    if not _is_precondition_failure(exc) or attempt == self.max_retries:
+                        raise
+                    remote, remote_generation, base = await self._read(idx.resource_type, idx.path)
+                    if not isinstance(remote, list):
+                        raise IndexCorruptedError(f"{idx.resource_type} index corrupted")
+                    idx.merge_remote(remote, remote_generation)
+                    idx.log_base = base
+                    state._log_event(
+                        "index_flush_conflict",
+                        resource_type=idx.resource_type,
+                        attempt=attempt + 1,
+                    )
+                    continue
+                idx.mark_flushed(snapshot_version, generation)
+                # The conditional write succeeded, so nothing newer exists remotely.
+                idx.checked_at = time.monotonic()
+                if self.log is not None and idx.generation - idx.log_base >= self.compact_segments:
+                    self._schedule_compaction(idx)
+                return True
+        return False
+
+    def _schedule_compaction(self, idx: ResidentIndex) -> None:
+        if idx.compact_task is None or idx.compact_task.done():
+            idx.compact_task = asyncio.get_running_loop().create_task(self._compact_quietly(idx.resource_type))
+
+    async def compact(self, resource_type: str) -> int:
+        """Fold the event log of *resource_type* into its snapshot. Returns segments folded."""
+        if self.log is None:
+            return 0
+        cfg = config.STORAGE_MAP.get(resource_type, config.STORAGE_MAP["default"])
+        idx = self._indexes.get(resource_type)
+        lock = idx.flush_lock if idx is not None else asyncio.Lock()
+        async with lock:
+            try:
+                through, folded = await self.log.compact(cfg["index"], resource_type)
+            except Exception as exc:
+                if not _is_precondition_failure(exc):
+                    raise
+                # Another worker compacted or rewrote the snapshot first.
+                state._log_event("index_log_compaction_conflict", resource_type=resource_type)
+                return 0
+        if idx is not None and idx.generation >= through:
+            idx.log_base = max(idx.log_base, through)
+        return folded
+
+    async def _compact_quietly(self, resource_type: str) -> None:
+        try:
+            await self.compact(resource_type)
+        except Exception as exc:
+            logging.error("Index log compaction failed for %s: %s", resource_type, exc)
+            state._log_event("index_log_compaction_failed", resource_type=resource_type, error=str(exc))
+
+    async def _compact_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            if not self._is_bound():
+                continue
+            for resource_type in list(self._indexes):
+                await self._compact_quietly(resource_type)
+
+    def start(self) -> None:
+        """Start the periodic compactor (event-log mode only)."""
+        if self.log is not None and self.compact_interval > 0 and (self._compactor is None or self._compactor.done()):
+            self._compactor = asyncio.get_running_loop().create_task(self._compact_loop())
+
+    async def stop(self) -> None:
+        if self._compactor is not None:
+            self._compactor.cancel()
+            try:
+                await self._compactor
+            except asyncio.CancelledError:
+                pass
+            self._compactor = None
+
+    async def flush_all(self) -> None:
+        """Flush every dirty index, cancelling pending timers (used at shutdown)."""
+        if not self._is_bound():
+            return
+        for resource_type, idx in list(self._indexes.items()):
+            if idx.flush_task is not None and not idx.flush_task.done():
+                idx.flush_task.cancel()
+            try:
+                await self._flush_index(idx)
+            except Exception as exc:
+                logging.error("Index flush failed for %s: %s", resource_type, exc)
+                state._log_event("index_flush_failed", resource_type=resource_type, error=str(exc))
+
+
+index_store: IndexStore = IndexStore()
+
+
+async def get_index(resource_type: str, detail: str = "Index corrupted") -> ResidentIndex:
+    """Route helper: the resident index for *resource_type*, HTTP 500 if corrupted."""
+    try:
+        return await index_store.get(resource_type)
+    except IndexCorruptedError:
+        raise HTTPException(500, detail)
@@ -1,10 +1,27 @@
 # storage_manager/intents.py
+import json
 import time
-from dataclasses import dataclass, field as dc_field
+import zlib
+import asyncio
+import logging
+import sqlite3
+import threading
+from dataclasses import asdict, dataclass, field as dc_field
 from typing import Dict, List, Optional, Protocol, runtime_checkable
 
+from . import config, state
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
 INTENT_TTL_SECONDS: float = 3600.0
 DIFF_PREVIEW_CAP: int = 100
+# Executed intents stay inspectable through the audit endpoints this long.
+EXECUTED_RETENTION_SECONDS: float = 7 * 24 * 3600
+# No intent record outlives its creation by more than this (see RedisIntentStore._key_ttl).
+_MAX_RECORD_AGE: float = max(EXECUTED_RETENTION_SECONDS, 2 * INTENT_TTL_SECONDS)
 
 
 @dataclass
@@ -30,10 +47,33 @@ class IntentStore(Protocol):
     def get(self, intent_id: str) -> Optional[SyncIntentDocument]: ...
     def list_recent(self, resource_type: str, limit: int = 20) -> List[SyncIntentDocument]: ...
     def cleanup_expired(self) -> int: ...
+    def transition(self, intent_id: str, from_status: str, to_status: str) -> Optional[SyncIntentDocument]: ...
+
+
+def _is_stale(status: str, created_at: float, expires_at: float, now: float) -> bool:
+    return (status in ("PENDING", "EXPIRED") and now > expires_at) or (
+        status == "EXECUTED" and now - created_at > EXECUTED_RETENTION_SECONDS
+    )
+
+
+def _encode(intent: SyncIntentDocument) -> bytes:
+    """Compact form of a document: zlib-compressed JSON (the full diff dominates)."""
+    return zlib.compress(json.dumps(asdict(intent), separators=(",", ":")).encode(), 6)
+
+
+def _decode(payload: bytes, status: Optional[str] = None) -> SyncIntentDocument:
+    intent = SyncIntentDocument(**json.loads(zlib.decompress(payload)))
+    if status is not None:
+        # The separately stored status column/field is authoritative.
+        intent.status = status
+    return intent
 
 
 class MemoryIntentStore:
-    """Single-instance in-memory intent store. Swap for Redis by implementing IntentStore."""
+    """Single-instance in-memory intent store; see SQLiteIntentStore / RedisIntentStore for multi-worker setups."""
+
+    # Methods only touch a dict, so they run on the event loop (see ``call``).
+    blocking = False
 
     def __init__(self, ttl: float = INTENT_TTL_SECONDS) -> None:
         self._store: Dict[str, SyncIntentDocument] = {}
@@ -61,13 +101,272 @@ class MemoryIntentStore:
         now = time.time()
         to_remove = [
             iid for iid, intent in self._store.items()
-            if (intent.status in ("PENDING", "EXPIRED") and now > intent.expires_at)
-            or (intent.status == "EXECUTED" and now - intent.created_at > 7 * 24 * 3600)
+            if _is_stale(intent.status, intent.created_at, intent.expires_at, now)
         ]
         for iid in to_remove:
             del self._store[iid]
         return len(to_remove)
 
+    def transition(self, intent_id: str, from_status: str, to_status: str) -> Optional[SyncIntentDocument]:
+        """Move *intent_id* from *from_status* to *to_status*; None if it was not in *from_status*."""
+        intent = self.get(intent_id)
+        if intent is None or intent.status != from_status:
+            return None
+        intent.status = to_status
+        return intent
+
+
+class SQLiteIntentStore:
+    """Intent store in a local SQLite file, shared by the workers on one host.
+
+    The status lives in its own column so transitions are a single
+    conditional ``UPDATE``; SQLite serialises writers across processes.
+    Documents are stored compressed.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = config.INTENT_STORE_SQLITE_PATH, ttl: float = INTENT_TTL_SECONDS) -> None:
+        self.path = path
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS intents ("
+            " intent_id TEXT PRIMARY KEY, resource_type TEXT NOT NULL, status TEXT NOT NULL,"
+            " created_at REAL NOT NULL, expires_at REAL NOT NULL, doc BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS intents_by_type ON intents (resource_type, created_at)"
+        )
+
+    def put(self, intent: SyncIntentDocument) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO intents VALUES (?, ?, ?, ?, ?, ?)",
+                (intent.intent_id, intent.resource_type, intent.status,
+                 intent.created_at, intent.expires_at, _encode(intent)),
+            )
+
+    def get(self, intent_id: str) -> Optional[SyncIntentDocument]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, expires_at, doc FROM intents WHERE intent_id = ?", (intent_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, expires_at, doc = row
+        if status == "PENDING" and time.time() > expires_at:
+            self.transition(intent_id, "PENDING", "EXPIRED")
+            status = "EXPIRED"
+        return _decode(doc, status)
+
+    def list_recent(self, resource_type: str, limit: int = 20) -> List[SyncIntentDocument]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, doc FROM intents WHERE resource_type = ? ORDER BY created_at DESC LIMIT ?",
+                (resource_type, limit),
+            ).fetchall()
+        return [_decode(doc, status) for status, doc in rows]
+
+    def cleanup_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM intents WHERE (status IN ('PENDING', 'EXPIRED') AND ? > expires_at)"
+                " OR (status = 'EXECUTED' AND ? - created_at > ?)",
+                (now, now, EXECUTED_RETENTION_SECONDS),
+            )
+        return cur.rowcount
+
+    def transition(self, intent_id: str, from_status: str, to_status: str) -> Optional[SyncIntentDocument]:
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE intents SET status = ? WHERE intent_id = ? AND status = ?",
+                (to_status, intent_id, from_status),
+            )
+            if cur.rowcount != 1:
+                return None
+            row = self._conn.execute("SELECT doc FROM intents WHERE intent_id = ?", (intent_id,)).fetchone()
+        return _decode(row[0], to_status)
+
+
+class RedisIntentStore:
+    """Intent store shared by every worker and replica through Redis.
+
+    Each intent is a hash (``status`` plus the compressed document) whose
+    key expires with the intent; a per-type sorted set indexes intents by
+    creation time.  Transitions use WATCH/MULTI, so exactly one worker can
+    move an intent from PENDING to EXECUTING.
+    """
+
+    blocking = True
+
+    def __init__(self, client, ttl: float = INTENT_TTL_SECONDS, prefix: str = "storage_manager:intent") -> None:
+        self._client = client
+        self._ttl = ttl
+        self._prefix = prefix
+
+    def _key(self, intent_id: str) -> str:
+        return f"{self._prefix}:{intent_id}"
+
+    def _index_key(self, resource_type: str) -> str:
+        return f"{self._prefix}s:{resource_type}"
+
+    @staticmethod
+    def _key_ttl(intent: SyncIntentDocument) -> int:
+        now = time.time()
+        if intent.status == "EXECUTED":
+            remaining = intent.created_at + EXECUTED_RETENTION_SECONDS - now
+        else:
+            # Keep expired intents around briefly so audits can still show them.
+            remaining = intent.expires_at - now + INTENT_TTL_SECONDS
+        return max(int(remaining), 1)
+
+    def put(self, intent: SyncIntentDocument) -> None:
+        key = self._key(intent.intent_id)
+        pipe = self._client.pipeline()
+        pipe.hset(key, mapping={"status": intent.status, "doc": _encode(intent)})
+        pipe.expire(key, self._key_ttl(intent))
+        index_key = self._index_key(intent.resource_type)
+        pipe.zadd(index_key, {intent.intent_id: intent.created_at})
+        # Entries older than any record can live are dangling; trim them here
+        # so the index stays bounded without a sweep.
+        pipe.zremrangebyscore(index_key, "-inf", time.time() - _MAX_RECORD_AGE)
+        pipe.execute()
+
+    def _load(self, intent_id: str) -> Optional[SyncIntentDocument]:
+        fields = self._client.hgetall(self._key(intent_id))
+        if not fields:
+            return None
+        status = fields.get(b"status", fields.get("status"))
+        doc = fields.get(b"doc", fields.get("doc"))
+        return _decode(doc, status.decode() if isinstance(status, bytes) else status)
+
+    def get(self, intent_id: str) -> Optional[SyncIntentDocument]:
+        intent = self._load(intent_id)
+        if intent is not None and intent.status == "PENDING" and time.time() > intent.expires_at:
+            self.transition(intent_id, "PENDING", "EXPIRED")
+            intent.status = "EXPIRED"
+        return intent
+
+    def list_recent(self, resource_type: str, limit: int = 20) -> List[SyncIntentDocument]:
+        index_key = self._index_key(resource_type)
+        results: List[SyncIntentDocument] = []
+        for raw_id in self._client.zrevrange(index_key, 0, limit - 1):
+            intent_id = raw_id.decode() if isinstance(raw_id, bytes) else raw_id
+            intent = self._load(intent_id)
+            if intent is None:
+                # The hash expired; drop it from the index too.
+                self._client.zrem(index_key, intent_id)
+                continue
+            results.append(intent)
+        return results
+
+    def cleanup_expired(self, resource_types=("image", "video")) -> int:
+        """Hashes expire on their own; drop index entries older than any hash can live.
+
+        ``put`` trims the same range and ``list_recent`` drops entries whose
+        hash expired early, so this is only a backstop for idle types.
+        """
+        cutoff = time.time() - _MAX_RECORD_AGE
+        pipe = self._client.pipeline()
+        for resource_type in resource_types:
+            pipe.zremrangebyscore(self._index_key(resource_type), "-inf", cutoff)
+        return sum(pipe.execute())
+
+    def transition(self, intent_id: str, from_status: str, to_status: str) -> Optional[SyncIntentDocument]:
+        key = self._key(intent_id)
+        with self._client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    status = pipe.hget(key, "status")
+                    if status is None or (status.decode() if isinstance(status, bytes) else status) != from_status:
+                        pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    pipe.hset(key, "status", to_status)
+                    pipe.execute()
+                    break
+                except redis.WatchError:
+                    continue
+        return self._load(intent_id)
+
+
+def _redis_client():
+    if config.REDIS_URL:
+        return redis.Redis.from_url(config.REDIS_URL)
+    return redis.Redis(
+        host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, password=config.REDIS_PASSWORD
+    )
+
+
+def configure(kind: Optional[str] = None):
+    """Select the intent store from ``config.INTENT_STORE_BACKEND``; called at startup.
+
+    ``memory`` keeps whatever store is installed (tests inject their own).
+    """
+    global intent_store, INTENT_STORE
+    kind = (kind or config.INTENT_STORE_BACKEND).lower()
+    store = None
+    if kind == "redis":
+        if redis is None:
+            logging.warning("INTENT_STORE_BACKEND=redis but the redis package is not installed; using memory")
+        elif not (config.REDIS_URL or config.REDIS_HOST):
+            logging.warning("INTENT_STORE_BACKEND=redis but REDIS_URL/REDIS_HOST is not set; using memory")
+        else:
+            store = RedisIntentStore(_redis_client())
+    elif kind == "sqlite":
+        store = SQLiteIntentStore(config.INTENT_STORE_SQLITE_PATH)
+    if store is not None:
+        intent_store = INTENT_STORE = store
+    return intent_store
+
+
+async def call(method: str, *args, **kwargs):
+    """Run ``intent_store.<method>`` without blocking the event loop.
+
+    SQLite and Redis stores do network or disk I/O, so their calls go to
+    the I/O executor; the in-memory store is called directly.
+    """
+    store = intent_store
+    func = getattr(store, method)
+    if getattr(store, "blocking", False):
+        return await state.run_io(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+
+async def _cleanup_loop(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await call("cleanup_expired")
+            if removed:
+                state._log_event("intents_cleaned", removed=removed)
+        except Exception as exc:
+            logging.warning(f"Intent cleanup failed: {exc}")
+
+
+_cleanup_task: Optional[asyncio.Task] = None
+
+
+def start(interval: Optional[float] = None) -> None:
+    """Sweep expired intents every ``INTENT_CLEANUP_INTERVAL_SECONDS`` (0 disables)."""
+    global _cleanup_task
+    interval = config.INTENT_CLEANUP_INTERVAL_SECONDS if interval is None else interval
+    if interval > 0 and (_cleanup_task is None or _cleanup_task.done()):
+        _cleanup_task = asyncio.get_running_loop().create_task(_cleanup_loop(interval))
+
+
+async def stop() -> None:
+    global _cleanup_task
+    task, _cleanup_task = _cleanup_task, None
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
 
-intent_store: MemoryIntentStore = MemoryIntentStore()
-INTENT_STORE: MemoryIntentStore = intent_store
+intent_store: IntentStore = MemoryIntentStore()
+INTENT_STORE: IntentStore = intent_store
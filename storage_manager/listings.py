@@ -0,0 +1,147 @@
+# storage_manager/listings.py
+import json
+import base64
+import bisect
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from . import config, models, backends
+from .indexes import ResidentIndex
+
+
+def _sort_spec(sort_by: models.SortBy):
+    """Return ``(key, reverse)`` for ordering shader entries by *sort_by*."""
+    if sort_by is models.SortBy.rating:
+        return (lambda s: s.get("stars") or 0), True
+    if sort_by is models.SortBy.date:
+        return (lambda s: s.get("date") or ""), True
+    if sort_by is models.SortBy.name:
+        return (lambda s: (s.get("name") or "").lower()), False
+    if sort_by is models.SortBy.coordinate:
+        # Uploads store an explicit ``None``; order those with the missing ones.
+        return (lambda s: 9999 if s.get("coordinate") is None else s["coordinate"]), False
+    if sort_by is models.SortBy.plays:
+        return (lambda s: s.get("play_count") or 0), True
+    # last_played: most recent first, never-played entries last.
+    return (lambda s: (s.get("last_played") is not None, s.get("last_played") or "")), True
+
+
+def encode_cursor(last_id: str, offset: int, served: int) -> str:
+    """Opaque pagination cursor: last id served, view offset and rows served so far."""
+    raw = json.dumps({"id": last_id, "o": offset, "n": served}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(data["id"]), int(data["o"]), int(data["n"])
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+
+
+class ShaderListing:
+    """Pre-sorted, pre-rendered views over one version of the shader index.
+
+    Built once per index mutation (see :meth:`ResidentIndex.derived`) so that
+    list requests only filter and slice.  Rows carry the listing defaults and
+    ``thumbnail_url`` already filled in; categories are answered from an
+    inverted index instead of scanning descriptions.
+    """
+
+    def __init__(self, index: ResidentIndex) -> None:
+        folder = config.STORAGE_MAP["shader"]["folder"]
+        storage = backends.current()
+        self.rows: Dict[str, dict] = {}
+        order: List[dict] = []
+        for entry in index.entries:
+            item_id = entry.get("id") if isinstance(entry, dict) else None
+            if item_id is None or item_id in self.rows:
+                continue
+            row = dict(entry)
+            row.setdefault("stars", 0.0)
+            row.setdefault("rating_count", 0)
+            row.setdefault("play_count", 0)
+            if row.get("thumbnail"):
+                row["thumbnail_url"] = storage.public_url(f"{folder}{row['thumbnail']}")
+            self.rows[item_id] = row
+            order.append(row)
+
+        self.by_tag: Dict[str, Set[str]] = {}
+        for row in order:
+            for tag in row.get("tags") or []:
+                self.by_tag.setdefault(tag, set()).add(row["id"])
+
+        self.by_category: Dict[str, Set[str]] = {}
+        for category in models.ShaderCategory:
+            needle = category.value.lower()
+            ids = set(self.by_tag.get(category.value, ()))
+            ids.update(r["id"] for r in order if needle in (r.get("description") or "").lower())
+            self.by_category[category.value] = ids
+
+        self.views: Dict[models.SortBy, List[str]] = {}
+        self.positions: Dict[models.SortBy, Dict[str, int]] = {}
+        for sort_by in models.SortBy:
+            key, reverse = _sort_spec(sort_by)
+            view = [r["id"] for r in sorted(order, key=key, reverse=reverse)]
+            self.views[sort_by] = view
+            self.positions[sort_by] = {item_id: pos for pos, item_id in enumerate(view)}
+
+        self._stars = sorted(r.get("stars") or 0 for r in order)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _matches(self, item_id: str, ids: Optional[Set[str]], min_stars: float) -> bool:
+        if ids is not None and item_id not in ids:
+            return False
+        return min_stars <= 0 or (self.rows[item_id].get("stars") or 0) >= min_stars
+
+    def count(self, category: Optional[str], min_stars: float) -> int:
+        ids = self.by_category.get(category, set()) if category else None
+        if min_stars <= 0:
+            return len(self.rows) if ids is None else len(ids)
+        if ids is None:
+            return len(self._stars) - bisect.bisect_left(self._stars, min_stars)
+        return sum(1 for item_id in ids if self._matches(item_id, None, min_stars))
+
+    def page(
+        self,
+        sort_by: models.SortBy,
+        category: Optional[str] = None,
+        min_stars: float = 0.0,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[dict], int, Optional[str]]:
+        """Return ``(rows, total, next_cursor)`` for one page in *sort_by* order."""
+        view = self.views[sort_by]
+        ids = self.by_category.get(category, set()) if category else None
+        total = self.count(category, min_stars)
+
+        start, served = 0, 0
+        if cursor:
+            last_id, offset, served = decode_cursor(cursor)
+            # Resume after the last row served; fall back to the offset if that
+            # shader has since been removed.
+            pos = self.positions[sort_by].get(last_id)
+            start = pos + 1 if pos is not None else min(max(offset, 0), len(view))
+
+        rows: List[dict] = []
+        pos = start
+        while pos < len(view) and (limit is None or len(rows) < limit):
+            item_id = view[pos]
+            if self._matches(item_id, ids, min_stars):
+                rows.append(self.rows[item_id])
+            pos += 1
+
+        next_cursor = None
+        if limit is not None and rows and pos < len(view) and served + len(rows) < total:
+            next_cursor = encode_cursor(rows[-1]["id"], pos, served + len(rows))
+        return rows, total, next_cursor
+
+
+def shader_listing(index: ResidentIndex) -> ShaderListing:
+    """Return the listing for the current version of the resident shader index."""
+    return index.derived("shader_listing", ShaderListing)
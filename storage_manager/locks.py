@@ -0,0 +1,344 @@
+# storage_manager/locks.py
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+import itertools
+from dataclasses import dataclass, field as dc_field
+from typing import Dict, Optional, Protocol
+
+from fastapi import HTTPException
+
+from . import config, state, backends, metrics
+from .indexes import _is_precondition_failure
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:
+    redis = None
+    aioredis = None
+
+_RETRY_BASE_DELAY = 0.05
+_RETRY_MAX_DELAY = 1.0
+
+
+class LockTimeout(Exception):
+    """The lease for a resource could not be acquired within the timeout."""
+
+
+@dataclass
+class Lease:
+    """A held lock.  ``token`` increases with every acquisition of the resource.
+
+    The token identifies the acquisition in logs only; storage writes do not
+    check it.  See :class:`ResourceLock` for what the lock does guarantee.
+    """
+
+    resource_type: str
+    token: int
+    owner: str = dc_field(default_factory=lambda: uuid.uuid4().hex)
+    generation: int = 0
+    lost: bool = False
+
+
+class LockProvider(Protocol):
+    name: str
+
+    async def acquire(self, resource_type: str, timeout: float) -> Lease: ...
+    async def renew(self, lease: Lease) -> bool: ...
+    async def release(self, lease: Lease) -> None: ...
+
+
+async def _backoff(attempt: int, deadline: float, resource_type: str) -> None:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise LockTimeout(f"timed out waiting for the {resource_type} lock")
+    delay = min(_RETRY_MAX_DELAY, _RETRY_BASE_DELAY * (2 ** attempt))
+    await asyncio.sleep(min(remaining, delay * random.uniform(0.5, 1.0)))
+
+
+class LocalLockProvider:
+    """No cross-process coordination; the per-process asyncio lock is the whole lock."""
+
+    name = "local"
+
+    def __init__(self) -> None:
+        self._tokens = itertools.count(1)
+
+    async def acquire(self, resource_type: str, timeout: float) -> Lease:
+        return Lease(resource_type, next(self._tokens))
+
+    async def renew(self, lease: Lease) -> bool:
+        return True
+
+    async def release(self, lease: Lease) -> None:
+        return None
+
+
+class RedisLockProvider:
+    """Lease held as ``SET key owner NX PX ttl``, renewed while held.
+
+    The token comes from an ``INCR`` counter per resource after the lease is
+    won.  Renew and release use WATCH/MULTI so a worker whose lease
+    expired never extends or deletes another worker's lease.
+    """
+
+    name = "redis"
+
+    def __init__(self, client, lease_seconds: float = config.LOCK_LEASE_SECONDS, prefix: str = "storage_manager:lock") -> None:
+        self._client = client
+        self.lease_seconds = lease_seconds
+        self._prefix = prefix
+
+    def _key(self, resource_type: str) -> str:
+        return f"{self._prefix}:{resource_type}"
+
+    async def acquire(self, resource_type: str, timeout: float) -> Lease:
+        key = self._key(resource_type)
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        while not await self._client.set(key, owner, nx=True, px=int(self.lease_seconds * 1000)):
+            await _backoff(attempt, deadline, resource_type)
+            attempt += 1
+        token = await self._client.incr(f"{key}:fence")
+        return Lease(resource_type, int(token), owner=owner)
+
+    async def _if_owner(self, lease: Lease, action) -> bool:
+        key = self._key(lease.resource_type)
+        async with self._client.pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    current = await pipe.get(key)
+                    if current is None or (current.decode() if isinstance(current, bytes) else current) != lease.owner:
+                        await pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    action(pipe, key)
+                    await pipe.execute()
+                    return True
+                except redis.WatchError:
+                    continue
+
+    async def renew(self, lease: Lease) -> bool:
+        return await self._if_owner(lease, lambda pipe, key: pipe.pexpire(key, int(self.lease_seconds * 1000)))
+
+    async def release(self, lease: Lease) -> None:
+        await self._if_owner(lease, lambda pipe, key: pipe.delete(key))
+
+
+class GcsLockProvider:
+    """Lease held as a small lock object written with generation preconditions.
+
+    Acquiring creates ``LOCK_PREFIX<resource>.lock`` with ``if_generation_match=0``
+    or takes over an expired lease conditionally on its generation; losers back
+    off and retry.  The object generation at acquisition is the token.
+    Releasing writes an already-expired lease instead of deleting, so the
+    object generation keeps increasing.  Works on any storage backend.
+    """
+
+    name = "gcs"
+
+    def __init__(self, lease_seconds: float = config.LOCK_LEASE_SECONDS, prefix: str = config.LOCK_PREFIX) -> None:
+        self.lease_seconds = lease_seconds
+        self.prefix = prefix
+
+    def _path(self, resource_type: str) -> str:
+        return f"{self.prefix}{resource_type}.lock"
+
+    def _payload(self, owner: str, expires_at: float) -> bytes:
+        return json.dumps({"owner": owner, "expires_at": expires_at}).encode()
+
+    async def _write(self, path: str, owner: str, expires_at: float, if_generation_match: int) -> Optional[int]:
+        try:
+            return await backends.current().write_json_generation(
+                path, self._payload(owner, expires_at), if_generation_match
+            )
+        except Exception as exc:
+            if _is_precondition_failure(exc):
+                return None
+            raise
+
+    async def acquire(self, resource_type: str, timeout: float) -> Lease:
+        path = self._path(resource_type)
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        while True:
+            current, current_generation = await backends.current().read_json_generation(path)
+            if not isinstance(current, dict) or current.get("expires_at", 0) <= time.time():
+                # Free or expired; a missing object has generation 0 (create-only).
+                generation = await self._write(path, owner, time.time() + self.lease_seconds, current_generation)
+                if generation is not None:
+                    return Lease(resource_type, int(generation), owner=owner, generation=int(generation))
+            await _backoff(attempt, deadline, resource_type)
+            attempt += 1
+
+    async def renew(self, lease: Lease) -> bool:
+        generation = await self._write(
+            self._path(lease.resource_type), lease.owner, time.time() + self.lease_seconds, lease.generation
+        )
+        if generation is None:
+            return False
+        lease.generation = int(generation)
+        return True
+
+    async def release(self, lease: Lease) -> None:
+        await self._write(self._path(lease.resource_type), lease.owner, 0.0, lease.generation)
+
+
+@dataclass
+class LockStats:
+    acquisitions: int = 0
+    contended: int = 0
+    timeouts: int = 0
+    lost: int = 0
+    wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    held_seconds: float = 0.0
+
+
+class ResourceLock:
+    """``async with`` lock for one resource type.
+
+    Coroutines in this process queue on an asyncio lock first, so at most one
+    lease per resource is requested from the provider at a time.  While held,
+    the lease is renewed in the background; a lease lost mid-section is logged
+    and counted.
+
+    The lock serialises read-modify-write sections on the resident index so
+    that workers rarely race.  It is not what keeps the stored index correct:
+    the index store writes back later, outside the lock, and no lease token
+    reaches storage.  Cross-worker safety comes from the index store's
+    ``if_generation_match`` writes, which reject a stale writer and merge its
+    changes onto the newer copy before retrying.
+    """
+
+    def __init__(self, resource_type: str, provider: LockProvider, timeout: float = config.LOCK_ACQUIRE_TIMEOUT_SECONDS) -> None:
+        self.resource_type = resource_type
+        self.provider = provider
+        self.timeout = timeout
+        self.stats = LockStats()
+        self.lease: Optional[Lease] = None
+        self._local = asyncio.Lock()
+        self._renewer: Optional[asyncio.Task] = None
+        self._acquired_at = 0.0
+        self._queued = 0  # holders plus waiters in this process
+
+    def locked(self) -> bool:
+        return self._local.locked()
+
+    async def _renew_loop(self, lease: Lease) -> None:
+        interval = getattr(self.provider, "lease_seconds", 0) / 3
+        if interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                renewed = await self.provider.renew(lease)
+            except Exception as exc:
+                logging.warning(f"Renewing the {self.resource_type} lock failed: {exc}")
+                continue
+            if not renewed:
+                lease.lost = True
+                return
+
+    async def __aenter__(self) -> Lease:
+        t0 = time.monotonic()
+        contended = self._queued > 0
+        self._queued += 1
+        try:
+            if contended:
+                await asyncio.wait_for(self._local.acquire(), self.timeout)
+            else:
+                await self._local.acquire()
+        except asyncio.TimeoutError:
+            self._queued -= 1
+            self.stats.timeouts += 1
+            raise HTTPException(503, f"Timed out waiting for the {self.resource_type} lock")
+        except BaseException:
+            self._queued -= 1
+            raise
+        try:
+            lease = await self.provider.acquire(self.resource_type, max(0.0, self.timeout - (time.monotonic() - t0)))
+        except LockTimeout:
+            self._release_local()
+            self.stats.timeouts += 1
+            raise HTTPException(503, f"Timed out waiting for the {self.resource_type} lock")
+        except BaseException:
+            self._release_local()
+            raise
+        waited = time.monotonic() - t0
+        self.stats.acquisitions += 1
+        self.stats.wait_seconds += waited
+        self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, waited)
+        metrics.LOCK_WAIT_SECONDS.observe(waited, resource=self.resource_type)
+        if contended or waited > 0.1:
+            self.stats.contended += 1
+            state._log_event(
+                "lock_contended", resource_type=self.resource_type,
+                provider=self.provider.name, wait_ms=round(waited * 1000, 1),
+            )
+        self.lease = lease
+        self._acquired_at = time.monotonic()
+        if self.provider.name != "local":
+            self._renewer = asyncio.ensure_future(self._renew_loop(lease))
+        return lease
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        lease, self.lease = self.lease, None
+        try:
+            if self._renewer is not None:
+                self._renewer.cancel()
+                self._renewer = None
+            if lease.lost:
+                self.stats.lost += 1
+                state._log_event("lock_lease_lost", resource_type=self.resource_type, token=lease.token)
+            else:
+                await self.provider.release(lease)
+        except Exception as exc:
+            logging.warning(f"Releasing the {self.resource_type} lock failed: {exc}")
+        finally:
+            self.stats.held_seconds += time.monotonic() - self._acquired_at
+            self._release_local()
+
+    def _release_local(self) -> None:
+        self._queued -= 1
+        self._local.release()
+
+
+provider: LockProvider = LocalLockProvider()
+
+
+def _redis_client():
+    if config.REDIS_URL:
+        return aioredis.Redis.from_url(config.REDIS_URL)
+    return aioredis.Redis(
+        host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, password=config.REDIS_PASSWORD
+    )
+
+
+def configure(kind: Optional[str] = None) -> LockProvider:
+    """Select the lock provider from ``config.LOCK_BACKEND``; called at startup."""
+    global provider
+    kind = (kind or config.LOCK_BACKEND).lower()
+    if kind == "redis" and (aioredis is None or not (config.REDIS_URL or config.REDIS_HOST)):
+        logging.warning("LOCK_BACKEND=redis needs the redis package and REDIS_URL/REDIS_HOST; using local locks")
+        kind = "local"
+    if kind == "redis":
+        provider = RedisLockProvider(_redis_client())
+    elif kind == "gcs":
+        provider = GcsLockProvider()
+    else:
+        provider = LocalLockProvider()
+    state.RESOURCE_LOCKS.clear()
+    return provider
+
+
+def stats() -> Dict[str, dict]:
+    """Contention counters per resource type for the current provider."""
+    return {name: vars(lock.stats).copy() for name, lock in state.RESOURCE_LOCKS.items()}
@@ -0,0 +1,221 @@
+# storage_manager/media_cache.py
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Dict, Optional, Set, Tuple
+
+from . import config, state, metrics
+
+_COUNT_LIMIT = 10000
+
+
+class MediaDiskCache:
+    """Size-bounded on-disk LRU of media objects in front of proxied reads.
+
+    Files are content-addressed by backend, path and generation, so a
+    replaced object simply gets a new key and the stale file ages out.  An
+    object is copied in the background once it has been requested
+    ``admit_after`` times, which keeps one-off reads from churning the cache.
+    Hits are opened before the response starts, so an eviction racing a
+    download only unlinks the name; the open file keeps streaming.
+
+    The in-memory index is only touched on the event loop; file I/O runs on
+    the media pool.
+    """
+
+    def __init__(
+        self,
+        root: str = config.MEDIA_CACHE_DIR,
+        max_bytes: int = config.MEDIA_CACHE_MAX_BYTES,
+        max_object_bytes: int = config.MEDIA_CACHE_MAX_OBJECT_BYTES,
+        admit_after: int = config.MEDIA_CACHE_ADMIT_AFTER,
+        max_fills: int = config.MEDIA_CACHE_MAX_FILLS,
+    ) -> None:
+        self.root = Path(root).resolve() if root else None
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self.admit_after = max(1, admit_after)
+        self.max_fills = max(1, max_fills)
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._requests: "OrderedDict[str, int]" = OrderedDict()
+        self._filling: Dict[str, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._fill_slots: Optional[asyncio.Semaphore] = None
+        self.hits = 0
+        self.misses = 0
+        if self.root is not None:
+            self._scan()
+
+    @property
+    def enabled(self) -> bool:
+        return self.root is not None and self.max_bytes > 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(storage_name: str, path: str, generation) -> str:
+        return hashlib.sha256(f"{storage_name}\0{path}\0{generation}".encode()).hexdigest()
+
+    def _file(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _scan(self) -> None:
+        """Adopt files left by a previous run, least recently used first."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                full = os.path.join(dirpath, filename)
+                if filename.startswith(".tmp-"):
+                    os.remove(full)
+                    continue
+                st = os.stat(full)
+                found.append((st.st_mtime, filename, st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._bytes += size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            try:
+                self._file(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    async def open(self, storage_name: str, path: str, generation, size: int) -> Optional[BinaryIO]:
+        """An open handle on the cached copy, or None on a miss."""
+        if not self.enabled or not generation:
+            return None
+        key = self.key(storage_name, path, generation)
+        if self._entries.get(key) != size:
+            self.misses += 1
+            metrics.CACHE_REQUESTS.inc(cache="media_disk", result="miss")
+            return None
+        self._entries.move_to_end(key)
+        target = self._file(key)
+
+        def _open():
+            fh = open(target, "rb")
+            # Persist recency for the next _scan; best effort.
+            try:
+                os.utime(target)
+            except OSError:
+                pass
+            return fh
+
+        try:
+            fh = await state.run_media_io(_open)
+        except FileNotFoundError:
+            self._bytes -= self._entries.pop(key, 0)
+            self.misses += 1
+            metrics.CACHE_REQUESTS.inc(cache="media_disk", result="miss")
+            return None
+        self.hits += 1
+        metrics.CACHE_REQUESTS.inc(cache="media_disk", result="hit")
+        return fh
+
+    def admit(self, storage, path: str, generation, size: Optional[int]) -> None:
+        """Count a miss for *path* and start copying it once it is requested often enough."""
+        if not self.enabled or not generation or size is None or size > self.max_object_bytes:
+            return
+        key = self.key(storage.name, path, generation)
+        if key in self._entries or key in self._filling:
+            return
+        count = self._requests.pop(key, 0) + 1
+        if count < self.admit_after:
+            self._requests[key] = count
+            while len(self._requests) > _COUNT_LIMIT:
+                self._requests.popitem(last=False)
+            return
+        task = asyncio.ensure_future(self._fill(key, storage, path, size))
+        self._filling[key] = task
+        self._tasks.add(task)
+
+        def _done(t: asyncio.Task) -> None:
+            self._tasks.discard(t)
+            self._filling.pop(key, None)
+
+        task.add_done_callback(_done)
+
+    async def _fill(self, key: str, storage, path: str, size: int) -> None:
+        if self._fill_slots is None:
+            self._fill_slots = asyncio.Semaphore(self.max_fills)
+        target = self._file(key)
+        tmp = None
+        try:
+            async with self._fill_slots:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+                written = 0
+                with os.fdopen(fd, "wb") as fh:
+                    async for chunk in storage.iter_bytes(path, 0, size - 1, chunk_size=config.MEDIA_STREAM_CHUNK_BYTES):
+                        await state.run_media_io(fh.write, chunk)
+                        written += len(chunk)
+                if written != size:
+                    # Replaced while we copied; the next request sees the new generation.
+                    return
+                await state.run_media_io(os.replace, tmp, target)
+                tmp = None
+            self._entries[key] = size
+            self._bytes += size
+            self._evict()
+            state._log_event("media_cache_filled", path=path, size=size)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logging.warning(f"Media cache fill failed for {path}: {exc}")
+        finally:
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def iter_file(fh: BinaryIO, start: int, end: int, chunk_size: int) -> AsyncIterator[bytes]:
+    """Yield bytes ``start..end`` (inclusive) of an open cached file, then close it."""
+    try:
+        await state.run_media_io(fh.seek, start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await state.run_media_io(fh.read, min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await state.run_media_io(fh.close)
+
+
+media_cache: MediaDiskCache = MediaDiskCache(root="")
+
+
+def configure() -> MediaDiskCache:
+    """(Re)create the cache from config; called at startup."""
+    global media_cache
+    media_cache = MediaDiskCache(
+        config.MEDIA_CACHE_DIR,
+        config.MEDIA_CACHE_MAX_BYTES,
+        config.MEDIA_CACHE_MAX_OBJECT_BYTES,
+        config.MEDIA_CACHE_ADMIT_AFTER,
+        config.MEDIA_CACHE_MAX_FILLS,
+    )
+    if media_cache.enabled:
+        logging.info(f"Media disk cache at {media_cache.root} ({len(media_cache)} files, {media_cache.nbytes} bytes)")
+    return media_cache
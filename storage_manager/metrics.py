@@ -0,0 +1,291 @@
+# storage_manager/metrics.py
+import math
+import time
+import functools
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond cache hits up to slow media transfers.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Observations arrive from executor threads as well as the event loop.
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # key -> [per-bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for n, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[n] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def count(self, **labels: str) -> int:
+        row = self._values.get(self._key(labels))
+        return int(row[-1]) if row else 0
+
+    def samples(self) -> List[Sample]:
+        out: List[Sample] = []
+        with self._lock:
+            rows = [(key, list(row)) for key, row in self._values.items()]
+        for key, row in rows:
+            labels = self._labels(key)
+            cumulative = 0.0
+            for bound, hits in zip(self.buckets, row):
+                cumulative += hits
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                out.append((f"{self.name}_bucket", {**labels, "le": le}, cumulative))
+            out.append((f"{self.name}_sum", labels, row[-2]))
+            out.append((f"{self.name}_count", labels, row[-1]))
+        return out
+
+
+class Registry:
+    """Metrics owned by this module plus callbacks read at scrape time.
+
+    A collector returns ``(name, kind, help, samples)`` tuples for values
+    that already live elsewhere (queue depths, lock and cache counters), so
+    they cost nothing between scrapes.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        families = [(m.name, m.kind, m.documentation, m.samples()) for m in self._metrics]
+        for collect in self._collectors:
+            families.extend(collect())
+        lines = []
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+IO_SECONDS = registry.histogram(
+    "storage_manager_io_seconds", "Executor calls from submit to result, by pool and function.", ("pool", "op")
+)
+IO_QUEUE_WAIT_SECONDS = registry.histogram(
+    "storage_manager_io_queue_wait_seconds", "Time executor calls spent queued before a worker picked them up.", ("pool",)
+)
+STORAGE_OP_SECONDS = registry.histogram(
+    "storage_manager_storage_op_seconds", "Storage backend operation latency.", ("backend", "op")
+)
+STORAGE_OP_ERRORS = registry.counter(
+    "storage_manager_storage_op_errors_total", "Storage backend operations that raised.", ("backend", "op")
+)
+CACHE_REQUESTS = registry.counter(
+    "storage_manager_cache_requests_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result")
+)
+LOCK_WAIT_SECONDS = registry.histogram(
+    "storage_manager_lock_wait_seconds", "Time to acquire a resource lock, including the provider lease.", ("resource",)
+)
+MEDIA_SEMAPHORE_WAIT_SECONDS = registry.histogram(
+    "storage_manager_media_semaphore_wait_seconds", "Time proxied media reads waited for a read slot."
+)
+MEDIA_CHUNK_SECONDS = registry.histogram(
+    "storage_manager_media_chunk_read_seconds", "Latency of one proxied media chunk read from storage."
+)
+MEDIA_PROXIED_BYTES = registry.counter(
+    "storage_manager_media_proxied_bytes_total", "Media bytes streamed from storage through the proxy."
+)
+MEDIA_RESPONSES = registry.counter(
+    "storage_manager_media_responses_total", "Proxied media responses by source (disk/storage) and status.", ("source", "status")
+)
+RATE_LIMIT_DECISIONS = registry.counter(
+    "storage_manager_rate_limit_decisions_total", "Rate limiter decisions by rule prefix and result.", ("rule", "result")
+)
+
+
+def timed_call(func: Callable, pool: str) -> Callable[[], object]:
+    """Wrap *func* for an executor so its queue wait is recorded when a worker starts it."""
+    submitted = time.perf_counter()
+
+    def run():
+        IO_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - submitted, pool=pool)
+        return func()
+
+    return run
+
+
+def op_name(func: Callable) -> str:
+    return getattr(func, "__name__", None) or type(func).__name__
+
+
+_BACKEND_OPS = (
+    "read_json", "read_json_generation", "write_json", "write_json_generation", "exists", "stat",
+    "delete", "download_bytes", "download_text", "read_range", "upload_bytes", "upload_file",
+    "list_prefix", "signed_url",
+)
+
+
+def timed_backend(cls):
+    """Class decorator timing the storage operations a backend defines itself."""
+    for op in _BACKEND_OPS:
+        method = cls.__dict__.get(op)
+        if method is None:
+            continue
+
+        def wrap(method, op=op):
+            @functools.wraps(method)
+            async def timed(self, *args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return await method(self, *args, **kwargs)
+                except Exception:
+                    STORAGE_OP_ERRORS.inc(backend=self.name, op=op)
+                    raise
+                finally:
+                    STORAGE_OP_SECONDS.observe(time.perf_counter() - t0, backend=self.name, op=op)
+            return timed
+
+        setattr(cls, op, wrap(method))
+    return cls
+
+
+try:
+    from aiocache.plugins import BasePlugin
+except ImportError:  # pragma: no cover - aiocache is a hard dependency of state
+    BasePlugin = object
+
+
+class CacheMetricsPlugin(BasePlugin):
+    """aiocache plugin counting hits and misses of ``state.cache`` reads."""
+
+    def __init__(self, name: str = "state") -> None:
+        self.name = name
+
+    async def post_get(self, client, key, took=0, ret=None, **kwargs):
+        CACHE_REQUESTS.inc(cache=self.name, result="miss" if ret is None else "hit")
+
+    async def post_multi_get(self, client, keys, took=0, ret=None, **kwargs):
+        hits = sum(1 for value in ret or () if value is not None)
+        CACHE_REQUESTS.inc(hits, cache=self.name, result="hit")
+        CACHE_REQUESTS.inc(len(keys) - hits, cache=self.name, result="miss")
+
+
+@registry.collector
+def _runtime_samples():
+    # Imported lazily: state and locks import this module.
+    from . import state, locks, media_cache, signed_urls, http_cache
+
+    depth, threads = [], []
+    for pool, executor in (("io", state.io_executor), ("media", state.media_executor)):
+        depth.append(("storage_manager_io_queue_depth", {"pool": pool}, executor._work_queue.qsize()))
+        threads.append(("storage_manager_io_threads", {"pool": pool}, len(executor._threads)))
+    yield "storage_manager_io_queue_depth", "gauge", "Executor calls waiting for a worker thread.", depth
+    yield "storage_manager_io_threads", "gauge", "Worker threads started per executor.", threads
+
+    lock_stats = locks.stats()
+    for field, name, doc in (
+        ("acquisitions", "storage_manager_lock_acquisitions_total", "Resource lock acquisitions."),
+        ("contended", "storage_manager_lock_contended_total", "Resource lock acquisitions that had to wait."),
+        ("timeouts", "storage_manager_lock_timeouts_total", "Resource lock acquisitions that timed out (503)."),
+        ("lost", "storage_manager_lock_leases_lost_total", "Leases that expired or were taken over while held."),
+        ("held_seconds", "storage_manager_lock_held_seconds_total", "Total time resource locks were held."),
+    ):
+        yield name, "counter", doc, [(name, {"resource": r}, s[field]) for r, s in lock_stats.items()]
+
+    disk = media_cache.media_cache
+    yield "storage_manager_media_disk_cache_bytes", "gauge", "Bytes held by the media disk cache.", [
+        ("storage_manager_media_disk_cache_bytes", {}, disk.nbytes)
+    ]
+    yield "storage_manager_cache_entries", "gauge", "Entries held by in-process caches.", [
+        ("storage_manager_cache_entries", {"cache": "media_disk"}, len(disk)),
+        ("storage_manager_cache_entries", {"cache": "response_body"}, len(http_cache.body_cache)),
+        ("storage_manager_cache_entries", {"cache": "signed_url"}, len(signed_urls.signed_url_cache)),
+    ]
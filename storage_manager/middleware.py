@@ -1,57 +1,81 @@
 # storage_manager/middleware.py
-import time
-import asyncio
-from typing import Dict, List
-from fastapi import Request
-from fastapi.responses import PlainTextResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from .config import RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW, RATE_LIMIT_PATHS, RATE_LIMIT_IP_HEADER
+from . import ratelimit, metrics
+from .config import RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW, RATE_LIMIT_PATHS, RATE_LIMIT_IP_HEADER, RATE_LIMIT_RULES
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, requests: int = RATE_LIMIT_REQUESTS, window: int = RATE_LIMIT_WINDOW, path_prefixes=None):
-        super().__init__(app)
+class RateLimitMiddleware:
+    """Rate limiting as plain ASGI middleware.
+
+    Unlike ``BaseHTTPMiddleware`` it does not run the endpoint in a separate
+    task or re-stream the body; it adds its headers to ``http.response.start``
+    and passes every body chunk through unchanged, which keeps proxied media
+    streaming at full speed.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        requests: int = RATE_LIMIT_REQUESTS,
+        window: int = RATE_LIMIT_WINDOW,
+        path_prefixes=None,
+        rules=None,
+        limiter=None,
+    ):
+        self.app = app
         self.requests = requests
         self.window = window
         self.path_prefixes = path_prefixes or RATE_LIMIT_PATHS
-        self.counters: Dict[str, List[float]] = {}
-        self.lock = asyncio.Lock()
+        self.rules = ratelimit.RuleSet(
+            ratelimit.parse_rules(RATE_LIMIT_RULES) if rules is None else rules,
+            ratelimit.Rule("", requests, window),
+            self.path_prefixes,
+        )
+        self.limiter = limiter if limiter is not None else ratelimit.create_limiter()
+        self._ip_header = RATE_LIMIT_IP_HEADER.lower()
 
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
-        if not any(path.startswith(prefix) for prefix in self.path_prefixes):
-            return await call_next(request)
-
-        client_ip = request.headers.get(RATE_LIMIT_IP_HEADER, "")
+    def _client_ip(self, scope: Scope) -> str:
+        client_ip = Headers(scope=scope).get(self._ip_header, "")
         if client_ip:
             client_ip = client_ip.split(",")[0].strip()
-        if not client_ip and request.client is not None:
-            client_ip = request.client.host
-        if not client_ip:
-            client_ip = "unknown"
-
-        key = f"{client_ip}:{request.method}:api"
-        now = time.time()
-
-        async with self.lock:
-            entry = self.counters.get(key)
-            if entry is None or entry[1] <= now:
-                self.counters[key] = [1, now + self.window]
-            else:
-                entry[0] += 1
-            count, reset = self.counters[key]
-
-        if count > self.requests:
-            retry_after = max(1, int(reset - now))
-            return PlainTextResponse(
+        if not client_ip and scope.get("client"):
+            client_ip = scope["client"][0]
+        return client_ip or "unknown"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rule = self.rules.match(scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Each rule is a separate budget, so streaming cannot starve admin calls.
+        key = f"{self._client_ip(scope)}:{scope['method']}:{rule.prefix or 'api'}"
+        decision = await self.limiter.hit(key, rule)
+        metrics.RATE_LIMIT_DECISIONS.inc(
+            rule=rule.prefix or "default", result="allowed" if decision.allowed else "limited"
+        )
+
+        if not decision.allowed:
+            response = PlainTextResponse(
                 "Too many requests",
                 status_code=429,
-                headers={"Retry-After": str(retry_after)},
+                headers={"Retry-After": str(decision.retry_after)},
             )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-RateLimit-Limit"] = str(decision.limit)
+                headers["X-RateLimit-Remaining"] = str(decision.remaining)
+                headers["X-RateLimit-Reset"] = str(int(decision.reset))
+            await send(message)
 
-        response = await call_next(request)
-        response.headers["X-RateLimit-Limit"] = str(self.requests)
-        response.headers["X-RateLimit-Remaining"] = str(max(0, self.requests - count))
-        response.headers["X-RateLimit-Reset"] = str(int(reset))
-        return response
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,187 @@
+# storage_manager/ratelimit.py
+import math
+import time
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from . import config
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+
+@dataclass(frozen=True)
+class Rule:
+    """*requests* per *window* seconds for paths starting with *prefix*."""
+
+    prefix: str
+    requests: int
+    window: float
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: float  # epoch seconds at which the budget is fully restored
+    retry_after: int = 0
+
+
+def parse_rules(spec: str) -> List[Rule]:
+    """Parse ``"/api/admin/sync=20/60,/api/videos/=600/60"`` into rules."""
+    rules = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            prefix, budget = item.rsplit("=", 1)
+            requests, window = budget.split("/", 1)
+            rules.append(Rule(prefix.strip(), int(requests), float(window)))
+        except ValueError:
+            logging.warning(f"Ignoring malformed RATE_LIMIT_RULES entry {item!r}")
+    return rules
+
+
+class RuleSet:
+    """Picks the budget for a path: the longest matching rule, else the default."""
+
+    def __init__(self, rules: Sequence[Rule], default: Rule, default_prefixes: Sequence[str]) -> None:
+        self.rules = sorted(rules, key=lambda r: len(r.prefix), reverse=True)
+        self.default = default
+        self.default_prefixes = tuple(default_prefixes)
+
+    def match(self, path: str) -> Optional[Rule]:
+        for rule in self.rules:
+            if path.startswith(rule.prefix):
+                return rule
+        if path.startswith(self.default_prefixes):
+            return self.default
+        return None
+
+
+class MemoryRateLimiter:
+    """Per-process token buckets.
+
+    Each key holds ``[tokens, last_refill]``; a hit refills the bucket for
+    the elapsed time and takes one token.  The update has no await, so it
+    is atomic on the event loop and needs no lock.  Buckets that have
+    refilled completely carry no state and are swept once per *sweep_interval*;
+    beyond *max_keys* the least recently used keys are dropped.
+    """
+
+    def __init__(self, max_keys: int = config.RATE_LIMIT_MAX_KEYS, sweep_interval: float = 60.0, clock=time.time) -> None:
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._buckets: Dict[str, List[float]] = {}
+        self._next_sweep = clock() + sweep_interval
+        # Longest refill time seen, so a sweep never drops a bucket that is still draining.
+        self._max_window = 0.0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def reset(self) -> None:
+        self._buckets.clear()
+
+    def _sweep(self, now: float) -> None:
+        self._next_sweep = now + self.sweep_interval
+        stale = [key for key, (_, last) in self._buckets.items() if now - last >= self._max_window]
+        for key in stale:
+            del self._buckets[key]
+
+    def hit_now(self, key: str, rule: Rule) -> Decision:
+        now = self._clock()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        self._max_window = max(self._max_window, rule.window)
+        rate = rule.requests / rule.window
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            bucket = [float(rule.requests), now]
+        else:
+            bucket[0] = min(float(rule.requests), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        # Re-inserting keeps the dict ordered by last use for the size cap.
+        self._buckets[key] = bucket
+        while len(self._buckets) > self.max_keys:
+            del self._buckets[next(iter(self._buckets))]
+
+        allowed = bucket[0] >= 1.0
+        if allowed:
+            bucket[0] -= 1.0
+        tokens = bucket[0]
+        reset = now + (rule.requests - tokens) / rate
+        retry_after = 0 if allowed else max(1, math.ceil((1.0 - tokens) / rate))
+        return Decision(allowed, rule.requests, int(tokens), reset, retry_after)
+
+    async def hit(self, key: str, rule: Rule) -> Decision:
+        return self.hit_now(key, rule)
+
+
+class RedisRateLimiter:
+    """Sliding-window counters in Redis, shared by every worker.
+
+    The count for the current fixed window is weighted together with the
+    previous window (``prev * (1 - elapsed/window) + current``), which needs
+    one pipelined round trip and no Lua.  If Redis is unreachable the
+    decision falls back to a per-process token bucket.
+    """
+
+    def __init__(self, client, prefix: str = "storage_manager:ratelimit", clock=time.time) -> None:
+        self._client = client
+        self._prefix = prefix
+        self._clock = clock
+        self.fallback = MemoryRateLimiter(clock=clock)
+
+    def reset(self) -> None:
+        self.fallback.reset()
+
+    async def hit(self, key: str, rule: Rule) -> Decision:
+        now = self._clock()
+        index, offset = divmod(now, rule.window)
+        current_key = f"{self._prefix}:{key}:{int(index)}"
+        previous_key = f"{self._prefix}:{key}:{int(index) - 1}"
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            pipe.incr(current_key)
+            pipe.expire(current_key, int(math.ceil(rule.window * 2)))
+            pipe.get(previous_key)
+            current, _, previous = await pipe.execute()
+        except Exception as exc:
+            logging.warning(f"Redis rate limiter unavailable, using local buckets: {exc}")
+            return self.fallback.hit_now(key, rule)
+        weight = 1.0 - offset / rule.window
+        used = int(previous or 0) * weight + int(current)
+        allowed = used <= rule.requests
+        reset = now - offset + rule.window
+        retry_after = 0 if allowed else max(1, math.ceil(rule.window - offset))
+        return Decision(allowed, rule.requests, max(0, int(rule.requests - used)), reset, retry_after)
+
+
+def default_rules() -> RuleSet:
+    return RuleSet(
+        parse_rules(config.RATE_LIMIT_RULES),
+        Rule("", config.RATE_LIMIT_REQUESTS, config.RATE_LIMIT_WINDOW),
+        config.RATE_LIMIT_PATHS,
+    )
+
+
+def create_limiter(kind: Optional[str] = None):
+    """The limiter selected by ``config.RATE_LIMIT_BACKEND``."""
+    kind = (kind or config.RATE_LIMIT_BACKEND).lower()
+    if kind == "redis":
+        if aioredis is None or not (config.REDIS_URL or config.REDIS_HOST):
+            logging.warning("RATE_LIMIT_BACKEND=redis needs the redis package and REDIS_URL/REDIS_HOST; using memory")
+        elif config.REDIS_URL:
+            return RedisRateLimiter(aioredis.Redis.from_url(config.REDIS_URL))
+        else:
+            return RedisRateLimiter(aioredis.Redis(
+                host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, password=config.REDIS_PASSWORD
+            ))
+    return MemoryRateLimiter()
@@ -1,9 +1,10 @@
 # storage_manager/routes/ftp.py
+import asyncio
 import logging
 from datetime import datetime
 from fastapi import APIRouter, HTTPException
 
-from .. import config, state, utils
+from .. import config, state, utils, indexes, backends, ftp_pool
 
 router = APIRouter()
 
@@ -20,7 +21,7 @@ async def get_ftp_shader(filename: str):
     if cached:
         return {"source": "cache", "filename": filename, "code": cached}
     try:
-        code = await state.run_io(utils._fetch_ftp_file_sync, filename)
+        code = await state.run_media_io(utils._fetch_ftp_file_sync, filename)
         await state.cache.set(cache_key, code, ttl=3600)
         return {"source": "ftp", "filename": filename, "code": code}
     except Exception as e:
@@ -30,50 +31,69 @@ async def get_ftp_shader(filename: str):
 
 @router.post("/api/admin/sync-ftp-to-gcs")
 async def sync_ftp_to_gcs():
-    """Scan FTP directory and import missing .wgsl shaders into GCS bucket."""
+    """Scan FTP directory and import missing .wgsl shaders into GCS bucket.
+
+    Files are fetched over pooled FTP sessions and uploaded with bounded
+    concurrency outside the shader lock; only the index update holds it.
+    """
     if not config.FTP_ENABLED:
         raise HTTPException(503, "FTP not configured")
     cfg = config.STORAGE_MAP["shader"]
     report = {"added": 0, "skipped": 0, "errors": []}
 
+    try:
+        ftp_files = await state.run_io(utils._list_ftp_files_sync)
+        index = await indexes.index_store.get("shader")
+    except Exception as e:
+        raise HTTPException(500, f"FTP sync failed: {str(e)}")
+
+    existing = {item.get("filename", "") for item in index.entries}
+    missing = [fname for fname in ftp_files if fname not in existing]
+    report["skipped"] = len(ftp_files) - len(missing)
+
+    slots = asyncio.Semaphore(max(1, min(config.FTP_IMPORT_CONCURRENCY, ftp_pool.pool.max_size)))
+
+    async def _import(fname: str) -> bool:
+        async with slots:
+            try:
+                code = await state.run_media_io(utils._fetch_ftp_file_sync, fname)
+                await backends.current().upload_bytes(f"{cfg['folder']}{fname}", code, content_type="text/plain")
+                return True
+            except Exception as e:
+                logging.error(f"Failed to import {fname} from FTP: {e}")
+                report["errors"].append({"file": fname, "error": str(e)})
+                return False
+
+    imported = await asyncio.gather(*(_import(fname) for fname in missing))
+
     async with state.get_resource_lock("shader"):
         try:
-            ftp_files = await state.run_io(utils._list_ftp_files_sync)
-            index = await state.run_io(utils._read_json_sync, cfg["index"])
-            if not isinstance(index, list):
-                index = []
-            existing = {item.get("filename", "") for item in index}
-
-            for fname in ftp_files:
-                if fname in existing:
+            index = await indexes.index_store.get("shader")
+            for fname, ok in zip(missing, imported):
+                if not ok:
+                    continue
+                if index.get_by_filename(fname) is not None:
+                    # Imported concurrently by another request.
                     report["skipped"] += 1
                     continue
-                try:
-                    code = await state.run_io(utils._fetch_ftp_file_sync, fname)
-                    blob = state.bucket.blob(f"{cfg['folder']}{fname}")
-                    await state.run_io(blob.upload_from_string, code, content_type="text/plain")
-                    shader_id = fname.replace(".wgsl", "")
-                    index.insert(0, {
-                        "id": shader_id,
-                        "name": shader_id.replace("-", " ").title(),
-                        "filename": fname,
-                        "author": "ftp-import",
-                        "date": datetime.now().strftime("%Y-%m-%d"),
-                        "type": "shader",
-                        "description": "Imported from FTP",
-                        "tags": ["ftp-import"],
-                        "stars": 0.0,
-                        "rating_count": 0,
-                        "play_count": 0
-                    })
-                    report["added"] += 1
-                except Exception as e:
-                    logging.error(f"Failed to import {fname} from FTP: {e}")
-                    report["errors"].append({"file": fname, "error": str(e)})
+                shader_id = fname.replace(".wgsl", "")
+                index.upsert({
+                    "id": shader_id,
+                    "name": shader_id.replace("-", " ").title(),
+                    "filename": fname,
+                    "author": "ftp-import",
+                    "date": datetime.now().strftime("%Y-%m-%d"),
+                    "type": "shader",
+                    "description": "Imported from FTP",
+                    "tags": ["ftp-import"],
+                    "stars": 0.0,
+                    "rating_count": 0,
+                    "play_count": 0
+                })
+                report["added"] += 1
 
             if report["added"] > 0:
-                await state.run_io(utils._write_json_sync, cfg["index"], index)
-            await state.clear_cache_for_type(None)
+                await indexes.index_store.flush("shader")
         except Exception as e:
             raise HTTPException(500, f"FTP sync failed: {str(e)}")
 
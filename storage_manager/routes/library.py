@@ -1,61 +1,94 @@
 # storage_manager/routes/library.py
 import json
 import uuid
+import heapq
+import asyncio
 import logging
+import itertools
 from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 
-from .. import config, state, models, utils
+from .. import config, state, models, indexes, http_cache, backends
 
 router = APIRouter()
 
 
-@router.get("/api/library")
-@router.get("/api/songs", response_model=List[models.MetaData])
-async def list_library(
-    type: Optional[str] = Query(None),
-    genre: Optional[str] = Query(None),
-    min_rating: Optional[int] = Query(None, ge=1, le=10),
-    sort_by: models.SortBy = Query(models.SortBy.date),
-    sort_desc: bool = Query(True)
-):
-    cache_key = f"library:{type or 'all'}:{sort_by}:{sort_desc}:{genre}:{min_rating}"
-    cached = await state.cache.get(cache_key)
-    if cached:
-        return cached
+_LIBRARY_TYPES = ["song", "pattern", "bank", "sample", "music", "shader", "image", "video"]
 
-    search_types = [type] if type else ["song", "pattern", "bank", "sample", "music", "shader", "image", "video"]
-    results = []
 
-    for t in search_types:
-        cfg = config.STORAGE_MAP.get(t, config.STORAGE_MAP["default"])
-        try:
-            items = await state.run_io(utils._read_json_sync, cfg["index"])
-            if isinstance(items, list):
-                if t == "shader":
-                    for item in items:
-                        if item.get("thumbnail"):
-                            item["thumbnail_url"] = state.bucket.blob(
-                                f"{config.STORAGE_MAP['shader']['folder']}{item['thumbnail']}"
-                            ).public_url
-                results.extend(items)
-        except Exception as e:
-            logging.error(f"Error listing {t}: {e}")
+def _search_types(type: Optional[str]) -> List[str]:
+    """Types named by ``?type=`` (every library type when absent); 400 for unknown ones."""
+    if not type:
+        return _LIBRARY_TYPES
+    if type not in config.STORAGE_MAP:
+        raise HTTPException(400, f"Unknown type: {type}")
+    return [type]
 
-    if genre:
-        results = [r for r in results if r.get("genre") == genre]
-    if min_rating is not None:
-        results = [r for r in results if (r.get("rating") or 0) >= min_rating]
 
+def _library_sort_key(sort_by: models.SortBy):
     def sort_key(item):
         val = item.get(sort_by.value)
         return (0, val) if val is not None else (1, "")
+    return sort_key
+
+
+def _sorted_rows(index: indexes.ResidentIndex, sort_by: models.SortBy, sort_desc: bool) -> List[dict]:
+    """Copies of *index* entries in library order, with shader thumbnail URLs filled in."""
+    rows = [dict(entry) for entry in index.entries]
+    if index.resource_type == "shader":
+        folder = config.STORAGE_MAP["shader"]["folder"]
+        storage = backends.current()
+        for row in rows:
+            if row.get("thumbnail"):
+                row["thumbnail_url"] = storage.public_url(f"{folder}{row['thumbnail']}")
+    rows.sort(key=_library_sort_key(sort_by), reverse=sort_desc)
+    return rows
+
 
-    results.sort(key=sort_key, reverse=sort_desc)
-    await state.cache.set(cache_key, results, ttl=30)
-    return results
+@router.get("/api/library")
+@router.get("/api/songs", response_model=List[models.MetaData])
+async def list_library(
+    request: Request,
+    type: Optional[str] = Query(None),
+    genre: Optional[str] = Query(None),
+    min_rating: Optional[int] = Query(None, ge=1, le=10),
+    sort_by: models.SortBy = Query(models.SortBy.date),
+    sort_desc: bool = Query(True),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    search_types = _search_types(type)
+    # Load every index concurrently; cold loads fan out across the io_executor.
+    loaded = await asyncio.gather(
+        *(indexes.index_store.get(t) for t in search_types), return_exceptions=True
+    )
+    resident = []
+    for t, index in zip(search_types, loaded):
+        if isinstance(index, BaseException):
+            logging.error(f"Error listing {t}: {index}")
+            continue
+        resident.append(index)
+
+    def build():
+        per_type = [
+            index.derived(
+                f"library:{sort_by.value}:{sort_desc}",
+                lambda idx: _sorted_rows(idx, sort_by, sort_desc),
+            )
+            for index in resident
+        ]
+        merged = heapq.merge(*per_type, key=_library_sort_key(sort_by), reverse=sort_desc)
+        if genre:
+            merged = (r for r in merged if r.get("genre") == genre)
+        if min_rating is not None:
+            merged = (r for r in merged if (r.get("rating") or 0) >= min_rating)
+        return list(itertools.islice(merged, offset, offset + limit if limit is not None else None))
+
+    tokens = ",".join(f"{index.resource_type}@{index.token}" for index in resident)
+    key = f"library:{tokens}:{sort_by.value}:{sort_desc}:{genre}:{min_rating}:{limit}:{offset}"
+    return http_cache.cached_json(request, key, build)
 
 
 @router.post("/api/upload")
@@ -83,15 +116,9 @@ async def upload_item(payload: models.ItemPayload):
 
     async with state.get_resource_lock(item_type):
         try:
-            await state.run_io(utils._write_json_sync, full_path, payload.data)
-
-            def _update_index():
-                current = utils._read_json_sync(cfg["index"])
-                current.insert(0, meta)
-                utils._write_json_sync(cfg["index"], current)
-
-            await state.run_io(_update_index)
-            await state.clear_cache_for_type(item_type)
+            await backends.current().write_json(full_path, payload.data)
+            index = await indexes.index_store.get(item_type)
+            index.upsert(meta)
             return {"success": True, "id": item_id}
         except Exception as e:
             raise HTTPException(500, f"Upload failed: {str(e)}")
@@ -121,20 +148,9 @@ async def update_item(item_id: str, payload: models.ItemPayload):
 
     async with state.get_resource_lock(item_type):
         try:
-            await state.run_io(utils._write_json_sync, full_path, payload.data)
-
-            def _update_index_logic():
-                current = utils._read_json_sync(cfg["index"])
-                if not isinstance(current, list):
-                    current = []
-                existing_index = next((i for i, item in enumerate(current) if item.get("id") == item_id), -1)
-                if existing_index != -1:
-                    current.pop(existing_index)
-                current.insert(0, new_meta)
-                utils._write_json_sync(cfg["index"], current)
-
-            await state.run_io(_update_index_logic)
-            await state.clear_cache_for_type(item_type)
+            await backends.current().write_json(full_path, payload.data)
+            index = await indexes.index_store.get(item_type)
+            index.upsert(new_meta)
             return {"success": True, "id": item_id, "action": "updated"}
         except Exception as e:
             raise HTTPException(500, f"Update failed: {str(e)}")
@@ -143,20 +159,20 @@ async def update_item(item_id: str, payload: models.ItemPayload):
 @router.get("/api/items/{item_id}/meta")
 @router.get("/api/songs/{item_id}/meta")
 async def get_item_metadata(item_id: str, type: Optional[str] = Query(None)):
-    search_types = [type] if type else ["song", "pattern", "bank", "sample", "music", "shader", "image", "video"]
+    search_types = _search_types(type)
     for t in search_types:
-        cfg = config.STORAGE_MAP.get(t)
-        if not cfg:
+        try:
+            index = await indexes.index_store.get(t)
+        except indexes.IndexCorruptedError:
             continue
-        index_data = await state.run_io(utils._read_json_sync, cfg["index"])
-        if isinstance(index_data, list):
-            entry = next((item for item in index_data if item.get("id") == item_id), None)
-            if entry:
-                if t == "shader" and entry.get("thumbnail"):
-                    entry["thumbnail_url"] = state.bucket.blob(
-                        f"{config.STORAGE_MAP['shader']['folder']}{entry['thumbnail']}"
-                    ).public_url
-                return entry
+        entry = index.get(item_id)
+        if entry:
+            entry = dict(entry)
+            if t == "shader" and entry.get("thumbnail"):
+                entry["thumbnail_url"] = backends.current().public_url(
+                    f"{config.STORAGE_MAP['shader']['folder']}{entry['thumbnail']}"
+                )
+            return entry
     raise HTTPException(404, "Item not found")
 
 
@@ -164,30 +180,22 @@ async def get_item_metadata(item_id: str, type: Optional[str] = Query(None)):
 @router.get("/api/items/{item_id}")
 @router.get("/api/songs/{item_id}")
 async def get_item(item_id: str, type: Optional[str] = Query(None)):
-    search_types = [type] if type else ["song", "pattern", "bank", "sample", "music", "shader", "image", "video"]
+    search_types = _search_types(type)
     for t in search_types:
-        cfg = config.STORAGE_MAP.get(t)
+        cfg = config.STORAGE_MAP[t]
         filepath = f"{cfg['folder']}{item_id}.json"
-        blob = state.bucket.blob(filepath)
-        exists = await state.run_io(blob.exists)
-        if exists:
-            data = await state.run_io(blob.download_as_text)
-            return json.loads(data)
+        storage = backends.current()
+        if await storage.exists(filepath):
+            return json.loads(await storage.download_text(filepath))
     raise HTTPException(404, "Item not found")
 
 
 @router.patch("/api/songs/{item_id}")
 async def patch_song(item_id: str, patch: models.MetaPatch):
-    cfg = config.STORAGE_MAP["song"]
-    index_path = cfg["index"]
-
     async with state.get_resource_lock("song"):
         try:
-            index = await state.run_io(utils._read_json_sync, index_path)
-            if not isinstance(index, list):
-                index = []
-
-            entry = next((e for e in index if e.get("id") == item_id), None)
+            index = await indexes.get_index("song")
+            entry = index.get(item_id)
             if not entry:
                 raise HTTPException(status_code=404, detail="Song not found")
 
@@ -203,8 +211,7 @@ async def patch_song(item_id: str, patch: models.MetaPatch):
                     entry[field] = value
                 updated[field] = entry[field]
 
-            await state.run_io(utils._write_json_sync, index_path, index)
-            await state.clear_cache_for_type("song")
+            index.touch(item_id)
 
             return {"status": "success", "item_id": item_id, "updated": updated}
         except Exception as e:
@@ -2,25 +2,24 @@
 import uuid
 import logging
 from datetime import datetime
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 
-from .. import config, state, models, utils
+from .. import config, state, models, indexes, http_cache, backends
 
 router = APIRouter()
 
 
 @router.get("/api/locations")
-async def list_locations():
+async def list_locations(request: Request):
     """List all saved locations from cloud storage."""
-    cfg = config.STORAGE_MAP["location"]
     try:
-        index = await state.run_io(utils._read_json_sync, cfg["index"])
-        if not isinstance(index, list):
-            index = []
-        return index
+        index = await indexes.index_store.get("location")
+    except indexes.IndexCorruptedError:
+        return http_cache.conditional_json(request, [])
     except Exception as e:
         logging.error(f"Failed to list locations: {e}")
         raise HTTPException(500, f"Failed to list locations: {str(e)}")
+    return http_cache.cached_json(request, f"locations:{index.token}", lambda: index.entries)
 
 
 @router.post("/api/locations")
@@ -49,15 +48,11 @@ async def save_location(payload: models.LocationPayload):
 
     async with state.get_resource_lock("location"):
         try:
-            await state.run_io(utils._write_json_sync, full_path, data)
+            await backends.current().write_json(full_path, data)
 
-            index = await state.run_io(utils._read_json_sync, cfg["index"])
-            if not isinstance(index, list):
-                index = []
-            index.insert(0, data)
-            await state.run_io(utils._write_json_sync, cfg["index"], index)
+            index = await indexes.get_index("location", "Location index corrupted")
+            index.upsert(data)
 
-            await state.cache.delete("locations:list")
             return {"success": True, "id": location_id, "location": data}
         except Exception as e:
             logging.error(f"Failed to save location: {e}")
@@ -67,15 +62,12 @@ async def save_location(payload: models.LocationPayload):
 @router.get("/api/locations/{location_id}")
 async def get_location(location_id: str):
     """Get a single location by ID."""
-    cfg = config.STORAGE_MAP["location"]
     try:
-        index = await state.run_io(utils._read_json_sync, cfg["index"])
-        if not isinstance(index, list):
-            raise HTTPException(500, "Location index corrupted")
-        entry = next((item for item in index if item.get("id") == location_id), None)
+        index = await indexes.get_index("location", "Location index corrupted")
+        entry = index.get(location_id)
         if not entry:
             raise HTTPException(404, "Location not found")
-        return entry
+        return dict(entry)
     except HTTPException:
         raise
     except Exception as e:
@@ -89,22 +81,15 @@ async def delete_location(location_id: str):
     cfg = config.STORAGE_MAP["location"]
     async with state.get_resource_lock("location"):
         try:
-            index = await state.run_io(utils._read_json_sync, cfg["index"])
-            if not isinstance(index, list):
-                raise HTTPException(500, "Location index corrupted")
-
-            entry = next((item for item in index if item.get("id") == location_id), None)
+            index = await indexes.get_index("location", "Location index corrupted")
+            entry = index.get(location_id)
             if not entry:
                 raise HTTPException(404, "Location not found")
 
             blob_path = f"{cfg['folder']}{entry['filename']}"
-            blob = state.bucket.blob(blob_path)
-            if await state.run_io(blob.exists):
-                await state.run_io(blob.delete)
+            await backends.current().delete(blob_path)
 
-            index = [item for item in index if item.get("id") != location_id]
-            await state.run_io(utils._write_json_sync, cfg["index"], index)
-            await state.cache.delete("locations:list")
+            index.remove(location_id)
 
             return {"success": True, "id": location_id, "deleted": True}
         except HTTPException:
@@ -120,31 +105,28 @@ async def update_location(location_id: str, payload: models.LocationPayload):
     cfg = config.STORAGE_MAP["location"]
     async with state.get_resource_lock("location"):
         try:
-            index = await state.run_io(utils._read_json_sync, cfg["index"])
-            if not isinstance(index, list):
-                raise HTTPException(500, "Location index corrupted")
-
-            entry_idx = next((i for i, item in enumerate(index) if item.get("id") == location_id), -1)
-            if entry_idx == -1:
+            index = await indexes.get_index("location", "Location index corrupted")
+            entry = index.get(location_id)
+            if not entry:
                 raise HTTPException(404, "Location not found")
 
-            entry = index[entry_idx]
-            entry["name"] = payload.name
-            entry["lat"] = payload.lat
-            entry["lng"] = payload.lng
-            entry["heading"] = payload.heading
-            entry["pitch"] = payload.pitch
-            entry["zoom"] = payload.zoom
-            entry["description"] = payload.description
-            entry["tags"] = payload.tags
-            entry["date"] = datetime.now().strftime("%Y-%m-%d")
-
-            blob_path = f"{cfg['folder']}{entry['filename']}"
-            await state.run_io(utils._write_json_sync, blob_path, entry)
-            await state.run_io(utils._write_json_sync, cfg["index"], index)
-            await state.cache.delete("locations:list")
-
-            return {"success": True, "id": location_id, "location": entry}
+            updated = dict(entry)
+            updated["name"] = payload.name
+            updated["lat"] = payload.lat
+            updated["lng"] = payload.lng
+            updated["heading"] = payload.heading
+            updated["pitch"] = payload.pitch
+            updated["zoom"] = payload.zoom
+            updated["description"] = payload.description
+            updated["tags"] = payload.tags
+            updated["date"] = datetime.now().strftime("%Y-%m-%d")
+
+            blob_path = f"{cfg['folder']}{updated['filename']}"
+            await backends.current().write_json(blob_path, updated)
+            entry.update(updated)
+            index.touch(location_id)
+
+            return {"success": True, "id": location_id, "location": updated}
         except HTTPException:
             raise
         except Exception as e:
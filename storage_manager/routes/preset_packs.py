@@ -2,9 +2,9 @@
 import uuid
 import logging
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 
-from .. import config, state, models, utils
+from .. import state, models, utils, indexes, counters, http_cache
 
 router = APIRouter()
 
@@ -29,15 +29,10 @@ async def publish_preset_pack(payload: models.PresetPackPublishPayload):
         "play_count": 0,
     }
 
-    cfg = config.STORAGE_MAP["preset_pack"]
     async with state.get_resource_lock("preset_pack"):
         try:
-            index = await state.run_io(utils._read_json_sync, cfg["index"])
-            if not isinstance(index, list):
-                index = []
-            index.insert(0, entry)
-            await state.run_io(utils._write_json_sync, cfg["index"], index)
-            await state.clear_cache_for_type("preset_pack")
+            index = await indexes.index_store.get("preset_pack")
+            index.upsert(entry)
             return {"success": True, "id": pack_id, "pack": entry}
         except Exception as e:
             logging.error(f"Failed to publish preset pack: {e}")
@@ -47,45 +42,55 @@ async def publish_preset_pack(payload: models.PresetPackPublishPayload):
 @router.get("/api/preset_packs")
 @router.get("/api/preset-packs")
 async def list_preset_packs(
+    request: Request,
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
     sort_by: str = Query("date", pattern="^(date|play_count)$"),
 ):
     """List published preset packs. Default sort is newest first; use play_count for popular packs."""
-    cfg = config.STORAGE_MAP["preset_pack"]
     try:
-        index = await state.run_io(utils._read_json_sync, cfg["index"])
-        if not isinstance(index, list):
-            index = []
-
-        for pack in index:
-            pack.setdefault("play_count", 0)
-
-        if sort_by == "play_count":
-            index = sorted(index, key=lambda p: p.get("play_count", 0), reverse=True)
-
-        total = len(index)
-        page = index[offset : offset + limit]
-        return {"total": total, "limit": limit, "offset": offset, "packs": page}
+        resident = await indexes.index_store.get("preset_pack")
     except Exception as e:
         logging.error(f"Failed to list preset packs: {e}")
         raise HTTPException(500, f"Failed to list preset packs: {str(e)}")
 
+    def build():
+        try:
+            index = [counters.counter_aggregator.overlay("preset_pack", pack) for pack in resident.entries]
+
+            for pack in index:
+                pack.setdefault("play_count", 0)
+
+            if sort_by == "play_count":
+                index = sorted(index, key=lambda p: p.get("play_count", 0), reverse=True)
+
+            total = len(index)
+            page = index[offset : offset + limit]
+            return {"total": total, "limit": limit, "offset": offset, "packs": page}
+        except Exception as e:
+            logging.error(f"Failed to list preset packs: {e}")
+            raise HTTPException(500, f"Failed to list preset packs: {str(e)}")
+
+    # Pending play counts are overlaid, so the body also depends on the counter epoch.
+    key = f"preset_packs:{resident.token}:{counters.counter_aggregator.epoch}:{sort_by}:{limit}:{offset}"
+    return http_cache.cached_json(request, key, build)
+
 
 @router.get("/api/preset_packs/{pack_id}")
 @router.get("/api/preset-packs/{pack_id}")
 async def get_preset_pack(pack_id: str):
     """Fetch a single preset pack by id."""
-    cfg = config.STORAGE_MAP["preset_pack"]
     try:
-        index = await state.run_io(utils._read_json_sync, cfg["index"])
-        if not isinstance(index, list):
+        try:
+            index = await indexes.index_store.get("preset_pack")
+        except indexes.IndexCorruptedError:
             raise HTTPException(500, "Preset pack index corrupted")
 
-        entry = next((p for p in index if p.get("id") == pack_id), None)
+        entry = index.get(pack_id)
         if not entry:
             raise HTTPException(404, "Preset pack not found")
 
+        entry = counters.counter_aggregator.overlay("preset_pack", entry)
         entry.setdefault("play_count", 0)
         return entry
     except HTTPException:
@@ -99,33 +104,28 @@ async def get_preset_pack(pack_id: str):
 @router.post("/api/preset-packs/{pack_id}/play")
 async def record_preset_pack_play(pack_id: str):
     """Increment the play count for a preset pack."""
-    cfg = config.STORAGE_MAP["preset_pack"]
     now = datetime.now().isoformat()
 
-    async with state.get_resource_lock("preset_pack"):
+    try:
         try:
-            index = await state.run_io(utils._read_json_sync, cfg["index"])
-            if not isinstance(index, list):
-                raise HTTPException(500, "Preset pack index corrupted")
-
-            entry = next((p for p in index if p.get("id") == pack_id), None)
-            if not entry:
-                raise HTTPException(404, "Preset pack not found")
-
-            entry["play_count"] = (entry.get("play_count") or 0) + 1
-            entry["last_played"] = now
-
-            await state.run_io(utils._write_json_sync, cfg["index"], index)
-            await state.clear_cache_for_type("preset_pack")
-
-            return {
-                "success": True,
-                "id": pack_id,
-                "play_count": entry["play_count"],
-                "last_played": now,
-            }
-        except HTTPException:
-            raise
-        except Exception as e:
-            logging.error(f"Failed to record play for preset pack {pack_id}: {e}")
-            raise HTTPException(500, f"Failed to record play: {str(e)}")
+            index = await indexes.index_store.get("preset_pack")
+        except indexes.IndexCorruptedError:
+            raise HTTPException(500, "Preset pack index corrupted")
+
+        entry = index.get(pack_id)
+        if not entry:
+            raise HTTPException(404, "Preset pack not found")
+
+        projected = counters.counter_aggregator.record("preset_pack", entry, plays=1, last_played=now)
+
+        return {
+            "success": True,
+            "id": pack_id,
+            "play_count": projected["play_count"],
+            "last_played": now,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to record play for preset pack {pack_id}: {e}")
+        raise HTTPException(500, f"Failed to record play: {str(e)}")
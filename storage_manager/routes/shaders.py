@@ -1,83 +1,78 @@
 # storage_manager/routes/shaders.py
 import json
 import uuid
+import base64
+import asyncio
+import hashlib
 import logging
 from datetime import datetime
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query, Body
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query, Body, Request
 from fastapi.responses import PlainTextResponse, StreamingResponse
 
-from .. import config, state, models, utils
+from .. import config, state, models, utils, indexes, counters, listings, http_cache, backends
 
 router = APIRouter()
 
 
 @router.get("/api/shaders")
 async def list_shaders(
+    request: Request,
     category: Optional[models.ShaderCategory] = Query(None),
     min_stars: float = Query(0.0, ge=0, le=5),
-    sort_by: models.SortBy = Query(models.SortBy.rating)
+    sort_by: models.SortBy = Query(models.SortBy.rating),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
 ):
-    cache_key = f"shaders:list:{category}:{min_stars}:{sort_by}"
-    cached = await state.cache.get(cache_key)
-    if cached:
-        return cached
+    """List shaders. Returns a plain list, or a page envelope when ``limit`` is given."""
+    index = await indexes.get_index("shader", "Shader index corrupted")
 
-    cfg = config.STORAGE_MAP["shader"]
-    try:
-        index = await state.run_io(utils._read_json_sync, cfg["index"])
-        if not isinstance(index, list):
-            index = []
-
-        if category:
-            index = [s for s in index if category.value in s.get("tags", []) or category.value.lower() in s.get("description", "").lower()]
-        if min_stars > 0:
-            index = [s for s in index if s.get("stars", 0) >= min_stars]
-
-        reverse = sort_by in [models.SortBy.rating, models.SortBy.date, models.SortBy.last_played]
-        if sort_by is models.SortBy.rating:
-            index.sort(key=lambda s: s.get("stars", 0), reverse=reverse)
-        elif sort_by is models.SortBy.date:
-            index.sort(key=lambda s: s.get("date", ""), reverse=reverse)
-        elif sort_by is models.SortBy.name:
-            index.sort(key=lambda s: s.get("name", "").lower())
-        elif sort_by is models.SortBy.coordinate:
-            index.sort(key=lambda s: s.get("coordinate", 9999))
-
-        for shader in index:
-            shader.setdefault("stars", 0.0)
-            shader.setdefault("rating_count", 0)
-            shader.setdefault("play_count", 0)
-            if shader.get("thumbnail"):
-                thumbnail_path = f"{cfg['folder']}{shader['thumbnail']}"
-                shader["thumbnail_url"] = state.bucket.blob(thumbnail_path).public_url
-
-        await state.cache.set(cache_key, index, ttl=300)
-        return index
-    except Exception as e:
-        raise HTTPException(500, f"Failed to list shaders: {str(e)}")
+    def build():
+        try:
+            rows, total, next_cursor = listings.shader_listing(index).page(
+                sort_by,
+                category=category.value if category else None,
+                min_stars=min_stars,
+                limit=limit,
+                cursor=cursor,
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(500, f"Failed to list shaders: {str(e)}")
+        # Same values as /api/shaders/{id}; order and filters follow the folded counts.
+        rows = counters.counter_aggregator.overlay_many("shader", rows)
+        if limit is None:
+            return rows
+        return {"total": total, "limit": limit, "next_cursor": next_cursor, "shaders": rows}
+
+    # Pending counters are overlaid, so the body also depends on the counter epoch.
+    key = (
+        f"shaders:{index.token}:{counters.counter_aggregator.epoch}:"
+        f"{sort_by.value}:{category}:{min_stars}:{limit}:{cursor}"
+    )
+    return http_cache.cached_json(request, key, build)
 
 
 @router.get("/api/shaders/{shader_id}")
 async def get_shader_meta(shader_id: str):
     """Get shader metadata including stars, rating_count, play_count, coordinate."""
     cfg = config.STORAGE_MAP["shader"]
-    index = await state.run_io(utils._read_json_sync, cfg["index"])
-    if not isinstance(index, list):
-        raise HTTPException(500, "Shader index corrupted")
+    index = await indexes.get_index("shader", "Shader index corrupted")
 
-    entry = next((s for s in index if s.get("id") == shader_id), None)
+    entry = index.get(shader_id)
     if not entry:
         raise HTTPException(404, "Shader not found")
 
+    entry = counters.counter_aggregator.overlay("shader", entry)
     entry.setdefault("stars", 0.0)
     entry.setdefault("rating_count", 0)
     entry.setdefault("play_count", 0)
     entry.setdefault("coordinate", None)
     if entry.get("thumbnail"):
         thumbnail_path = f"{cfg['folder']}{entry['thumbnail']}"
-        entry["thumbnail_url"] = state.bucket.blob(thumbnail_path).public_url
+        entry["thumbnail_url"] = backends.current().public_url(thumbnail_path)
 
     return entry
 
@@ -88,80 +83,55 @@ async def rate_shader(shader_id: str, stars: float = Form(...)):
     if not 1 <= stars <= 5:
         raise HTTPException(400, "Stars must be between 1 and 5")
 
-    cfg = config.STORAGE_MAP["shader"]
-    index_path = cfg["index"]
-
-    async with state.get_resource_lock("shader"):
-        try:
-            index = await state.run_io(utils._read_json_sync, index_path)
-            if not isinstance(index, list):
-                raise HTTPException(500, "Shader index corrupted")
-
-            entry = next((s for s in index if s.get("id") == shader_id), None)
-            if not entry:
-                raise HTTPException(404, "Shader not found")
-
-            current_stars = entry.get("stars", 0.0)
-            current_count = entry.get("rating_count", 0)
-
-            new_count = current_count + 1
-            new_stars = ((current_stars * current_count) + stars) / new_count
+    try:
+        index = await indexes.get_index("shader", "Shader index corrupted")
 
-            entry["stars"] = round(new_stars, 2)
-            entry["rating_count"] = new_count
+        entry = index.get(shader_id)
+        if not entry:
+            raise HTTPException(404, "Shader not found")
 
-            await state.run_io(utils._write_json_sync, index_path, index)
-            await state.clear_cache_for_type("shader")
+        projected = counters.counter_aggregator.record("shader", entry, rating=stars)
 
-            return {
-                "id": shader_id,
-                "stars": entry["stars"],
-                "rating_count": entry["rating_count"],
-                "your_rating": stars
-            }
+        return {
+            "id": shader_id,
+            "stars": projected["stars"],
+            "rating_count": projected["rating_count"],
+            "your_rating": stars
+        }
 
-        except HTTPException:
-            raise
-        except Exception as e:
-            logging.error(f"Failed to rate shader {shader_id}: {e}")
-            raise HTTPException(500, f"Rating failed: {str(e)}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to rate shader {shader_id}: {e}")
+        raise HTTPException(500, f"Rating failed: {str(e)}")
 
 
 @router.post("/api/shaders/{shader_id}/play")
 async def record_shader_play(shader_id: str):
     """Record that a shader was played. Increments play_count."""
-    cfg = config.STORAGE_MAP["shader"]
-    index_path = cfg["index"]
     now = datetime.now().isoformat()
 
-    async with state.get_resource_lock("shader"):
-        try:
-            index = await state.run_io(utils._read_json_sync, index_path)
-            if not isinstance(index, list):
-                raise HTTPException(500, "Shader index corrupted")
-
-            entry = next((s for s in index if s.get("id") == shader_id), None)
-            if not entry:
-                raise HTTPException(404, "Shader not found")
+    try:
+        index = await indexes.get_index("shader", "Shader index corrupted")
 
-            entry["play_count"] = (entry.get("play_count") or 0) + 1
-            entry["last_played"] = now
+        entry = index.get(shader_id)
+        if not entry:
+            raise HTTPException(404, "Shader not found")
 
-            await state.run_io(utils._write_json_sync, index_path, index)
-            await state.clear_cache_for_type("shader")
+        projected = counters.counter_aggregator.record("shader", entry, plays=1, last_played=now)
 
-            return {
-                "success": True,
-                "id": shader_id,
-                "play_count": entry["play_count"],
-                "last_played": now
-            }
+        return {
+            "success": True,
+            "id": shader_id,
+            "play_count": projected["play_count"],
+            "last_played": now
+        }
 
-        except HTTPException:
-            raise
-        except Exception as e:
-            logging.error(f"Failed to record play for {shader_id}: {e}")
-            raise HTTPException(500, f"Failed to record play: {str(e)}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to record play for {shader_id}: {e}")
+        raise HTTPException(500, f"Failed to record play: {str(e)}")
 
 
 @router.post("/api/shaders/upload")
@@ -205,36 +175,122 @@ async def upload_shader(
 
     async with state.get_resource_lock("shader"):
         try:
-            blob = state.bucket.blob(full_path)
-            await state.run_io(blob.upload_from_file, file.file, content_type="text/plain")
+            await backends.current().upload_file(full_path, file.file, content_type="text/plain")
 
             if thumbnail is not None:
                 thumb_path = f"{cfg['folder']}{shader_id}.png"
-                thumb_blob = state.bucket.blob(thumb_path)
-                await state.run_io(thumb_blob.upload_from_file, thumbnail.file, content_type="image/png")
+                await backends.current().upload_file(thumb_path, thumbnail.file, content_type="image/png")
                 meta["thumbnail"] = f"{shader_id}.png"
-                meta["thumbnail_url"] = thumb_blob.public_url
+                meta["thumbnail_url"] = backends.current().public_url(thumb_path)
 
-            index = await state.run_io(utils._read_json_sync, cfg["index"])
-            if not isinstance(index, list):
-                index = []
-            index = [s for s in index if s.get("id") != shader_id]
-            index.insert(0, meta)
-            await state.run_io(utils._write_json_sync, cfg["index"], index)
+            index = await indexes.index_store.get("shader")
+            index.upsert(meta)
 
-            await state.clear_cache_for_type("shader")
             return {"success": True, "id": shader_id, "meta": meta}
         except Exception as e:
             raise HTTPException(500, f"Upload failed: {str(e)}")
 
 
+def _bulk_shader_meta(shader_id: str, meta_override: dict) -> dict:
+    return {
+        "id": shader_id,
+        "name": meta_override.get("name", shader_id.replace("-", " ").replace("_", " ").title()),
+        "author": meta_override.get("author", "ford442"),
+        "date": datetime.now().strftime("%Y-%m-%d"),
+        "type": "shader",
+        "description": meta_override.get("description", ""),
+        "tags": meta_override.get("tags", []),
+        "filename": f"{shader_id}.wgsl",
+        "coordinate": meta_override.get("coordinate"),
+        "stars": 0.0,
+        "rating_count": 0,
+        "play_count": 0,
+        "thumbnail": None,
+        "thumbnail_url": None
+    }
+
+
+async def _bulk_ingest(uploads: List[Tuple[str, bytes]], parsed_meta: dict) -> AsyncIterator[dict]:
+    """Upload shader blobs concurrently, then commit the index once.
+
+    Yields one ``{"event": "file", ...}`` record per file as its upload
+    finishes and a final ``{"event": "done", ...}`` report.  Blobs whose MD5
+    already matches are not re-uploaded; if their index entry exists and no
+    metadata override was given, the entry is left alone as well.
+    """
+    cfg = config.STORAGE_MAP["shader"]
+    storage = backends.current()
+    report = {"added": 0, "updated": 0, "unchanged": 0, "failed": 0, "errors": []}
+    slots = asyncio.Semaphore(max(1, config.BULK_UPLOAD_CONCURRENCY))
+
+    async def _upload(filename: str, data: bytes) -> dict:
+        if not filename.endswith(".wgsl"):
+            return {"event": "file", "file": filename, "status": "failed", "error": "Not a .wgsl file"}
+        shader_id = filename[:-len(".wgsl")]
+        full_path = f"{cfg['folder']}{shader_id}.wgsl"
+        async with slots:
+            try:
+                md5 = base64.b64encode(hashlib.md5(data).digest()).decode()
+                info = await storage.stat(full_path)
+                if info is not None and info.md5_hash == md5:
+                    status = "unchanged"
+                else:
+                    await storage.upload_bytes(full_path, data, content_type="text/plain")
+                    status = "uploaded"
+            except Exception as e:
+                return {"event": "file", "file": filename, "id": shader_id, "status": "failed", "error": str(e)}
+        return {"event": "file", "file": filename, "id": shader_id, "status": status}
+
+    results = []
+    for pending in asyncio.as_completed([_upload(name, data) for name, data in uploads]):
+        result = await pending
+        results.append(result)
+        yield result
+
+    async with state.get_resource_lock("shader"):
+        try:
+            index = await indexes.index_store.get("shader")
+        except indexes.IndexCorruptedError as e:
+            raise HTTPException(500, f"Failed to load index for bulk upload: {str(e)}")
+
+        # Keep request order so the index ends up as if files were added one by one.
+        order = {name: n for n, (name, _) in enumerate(uploads)}
+        metas = []
+        for result in sorted(results, key=lambda r: order[r["file"]]):
+            if result["status"] == "failed":
+                report["failed"] += 1
+                report["errors"].append({"file": result["file"], "error": result["error"]})
+                continue
+            shader_id = result["id"]
+            if result["status"] == "unchanged" and shader_id not in parsed_meta and index.get(shader_id) is not None:
+                report["unchanged"] += 1
+                continue
+            metas.append(_bulk_shader_meta(shader_id, parsed_meta.get(shader_id, {})))
+
+        for existed in index.upsert_many(metas):
+            report["updated" if existed else "added"] += 1
+
+        try:
+            if metas:
+                await indexes.index_store.flush("shader")
+        except Exception as e:
+            raise HTTPException(500, f"Failed to save index after bulk upload: {str(e)}")
+
+    report["total_in_index"] = len(index)
+    yield {"event": "done", **report}
+
+
 @router.post("/api/admin/bulk-upload-shaders")
 async def bulk_upload_shaders(
     files: List[UploadFile] = File(...),
-    metadata_json: Optional[str] = Form(None)
+    metadata_json: Optional[str] = Form(None),
+    stream: bool = Query(False),
 ):
-    """Bulk upload multiple .wgsl shader files."""
-    cfg = config.STORAGE_MAP["shader"]
+    """Bulk upload multiple .wgsl shader files.
+
+    With ``?stream=true`` the response is NDJSON: one line per file as its
+    upload completes, then the summary report.
+    """
     parsed_meta = {}
     if metadata_json:
         try:
@@ -242,64 +298,25 @@ async def bulk_upload_shaders(
         except json.JSONDecodeError:
             raise HTTPException(400, "metadata_json must be valid JSON")
 
-    report = {"added": 0, "updated": 0, "failed": 0, "errors": []}
-
-    async with state.get_resource_lock("shader"):
-        index = await state.run_io(utils._read_json_sync, cfg["index"])
-        if not isinstance(index, list):
-            index = []
-
-        for file in files:
-            if not file.filename.endswith(".wgsl"):
-                report["failed"] += 1
-                report["errors"].append({"file": file.filename, "error": "Not a .wgsl file"})
-                continue
-
-            shader_id = file.filename.replace(".wgsl", "")
-            meta_override = parsed_meta.get(shader_id, {})
-            storage_filename = f"{shader_id}.wgsl"
-            full_path = f"{cfg['folder']}{storage_filename}"
-
-            meta = {
-                "id": shader_id,
-                "name": meta_override.get("name", shader_id.replace("-", " ").replace("_", " ").title()),
-                "author": meta_override.get("author", "ford442"),
-                "date": datetime.now().strftime("%Y-%m-%d"),
-                "type": "shader",
-                "description": meta_override.get("description", ""),
-                "tags": meta_override.get("tags", []),
-                "filename": storage_filename,
-                "coordinate": meta_override.get("coordinate"),
-                "stars": 0.0,
-                "rating_count": 0,
-                "play_count": 0,
-                "thumbnail": None,
-                "thumbnail_url": None
-            }
+    # Shader sources are small; read them before the response starts so the
+    # uploads do not depend on the request's spooled files staying open.
+    uploads = [(file.filename, await file.read()) for file in files]
+    events = _bulk_ingest(uploads, parsed_meta)
 
+    if stream:
+        async def ndjson():
             try:
-                blob = state.bucket.blob(full_path)
-                await state.run_io(blob.upload_from_file, file.file, content_type="text/plain")
+                async for event in events:
+                    yield json.dumps(event) + "\n"
+            except HTTPException as e:
+                yield json.dumps({"event": "error", "status": e.status_code, "detail": e.detail}) + "\n"
 
-                existed = any(s.get("id") == shader_id for s in index)
-                index = [s for s in index if s.get("id") != shader_id]
-                index.insert(0, meta)
-
-                if existed:
-                    report["updated"] += 1
-                else:
-                    report["added"] += 1
-            except Exception as e:
-                report["failed"] += 1
-                report["errors"].append({"file": file.filename, "error": str(e)})
-
-        try:
-            await state.run_io(utils._write_json_sync, cfg["index"], index)
-            await state.clear_cache_for_type("shader")
-        except Exception as e:
-            raise HTTPException(500, f"Failed to save index after bulk upload: {str(e)}")
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
-    report["total_in_index"] = len(index)
+    report = {}
+    async for event in events:
+        report = event
+    report.pop("event", None)
     return report
 
 
@@ -307,25 +324,18 @@ async def bulk_upload_shaders(
 async def get_shader_thumbnail(shader_id: str):
     """Return the shader thumbnail image if available."""
     cfg = config.STORAGE_MAP["shader"]
-    index = await state.run_io(utils._read_json_sync, cfg["index"])
-    if not isinstance(index, list):
-        raise HTTPException(500, "Shader index corrupted")
+    index = await indexes.get_index("shader", "Shader index corrupted")
 
-    entry = next((s for s in index if s.get("id") == shader_id), None)
+    entry = index.get(shader_id)
     if not entry or not entry.get("thumbnail"):
         raise HTTPException(404, "Thumbnail not found")
 
     thumb_path = f"{cfg['folder']}{entry['thumbnail']}"
-    blob = state.bucket.blob(thumb_path)
-    if not await state.run_io(blob.exists):
+    storage = backends.current()
+    if not await storage.exists(thumb_path):
         raise HTTPException(404, "Thumbnail not found")
 
-    def iterfile():
-        with blob.open("rb") as f:
-            while chunk := f.read(1024 * 1024):
-                yield chunk
-
-    return StreamingResponse(iterfile(), media_type="image/png")
+    return StreamingResponse(storage.iter_bytes(thumb_path), media_type="image/png")
 
 
 @router.get("/api/shaders/{shader_id}/code")
@@ -333,17 +343,17 @@ async def get_shader_code(shader_id: str):
     """Returns the actual .wgsl shader code."""
     cfg = config.STORAGE_MAP["shader"]
 
-    index = await state.run_io(utils._read_json_sync, cfg["index"])
-    entry = next((s for s in index if s.get("id") == shader_id), None)
+    index = await indexes.get_index("shader", "Shader index corrupted")
+    entry = index.get(shader_id)
     if not entry:
         raise HTTPException(404, "Shader not found")
 
     blob_path = f"{cfg['folder']}{entry['filename']}"
-    blob = state.bucket.blob(blob_path)
-    if not await state.run_io(blob.exists):
+    storage = backends.current()
+    if not await storage.exists(blob_path):
         raise HTTPException(404, "Shader file not found")
 
-    code = await state.run_io(blob.download_as_text)
+    code = await storage.download_text(blob_path)
     return {"id": shader_id, "code": code, "name": entry.get("name")}
 
 
@@ -351,20 +361,17 @@ async def get_shader_code(shader_id: str):
 @router.put("/api/shaders/{shader_id}")
 async def update_shader_metadata(shader_id: str, payload: models.MetaPatch):
     """Update shader metadata (name, rating, coordinate, etc)."""
-    cfg = config.STORAGE_MAP["shader"]
-    index_path = cfg["index"]
-
     async with state.get_resource_lock("shader"):
         try:
-            index = await state.run_io(utils._read_json_sync, index_path)
-            if not isinstance(index, list):
+            try:
+                index = await indexes.index_store.get("shader")
+            except indexes.IndexCorruptedError:
                 raise HTTPException(500, "Index corrupted")
 
-            entry_idx = next((i for i, s in enumerate(index) if s.get("id") == shader_id), -1)
-            if entry_idx == -1:
+            entry = index.get(shader_id)
+            if entry is None:
                 raise HTTPException(404, "Shader not found")
 
-            entry = index[entry_idx]
             updated = {}
 
             if payload.name is not None:
@@ -384,8 +391,7 @@ async def update_shader_metadata(shader_id: str, payload: models.MetaPatch):
                 updated["params"] = f"{len(payload.params)} parameters"
 
             if updated:
-                await state.run_io(utils._write_json_sync, index_path, index)
-                await state.clear_cache_for_type("shader")
+                index.touch(shader_id)
 
             return {"success": True, "id": shader_id, "updated": updated}
 
@@ -400,19 +406,14 @@ async def update_shader_metadata(shader_id: str, payload: models.MetaPatch):
 @router.post("/api/shaders/coordinates")
 async def sync_shader_coordinates(payload: models.CoordinateSyncPayload):
     """Sync coordinates from shader_coordinates.json."""
-    cfg = config.STORAGE_MAP["shader"]
-    index_path = cfg["index"]
-
     async with state.get_resource_lock("shader"):
         try:
-            index = await state.run_io(utils._read_json_sync, index_path)
-            if not isinstance(index, list):
-                index = []
+            index = await indexes.index_store.get("shader")
 
             updated = 0
             skipped = 0
 
-            for entry in index:
+            for entry in index.entries:
                 shader_id = entry.get("id")
                 if shader_id in payload.coordinates:
                     existing_coord = entry.get("coordinate")
@@ -420,14 +421,11 @@ async def sync_shader_coordinates(payload: models.CoordinateSyncPayload):
 
                     if existing_coord is None or payload.overwrite:
                         entry["coordinate"] = new_coord
+                        index.touch(shader_id)
                         updated += 1
                     else:
                         skipped += 1
 
-            if updated > 0:
-                await state.run_io(utils._write_json_sync, index_path, index)
-                await state.clear_cache_for_type("shader")
-
             return {
                 "success": True,
                 "updated": updated,
@@ -452,28 +450,51 @@ async def rescan_shaders(payload: models.ShaderRescanPayload = Body(default_fact
         raise HTTPException(500, f"Shader rescan failed: {str(e)}")
 
 
+def _wgsl_response(request: Request, cached: dict):
+    last_modified = http_cache.http_date(cached.get("updated"))
+    cache_control = config.HTTP_WGSL_CACHE_CONTROL
+    if http_cache.etag_matches(request, cached["etag"]) or http_cache.not_modified_since(request, cached.get("updated")):
+        return http_cache.not_modified(cached["etag"], cache_control, last_modified)
+    return PlainTextResponse(
+        cached["code"],
+        media_type="text/plain",
+        headers=http_cache.validator_headers(cached["etag"], cache_control, last_modified),
+    )
+
+
 @router.head("/api/shaders/{shader_id}/wgsl")
 @router.get("/api/shaders/{shader_id}/wgsl", response_class=PlainTextResponse)
-async def get_shader_wgsl(shader_id: str):
+async def get_shader_wgsl(shader_id: str, request: Request):
     """Returns raw WGSL text for direct consumption by WebGPU renderer."""
     cache_key = f"shader_wgsl:{shader_id}"
     cached = await state.cache.get(cache_key)
+    if isinstance(cached, str):
+        # Entry written before validators were cached alongside the code.
+        cached = {"code": cached, "etag": http_cache.body_etag(cached.encode())}
     if cached:
-        return PlainTextResponse(cached, media_type="text/plain")
+        return _wgsl_response(request, cached)
 
     cfg = config.STORAGE_MAP["shader"]
     blob_path = f"{cfg['folder']}{shader_id}.wgsl"
-    blob = state.bucket.blob(blob_path)
-    if await state.run_io(blob.exists):
-        code = await state.run_io(blob.download_as_text)
-        await state.cache.set(cache_key, code, ttl=3600)
-        return PlainTextResponse(code, media_type="text/plain")
+    storage = backends.current()
+    # stat fetches metadata (md5, updated) in the same call that checks existence.
+    info = await storage.stat(blob_path)
+    if info is not None:
+        etag = http_cache.md5_etag(info)
+        updated = info.updated.timestamp() if info.updated is not None else None
+        if etag and (http_cache.etag_matches(request, etag) or http_cache.not_modified_since(request, updated)):
+            return http_cache.not_modified(etag, config.HTTP_WGSL_CACHE_CONTROL, http_cache.http_date(updated))
+        code = await storage.download_text(blob_path)
+        cached = {"code": code, "etag": etag or http_cache.body_etag(code.encode()), "updated": updated}
+        await state.cache.set(cache_key, cached, ttl=3600)
+        return _wgsl_response(request, cached)
 
     if config.FTP_ENABLED:
         try:
-            code = await state.run_io(utils._fetch_ftp_file_sync, f"{shader_id}.wgsl")
-            await state.cache.set(cache_key, code, ttl=3600)
-            return PlainTextResponse(code, media_type="text/plain")
+            code = await state.run_media_io(utils._fetch_ftp_file_sync, f"{shader_id}.wgsl")
+            cached = {"code": code, "etag": http_cache.body_etag(code.encode())}
+            await state.cache.set(cache_key, cached, ttl=3600)
+            return _wgsl_response(request, cached)
         except Exception:
             pass
 
@@ -6,19 +6,37 @@ from datetime import datetime
 from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import JSONResponse
 
-from .. import config, state, models, utils, intents
+from .. import config, state, models, utils, intents, indexes, signed_urls, backups
 
 router = APIRouter()
 
 
+def _apply_to_index(idx: indexes.ResidentIndex, remove_filenames: set, new_entries: list) -> None:
+    """Drop entries for *remove_filenames* and add *new_entries* on top of the resident index.
+
+    Individual removals and upserts keep counter folds and other unflushed
+    changes, and the generation-checked flush merges concurrent writers.
+    """
+    doomed = [e for e in idx.entries if isinstance(e, dict) and e.get("filename") in remove_filenames]
+    if all(e.get("id") is not None and idx.get(e["id"]) is e for e in doomed):
+        for entry in doomed:
+            idx.remove(entry["id"])
+    else:
+        # Entries without an id (or shadowed duplicates) can only go through a rewrite.
+        idx.replace_all([
+            e for e in idx.entries if not (isinstance(e, dict) and e.get("filename") in remove_filenames)
+        ])
+    idx.upsert_many(new_entries)
+
+
 async def _plan_sync(resource_type: str, allowed_extensions: tuple) -> dict:
     """Run the read-only planning phase for *resource_type*. Returns the full response dict."""
     cfg = config.STORAGE_MAP[resource_type]
     t0 = time.monotonic()
 
-    existing_index = await state.run_io(utils._read_json_sync, cfg["index"])
-    if not isinstance(existing_index, list):
-        existing_index = []
+    idx = await indexes.index_store.refresh(resource_type)
+    # Shallow copies: the diff runs on a worker thread while folds may edit entries.
+    existing_index = [dict(e) if isinstance(e, dict) else e for e in idx.entries]
 
     diff_full, gcs_sha, index_sha = await state.run_io(
         utils._compute_sync_diff_sync, cfg, allowed_extensions, existing_index
@@ -40,7 +58,7 @@ async def _plan_sync(resource_type: str, allowed_extensions: tuple) -> dict:
         diff=diff_full,
         diff_preview=diff_preview,
     )
-    intents.intent_store.put(doc)
+    await intents.call("put", doc)
 
     duration_ms = round((time.monotonic() - t0) * 1000, 1)
     state._log_event(
@@ -73,9 +91,8 @@ async def _apply_sync(
 ) -> dict:
     """Run the mutating apply phase for *resource_type*. Returns the response dict."""
     cfg = config.STORAGE_MAP[resource_type]
-    cache_keys = [f"library:{resource_type}", "library:all"]
 
-    doc = intents.intent_store.get(payload.intent_id)
+    doc = await intents.call("get", payload.intent_id)
     if doc is None or doc.status == "EXPIRED":
         raise HTTPException(
             410,
@@ -116,21 +133,20 @@ async def _apply_sync(
     async with state.get_resource_lock(resource_type):
         t0 = time.monotonic()
 
-        existing_index = await state.run_io(utils._read_json_sync, cfg["index"])
-        if not isinstance(existing_index, list):
-            existing_index = []
+        idx = await indexes.index_store.refresh(resource_type)
+        existing_index = idx.entries
 
-        _, current_gcs_sha, current_index_sha = await state.run_io(
-            utils._compute_sync_diff_sync, cfg, allowed_extensions, existing_index
+        current_index_sha = utils._index_snapshot_sha(existing_index)
+        gcs_unchanged = current_index_sha == doc.index_snapshot_sha and await state.run_io(
+            utils._sync_snapshot_unchanged_sync, cfg, allowed_extensions, doc.gcs_snapshot_sha
         )
 
-        if current_gcs_sha != doc.gcs_snapshot_sha or current_index_sha != doc.index_snapshot_sha:
+        if not gcs_unchanged:
             state._log_event(
                 "intent_stale",
                 intent_id=doc.intent_id,
                 resource_type=resource_type,
                 expected_gcs_sha=doc.gcs_snapshot_sha,
-                actual_gcs_sha=current_gcs_sha,
                 expected_index_sha=doc.index_snapshot_sha,
                 actual_index_sha=current_index_sha,
             )
@@ -143,13 +159,38 @@ async def _apply_sync(
                 },
             )
 
-        doc.status = "EXECUTING"
-        intents.intent_store.put(doc)
+        # Claim the intent atomically: with a shared store only one worker wins.
+        claimed = await intents.call("transition", doc.intent_id, "PENDING", "EXECUTING")
+        if claimed is None:
+            current = await intents.call("get", doc.intent_id)
+            if current is not None and current.status == "EXECUTED":
+                return {
+                    "intent_id": current.intent_id,
+                    "status": "EXECUTED",
+                    "changes_applied": True,
+                    "duration_ms": current.duration_ms,
+                    "backup_path": current.backup_path,
+                    "diff": current.diff_preview,
+                }
+            if current is None or current.status == "EXPIRED":
+                raise HTTPException(
+                    410,
+                    detail={
+                        "error": "INTENT_NOT_FOUND",
+                        "message": "Intent has expired or does not exist. Run /plan again.",
+                        "intent_id": payload.intent_id,
+                    },
+                )
+            raise HTTPException(
+                409,
+                detail={"error": "EXECUTING", "message": "This intent is already being applied."},
+            )
+        doc = claimed
 
         try:
             diff = doc.diff
             remove_set = {r["filename"] for r in diff["to_remove"]}
-            new_index = [item for item in existing_index if item["filename"] not in remove_set]
+            new_entries = []
 
             for blob_info in diff["to_add"]:
                 new_entry = {
@@ -165,19 +206,25 @@ async def _apply_sync(
                     "size": blob_info["size"],
                     "_sync_base": {"size": blob_info["size"], "url": blob_info["url"]},
                 }
-                new_index.insert(0, new_entry)
-
-            backup_path = await state.run_io(utils._write_json_atomic_sync, cfg["index"], new_index)
-
-            for key in cache_keys:
-                await state.cache.delete(key)
+                new_entries.append(new_entry)
+
+            # Back up the blob as it is before this apply, with the log folded in.
+            await indexes.index_store.flush(resource_type, compact=True)
+            backup_path = await state.run_io(utils._backup_blob_sync, cfg["index"])
+            if backup_path:
+                backups.backup_pruner.schedule(cfg["index"])
+            _apply_to_index(idx, remove_set, new_entries)
+            await indexes.index_store.flush(resource_type)
+            # Removed or re-added objects must be re-checked before the next redirect.
+            for changed in diff["to_remove"] + diff["to_add"]:
+                signed_urls.signed_url_cache.invalidate(f"{cfg['folder']}{changed['filename']}")
 
             duration_ms = round((time.monotonic() - t0) * 1000, 1)
             doc.status = "EXECUTED"
             doc.applied_at = time.time()
             doc.duration_ms = duration_ms
             doc.backup_path = backup_path
-            intents.intent_store.put(doc)
+            await intents.call("put", doc)
 
             state._log_event(
                 "intent_applied",
@@ -194,7 +241,7 @@ async def _apply_sync(
         except Exception as exc:
             doc.status = "PENDING"
             doc.error = str(exc)
-            intents.intent_store.put(doc)
+            await intents.call("put", doc)
             logging.error(f"apply_sync failed for {resource_type}: {exc}")
             raise HTTPException(500, f"Apply failed: {str(exc)}")
 
@@ -250,14 +297,14 @@ async def apply_sync_images(payload: models.ApplyIntentPayload):
 @router.get("/api/admin/sync-images/intents")
 async def list_image_intents(limit: int = Query(20, ge=1, le=100)):
     """Return recent sync intents for images (newest first)."""
-    docs = intents.intent_store.list_recent("image", limit=limit)
+    docs = await intents.call("list_recent", "image", limit=limit)
     return {"intents": [_intent_to_summary(d) for d in docs]}
 
 
 @router.get("/api/admin/sync-images/intents/{intent_id}")
 async def get_image_intent(intent_id: str):
     """Return detail for a single image sync intent."""
-    doc = intents.intent_store.get(intent_id)
+    doc = await intents.call("get", intent_id)
     if doc is None or doc.resource_type != "image":
         raise HTTPException(404, "Intent not found")
     result = _intent_to_summary(doc)
@@ -283,14 +330,14 @@ async def apply_sync_videos(payload: models.ApplyIntentPayload):
 @router.get("/api/admin/sync-videos/intents")
 async def list_video_intents(limit: int = Query(20, ge=1, le=100)):
     """Return recent sync intents for videos (newest first)."""
-    docs = intents.intent_store.list_recent("video", limit=limit)
+    docs = await intents.call("list_recent", "video", limit=limit)
     return {"intents": [_intent_to_summary(d) for d in docs]}
 
 
 @router.get("/api/admin/sync-videos/intents/{intent_id}")
 async def get_video_intent(intent_id: str):
     """Return detail for a single video sync intent."""
-    doc = intents.intent_store.get(intent_id)
+    doc = await intents.call("get", intent_id)
     if doc is None or doc.resource_type != "video":
         raise HTTPException(404, "Intent not found")
     result = _intent_to_summary(doc)
@@ -351,15 +398,17 @@ async def sync_gcs_storage():
                     if fname and not b.name.endswith(cfg["index"]):
                         actual_files.append(fname)
 
-                index_data = await state.run_io(utils._read_json_sync, cfg["index"])
-                if not isinstance(index_data, list):
-                    index_data = []
+                idx = await indexes.index_store.refresh(item_type)
+                index_data = idx.entries
 
                 index_map = {item["filename"]: item for item in index_data}
                 disk_set = set(actual_files)
 
-                new_index = [item for item in index_data if item["filename"] in disk_set]
-                removed = len(index_data) - len(new_index)
+                gone = {item["filename"] for item in index_data if item["filename"] not in disk_set}
+                removed = sum(1 for item in index_data if item["filename"] in gone)
+                new_entries = []
+                for filename in gone:
+                    signed_urls.signed_url_cache.invalidate(f"{cfg['folder']}{filename}")
 
                 for filename in actual_files:
                     if filename not in index_map:
@@ -386,15 +435,15 @@ async def sync_gcs_storage():
                             except Exception as meta_err:
                                 logging.debug("Could not extract metadata for %s: %s", filename, meta_err)
 
-                        new_index.insert(0, new_entry)
+                        new_entries.append(new_entry)
                         added += 1
 
                 if added > 0 or removed > 0:
-                    await state.run_io(utils._write_json_sync, cfg["index"], new_index)
+                    _apply_to_index(idx, gone, new_entries)
+                    await indexes.index_store.flush(item_type)
 
                 report[item_type] = {"added": added, "removed": removed, "status": "synced"}
         except Exception as e:
             report[item_type] = {"error": str(e)}
 
-    await state.clear_cache_for_type(None)
     return report
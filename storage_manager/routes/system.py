@@ -2,9 +2,9 @@
 import uuid
 from datetime import datetime
 from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 
-from .. import config, state, models, utils
+from .. import config, state, models, utils, indexes, backends, health, locks, media_cache, signed_urls, metrics
 
 router = APIRouter()
 
@@ -26,25 +26,51 @@ def home():
     }
 
 
+@router.get("/api/health/live")
+async def liveness_check():
+    """Liveness: the event loop answers; reports loop lag and executor backlog."""
+    return await health.liveness()
+
+
+@router.get("/api/health/ready")
+async def readiness_check():
+    """Readiness: cached storage probe plus saturation; 503 when not ready."""
+    report = await health.readiness()
+    return JSONResponse(report, status_code=200 if report["status"] == "ready" else 503)
+
+
 @router.get("/api/health")
+@router.get("/api/health/details")
 async def health_check():
-    status_report = {}
-    for item_type, cfg in config.STORAGE_MAP.items():
-        try:
-            index_data = await state.run_io(utils._read_json_sync, cfg["index"])
-            status_report[item_type] = {
-                "count": len(index_data) if isinstance(index_data, list) else 0,
-                "status": "connected"
-            }
-        except Exception as e:
-            status_report[item_type] = {"count": 0, "status": "error", "error": str(e)}
+    """Detailed stats from memory: resident index counts, locks, executors, caches."""
     return {
         "status": "online",
         "gcs_connected": state.bucket is not None,
-        "storage": status_report
+        "storage_backend": backends.current().name,
+        "storage_probe": await health.storage_probe.check(),
+        "storage": health.index_stats(),
+        "executors": health.executors(),
+        "locks": locks.stats(),
+        "caches": {
+            "signed_urls": len(signed_urls.signed_url_cache),
+            "media_disk": {
+                "files": len(media_cache.media_cache),
+                "bytes": media_cache.media_cache.nbytes,
+                "hits": media_cache.media_cache.hits,
+                "misses": media_cache.media_cache.misses,
+            },
+        },
     }
 
 
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint for this worker's I/O, cache, lock and media metrics."""
+    if not config.METRICS_ENABLED:
+        raise HTTPException(404, "Metrics disabled")
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @router.post("/api/admin/sync-music")
 async def sync_music_folder():
     """Scans the music/ folder and rebuilds the music index."""
@@ -53,7 +79,7 @@ async def sync_music_folder():
 
     async with state.get_resource_lock("music"):
         try:
-            blobs = await state.run_io(lambda: list(state.bucket.list_blobs(prefix=cfg["folder"])))
+            blobs = await backends.current().list_prefix(cfg["folder"])
 
             audio_files = []
             for b in blobs:
@@ -68,18 +94,16 @@ async def sync_music_folder():
                             "url": b.public_url
                         })
 
-            index_data = await state.run_io(utils._read_json_sync, cfg["index"])
-            if not isinstance(index_data, list):
-                index_data = []
-
-            index_map = {item["filename"]: item for item in index_data}
+            index = await indexes.get_index("music")
             disk_set = set(f["filename"] for f in audio_files)
 
-            new_index = [item for item in index_data if item["filename"] in disk_set]
-            report["removed"] = len(index_data) - len(new_index)
+            for item in list(index.entries):
+                if item.get("filename") not in disk_set and item.get("id") is not None:
+                    index.remove(item["id"])
+                    report["removed"] += 1
 
             for file_info in audio_files:
-                if file_info["filename"] not in index_map:
+                if index.get_by_filename(file_info["filename"]) is None:
                     new_entry = {
                         "id": str(uuid.uuid4()),
                         "filename": file_info["filename"],
@@ -94,16 +118,11 @@ async def sync_music_folder():
                         "url": file_info["url"],
                         "size": file_info["size"]
                     }
-                    new_index.insert(0, new_entry)
+                    index.upsert(new_entry)
                     report["added"] += 1
 
-            if report["added"] > 0 or report["removed"] > 0:
-                await state.run_io(utils._write_json_sync, cfg["index"], new_index)
-
-            await state.cache.delete("library:music")
-            await state.cache.delete("library:all")
 
-            report["total"] = len(new_index)
+            report["total"] = len(index)
             return report
 
         except Exception as e:
@@ -114,7 +133,6 @@ async def sync_music_folder():
 @router.post("/api/seed/test-samples")
 async def seed_test_samples():
     """Creates test sample entries for development."""
-    cfg = config.STORAGE_MAP["sample"]
     test_samples = [
         {
             "id": "test-flac-001",
@@ -153,22 +171,15 @@ async def seed_test_samples():
 
     async with state.get_resource_lock("sample"):
         try:
-            index_data = await state.run_io(utils._read_json_sync, cfg["index"])
-            if not isinstance(index_data, list):
-                index_data = []
-
-            existing_ids = {item.get("id") for item in index_data}
+            index = await indexes.get_index("sample")
             added = 0
             for sample in test_samples:
-                if sample["id"] not in existing_ids:
-                    index_data.insert(0, sample)
+                if index.get(sample["id"]) is None:
+                    index.upsert(sample)
                     added += 1
 
-            await state.run_io(utils._write_json_sync, cfg["index"], index_data)
-            await state.cache.delete("library:sample")
-            await state.cache.delete("library:all")
 
-            return {"success": True, "added": added, "total": len(index_data)}
+            return {"success": True, "added": added, "total": len(index)}
         except Exception as e:
             raise HTTPException(500, f"Failed to seed: {str(e)}")
 
@@ -176,7 +187,6 @@ async def seed_test_samples():
 @router.post("/api/admin/seed-brainfuck-examples")
 @router.post("/api/seed/brainfuck")
 async def seed_brainfuck_examples():
-    cfg = config.STORAGE_MAP["brainfuck"]
     examples = [
         {"id": "bf-mandelbrot", "name": "Mandelbrot Set", "type": "brainfuck", "author": "Classic BF",
          "date": "2026-03-07", "description": "bf2wasm + -O3", "filename": "mandelbrot.bf",
@@ -190,16 +200,12 @@ async def seed_brainfuck_examples():
     ]
 
     async with state.get_resource_lock("brainfuck"):
-        idx = await state.run_io(utils._read_json_sync, cfg["index"]) or []
-        existing_ids = {item.get("id") for item in idx}
+        idx = await indexes.get_index("brainfuck")
         added = 0
         for ex in examples:
-            if ex["id"] not in existing_ids:
-                idx.insert(0, ex)
+            if idx.get(ex["id"]) is None:
+                idx.upsert(ex)
                 added += 1
-        await state.run_io(utils._write_json_sync, cfg["index"], idx)
-        await state.cache.delete("library:brainfuck")
-        await state.cache.delete("library:all")
         return {"success": True, "added": added, "total": len(idx)}
 
 
@@ -210,21 +216,16 @@ async def list_gcs_folder(folder: str = Query(..., description="Folder name, e.g
     prefix = cfg["folder"] if cfg else f"{folder}/"
 
     try:
-        def _fetch_blobs():
-            blobs = state.bucket.list_blobs(prefix=prefix, delimiter="/")
-            file_list = []
-            for blob in blobs:
-                name = blob.name.replace(prefix, "")
-                if name:
-                    file_list.append({
-                        "filename": name,
-                        "size": blob.size,
-                        "updated": blob.updated.isoformat() if blob.updated else None,
-                        "url": blob.public_url if blob.public_url else None
-                    })
-            return file_list
-
-        files = await state.run_io(_fetch_blobs)
+        files = []
+        for info in await backends.current().list_prefix(prefix, delimiter="/"):
+            name = info.name.replace(prefix, "")
+            if name:
+                files.append({
+                    "filename": name,
+                    "size": info.size,
+                    "updated": info.updated.isoformat() if info.updated else None,
+                    "url": info.public_url or None
+                })
         return {"folder": prefix, "count": len(files), "files": files}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
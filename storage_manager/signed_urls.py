@@ -0,0 +1,84 @@
+# storage_manager/signed_urls.py
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from . import config, state, metrics
+
+
+class SignedUrlCache:
+    """LRU of signed download URLs keyed by object path.
+
+    A URL is handed out until ``refresh_fraction`` of its lifetime has
+    passed and is then re-signed, so a redirect never points at a URL with
+    less than the remaining fraction of its validity left.  The existence
+    check only happens when a URL has to be signed; concurrent misses for
+    the same object share one signing call.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = config.SIGNED_URL_CACHE_MAX_ENTRIES,
+        refresh_fraction: float = config.SIGNED_URL_REFRESH_FRACTION,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.refresh_fraction = refresh_fraction
+        self.clock = clock
+        self._entries: "OrderedDict[Tuple, Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def invalidate(self, path: str) -> None:
+        """Drop every cached URL for *path* (e.g. after the object is replaced)."""
+        for key in [key for key in self._entries if key[2] == path]:
+            del self._entries[key]
+
+    async def get(self, storage, path: str, expires_seconds: Optional[int] = None) -> Optional[str]:
+        """Signed URL for *path*, or None when *storage* cannot sign.
+
+        Raises ``FileNotFoundError`` when the object has to be signed and
+        does not exist.
+        """
+        if not storage.can_sign():
+            return None
+        expires = expires_seconds or config.GCS_SIGNED_URL_EXPIRATION_SECONDS
+        # The bucket is part of the key so a rebound client never serves URLs
+        # signed for another bucket.
+        key = (storage, state.bucket, path, expires)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > self.clock():
+                self._entries.move_to_end(key)
+                metrics.CACHE_REQUESTS.inc(cache="signed_url", result="hit")
+                return entry[0]
+            del self._entries[key]
+        metrics.CACHE_REQUESTS.inc(cache="signed_url", result="miss")
+
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._sign(key, storage, path, expires))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _f: self._inflight.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _sign(self, key: Tuple, storage, path: str, expires: int) -> Optional[str]:
+        if not await storage.exists(path):
+            raise FileNotFoundError(path)
+        refresh_at = self.clock() + expires * self.refresh_fraction
+        url = await storage.signed_url(path, expires)
+        if url and self.max_entries > 0:
+            self._entries[key] = (url, refresh_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return url
+
+
+signed_url_cache = SignedUrlCache()
@@ -1,14 +1,16 @@
 # storage_manager/state.py
 import json
+import time
 import logging
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, Optional
 
+from . import metrics
 from .config import (
     REDIS_URL, REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD,
-    CREDENTIALS_JSON
+    CREDENTIALS_JSON, IO_METADATA_WORKERS, IO_MEDIA_WORKERS
 )
 
 # OpenTelemetry initialization check
@@ -37,7 +39,10 @@ def _log_event(event: str, **kwargs) -> None:
 # Global Cloud Storage & I/O
 gcs_client = None
 bucket = None
-io_executor = ThreadPoolExecutor(max_workers=20)
+# Small index/metadata calls and large media transfers run on separate pools
+# so a burst of slow uploads cannot starve index reads.
+io_executor = ThreadPoolExecutor(max_workers=IO_METADATA_WORKERS)
+media_executor = ThreadPoolExecutor(max_workers=IO_MEDIA_WORKERS)
 
 _has_signing_creds: bool = False
 _media_semaphore: Optional[asyncio.Semaphore] = None
@@ -63,6 +68,7 @@ def _create_cache_backend():
 
             return Cache(
                 Cache.REDIS,
+                plugins=[metrics.CacheMetricsPlugin()],
                 endpoint=host,
                 port=port,
                 password=password,
@@ -74,42 +80,35 @@ def _create_cache_backend():
             _log_event("redis_cache_init_failed", error=str(exc))
 
     from aiocache import Cache
-    return Cache(Cache.MEMORY)
+    return Cache(Cache.MEMORY, plugins=[metrics.CacheMetricsPlugin()])
 
 
 cache = _create_cache_backend()
 
-RESOURCE_LOCKS: Dict[str, asyncio.Lock] = {}
+RESOURCE_LOCKS: Dict[str, "locks.ResourceLock"] = {}
 
 
-def get_resource_lock(resource_type: str) -> asyncio.Lock:
-    """Return (creating if necessary) a per-resource asyncio.Lock."""
+def get_resource_lock(resource_type: str) -> "locks.ResourceLock":
+    """Return (creating if necessary) the lock for *resource_type*.
+
+    The lock serialises writers in this process and, depending on
+    ``LOCK_BACKEND``, across workers (see ``locks``).
+    """
+    from . import locks
+
     if resource_type not in RESOURCE_LOCKS:
-        RESOURCE_LOCKS[resource_type] = asyncio.Lock()
+        RESOURCE_LOCKS[resource_type] = locks.ResourceLock(resource_type, locks.provider)
     return RESOURCE_LOCKS[resource_type]
 
 
 async def clear_cache_for_type(item_type: Optional[str] = None) -> None:
-    """Invalidate cache entries for a specific asset type or clear everything."""
-    if item_type is None:
-        await cache.clear()
-        return
+    """Clear the shared cache when *item_type* is None (after a shader list rescan).
 
-    patterns = {"library:all"}
-    if item_type == "shader":
-        patterns.update({"shaders:list", "shader:", "library:shader"})
-    else:
-        patterns.add(f"library:{item_type}")
-
-    try:
-        keys = await cache.keys("*")
-    except Exception:
+    Responses derived from an index are keyed on ``ResidentIndex.token`` and
+    need no invalidation, so a single type is a no-op.
+    """
+    if item_type is None:
         await cache.clear()
-        return
-
-    for key in keys:
-        if any(pattern in str(key) for pattern in patterns):
-            await cache.delete(key)
 
 
 def get_gcs_client():
@@ -129,6 +128,19 @@ def get_gcs_client():
     return gcs_client
 
 
-async def run_io(func, *args, **kwargs):
+async def _run_on(executor: ThreadPoolExecutor, pool: str, func, args, kwargs):
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(io_executor, lambda: func(*args, **kwargs))
+    t0 = time.perf_counter()
+    try:
+        return await loop.run_in_executor(executor, metrics.timed_call(lambda: func(*args, **kwargs), pool))
+    finally:
+        metrics.IO_SECONDS.observe(time.perf_counter() - t0, pool=pool, op=metrics.op_name(func))
+
+
+async def run_io(func, *args, **kwargs):
+    return await _run_on(io_executor, "io", func, args, kwargs)
+
+
+async def run_media_io(func, *args, **kwargs):
+    """Like :func:`run_io`, on the pool reserved for media uploads and downloads."""
+    return await _run_on(media_executor, "media", func, args, kwargs)
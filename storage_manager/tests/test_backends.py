@@ -0,0 +1,202 @@
+"""
+Pytest suite for storage backends (``storage_manager.backends``).
+
+The local-disk backend has to behave like the GCS one for everything the
+routes rely on: missing JSON reads as ``[]``, conditional writes fail with a
+412-coded error, ranged reads, prefix listing and md5 metadata.  The app is
+also run end to end against a local bucket with no GCS client at all.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the app (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+import sys
+import types
+
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+import storage_manager.app as app_module
+from storage_manager import backends, indexes
+from storage_manager.app import app
+from storage_manager.backends import LocalBackend
+
+
+@pytest.fixture()
+def local(tmp_path):
+    return LocalBackend(str(tmp_path), "")
+
+
+class TestLocalBackend:
+    @pytest.mark.asyncio
+    async def test_missing_json_reads_as_empty(self, local):
+        assert await local.read_json_generation("shaders/_shaders.json") == ([], 0)
+        assert await local.stat("shaders/_shaders.json") is None
+        assert await local.exists("shaders/_shaders.json") is False
+
+    @pytest.mark.asyncio
+    async def test_conditional_writes(self, local):
+        gen1 = await local.write_json_generation("i.json", b"[1]", 0)
+        assert gen1 > 0
+        gen2 = await local.write_json_generation("i.json", b"[1, 2]", gen1)
+        assert gen2 > gen1
+        with pytest.raises(backends.PreconditionFailed) as exc:
+            await local.write_json_generation("i.json", b"[3]", gen1)
+        assert indexes._is_precondition_failure(exc.value)
+        assert await local.read_json_generation("i.json") == ([1, 2], gen2)
+
+    @pytest.mark.asyncio
+    async def test_stat_reports_md5_and_size(self, local):
+        await local.upload_bytes("shaders/a.wgsl", "fn main() {}", content_type="text/plain")
+        info = await local.stat("shaders/a.wgsl")
+        assert info.size == 12
+        assert info.md5_hash == base64.b64encode(hashlib.md5(b"fn main() {}").digest()).decode()
+        assert info.updated is not None
+
+    @pytest.mark.asyncio
+    async def test_ranges_and_chunked_reads(self, local):
+        await local.upload_bytes("videos/v.mp4", bytes(range(100)))
+        assert await local.read_range("videos/v.mp4", 10, 19) == bytes(range(10, 20))
+        chunks = [c async for c in local.iter_bytes("videos/v.mp4", 5, 54, chunk_size=16)]
+        assert [len(c) for c in chunks] == [16, 16, 16, 2]
+        assert b"".join(chunks) == bytes(range(5, 55))
+
+    @pytest.mark.asyncio
+    async def test_list_prefix_with_delimiter(self, local):
+        for path in ("music/a.mp3", "music/b.mp3", "music/sub/c.mp3", "images/x.png"):
+            await local.upload_bytes(path, b"x")
+        assert [i.name for i in await local.list_prefix("music/")] == ["music/a.mp3", "music/b.mp3", "music/sub/c.mp3"]
+        assert [i.name for i in await local.list_prefix("music/", delimiter="/")] == ["music/a.mp3", "music/b.mp3"]
+
+    @pytest.mark.asyncio
+    async def test_listing_skips_checksums_and_other_folders(self, local):
+        await local.upload_bytes("videos/v.mp4", b"v" * 100)
+        await local.upload_bytes("images/x.png", b"x")
+        with patch.object(local, "_md5", side_effect=AssertionError("checksum computed")), \
+                patch.object(backends.os, "walk", wraps=os.walk) as walk:
+            infos = await local.list_prefix("videos/")
+        assert [(i.name, i.size, i.md5_hash) for i in infos] == [("videos/v.mp4", 100, None)]
+        assert walk.call_args.args[0] == local.root / "videos"
+
+    @pytest.mark.asyncio
+    async def test_md5_cache_keeps_one_entry_per_object(self, local):
+        for payload in (b"one", b"two", b"three"):
+            await local.upload_bytes("shaders/a.wgsl", payload)
+            info = await local.stat("shaders/a.wgsl")
+            assert info.md5_hash == base64.b64encode(hashlib.md5(payload).digest()).decode()
+        assert list(local._md5_cache) == ["shaders/a.wgsl"]
+
+    @pytest.mark.asyncio
+    async def test_upload_file_streams_in_chunks(self, local):
+        source = io.BytesIO(b"a" * (3 * 1024 * 1024))
+        reads = []
+        original_read = source.read
+        source.read = lambda size=-1: reads.append(size) or original_read(size)
+        await local.upload_file("videos/big.mp4", source)
+        assert (await local.stat("videos/big.mp4", checksum=False)).size == 3 * 1024 * 1024
+        assert reads and all(size > 0 for size in reads)
+
+    @pytest.mark.asyncio
+    async def test_delete(self, local):
+        await local.write_json("locations/l1.json", {"id": "l1"})
+        assert await local.delete("locations/l1.json") is True
+        assert await local.delete("locations/l1.json") is False
+
+    def test_paths_cannot_escape_root(self, local):
+        with pytest.raises(ValueError):
+            local._file("../outside.json")
+
+    def test_public_url(self, tmp_path):
+        assert LocalBackend(str(tmp_path), "http://localhost:8000/files/").public_url("a/b.png") == \
+            "http://localhost:8000/files/a/b.png"
+        assert LocalBackend(str(tmp_path), "").public_url("a/b.png").startswith("file://")
+
+
+@pytest.fixture()
+def local_client(tmp_path):
+    from fastapi.testclient import TestClient
+
+    asyncio.run(app_module.cache.clear())
+    with patch.object(backends.config, "STORAGE_BACKEND", "local"), \
+            patch.object(backends.config, "LOCAL_STORAGE_ROOT", str(tmp_path)), \
+            patch.object(app_module, "bucket", None), \
+            patch("storage_manager.app.get_gcs_client", side_effect=AssertionError("GCS used")):
+        with TestClient(app, raise_server_exceptions=True) as c:
+            yield c, tmp_path
+    backends.configure("gcs")
+
+
+class TestAppOnLocalBackend:
+    def test_shader_upload_list_and_source(self, local_client):
+        c, root = local_client
+        resp = c.post(
+            "/api/shaders/upload",
+            files={"file": ("glow.wgsl", b"@compute fn main() {}", "text/plain")},
+            data={"name": "Glow", "shader_id": "glow"},
+        )
+        assert resp.status_code == 200, resp.text
+        assert [s["id"] for s in c.get("/api/shaders").json()] == ["glow"]
+
+        wgsl = c.get("/api/shaders/glow/wgsl")
+        assert wgsl.text == "@compute fn main() {}"
+        assert wgsl.headers["etag"] == f'"{hashlib.md5(b"@compute fn main() {}").hexdigest()}"'
+        assert (root / "shaders" / "glow.wgsl").exists()
+
+    def test_index_is_flushed_to_disk(self, local_client):
+        c, root = local_client
+        c.post("/api/samples", files={"file": ("kick.wav", b"RIFF", "audio/wav")}, data={"author": "me"})
+        asyncio.run(indexes.index_store.flush("sample"))
+        index = json.loads((root / "samples" / "_samples.json").read_text())
+        assert index[0]["name"] == "kick.wav"
+
+    def test_sample_streams_from_disk(self, local_client):
+        c, _ = local_client
+        sample_id = c.post(
+            "/api/samples", files={"file": ("kick.wav", b"RIFF-data", "audio/wav")}, data={"author": "me"}
+        ).json()["id"]
+        resp = c.get(f"/api/samples/{sample_id}")
+        assert resp.status_code == 200
+        assert resp.content == b"RIFF-data"
+
+    def test_video_range_proxy(self, local_client):
+        c, root = local_client
+        (root / "videos").mkdir()
+        (root / "videos" / "v.mp4").write_bytes(bytes(range(64)))
+        (root / "videos" / "_videos.json").write_text(json.dumps([{"id": "v1", "name": "V", "filename": "v.mp4"}]))
+        resp = c.get("/api/videos/v1", headers={"Range": "bytes=8-15"}, follow_redirects=False)
+        assert resp.status_code == 206
+        assert resp.content == bytes(range(8, 16))
+        assert resp.headers["content-range"] == "bytes 8-15/64"
+
+    def test_health_reports_backend(self, local_client):
+        c, _ = local_client
+        assert c.get("/api/health").json()["storage_backend"] == "local"
@@ -0,0 +1,115 @@
+"""
+Pytest suite for index backup retention (``storage_manager.backups``).
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import types
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the package (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+from storage_manager import backups, state, utils
+
+INDEX = "images/_images.json"
+NOW = datetime(2026, 6, 1, 12, 0, 0)
+
+
+class _Bucket:
+    """Just enough of a GCS bucket: prefix listings, copies, uploads and deletes."""
+
+    def __init__(self, names):
+        self.names = set(names)
+
+    def list_blobs(self, prefix="", fields=None):
+        for name in sorted(self.names):
+            if name.startswith(prefix):
+                blob = MagicMock()
+                blob.name = name
+                yield blob
+
+    def blob(self, name):
+        blob = MagicMock()
+        blob.name = name
+        blob.exists.side_effect = lambda: name in self.names
+        blob.upload_from_string.side_effect = lambda *a, **k: self.names.add(name)
+        blob.delete.side_effect = lambda: self.names.discard(name)
+        return blob
+
+    def copy_blob(self, blob, bucket, new_name):
+        self.names.add(new_name)
+
+
+def _backup(days_ago, legacy=False):
+    ts = (NOW - timedelta(days=days_ago)).strftime("%Y%m%dT%H%M%SZ")
+    return f"{INDEX}.backup.{ts}" if legacy else f"_backups/{INDEX}.backup.{ts}"
+
+
+@pytest.fixture()
+def bucket(monkeypatch):
+    fake = _Bucket([INDEX, "images/cat.png"])
+    monkeypatch.setattr(state, "bucket", fake)
+    return fake
+
+
+class TestBackupPath:
+    def test_atomic_write_puts_backups_under_the_backup_prefix(self, bucket):
+        path = utils._write_json_atomic_sync(INDEX, [])
+        assert path.startswith(f"_backups/{INDEX}.backup.")
+        assert path in bucket.names
+        # Nothing new lands in the media folder itself.
+        assert {n for n in bucket.names if n.startswith("images/")} == {INDEX, "images/cat.png"}
+
+
+class TestRetention:
+    def test_keeps_newest_n_or_younger_than_d_days(self, bucket):
+        bucket.names |= {_backup(d) for d in (0, 1, 2, 40, 50)} | {_backup(60, legacy=True)}
+        deleted = backups._prune_backups_sync(INDEX, keep_last=2, keep_days=30, now=NOW)
+        assert sorted(deleted) == sorted([_backup(40), _backup(50), _backup(60, legacy=True)])
+        assert {_backup(0), _backup(1), _backup(2)} <= bucket.names
+
+    def test_keep_last_only(self, bucket):
+        bucket.names |= {_backup(d) for d in (0, 1, 2)}
+        backups._prune_backups_sync(INDEX, keep_last=1, keep_days=0, now=NOW)
+        assert {n for n in bucket.names if ".backup." in n} == {_backup(0)}
+
+    def test_disabled_policy_deletes_nothing(self, bucket):
+        bucket.names |= {_backup(d) for d in (0, 100)}
+        assert backups._prune_backups_sync(INDEX, keep_last=0, keep_days=0, now=NOW) == []
+
+    @pytest.mark.asyncio
+    async def test_pruner_covers_every_index(self, bucket, monkeypatch):
+        monkeypatch.setattr(backups.config, "BACKUP_KEEP_LAST", 1)
+        monkeypatch.setattr(backups.config, "BACKUP_KEEP_DAYS", 0)
+        videos = {f"_backups/videos/_videos.json.backup.2020010{d}T000000Z" for d in (1, 2)}
+        bucket.names |= {_backup(d) for d in (100, 200)} | videos
+        assert await backups.BackupPruner().prune() == 2
+        assert {n for n in bucket.names if ".backup." in n} == {
+            _backup(100), "_backups/videos/_videos.json.backup.20200102T000000Z",
+        }
@@ -0,0 +1,97 @@
+"""
+Pytest suite for the endpoint benchmark helpers (``scripts/bench_endpoints.py``).
+
+No server and no network: only workload generation, seeding and the
+baseline comparison are exercised.
+"""
+
+from __future__ import annotations
+
+import importlib
+import json
+import os
+import sys
+import types
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the package (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+# The benchmarks are standalone scripts, not a package; bench_endpoints
+# imports its sibling bench_media_proxy by module name.
+_SCRIPTS = Path(__file__).resolve().parents[2] / "scripts"
+
+
+def _load_bench():
+    with pytest.MonkeyPatch.context() as mp:
+        mp.syspath_prepend(str(_SCRIPTS))
+        return importlib.import_module("bench_endpoints")
+
+
+bench_endpoints = _load_bench()
+Workload, _compare, _parse_mix, _seed = (
+    bench_endpoints.Workload, bench_endpoints._compare, bench_endpoints._parse_mix, bench_endpoints._seed
+)
+
+
+def test_parse_mix_weights_and_rejects_unknown_ops():
+    assert _parse_mix("list=3, media=1") == {"list": 3.0, "media": 1.0}
+    with pytest.raises(SystemExit):
+        _parse_mix("list=1,upload=2")
+    with pytest.raises(SystemExit):
+        _parse_mix("list=0")
+
+
+def test_seed_writes_catalog_and_videos(tmp_path: Path):
+    shader_ids, video_ids = _seed(str(tmp_path), 250, 2, 4, seed=3)
+    index = json.loads((tmp_path / "shaders" / "_shaders.json").read_text())
+    assert len(index) == 250 and [s["id"] for s in index] == shader_ids
+    assert (tmp_path / "videos" / "bench-1.mp4").stat().st_size == 4 * 1024
+    assert video_ids == ["video-0", "video-1"]
+
+
+def test_workload_ranges_stay_inside_the_video():
+    workload = Workload({"media": 1}, ["s"], ["v"], video_kb=8, range_kb=3, seed=1)
+    for _ in range(100):
+        op, method, path, kwargs = workload.next()
+        start, end = map(int, kwargs["headers"]["Range"][len("bytes="):].split("-"))
+        assert (op, method, path) == ("media", "GET", "/api/videos/v")
+        assert end - start + 1 == 3 * 1024 and end < 8 * 1024
+
+
+def _run(catalog, p95, rps):
+    return {"catalog": catalog, "endpoints": {"list": {
+        "requests": 100, "requests_per_second": rps, "latency_ms": {"p50": 1.0, "p95": p95, "p99": p95},
+    }}}
+
+
+def test_compare_flags_slower_p95_and_lower_throughput():
+    baseline = {"runs": [_run(1000, 10.0, 200.0), _run(10000, 10.0, 200.0)]}
+    report = {"runs": [_run(1000, 10.5, 195.0), _run(10000, 13.0, 150.0)]}
+    rows, regressions = _compare(report, baseline, threshold=0.10)
+    assert len(rows) == 2
+    assert [r["catalog"] for r in regressions] == [10000]
+    assert regressions[0]["p95_change"] == 0.3 and regressions[0]["rps_change"] == -0.25
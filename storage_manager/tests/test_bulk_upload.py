@@ -0,0 +1,137 @@
+"""
+Pytest suite for /api/admin/bulk-upload-shaders on the local storage backend.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sys
+import types
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the app (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+import storage_manager.app as app_module
+from storage_manager import backends
+from storage_manager.app import app
+
+
+@pytest.fixture()
+def local_client(tmp_path):
+    from fastapi.testclient import TestClient
+
+    asyncio.run(app_module.cache.clear())
+    with patch.object(backends.config, "STORAGE_BACKEND", "local"), \
+            patch.object(backends.config, "LOCAL_STORAGE_ROOT", str(tmp_path)), \
+            patch.object(app_module, "bucket", None), \
+            patch("storage_manager.app.get_gcs_client", side_effect=AssertionError("GCS used")):
+        with TestClient(app, raise_server_exceptions=True) as c:
+            yield c, tmp_path
+    backends.configure("gcs")
+
+
+def _files(sources):
+    return [("files", (name, body, "text/plain")) for name, body in sources.items()]
+
+
+def _ndjson(resp):
+    return [json.loads(line) for line in resp.text.splitlines() if line.strip()]
+
+
+class TestBulkUpload:
+    def test_uploads_all_files_and_commits_index_once(self, local_client):
+        c, root = local_client
+        sources = {f"s{n}.wgsl": f"fn s{n}() {{}}".encode() for n in range(30)}
+        with patch.object(backends.LocalBackend, "write_json_generation", autospec=True,
+                          side_effect=backends.LocalBackend.write_json_generation) as writes:
+            resp = c.post(
+                "/api/admin/bulk-upload-shaders",
+                files=_files(sources),
+                data={"metadata_json": json.dumps({"s3": {"name": "Third", "tags": ["x"]}})},
+            )
+        assert resp.status_code == 200, resp.text
+        report = resp.json()
+        assert report["added"] == 30 and report["failed"] == 0 and report["total_in_index"] == 30
+        assert writes.call_count == 1
+        shaders = c.get("/api/shaders").json()
+        # Same order as uploading the files one at a time: last file on top.
+        assert [s["id"] for s in shaders][:2] == ["s29", "s28"]
+        assert next(s for s in shaders if s["id"] == "s3")["name"] == "Third"
+        assert (root / "shaders" / "s17.wgsl").read_bytes() == b"fn s17() {}"
+
+    def test_unchanged_blobs_are_skipped(self, local_client):
+        c, root = local_client
+        c.post("/api/admin/bulk-upload-shaders", files=_files({"a.wgsl": b"A", "b.wgsl": b"B"}))
+        c.post("/api/shaders/a/rate", data={"stars": 5})
+        mtime = (root / "shaders" / "a.wgsl").stat().st_mtime_ns
+
+        report = c.post(
+            "/api/admin/bulk-upload-shaders", files=_files({"a.wgsl": b"A", "b.wgsl": b"B2"})
+        ).json()
+        assert report["unchanged"] == 1 and report["updated"] == 1 and report["added"] == 0
+        assert (root / "shaders" / "a.wgsl").stat().st_mtime_ns == mtime
+        assert (root / "shaders" / "b.wgsl").read_bytes() == b"B2"
+        assert c.get("/api/shaders/a").json()["rating_count"] == 1
+
+    def test_streams_ndjson_progress(self, local_client):
+        c, _ = local_client
+        sources = {"good.wgsl": b"fn g() {}", "bad.txt": b"nope", "other.wgsl": b"fn o() {}"}
+        resp = c.post("/api/admin/bulk-upload-shaders?stream=true", files=_files(sources))
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        events = _ndjson(resp)
+        per_file = {e["file"]: e["status"] for e in events if e["event"] == "file"}
+        assert per_file == {"good.wgsl": "uploaded", "bad.txt": "failed", "other.wgsl": "uploaded"}
+        done = events[-1]
+        assert done["event"] == "done"
+        assert done["added"] == 2 and done["failed"] == 1
+        assert done["errors"] == [{"file": "bad.txt", "error": "Not a .wgsl file"}]
+
+    def test_upload_errors_are_reported_per_file(self, local_client):
+        c, _ = local_client
+        real = backends.LocalBackend.upload_bytes
+
+        async def flaky(self, path, data, content_type=None):
+            if path.endswith("boom.wgsl"):
+                raise OSError("disk full")
+            return await real(self, path, data, content_type=content_type)
+
+        with patch.object(backends.LocalBackend, "upload_bytes", flaky):
+            report = c.post(
+                "/api/admin/bulk-upload-shaders", files=_files({"ok.wgsl": b"1", "boom.wgsl": b"2"})
+            ).json()
+        assert report["added"] == 1 and report["failed"] == 1
+        assert report["errors"] == [{"file": "boom.wgsl", "error": "disk full"}]
+        assert [s["id"] for s in c.get("/api/shaders").json()] == ["ok"]
+
+    def test_invalid_metadata_json(self, local_client):
+        c, _ = local_client
+        resp = c.post(
+            "/api/admin/bulk-upload-shaders", files=_files({"a.wgsl": b"A"}), data={"metadata_json": "{"}
+        )
+        assert resp.status_code == 400
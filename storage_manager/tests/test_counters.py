@@ -0,0 +1,278 @@
+"""
+Pytest suite for batched play/rating counter aggregation (``storage_manager.counters``).
+
+Hits are coalesced per id in memory, folded into the resident index in one
+write, and journalled to a local append-only log that a restarted process
+replays.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the app (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+import sys
+import types
+
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+import storage_manager.app as app_module
+from storage_manager.app import app
+from storage_manager.counters import CounterAggregator, CounterDelta
+from storage_manager.indexes import IndexStore
+
+from .test_index_store import FakeIndexBucket
+
+_SHADERS = [
+    {"id": "alpha", "name": "Alpha", "filename": "alpha.wgsl", "stars": 0.0, "rating_count": 0, "play_count": 0},
+    {"id": "beta", "name": "Beta", "filename": "beta.wgsl", "stars": 4.0, "rating_count": 2, "play_count": 7},
+]
+
+
+@pytest.fixture()
+def store(monkeypatch):
+    fake = FakeIndexBucket({"shaders/_shaders.json": [dict(s) for s in _SHADERS]})
+    app_module.io_executor = ThreadPoolExecutor(max_workers=2)
+    app_module.bucket = fake.mock
+    fresh = IndexStore(flush_delay=60, max_flush_delay=60)
+    monkeypatch.setattr("storage_manager.indexes.index_store", fresh)
+    yield fresh, fake
+    fresh.reset()
+
+
+# ---------------------------------------------------------------------------
+# Unit tests: CounterDelta
+# ---------------------------------------------------------------------------
+
+
+class TestCounterDelta:
+    def test_apply_plays_and_last_played(self):
+        entry = {"id": "a", "play_count": 3}
+        CounterDelta(plays=2, last_played="2026-01-01T00:00:00").apply(entry)
+        assert entry["play_count"] == 5
+        assert entry["last_played"] == "2026-01-01T00:00:00"
+
+    def test_apply_ratings_updates_running_average(self):
+        entry = {"id": "b", "stars": 4.0, "rating_count": 2}
+        CounterDelta(rating_count=2, rating_sum=3.0).apply(entry)
+        assert entry["rating_count"] == 4
+        assert entry["stars"] == 2.75
+
+    def test_merge_keeps_latest_last_played(self):
+        delta = CounterDelta(plays=1, last_played="2026-01-02")
+        delta.merge(CounterDelta(plays=1, last_played="2026-01-01"))
+        assert delta.plays == 2
+        assert delta.last_played == "2026-01-02"
+
+
+# ---------------------------------------------------------------------------
+# Unit tests: CounterAggregator
+# ---------------------------------------------------------------------------
+
+
+class TestCounterAggregator:
+    @pytest.mark.asyncio
+    async def test_record_projects_pending_values(self, store):
+        index_store, _ = store
+        agg = CounterAggregator(log_dir="", fold_interval=60, fold_max_pending=1000)
+        idx = await index_store.get("shader")
+        for _ in range(3):
+            projected = agg.record("shader", idx.get("beta"), plays=1)
+        assert projected["play_count"] == 10
+        # The resident entry is untouched until the fold.
+        assert idx.get("beta")["play_count"] == 7
+
+    @pytest.mark.asyncio
+    async def test_fold_writes_coalesced_counts_once(self, store):
+        index_store, fake = store
+        agg = CounterAggregator(log_dir="", fold_interval=60, fold_max_pending=1000)
+        idx = await index_store.get("shader")
+        for _ in range(50):
+            agg.record("shader", idx.get("alpha"), plays=1)
+        agg.record("shader", idx.get("alpha"), rating=5)
+        agg.record("shader", idx.get("alpha"), rating=3)
+
+        assert await agg.fold() == 1
+        assert fake.uploads == ["shaders/_shaders.json"]
+        written = fake.data["shaders/_shaders.json"][0]
+        assert written["play_count"] == 50
+        assert written["rating_count"] == 2
+        assert written["stars"] == 4.0
+        assert agg.pending("shader", "alpha") is None
+
+    @pytest.mark.asyncio
+    async def test_fold_rebases_increments_after_conflict(self, store):
+        index_store, fake = store
+        agg = CounterAggregator(log_dir="", fold_interval=60, fold_max_pending=1000)
+        idx = await index_store.get("shader")
+        agg.record("shader", idx.get("beta"), plays=3)
+
+        # Another worker already flushed its own plays for beta.
+        remote = [dict(s) for s in _SHADERS]
+        remote[1]["play_count"] = 20
+        fake.data["shaders/_shaders.json"] = remote
+        fake.generations["shaders/_shaders.json"] = 5
+
+        await agg.fold()
+        assert fake.data["shaders/_shaders.json"][1]["play_count"] == 23
+
+    @pytest.mark.asyncio
+    async def test_fold_drops_increments_for_deleted_ids(self, store):
+        index_store, fake = store
+        agg = CounterAggregator(log_dir="", fold_interval=60, fold_max_pending=1000)
+        agg.record("shader", {"id": "ghost"}, plays=1)
+        assert await agg.fold() == 1
+        assert fake.uploads == []
+
+    @pytest.mark.asyncio
+    async def test_journal_is_replayed_after_crash(self, store, tmp_path):
+        index_store, fake = store
+        crashed = CounterAggregator(log_dir=str(tmp_path), fold_interval=60, fold_max_pending=1000)
+        idx = await index_store.get("shader")
+        for _ in range(4):
+            crashed.record("shader", idx.get("alpha"), plays=1)
+        crashed.record("shader", idx.get("beta"), rating=1)
+        live = crashed._own(".live.log")
+        # Simulate a crash: no fold, the file handle and journal lock abandoned.
+        crashed._log_file.close()
+        os.close(crashed._lock_fd)
+        with open(live, "a", encoding="utf-8") as fh:
+            fh.write('{"t": "shader", "id": "alp')  # torn final line
+
+        restarted = CounterAggregator(log_dir=str(tmp_path), fold_interval=60, fold_max_pending=1000)
+        assert restarted.replay() == 5
+        await restarted.fold()
+
+        written = {e["id"]: e for e in fake.data["shaders/_shaders.json"]}
+        assert written["alpha"]["play_count"] == 4
+        assert written["beta"]["rating_count"] == 3
+        restarted._release_owner()
+        assert list(tmp_path.iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_running_workers_keep_their_own_journals(self, store, tmp_path):
+        index_store, fake = store
+        other = CounterAggregator(log_dir=str(tmp_path), fold_interval=60, fold_max_pending=1000)
+        idx = await index_store.get("shader")
+        other.record("shader", idx.get("alpha"), plays=2)
+
+        worker = CounterAggregator(log_dir=str(tmp_path), fold_interval=60, fold_max_pending=1000)
+        assert worker.replay() == 0
+        worker.record("shader", idx.get("beta"), plays=1)
+        await worker.fold()
+        # The other worker's live journal was neither rotated nor replayed.
+        assert os.path.exists(other._own(".live.log"))
+        assert fake.data["shaders/_shaders.json"][0]["play_count"] == 0
+
+        other.record("shader", idx.get("alpha"), plays=1)
+        other._release_owner()  # clean stop without a fold
+        assert worker.replay() == 2
+        await worker.fold()
+        assert fake.data["shaders/_shaders.json"][0]["play_count"] == 3
+
+    def test_legacy_journal_is_adopted(self, tmp_path):
+        (tmp_path / "counters.log").write_text('{"t": "shader", "id": "alpha", "p": 2}\n')
+        (tmp_path / "counters.1700000000000.1.folded.log").write_text('{"t": "shader", "id": "beta", "p": 1}\n')
+        agg = CounterAggregator(log_dir=str(tmp_path), fold_interval=60, fold_max_pending=1000)
+        assert agg.replay() == 2
+        assert agg.pending("shader", "alpha").plays == 2
+        assert not (tmp_path / "counters.log").exists()
+        agg._release_owner()
+
+    @pytest.mark.asyncio
+    async def test_fold_keeps_journal_when_flush_fails(self, store, tmp_path):
+        index_store, fake = store
+        agg = CounterAggregator(log_dir=str(tmp_path), fold_interval=60, fold_max_pending=1000)
+        idx = await index_store.get("shader")
+        agg.record("shader", idx.get("alpha"), plays=1)
+
+        original = fake._blob
+
+        def _failing_blob(path):
+            b = original(path)
+            b.upload_from_string.side_effect = RuntimeError("gcs down")
+            return b
+
+        fake.mock.blob.side_effect = _failing_blob
+        await agg.fold()
+        assert len(list(tmp_path.glob("counters.*.folded.log"))) == 1
+
+        fake.mock.blob.side_effect = original
+        await agg.fold()
+        assert list(tmp_path.glob("counters.*.log")) == []
+        assert fake.data["shaders/_shaders.json"][0]["play_count"] == 1
+
+
+# ---------------------------------------------------------------------------
+# Integration tests: play/rate routes
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture()
+def client():
+    from fastapi.testclient import TestClient
+
+    gcs_client = MagicMock()
+    gcs_client.bucket.return_value.blob.return_value.exists.return_value = False
+    app_module.io_executor = ThreadPoolExecutor(max_workers=2)
+
+    with patch("storage_manager.app.get_gcs_client", return_value=gcs_client):
+        with TestClient(app, raise_server_exceptions=True) as c:
+            fake = FakeIndexBucket({"shaders/_shaders.json": [dict(s) for s in _SHADERS]})
+            app_module.bucket = fake.mock
+            yield c, fake
+
+
+class TestCounterRoutes:
+    def test_plays_do_not_rewrite_index_per_hit(self, client):
+        c, fake = client
+        for i in range(20):
+            resp = c.post("/api/shaders/alpha/play")
+            assert resp.json()["play_count"] == i + 1
+        assert fake.uploads == []
+        assert c.get("/api/shaders/alpha").json()["play_count"] == 20
+
+    def test_listing_includes_pending_plays(self, client):
+        c, _ = client
+        before = {s["id"]: s["play_count"] for s in c.get("/api/shaders").json()}
+        c.post("/api/shaders/alpha/play")
+        listed = {s["id"]: s["play_count"] for s in c.get("/api/shaders").json()}
+        assert listed["alpha"] == before["alpha"] + 1 == c.get("/api/shaders/alpha").json()["play_count"]
+
+    def test_rate_returns_projected_average(self, client):
+        c, _ = client
+        c.post("/api/shaders/beta/rate", data={"stars": 5})
+        resp = c.post("/api/shaders/beta/rate", data={"stars": 1})
+        data = resp.json()
+        assert data["rating_count"] == 4
+        assert data["stars"] == 3.5
+        assert data["your_rating"] == 1
+
+    def test_rate_out_of_range_returns_400(self, client):
+        c, _ = client
+        assert c.post("/api/shaders/beta/rate", data={"stars": 6}).status_code == 400
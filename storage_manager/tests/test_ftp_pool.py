@@ -0,0 +1,264 @@
+"""
+Pytest suite for pooled FTP sessions (``storage_manager.ftp_pool``) and the
+FTP→GCS import pipeline.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import types
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the app (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+import storage_manager.app as app_module
+from storage_manager import backends, ftp_pool
+from storage_manager.app import app
+from storage_manager.ftp_pool import FtpPool
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeFTPServer:
+    """Counts logins and concurrent sessions; files live in a dict."""
+
+    def __init__(self, files=None, latency: float = 0.0) -> None:
+        self.files = files or {}
+        self.latency = latency
+        self.logins = 0
+        self.active = 0
+        self.max_active = 0
+        self.noops = 0
+        self._lock = threading.Lock()
+
+    def factory(self, host, timeout=None):
+        server = self
+
+        class _Session:
+            alive = True
+
+            def login(self, user, password):
+                with server._lock:
+                    server.logins += 1
+
+            def cwd(self, directory):
+                pass
+
+            def voidcmd(self, cmd):
+                server.noops += 1
+                if not self.alive:
+                    raise EOFError("connection closed")
+                return "200 OK"
+
+            def retrbinary(self, cmd, callback):
+                if not self.alive:
+                    raise EOFError("connection closed")
+                with server._lock:
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                try:
+                    time.sleep(server.latency)
+                    callback(server.files[cmd.split(" ", 1)[1]])
+                finally:
+                    with server._lock:
+                        server.active -= 1
+
+            def nlst(self):
+                return list(server.files)
+
+            def quit(self):
+                self.alive = False
+
+            def close(self):
+                self.alive = False
+
+        return _Session()
+
+
+def _pool(server, clock=None, **kwargs):
+    return FtpPool("ftp.example", "u", "p", "/shaders", factory=server.factory, clock=clock or _Clock(), **kwargs)
+
+
+class TestFtpPool:
+    def test_sessions_are_reused(self):
+        server = FakeFTPServer({"a.wgsl": b"fn a() {}"})
+        pool = _pool(server, max_size=2)
+        for _ in range(10):
+            assert pool.run(lambda ftp: ftp_pool._retr_text(ftp, "a.wgsl")) == "fn a() {}"
+        assert server.logins == 1
+
+    def test_idle_sessions_are_noop_checked_and_replaced_when_dead(self):
+        server = FakeFTPServer({"a.wgsl": b"x"})
+        clock = _Clock()
+        pool = _pool(server, clock=clock, noop_after=10, max_idle=100)
+        pool.run(lambda ftp: ftp.nlst())
+        clock.now = 5
+        pool.run(lambda ftp: ftp.nlst())
+        assert server.noops == 0
+
+        clock.now = 20
+        # The server dropped the idle connection meanwhile.
+        pool._idle[-1][0].alive = False
+        assert pool.run(lambda ftp: ftp_pool._retr_text(ftp, "a.wgsl")) == "x"
+        assert server.noops == 1
+        assert server.logins == 2
+
+    def test_sessions_idle_too_long_are_closed_without_a_noop(self):
+        server = FakeFTPServer()
+        clock = _Clock()
+        pool = _pool(server, clock=clock, noop_after=10, max_idle=30)
+        pool.run(lambda ftp: ftp.nlst())
+        clock.now = 31
+        pool.run(lambda ftp: ftp.nlst())
+        assert server.noops == 0 and server.logins == 2
+
+    def test_broken_session_is_retried_once_and_discarded(self):
+        server = FakeFTPServer({"a.wgsl": b"x"})
+        pool = _pool(server)
+        calls = []
+
+        def flaky(ftp):
+            calls.append(ftp)
+            if len(calls) == 1:
+                raise EOFError("reset")
+            return ftp_pool._retr_text(ftp, "a.wgsl")
+
+        assert pool.run(flaky) == "x"
+        assert calls[0] is not calls[1]
+        assert len(pool) == 1
+
+    def test_command_errors_keep_the_session(self):
+        import ftplib
+
+        server = FakeFTPServer()
+        pool = _pool(server)
+
+        def missing(ftp):
+            raise ftplib.error_perm("550 not found")
+
+        with pytest.raises(ftplib.error_perm):
+            pool.run(missing)
+        assert len(pool) == 1 and server.logins == 1
+
+    def test_size_is_bounded(self):
+        server = FakeFTPServer({f"{n}.wgsl": b"x" for n in range(12)}, latency=0.02)
+        pool = _pool(server, max_size=3)
+        threads = [
+            threading.Thread(target=pool.run, args=(lambda ftp, n=n: ftp_pool._retr_text(ftp, f"{n}.wgsl"),))
+            for n in range(12)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert server.max_active <= 3
+        assert server.logins <= 3
+
+    def test_slow_login_does_not_block_idle_sessions(self):
+        server = FakeFTPServer()
+        pool = _pool(server, max_size=2)
+        pool.run(lambda ftp: ftp.nlst())
+        entered, release = threading.Event(), threading.Event()
+        connect = pool._connect
+
+        def slow_connect():
+            entered.set()
+            release.wait(5)
+            return connect()
+
+        borrowed = pool._take_idle()  # the one idle session
+        pool._connect = slow_connect
+        connecting = threading.Thread(target=pool.run, args=(lambda ftp: ftp.nlst(),))
+        connecting.start()
+        assert entered.wait(5)
+        try:
+            # While the second slot is logging in, the pool lock stays free.
+            assert pool._lock.acquire(timeout=1)
+            pool._lock.release()
+            pool._idle.append((borrowed, 0.0))
+            assert pool._take_idle() is borrowed
+        finally:
+            release.set()
+            connecting.join()
+        assert server.logins == 2
+
+
+@pytest.fixture()
+def ftp_client(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    server = FakeFTPServer({f"s{n}.wgsl": f"fn s{n}() {{}}".encode() for n in range(20)}, latency=0.01)
+    monkeypatch.setattr(ftp_pool, "pool", _pool(server, max_size=4))
+    monkeypatch.setattr(app_module.config, "FTP_ENABLED", True)
+    monkeypatch.setattr(app_module.config, "FTP_IMPORT_CONCURRENCY", 8)
+    asyncio.run(app_module.cache.clear())
+    with patch.object(backends.config, "STORAGE_BACKEND", "local"), \
+            patch.object(backends.config, "LOCAL_STORAGE_ROOT", str(tmp_path)), \
+            patch.object(app_module, "bucket", None), \
+            patch("storage_manager.app.get_gcs_client", side_effect=AssertionError("GCS used")):
+        (tmp_path / "shaders").mkdir()
+        (tmp_path / "shaders" / "_shaders.json").write_text(json.dumps([{"id": "s0", "filename": "s0.wgsl"}]))
+        with TestClient(app, raise_server_exceptions=True) as c:
+            yield c, tmp_path, server
+    backends.configure("gcs")
+
+
+class TestFtpImport:
+    def test_imports_missing_shaders_over_pooled_sessions(self, ftp_client):
+        c, root, server = ftp_client
+        resp = c.post("/api/admin/sync-ftp-to-gcs")
+        assert resp.status_code == 200, resp.text
+        report = resp.json()
+        assert report["added"] == 19 and report["skipped"] == 1 and report["errors"] == []
+        assert report["total"] == 20
+        assert (root / "shaders" / "s7.wgsl").read_text() == "fn s7() {}"
+        # One login per pooled session, not per file; transfers overlapped.
+        assert server.logins <= 4
+        assert 1 < server.max_active <= 4
+
+        again = c.post("/api/admin/sync-ftp-to-gcs").json()
+        assert again["added"] == 0 and again["skipped"] == 20
+
+    def test_failed_files_are_reported_and_not_indexed(self, ftp_client):
+        c, _, server = ftp_client
+        del server.files["s3.wgsl"]
+        server.files["s3.wgsl"] = None  # listed but unreadable
+        report = c.post("/api/admin/sync-ftp-to-gcs").json()
+        assert [e["file"] for e in report["errors"]] == ["s3.wgsl"]
+        assert report["added"] == 18
+        ids = {s["id"] for s in c.get("/api/shaders").json()}
+        assert "s3" not in ids and "s4" in ids
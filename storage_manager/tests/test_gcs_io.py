@@ -0,0 +1,257 @@
+"""
+Pytest suite for the pluggable GCS client (``storage_manager.gcs_io``).
+
+The synchronous client runs on separate metadata and media worker pools; the
+aiohttp JSON API client is exercised against a fake session so no network
+or aiohttp install is needed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the app (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+import sys
+import types
+
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+import storage_manager.app as app_module
+from storage_manager import backends, gcs_io, indexes
+from storage_manager.indexes import IndexStore
+
+
+class _FakeResponse:
+    def __init__(self, status: int, body: bytes = b"", headers: dict | None = None) -> None:
+        self.status = status
+        self._body = body
+        self.headers = headers or {}
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _FakeSession:
+    """Records requests and replies from a queue of ``_FakeResponse``."""
+
+    def __init__(self, *responses: _FakeResponse) -> None:
+        self.responses = list(responses)
+        self.requests = []
+        self.closed = False
+
+    def request(self, method, url, params=None, data=None, headers=None):
+        self.requests.append({"method": method, "url": url, "params": params, "data": data, "headers": headers})
+        return self.responses.pop(0)
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def _async_client(metadata: _FakeSession, media: _FakeSession | None = None) -> gcs_io.AiohttpGcsIO:
+    bucket = MagicMock()
+    bucket.name = "test-bucket"
+    credentials = MagicMock(valid=True, token="tok")
+    client = gcs_io.AiohttpGcsIO(bucket, credentials)
+    client._sessions = {"metadata": metadata, "media": media or _FakeSession()}
+    return client
+
+
+class TestClientSelection:
+    def test_sync_client_when_async_not_started(self):
+        with patch.object(gcs_io, "async_io", None):
+            assert gcs_io.current() is gcs_io.thread_io
+
+    def test_async_client_only_for_its_bucket(self):
+        client = _async_client(_FakeSession())
+        with patch.object(gcs_io, "async_io", client), patch.object(app_module, "bucket", client.bucket):
+            assert gcs_io.current() is client
+        with patch.object(gcs_io, "async_io", client), patch.object(app_module, "bucket", MagicMock()):
+            assert gcs_io.current() is gcs_io.thread_io
+
+    @pytest.mark.asyncio
+    async def test_falls_back_without_aiohttp(self):
+        with patch.object(gcs_io, "aiohttp", None), \
+                patch.object(gcs_io.config, "GCS_IO_BACKEND", "aiohttp"), \
+                patch.object(app_module, "bucket", MagicMock()):
+            assert await gcs_io.start() is gcs_io.thread_io
+            assert gcs_io.async_io is None
+
+    @pytest.mark.asyncio
+    async def test_falls_back_when_credentials_fail(self):
+        with patch.object(gcs_io, "aiohttp", MagicMock()), \
+                patch.object(gcs_io, "_load_credentials", side_effect=RuntimeError("no creds")), \
+                patch.object(app_module, "bucket", MagicMock()):
+            assert await gcs_io.start() is gcs_io.thread_io
+
+
+class TestSyncClient:
+    @pytest.mark.asyncio
+    async def test_media_transfers_use_media_pool(self):
+        bucket = MagicMock()
+        bucket.blob.return_value.download_as_bytes.return_value = b"data"
+        media_pool = MagicMock(wraps=ThreadPoolExecutor(max_workers=1))
+        with patch.object(app_module, "bucket", bucket), patch.object(app_module, "media_executor", media_pool):
+            assert await gcs_io.thread_io.download_bytes("samples/a.wav") == b"data"
+        media_pool.submit.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_delete_reports_missing_object(self):
+        bucket = MagicMock()
+        bucket.blob.return_value.exists.return_value = False
+        with patch.object(app_module, "bucket", bucket):
+            assert await gcs_io.thread_io.delete("locations/x.json") is False
+        bucket.blob.return_value.delete.assert_not_called()
+
+
+class TestAiohttpClient:
+    @pytest.mark.asyncio
+    async def test_read_json_generation(self):
+        session = _FakeSession(_FakeResponse(200, b'[{"id": "a"}]', {"x-goog-generation": "17"}))
+        client = _async_client(session)
+        assert await client.read_json_generation("shaders/_shaders.json") == ([{"id": "a"}], 17)
+        req = session.requests[0]
+        assert req["url"].endswith("/b/test-bucket/o/shaders%2F_shaders.json")
+        assert req["params"] == {"alt": "media"}
+        assert req["headers"]["Authorization"] == "Bearer tok"
+
+    @pytest.mark.asyncio
+    async def test_missing_object(self):
+        client = _async_client(_FakeSession(_FakeResponse(404), _FakeResponse(404), _FakeResponse(404)))
+        assert await client.read_json_generation("x.json") == ([], 0)
+        assert await client.exists("x.json") is False
+        assert await client.delete("x.json") is False
+
+    @pytest.mark.asyncio
+    async def test_conditional_write_sends_generation(self):
+        session = _FakeSession(_FakeResponse(200, json.dumps({"generation": "9"}).encode()))
+        client = _async_client(session)
+        assert await client.write_json_generation("i.json", b"[]", 8) == 9
+        assert session.requests[0]["params"]["ifGenerationMatch"] == "8"
+        assert session.requests[0]["params"]["name"] == "i.json"
+
+    @pytest.mark.asyncio
+    async def test_precondition_failure_is_recognised_by_index_store(self):
+        client = _async_client(_FakeSession(_FakeResponse(412, b"conditionNotMet")))
+        with pytest.raises(gcs_io.GcsError) as exc:
+            await client.write_json_generation("i.json", b"[]", 1)
+        assert indexes._is_precondition_failure(exc.value)
+
+    @pytest.mark.asyncio
+    async def test_stat_and_list_prefix_use_object_metadata(self):
+        resource = {
+            "name": "music/a b.mp3", "size": "5", "contentType": "audio/mpeg", "md5Hash": "bWQ1",
+            "updated": "2026-01-02T03:04:05.678Z", "generation": "12",
+        }
+        session = _FakeSession(
+            _FakeResponse(200, json.dumps(resource).encode()),
+            _FakeResponse(404),
+            _FakeResponse(200, json.dumps({"items": [resource], "nextPageToken": "p2"}).encode()),
+            _FakeResponse(200, json.dumps({"items": [{**resource, "name": "music/c.mp3"}]}).encode()),
+        )
+        client = _async_client(session)
+        info = backends._blob_info(await client.stat("music/a b.mp3"))
+        assert (info.size, info.content_type, info.md5_hash, info.generation) == (5, "audio/mpeg", "bWQ1", 12)
+        assert info.updated.year == 2026 and info.updated.tzinfo is not None
+        assert info.public_url == "https://storage.googleapis.com/test-bucket/music/a%20b.mp3"
+        assert await client.stat("missing") is None
+        listed = await client.list_prefix("music/", delimiter="/")
+        assert [o.name for o in listed] == ["music/a b.mp3", "music/c.mp3"]
+        assert session.requests[2]["params"]["delimiter"] == "/"
+        assert session.requests[3]["params"]["pageToken"] == "p2"
+
+    @pytest.mark.asyncio
+    async def test_gcs_backend_metadata_goes_through_current_client(self):
+        client = _async_client(_FakeSession(_FakeResponse(200, json.dumps({"items": []}).encode())))
+        with patch.object(app_module, "bucket", client.bucket), patch.object(gcs_io, "async_io", client):
+            assert await backends.GcsBackend().list_prefix("music/") == []
+        client.bucket.list_blobs.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_media_uses_separate_session(self):
+        metadata, media = _FakeSession(), _FakeSession(_FakeResponse(200, b"wgsl"), _FakeResponse(200, b"{}"))
+        client = _async_client(metadata, media)
+        assert await client.download_text("shaders/a.wgsl") == "wgsl"
+        await client.upload_bytes("shaders/b.wgsl", "code", content_type="text/plain")
+        assert metadata.requests == []
+        assert media.requests[1]["data"] == b"code"
+        assert media.requests[1]["headers"]["Content-Type"] == "text/plain"
+
+    @pytest.mark.asyncio
+    async def test_refreshes_expired_token(self):
+        client = _async_client(_FakeSession(_FakeResponse(200, b"{}")))
+        client.credentials.valid = False
+        auth_requests = types.ModuleType("google.auth.transport.requests")
+        auth_requests.Request = MagicMock()
+        with patch.dict(sys.modules, {
+            "google.auth": types.ModuleType("google.auth"),
+            "google.auth.transport": types.ModuleType("google.auth.transport"),
+            "google.auth.transport.requests": auth_requests,
+        }):
+            await client.exists("x")
+        client.credentials.refresh.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_index_store_loads_through_async_client(self):
+        session = _FakeSession(_FakeResponse(200, b'[{"id": "a", "filename": "a.wgsl"}]', {"x-goog-generation": "3"}))
+        client = _async_client(session)
+        store = IndexStore()
+        with patch.object(app_module, "bucket", client.bucket), patch.object(gcs_io, "async_io", client):
+            store.reset()
+            idx = await store.get("shader")
+        assert idx.get("a")["filename"] == "a.wgsl"
+        assert idx.generation == 3
+
+    @pytest.mark.asyncio
+    async def test_read_range_sends_range_header_on_media_pool(self):
+        metadata, media = _FakeSession(), _FakeSession(_FakeResponse(206, b"456"))
+        client = _async_client(metadata, media)
+        assert await client.read_range("videos/a.mp4", 4, 6) == b"456"
+        assert media.requests[0]["headers"]["Range"] == "bytes=4-6"
+        assert metadata.requests == []
+
+    @pytest.mark.asyncio
+    async def test_read_range_retries_transient_errors(self):
+        media = _FakeSession(_FakeResponse(503, b"busy"), _FakeResponse(206, b"456"))
+        client = _async_client(_FakeSession(), media)
+        with patch.object(gcs_io, "_RETRY_BASE_DELAY", 0):
+            assert await client.read_range("videos/a.mp4", 4, 6) == b"456"
+        assert len(media.requests) == 2
+
+    @pytest.mark.asyncio
+    async def test_read_range_does_not_retry_client_errors(self):
+        media = _FakeSession(_FakeResponse(404, b"gone"))
+        client = _async_client(_FakeSession(), media)
+        with pytest.raises(gcs_io.GcsError):
+            await client.read_range("videos/a.mp4", 4, 6)
+        assert len(media.requests) == 1
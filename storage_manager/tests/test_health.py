@@ -0,0 +1,156 @@
+"""
+Pytest suite for the liveness, readiness and detailed health endpoints.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sys
+import types
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the app (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+import storage_manager.app as app_module
+from storage_manager import backends, health
+from storage_manager.app import app
+from storage_manager.health import StorageProbe
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture()
+def local_client(tmp_path):
+    from fastapi.testclient import TestClient
+
+    asyncio.run(app_module.cache.clear())
+    (tmp_path / "shaders").mkdir()
+    (tmp_path / "shaders" / "_shaders.json").write_text(json.dumps([{"id": "a"}, {"id": "b"}]))
+    with patch.object(backends.config, "STORAGE_BACKEND", "local"), \
+            patch.object(backends.config, "LOCAL_STORAGE_ROOT", str(tmp_path)), \
+            patch.object(app_module, "bucket", None), \
+            patch("storage_manager.app.get_gcs_client", side_effect=AssertionError("GCS used")):
+        with TestClient(app, raise_server_exceptions=True) as c:
+            yield c
+    backends.configure("gcs")
+
+
+def _no_index_reads():
+    return patch.object(backends.LocalBackend, "read_json_generation", side_effect=AssertionError("index read"))
+
+
+class TestStorageProbe:
+    @pytest.mark.asyncio
+    async def test_concurrent_checks_share_one_probe_and_cache_it(self):
+        clock = _Clock()
+        probe = StorageProbe(ttl=10, timeout=1, clock=clock)
+        release = asyncio.Event()
+
+        async def slow_stat(path, checksum=True):
+            await release.wait()
+            return None
+
+        with patch.object(backends.current(), "stat", side_effect=slow_stat):
+            checks = [asyncio.ensure_future(probe.check()) for _ in range(20)]
+            await asyncio.sleep(0)
+            release.set()
+            results = await asyncio.gather(*checks)
+            assert all(r["ok"] for r in results)
+            assert probe.probes == 1
+
+            clock.now = 5
+            assert (await probe.check())["age_seconds"] == 5
+            assert probe.probes == 1
+            clock.now = 11
+            await probe.check()
+            assert probe.probes == 2
+
+    @pytest.mark.asyncio
+    async def test_failures_and_timeouts_are_reported(self):
+        probe = StorageProbe(ttl=0, timeout=0.01)
+        with patch.object(backends.current(), "stat", side_effect=OSError("unreachable")):
+            result = await probe.check()
+        assert result["ok"] is False and result["error"] == "unreachable"
+
+        async def hang(path, checksum=True):
+            await asyncio.sleep(1)
+
+        with patch.object(backends.current(), "stat", side_effect=hang):
+            result = await probe.check()
+        assert result["ok"] is False and "timed out" in result["error"]
+
+
+class TestHealthEndpoints:
+    def test_liveness_never_touches_storage(self, local_client):
+        with _no_index_reads(), patch.object(backends.LocalBackend, "stat", side_effect=AssertionError("stat")):
+            resp = local_client.get("/api/health/live")
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["status"] == "ok"
+        assert set(body["executors"]) == {"io", "media"}
+        assert body["executors"]["io"]["queued"] == 0
+
+    def test_readiness_is_cached(self, local_client):
+        before = health.storage_probe.probes
+        with _no_index_reads():
+            for _ in range(5):
+                resp = local_client.get("/api/health/ready")
+                assert resp.status_code == 200
+        assert resp.json()["storage"]["backend"] == "local"
+        assert health.storage_probe.probes == before + 1
+
+    def test_readiness_fails_when_storage_is_unreachable(self, local_client):
+        with patch.object(backends.LocalBackend, "stat", side_effect=OSError("disk gone")):
+            resp = local_client.get("/api/health/ready")
+        assert resp.status_code == 503
+        assert resp.json()["storage"]["error"] == "disk gone"
+
+    def test_saturated_worker_is_live_but_not_ready(self, local_client, monkeypatch):
+        monkeypatch.setattr(health.config, "HEALTH_MAX_LOOP_LAG_SECONDS", -1.0)
+        assert local_client.get("/api/health/live").json()["status"] == "saturated"
+        assert local_client.get("/api/health/ready").status_code == 503
+
+    def test_details_use_resident_indexes_only(self, local_client):
+        with _no_index_reads():
+            body = local_client.get("/api/health").json()
+        assert body["storage_backend"] == "local"
+        assert body["storage"]["shader"] == {"count": None, "status": "not_loaded"}
+
+        local_client.get("/api/shaders")
+        with _no_index_reads():
+            body = local_client.get("/api/health/details").json()
+        assert body["storage"]["shader"]["count"] == 2
+        assert body["storage"]["shader"]["status"] == "loaded"
+        assert body["storage"]["music"]["status"] == "not_loaded"
+        assert body["caches"]["media_disk"]["files"] == 0
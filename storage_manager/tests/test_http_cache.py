@@ -0,0 +1,262 @@
+"""
+Pytest suite for conditional responses (``storage_manager.http_cache``).
+
+Index listings carry a content-hash ETag and answer If-None-Match with 304;
+WGSL source uses the blob's md5 and updated time so revalidation does not
+download the shader.  Listing bodies are serialised and compressed once per
+index revision and served pre-encoded.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the app (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+import sys
+import types
+
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+import storage_manager.app as app_module
+from storage_manager import http_cache
+from storage_manager.app import app
+
+from .test_index_store import FakeIndexBucket
+
+_WGSL = "@compute fn main() {}"
+_UPDATED = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture()
+def client():
+    from fastapi.testclient import TestClient
+
+    gcs_client = MagicMock()
+    gcs_client.bucket.return_value.blob.return_value.exists.return_value = False
+    app_module.io_executor = ThreadPoolExecutor(max_workers=2)
+    asyncio.run(app_module.cache.clear())
+    http_cache.body_cache.clear()
+
+    with patch("storage_manager.app.get_gcs_client", return_value=gcs_client):
+        with TestClient(app, raise_server_exceptions=True) as c:
+            fake = FakeIndexBucket({
+                "shaders/_shaders.json": [{"id": "a", "name": "A", "filename": "a.wgsl"}],
+                "images/_images.json": [{"id": "i1", "name": "One", "filename": "one.png", "rating": 3}],
+                "locations/_locations.json": [{"id": "l1", "name": "Home", "filename": "l1.json"}],
+                "preset_packs/_preset_packs.json": [{"id": "p1", "name": "Pack", "chain": "x"}],
+            })
+            wgsl_blob = MagicMock()
+            wgsl_blob.md5_hash = base64.b64encode(hashlib.md5(_WGSL.encode()).digest()).decode()
+            wgsl_blob.updated = _UPDATED
+            wgsl_blob.download_as_text.return_value = _WGSL
+            fake.mock.get_blob.side_effect = lambda path: wgsl_blob if path == "shaders/a.wgsl" else None
+            index_blob = fake.mock.blob.side_effect
+            fake.mock.blob.side_effect = lambda path: wgsl_blob if path == "shaders/a.wgsl" else index_blob(path)
+            app_module.bucket = fake.mock
+            yield c, fake, wgsl_blob
+
+
+class TestIndexListings:
+    @pytest.mark.parametrize("path", ["/api/shaders", "/api/library", "/api/locations", "/api/preset-packs"])
+    def test_etag_round_trip_returns_304(self, client, path):
+        c, _, _ = client
+        first = c.get(path)
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert etag.startswith('"')
+        assert first.headers["cache-control"] == "no-cache"
+
+        second = c.get(path, headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["etag"] == etag
+
+    def test_weak_and_listed_validators_match(self, client):
+        c, _, _ = client
+        etag = c.get("/api/shaders").headers["etag"]
+        resp = c.get("/api/shaders", headers={"If-None-Match": f'"other", W/{etag}'})
+        assert resp.status_code == 304
+
+    def test_etag_changes_when_index_changes(self, client):
+        c, _, _ = client
+        etag = c.get("/api/library", params={"type": "image"}).headers["etag"]
+        c.patch("/api/images/i1/meta", json={"name": "Renamed"})
+        resp = c.get("/api/library", params={"type": "image"}, headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.json()[0]["name"] == "Renamed"
+
+    def test_songs_route_keeps_response_model(self, client):
+        c, _, _ = client
+        data = c.get("/api/songs", params={"type": "image"}).json()
+        assert data == [{"name": "One", "author": None, "description": None, "rating": 3.0, "tags": None}]
+
+
+def _many_locations(n: int = 40):
+    return [
+        {"id": f"l{i}", "name": f"Location number {i}", "filename": f"l{i}.json", "lat": i, "lng": -i}
+        for i in range(n)
+    ]
+
+
+class TestPreEncodedBodies:
+    def test_large_listing_is_served_gzipped(self, client):
+        c, fake, _ = client
+        fake.data["locations/_locations.json"] = _many_locations()
+        resp = c.get("/api/locations", headers={"Accept-Encoding": "gzip"})
+        assert resp.status_code == 200
+        assert resp.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in resp.headers["vary"]
+        assert resp.headers["etag"].endswith('-gzip"')
+        assert len(resp.json()) == 40
+
+    def test_identity_when_client_does_not_accept_gzip(self, client):
+        c, fake, _ = client
+        fake.data["locations/_locations.json"] = _many_locations()
+        gz = c.get("/api/locations", headers={"Accept-Encoding": "gzip"})
+        plain = c.get("/api/locations", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.json() == gz.json()
+        assert gz.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+
+    def test_either_variant_etag_revalidates(self, client):
+        c, fake, _ = client
+        fake.data["locations/_locations.json"] = _many_locations()
+        etag = c.get("/api/locations", headers={"Accept-Encoding": "gzip"}).headers["etag"]
+        for encoding in ("gzip", "identity"):
+            resp = c.get("/api/locations", headers={"Accept-Encoding": encoding, "If-None-Match": etag})
+            assert resp.status_code == 304
+
+    def test_small_bodies_are_not_compressed(self, client):
+        c, _, _ = client
+        resp = c.get("/api/shaders", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in resp.headers
+
+    def test_body_serialised_once_per_revision(self, client):
+        c, fake, _ = client
+        fake.data["locations/_locations.json"] = _many_locations()
+        with patch.object(http_cache, "serialize_json", wraps=http_cache.serialize_json) as spy:
+            for _ in range(3):
+                c.get("/api/locations")
+            assert spy.call_count == 1
+            c.patch("/api/images/i1/meta", json={"name": "Renamed"})
+            c.get("/api/library", params={"type": "image"})
+            c.get("/api/library", params={"type": "image"})
+            assert spy.call_count == 2
+
+    def test_preset_pack_plays_are_visible_immediately(self, client):
+        c, _, _ = client
+        assert c.get("/api/preset-packs").json()["packs"][0]["play_count"] == 0
+        c.post("/api/preset-packs/p1/play")
+        assert c.get("/api/preset-packs").json()["packs"][0]["play_count"] == 1
+
+
+class TestResponseBodyCache:
+    def test_byte_budget_evicts_least_recently_used(self):
+        cache = http_cache.ResponseBodyCache(max_bytes=250, ttl=60)
+        cache.put("a", b"a" * 100)
+        cache.put("b", b"b" * 100)
+        assert cache.get("a") is not None
+        cache.put("c", b"c" * 100)
+        assert cache.get("b") is None
+        assert cache.get("a") is not None and cache.get("c") is not None
+        assert cache.nbytes == 200
+
+    def test_compressed_variants_count_towards_budget(self):
+        cache = http_cache.ResponseBodyCache(max_bytes=10_000, ttl=60)
+        entry = cache.put("a", b"x" * 2000)
+        data = cache.encoded("a", entry, "gzip")
+        assert cache.nbytes == 2000 + len(data)
+        assert cache.encoded("a", entry, "gzip") is data
+
+    def test_expired_entries_are_dropped(self):
+        cache = http_cache.ResponseBodyCache(max_bytes=10_000, ttl=0)
+        cache.put("a", b"{}")
+        assert cache.get("a") is None
+        assert cache.nbytes == 0
+
+    def test_oversized_body_is_not_kept(self):
+        cache = http_cache.ResponseBodyCache(max_bytes=10, ttl=60)
+        entry = cache.put("a", b"x" * 100)
+        assert entry.body == b"x" * 100
+        assert len(cache) == 0
+
+
+class TestNegotiateEncoding:
+    @pytest.mark.parametrize("header,expected", [
+        (None, None),
+        ("identity", None),
+        ("gzip, deflate", "gzip"),
+        ("gzip;q=0", None),
+        ("*", "gzip"),
+        ("deflate, *;q=0.5", "gzip"),
+    ])
+    def test_gzip_without_brotli(self, header, expected):
+        with patch.object(http_cache, "brotli", None):
+            assert http_cache.negotiate_encoding(header) == expected
+
+    def test_prefers_brotli_when_available(self):
+        with patch.object(http_cache, "brotli", MagicMock()):
+            assert http_cache.negotiate_encoding("gzip, br") == "br"
+            assert http_cache.negotiate_encoding("gzip, br;q=0") == "gzip"
+
+
+class TestWgslValidators:
+    def test_etag_is_blob_md5(self, client):
+        c, _, _ = client
+        resp = c.get("/api/shaders/a/wgsl")
+        assert resp.status_code == 200
+        assert resp.text == _WGSL
+        assert resp.headers["etag"] == f'"{hashlib.md5(_WGSL.encode()).hexdigest()}"'
+        assert resp.headers["last-modified"] == "Wed, 01 May 2024 12:00:00 GMT"
+
+    def test_revalidation_skips_download(self, client):
+        c, _, blob = client
+        etag = f'"{hashlib.md5(_WGSL.encode()).hexdigest()}"'
+        resp = c.get("/api/shaders/a/wgsl", headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        blob.download_as_text.assert_not_called()
+
+    def test_if_modified_since(self, client):
+        c, _, _ = client
+        resp = c.get("/api/shaders/a/wgsl", headers={"If-Modified-Since": "Wed, 01 May 2024 12:00:00 GMT"})
+        assert resp.status_code == 304
+        resp = c.get("/api/shaders/a/wgsl", headers={"If-Modified-Since": "Tue, 30 Apr 2024 12:00:00 GMT"})
+        assert resp.status_code == 200
+
+    def test_cached_source_is_revalidated_without_gcs(self, client):
+        c, fake, _ = client
+        etag = c.get("/api/shaders/a/wgsl").headers["etag"]
+        fake.mock.get_blob.side_effect = AssertionError("GCS consulted")
+        assert c.get("/api/shaders/a/wgsl", headers={"If-None-Match": etag}).status_code == 304
+
+    def test_missing_shader_returns_404(self, client):
+        c, _, _ = client
+        assert c.get("/api/shaders/nope/wgsl").status_code == 404
@@ -0,0 +1,181 @@
+"""
+Pytest suite for the event-sourced index mode (``storage_manager.index_log``).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import types
+from unittest.mock import MagicMock
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the package (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+from storage_manager import backends
+from storage_manager.backends import LocalBackend
+from storage_manager.index_log import apply_events
+from storage_manager.indexes import IndexStore
+
+INDEX = "shaders/_shaders.json"
+
+
+@pytest.fixture()
+def local(tmp_path, monkeypatch):
+    backend = LocalBackend(str(tmp_path), "")
+    monkeypatch.setattr(backends, "local_backend", backend)
+    (tmp_path / "shaders").mkdir()
+    (tmp_path / "shaders" / "_shaders.json").write_text(json.dumps([{"id": "a", "n": 0}, {"id": "b", "n": 0}]))
+    return backend
+
+
+def _store(**kwargs):
+    store = IndexStore(flush_delay=60, max_flush_delay=60, mode="eventlog", compact_interval=0, **kwargs)
+    store.reset()
+    return store
+
+
+def _snapshot(local):
+    return json.loads((local.root / INDEX).read_text())
+
+
+def _segments(local):
+    return sorted(p.name for p in (local.root / "_index_log" / "shader").glob("*.jsonl"))
+
+
+def _bump(entry):
+    entry["n"] += 1
+
+
+class TestApplyEvents:
+    def test_put_del_reset(self):
+        entries = [{"id": "a", "v": 1}, {"id": "b", "v": 1}]
+        events = [
+            {"op": "put", "id": "b", "entry": {"id": "b", "v": 2}},
+            {"op": "put", "id": "c", "entry": {"id": "c", "v": 1}},
+            {"op": "put", "id": "d", "entry": {"id": "d", "v": 1}},
+            {"op": "del", "id": "a"},
+        ]
+        assert apply_events(entries, events) == [
+            {"id": "d", "v": 1}, {"id": "c", "v": 1}, {"id": "b", "v": 2},
+        ]
+        assert apply_events(entries, [{"op": "reset", "entries": [{"id": "z"}]}]) == [{"id": "z"}]
+
+    def test_replaying_folded_events_is_harmless(self):
+        events = [{"op": "put", "id": "c", "entry": {"id": "c"}}, {"op": "del", "id": "a"}]
+        once = apply_events([{"id": "a"}, {"id": "b"}], events)
+        assert apply_events(once, events) == once
+
+
+class TestEventLogStore:
+    @pytest.mark.asyncio
+    async def test_flush_appends_a_segment_and_readers_apply_the_tail(self, local):
+        store = _store()
+        idx = await store.get("shader")
+        idx.upsert({"id": "c", "n": 0})
+        idx.apply("a", _bump)
+        assert await store.flush("shader") is True
+
+        # The snapshot is untouched; the change went to a small segment.
+        assert [e["id"] for e in _snapshot(local)] == ["a", "b"]
+        assert _segments(local) == ["000000000001.jsonl"]
+
+        fresh = await _store().get("shader")
+        assert [e["id"] for e in fresh.entries] == ["c", "a", "b"]
+        assert fresh.get("a")["n"] == 1
+        assert fresh.generation == 1
+
+    @pytest.mark.asyncio
+    async def test_compaction_folds_the_log_into_the_snapshot(self, local):
+        store = _store()
+        idx = await store.get("shader")
+        for n in range(3):
+            idx.upsert({"id": f"new{n}", "n": 0})
+            await store.flush("shader")
+        idx.remove("b")
+        await store.flush("shader", compact=True)
+
+        assert [e["id"] for e in _snapshot(local)] == ["new2", "new1", "new0", "a"]
+        # Only the newest folded segment is kept.
+        assert _segments(local) == ["000000000004.jsonl"]
+        assert idx.log_base == 4
+        reloaded = await _store().get("shader")
+        assert [e["id"] for e in reloaded.entries] == ["new2", "new1", "new0", "a"]
+
+    @pytest.mark.asyncio
+    async def test_compacts_after_enough_segments(self, local):
+        store = _store(compact_segments=2)
+        idx = await store.get("shader")
+        for n in range(2):
+            idx.apply("a", _bump)
+            await store.flush("shader")
+        await idx.compact_task
+        assert _snapshot(local)[0]["n"] == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_workers_do_not_lose_updates(self, local):
+        one, two = _store(), _store()
+        idx_one, idx_two = await one.get("shader"), await two.get("shader")
+        idx_one.upsert({"id": "from-one", "n": 0})
+        idx_one.apply("a", _bump)
+        idx_two.upsert({"id": "from-two", "n": 0})
+        idx_two.apply("a", _bump)
+
+        await one.flush("shader")
+        # Same sequence number: the second writer reloads, rebases and retries.
+        await two.flush("shader")
+
+        merged = await _store().get("shader")
+        assert {e["id"] for e in merged.entries} == {"from-one", "from-two", "a", "b"}
+        assert merged.get("a")["n"] == 2
+
+    @pytest.mark.asyncio
+    async def test_writer_behind_a_compaction_retries_at_the_tail(self, local):
+        stale, busy = _store(), _store()
+        stale_idx = await stale.get("shader")
+        busy_idx = await busy.get("shader")
+        for n in range(3):
+            busy_idx.upsert({"id": f"busy{n}", "n": 0})
+            await busy.flush("shader")
+        await busy.compact("shader")
+
+        # Segment 1 was deleted by the compaction; writing it must not be lost.
+        stale_idx.upsert({"id": "late", "n": 0})
+        await stale.flush("shader")
+        assert stale_idx.generation == 4
+
+        reloaded = await _store().get("shader")
+        assert {"late", "busy0", "busy1", "busy2"} <= {e["id"] for e in reloaded.entries}
+
+    @pytest.mark.asyncio
+    async def test_snapshot_mode_is_unchanged(self, local):
+        store = IndexStore(flush_delay=60, max_flush_delay=60)
+        store.reset()
+        idx = await store.get("shader")
+        idx.upsert({"id": "c", "n": 0})
+        await store.flush("shader", compact=True)
+        assert [e["id"] for e in _snapshot(local)] == ["c", "a", "b"]
+        assert not (local.root / "_index_log").exists()
@@ -0,0 +1,491 @@
+"""
+Pytest suite for the resident index store (``storage_manager.indexes``).
+
+Covers load-once semantics, id lookups, debounced write-behind flushing with
+generation-match preconditions, and conflict replay when another writer
+replaced the index blob between load and flush.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the app (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+import sys
+import types
+
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+import os
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+import storage_manager.app as app_module
+from storage_manager.app import app
+from storage_manager.indexes import IndexCorruptedError, IndexStore
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+
+class _PreconditionFailed(Exception):
+    code = 412
+
+
+class FakeIndexBucket:
+    """Mock bucket holding index blobs in memory with GCS-style generations."""
+
+    def __init__(self, blobs: Dict[str, Any] | None = None) -> None:
+        self.data: Dict[str, Any] = dict(blobs or {})
+        self.generations: Dict[str, int] = {path: 1 for path in self.data}
+        self.downloads: List[str] = []
+        self.uploads: List[str] = []
+        self.mock = MagicMock()
+        self.mock.blob.side_effect = self._blob
+        self.mock.get_blob.side_effect = lambda path: self._blob(path) if path in self.data else None
+        self.mock.list_blobs.return_value = iter([])
+
+    def _blob(self, path: str) -> MagicMock:
+        fake = self
+        b = MagicMock()
+        b.name = path
+        b.exists.side_effect = lambda: path in fake.data
+        b.generation = fake.generations.get(path, 0)
+
+        def _download_as_text():
+            fake.downloads.append(path)
+            b.generation = fake.generations.get(path, 0)
+            return json.dumps(fake.data[path])
+
+        def _upload_from_string(payload, content_type=None, if_generation_match=None):
+            current = fake.generations.get(path, 0)
+            if if_generation_match is not None and if_generation_match != current:
+                raise _PreconditionFailed("generation mismatch")
+            fake.data[path] = json.loads(payload)
+            fake.generations[path] = current + 1
+            fake.uploads.append(path)
+            b.generation = current + 1
+
+        b.download_as_text.side_effect = _download_as_text
+        b.upload_from_string.side_effect = _upload_from_string
+        return b
+
+
+_SHADERS = [
+    {"id": "alpha", "name": "Alpha", "filename": "alpha.wgsl", "stars": 0.0, "rating_count": 0, "play_count": 0},
+    {"id": "beta", "name": "Beta", "filename": "beta.wgsl", "stars": 4.0, "rating_count": 2, "play_count": 7},
+]
+
+
+@pytest.fixture()
+def fake_bucket():
+    fake = FakeIndexBucket({"shaders/_shaders.json": [dict(s) for s in _SHADERS]})
+    app_module.io_executor = ThreadPoolExecutor(max_workers=2)
+    app_module.bucket = fake.mock
+    yield fake
+
+
+# ---------------------------------------------------------------------------
+# Unit tests: IndexStore
+# ---------------------------------------------------------------------------
+
+
+class TestIndexStoreLoad:
+    @pytest.mark.asyncio
+    async def test_loads_index_once(self, fake_bucket):
+        store = IndexStore(flush_delay=60, max_flush_delay=60)
+        first = await store.get("shader")
+        second = await store.get("shader")
+        assert first is second
+        assert fake_bucket.downloads == ["shaders/_shaders.json"]
+
+    @pytest.mark.asyncio
+    async def test_lookup_by_id(self, fake_bucket):
+        store = IndexStore(flush_delay=60, max_flush_delay=60)
+        idx = await store.get("shader")
+        assert idx.get("beta")["play_count"] == 7
+        assert idx.get("missing") is None
+
+    @pytest.mark.asyncio
+    async def test_missing_index_is_empty(self, fake_bucket):
+        store = IndexStore(flush_delay=60, max_flush_delay=60)
+        idx = await store.get("image")
+        assert len(idx) == 0
+        assert idx.generation == 0
+
+    @pytest.mark.asyncio
+    async def test_corrupted_index_raises(self, fake_bucket):
+        fake_bucket.data["shaders/_shaders.json"] = {"not": "a list"}
+        store = IndexStore(flush_delay=60, max_flush_delay=60)
+        with pytest.raises(IndexCorruptedError):
+            await store.get("shader")
+
+    @pytest.mark.asyncio
+    async def test_bucket_swap_drops_resident_indexes(self, fake_bucket):
+        store = IndexStore(flush_delay=60, max_flush_delay=60)
+        await store.get("shader")
+        other = FakeIndexBucket({"shaders/_shaders.json": []})
+        app_module.bucket = other.mock
+        idx = await store.get("shader")
+        assert len(idx) == 0
+
+
+class TestResidentIndexMaps:
+    def _index(self):
+        from storage_manager.indexes import ResidentIndex
+
+        return ResidentIndex("shader", "shaders/_shaders.json", [dict(s) for s in _SHADERS], 1)
+
+    def test_lookup_by_filename(self):
+        idx = self._index()
+        assert idx.get_by_filename("beta.wgsl")["id"] == "beta"
+        assert idx.get_by_filename("missing.wgsl") is None
+
+    def test_first_entry_wins_on_duplicate_id(self):
+        from storage_manager.indexes import ResidentIndex
+
+        idx = ResidentIndex("image", "images/_images.json", [
+            {"id": "dup", "filename": "new.png"},
+            {"id": "dup", "filename": "old.png"},
+        ], 1)
+        assert idx.get("dup")["filename"] == "new.png"
+        assert idx.get_by_filename("new.png") is idx.get("dup")
+
+    @pytest.mark.asyncio
+    async def test_maps_follow_upsert_remove_and_touch(self):
+        idx = self._index()
+        idx.upsert({"id": "alpha", "filename": "alpha-v2.wgsl"})
+        assert idx.get_by_filename("alpha.wgsl") is None
+        assert idx.get_by_filename("alpha-v2.wgsl")["id"] == "alpha"
+
+        idx.get("beta")["filename"] = "renamed.wgsl"
+        idx.touch("beta")
+        assert idx.get_by_filename("beta.wgsl") is None
+        assert idx.get_by_filename("renamed.wgsl")["id"] == "beta"
+
+        idx.remove("beta")
+        assert idx.get("beta") is None
+        assert idx.get_by_filename("renamed.wgsl") is None
+
+    def test_upsert_many_matches_sequential_upserts(self):
+        batch = [
+            {"id": "gamma", "filename": "gamma.wgsl"},
+            {"id": "alpha", "filename": "alpha-v2.wgsl"},
+            {"id": "delta", "filename": "delta.wgsl"},
+            {"id": "gamma", "filename": "gamma-v2.wgsl"},
+        ]
+        one_by_one = self._index()
+        expected = [one_by_one.upsert(dict(e)) for e in batch]
+        idx = self._index()
+        assert idx.upsert_many([dict(e) for e in batch]) == expected == [False, True, False, True]
+        assert idx.entries == one_by_one.entries
+        assert idx.get_by_filename("gamma.wgsl") is None
+        assert idx.get_by_filename("alpha-v2.wgsl")["id"] == "alpha"
+        assert {e["id"] for e in idx.pending_events()} == {"gamma", "alpha", "delta"}
+        assert idx.dirty
+
+
+class TestIndexStoreFlush:
+    @pytest.mark.asyncio
+    async def test_mutation_is_not_written_until_flush(self, fake_bucket):
+        store = IndexStore(flush_delay=60, max_flush_delay=60)
+        idx = await store.get("shader")
+        idx.get("alpha")["play_count"] = 1
+        idx.touch("alpha")
+        assert fake_bucket.uploads == []
+
+        assert await store.flush("shader") is True
+        assert fake_bucket.uploads == ["shaders/_shaders.json"]
+        assert fake_bucket.data["shaders/_shaders.json"][0]["play_count"] == 1
+        assert not idx.dirty
+        store.reset()
+
+    @pytest.mark.asyncio
+    async def test_flush_without_changes_is_noop(self, fake_bucket):
+        store = IndexStore(flush_delay=60, max_flush_delay=60)
+        await store.get("shader")
+        assert await store.flush("shader") is False
+        assert fake_bucket.uploads == []
+
+    @pytest.mark.asyncio
+    async def test_debounced_flush_coalesces_writes(self, fake_bucket):
+        store = IndexStore(flush_delay=0.05, max_flush_delay=1.0)
+        idx = await store.get("shader")
+        for _ in range(10):
+            idx.get("alpha")["play_count"] += 1
+            idx.touch("alpha")
+        await asyncio.sleep(0.3)
+        assert fake_bucket.uploads == ["shaders/_shaders.json"]
+        assert fake_bucket.data["shaders/_shaders.json"][0]["play_count"] == 10
+
+    @pytest.mark.asyncio
+    async def test_flush_uses_generation_precondition(self, fake_bucket):
+        store = IndexStore(flush_delay=60, max_flush_delay=60)
+        idx = await store.get("shader")
+        idx.upsert({"id": "gamma", "name": "Gamma", "filename": "gamma.wgsl"})
+        await store.flush("shader")
+        assert idx.generation == 2
+        idx.remove("gamma")
+        await store.flush("shader")
+        assert idx.generation == 3
+        assert [e["id"] for e in fake_bucket.data["shaders/_shaders.json"]] == ["alpha", "beta"]
+
+    @pytest.mark.asyncio
+    async def test_conflict_replays_local_changes_on_remote(self, fake_bucket):
+        store = IndexStore(flush_delay=60, max_flush_delay=60)
+        idx = await store.get("shader")
+        idx.get("alpha")["play_count"] = 5
+        idx.touch("alpha")
+        idx.upsert({"id": "gamma", "name": "Gamma", "filename": "gamma.wgsl"})
+
+        # Another writer updates beta and adds delta behind our back.
+        remote = [dict(s) for s in _SHADERS]
+        remote[1]["name"] = "Beta (renamed)"
+        remote.append({"id": "delta", "name": "Delta", "filename": "delta.wgsl"})
+        fake_bucket.data["shaders/_shaders.json"] = remote
+        fake_bucket.generations["shaders/_shaders.json"] = 7
+
+        assert await store.flush("shader") is True
+        written = {e["id"]: e for e in fake_bucket.data["shaders/_shaders.json"]}
+        assert written["alpha"]["play_count"] == 5
+        assert written["beta"]["name"] == "Beta (renamed)"
+        assert "gamma" in written and "delta" in written
+        assert idx.get("delta") is not None
+        assert idx.generation == 8
+
+    @pytest.mark.asyncio
+    async def test_conflict_keeps_remote_deletion_of_locally_edited_entry(self, fake_bucket):
+        store = IndexStore(flush_delay=60, max_flush_delay=60)
+        idx = await store.get("shader")
+        idx.get("beta")["name"] = "Beta (edited)"
+        idx.touch("beta")
+        idx.upsert({"id": "gamma", "name": "Gamma", "filename": "gamma.wgsl"})
+
+        # Another writer deletes beta before our flush.
+        fake_bucket.data["shaders/_shaders.json"] = [dict(_SHADERS[0])]
+        fake_bucket.generations["shaders/_shaders.json"] = 7
+
+        assert await store.flush("shader") is True
+        assert [e["id"] for e in fake_bucket.data["shaders/_shaders.json"]] == ["gamma", "alpha"]
+        assert idx.get("beta") is None
+
+    @pytest.mark.asyncio
+    async def test_flush_all_writes_dirty_indexes(self, fake_bucket):
+        store = IndexStore(flush_delay=60, max_flush_delay=60)
+        store.reset()
+        idx = await store.get("shader")
+        idx.get("beta")["stars"] = 5.0
+        idx.touch("beta")
+        await store.flush_all()
+        assert fake_bucket.data["shaders/_shaders.json"][1]["stars"] == 5.0
+
+
+
+class TestIndexStoreRevalidation:
+    @pytest.mark.asyncio
+    async def test_fresh_copy_is_not_rechecked(self, fake_bucket):
+        store = IndexStore(flush_delay=60, max_flush_delay=60, revalidate_interval=60)
+        await store.get("shader")
+        fake_bucket.data["shaders/_shaders.json"] = []
+        fake_bucket.generations["shaders/_shaders.json"] = 5
+        idx = await store.get("shader")
+        assert len(idx) == 2
+        fake_bucket.mock.get_blob.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_unchanged_generation_skips_download(self, fake_bucket):
+        store = IndexStore(flush_delay=60, max_flush_delay=60, revalidate_interval=60)
+        idx = await store.get("shader")
+        idx.checked_at -= 120
+        await store.get("shader")
+        assert fake_bucket.downloads == ["shaders/_shaders.json"]
+        assert fake_bucket.mock.get_blob.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_picks_up_other_workers_writes(self, fake_bucket):
+        worker_a = IndexStore(flush_delay=60, max_flush_delay=60, revalidate_interval=60)
+        worker_b = IndexStore(flush_delay=60, max_flush_delay=60, revalidate_interval=60)
+        idx_a = await worker_a.get("shader")
+        idx_b = await worker_b.get("shader")
+        token = idx_b.token
+
+        idx_a.get("beta")["name"] = "Beta (renamed)"
+        idx_a.touch("beta")
+        assert await worker_a.flush("shader") is True
+        # Worker B has an unflushed edit of its own.
+        idx_b.get("alpha")["play_count"] = 3
+        idx_b.touch("alpha")
+
+        idx_b.checked_at -= 120
+        assert await worker_b.get("shader") is idx_b
+        assert idx_b.get("beta")["name"] == "Beta (renamed)"
+        assert idx_b.get("alpha")["play_count"] == 3
+        assert idx_b.token != token
+        assert idx_b.generation == fake_bucket.generations["shaders/_shaders.json"]
+
+        # B's flush now succeeds without a conflict and keeps both edits.
+        uploads = len(fake_bucket.uploads)
+        assert await worker_b.flush("shader") is True
+        assert len(fake_bucket.uploads) == uploads + 1
+        written = {e["id"]: e for e in fake_bucket.data["shaders/_shaders.json"]}
+        assert written["beta"]["name"] == "Beta (renamed)"
+        assert written["alpha"]["play_count"] == 3
+
+    @pytest.mark.asyncio
+    async def test_concurrent_readers_share_one_check(self, fake_bucket):
+        store = IndexStore(flush_delay=60, max_flush_delay=60, revalidate_interval=60)
+        idx = await store.get("shader")
+        fake_bucket.generations["shaders/_shaders.json"] = 4
+        idx.checked_at -= 120
+        results = await asyncio.gather(*(store.get("shader") for _ in range(5)))
+        assert all(r is idx for r in results)
+        assert fake_bucket.mock.get_blob.call_count == 1
+        assert fake_bucket.downloads.count("shaders/_shaders.json") == 2
+
+# ---------------------------------------------------------------------------
+# Integration tests: shader routes served from the resident index
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture()
+def client():
+    from fastapi.testclient import TestClient
+
+    startup_bucket = MagicMock()
+    startup_bucket.blob.return_value.exists.return_value = False
+    gcs_client = MagicMock()
+    gcs_client.bucket.return_value = startup_bucket
+    app_module.io_executor = ThreadPoolExecutor(max_workers=2)
+
+    with patch("storage_manager.app.get_gcs_client", return_value=gcs_client):
+        with TestClient(app, raise_server_exceptions=True) as c:
+            fake = FakeIndexBucket({"shaders/_shaders.json": [dict(s) for s in _SHADERS]})
+            app_module.bucket = fake.mock
+            yield c, fake
+
+
+class TestShaderRoutesUseResidentIndex:
+    def test_meta_requests_download_index_once(self, client):
+        c, fake = client
+        for _ in range(5):
+            resp = c.get("/api/shaders/beta")
+            assert resp.status_code == 200
+            assert resp.json()["play_count"] == 7
+        assert fake.downloads == ["shaders/_shaders.json"]
+
+    def test_play_is_visible_before_flush(self, client):
+        c, fake = client
+        resp = c.post("/api/shaders/alpha/play")
+        assert resp.status_code == 200
+        assert resp.json()["play_count"] == 1
+        assert c.get("/api/shaders/alpha").json()["play_count"] == 1
+        assert fake.uploads == []
+
+    def test_rate_is_flushed_on_shutdown(self):
+        from fastapi.testclient import TestClient
+
+        gcs_client = MagicMock()
+        gcs_client.bucket.return_value.blob.return_value.exists.return_value = False
+        app_module.io_executor = ThreadPoolExecutor(max_workers=2)
+        fake = FakeIndexBucket({"shaders/_shaders.json": [dict(s) for s in _SHADERS]})
+
+        with patch("storage_manager.app.get_gcs_client", return_value=gcs_client):
+            with TestClient(app, raise_server_exceptions=True) as c:
+                app_module.bucket = fake.mock
+                resp = c.post("/api/shaders/alpha/rate", data={"stars": 4})
+                assert resp.status_code == 200
+                assert fake.uploads == []
+
+        # Leaving the TestClient context runs the lifespan shutdown flush.
+        assert fake.data["shaders/_shaders.json"][0]["stars"] == 4.0
+
+    def test_unknown_shader_returns_404(self, client):
+        c, _ = client
+        assert c.get("/api/shaders/nope").status_code == 404
+        assert c.post("/api/shaders/nope/play").status_code == 404
+
+
+_IMAGES = [{"id": "img-1", "filename": "one.png", "name": "One"}]
+_LOCATIONS = [{"id": "loc-1", "name": "Home", "lat": 1.0, "lng": 2.0, "filename": "loc-1.json"}]
+
+
+@pytest.fixture()
+def media_client():
+    from fastapi.testclient import TestClient
+
+    gcs_client = MagicMock()
+    gcs_client.bucket.return_value.blob.return_value.exists.return_value = False
+    app_module.io_executor = ThreadPoolExecutor(max_workers=2)
+    asyncio.run(app_module.cache.clear())
+
+    with patch("storage_manager.app.get_gcs_client", return_value=gcs_client):
+        with TestClient(app, raise_server_exceptions=True) as c:
+            fake = FakeIndexBucket({
+                "images/_images.json": [dict(e) for e in _IMAGES],
+                "locations/_locations.json": [dict(e) for e in _LOCATIONS],
+            })
+            app_module.bucket = fake.mock
+            app_module._has_signing_creds = False
+            yield c, fake
+
+
+class TestOtherRoutesUseResidentIndex:
+    def test_image_lookups_download_index_once(self, media_client):
+        c, fake = media_client
+        for _ in range(3):
+            # The media blob itself is missing; only the index lookup matters here.
+            assert c.get("/api/images/img-1").status_code == 404
+        assert c.get("/api/images/nope").json()["detail"] == "Image not found"
+        assert fake.downloads == ["images/_images.json"]
+
+    def test_image_metadata_update_is_write_behind(self, media_client):
+        c, fake = media_client
+        resp = c.patch("/api/images/img-1/meta", json={"name": "Renamed"})
+        assert resp.json()["action"] == "updated"
+        assert fake.uploads == []
+        meta = c.get("/api/items/img-1/meta", params={"type": "image"}).json()
+        assert meta["name"] == "Renamed"
+
+    def test_location_crud_uses_resident_index(self, media_client):
+        c, fake = media_client
+        payload = {"name": "Work", "lat": 3.0, "lng": 4.0}
+        created = c.post("/api/locations", json=payload).json()
+        new_id = created["id"]
+        assert c.get(f"/api/locations/{new_id}").json()["name"] == "Work"
+        assert [loc["id"] for loc in c.get("/api/locations").json()] == [new_id, "loc-1"]
+
+        assert c.delete("/api/locations/loc-1").json()["deleted"] is True
+        assert c.get("/api/locations/loc-1").status_code == 404
+        assert fake.downloads == ["locations/_locations.json"]
+        assert "locations/_locations.json" not in fake.uploads
+
+    def test_library_listing_refreshes_after_image_edit(self, media_client):
+        c, _ = media_client
+        assert c.get("/api/library", params={"type": "image"}).json()[0]["name"] == "One"
+        c.patch("/api/images/img-1/meta", json={"name": "Renamed"})
+        assert c.get("/api/library", params={"type": "image"}).json()[0]["name"] == "Renamed"
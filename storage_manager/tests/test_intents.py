@@ -0,0 +1,208 @@
+"""
+Pytest suite for the sync intent stores (``storage_manager.intents``).
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import asyncio
+import threading
+import time
+import types
+from unittest.mock import MagicMock
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the package (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+from storage_manager import intents
+from storage_manager.intents import MemoryIntentStore, RedisIntentStore, SQLiteIntentStore, SyncIntentDocument
+
+
+def _doc(intent_id="i1", status="PENDING", created_at=None, ttl=3600.0, resource_type="image"):
+    now = time.time() if created_at is None else created_at
+    return SyncIntentDocument(
+        intent_id=intent_id,
+        resource_type=resource_type,
+        status=status,
+        created_at=now,
+        expires_at=now + ttl,
+        gcs_snapshot_sha="g",
+        index_snapshot_sha="i",
+        diff={"to_add": [{"filename": f"{n}.png", "size": n} for n in range(500)], "to_remove": []},
+        diff_preview={"to_add": [], "to_remove": []},
+    )
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryIntentStore()
+    if request.param == "sqlite":
+        return SQLiteIntentStore(str(tmp_path / "intents.sqlite3"))
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisIntentStore(fakeredis.FakeRedis())
+
+
+class TestIntentStores:
+    def test_round_trip(self, store):
+        doc = _doc()
+        store.put(doc)
+        loaded = store.get("i1")
+        assert loaded.status == "PENDING"
+        assert loaded.diff == doc.diff
+        assert store.get("missing") is None
+
+    def test_transition_only_from_expected_status(self, store):
+        store.put(_doc())
+        claimed = store.transition("i1", "PENDING", "EXECUTING")
+        assert claimed is not None and claimed.status == "EXECUTING"
+        assert store.transition("i1", "PENDING", "EXECUTING") is None
+        assert store.get("i1").status == "EXECUTING"
+        assert store.transition("missing", "PENDING", "EXECUTING") is None
+
+    def test_pending_past_expiry_reads_as_expired(self, store):
+        store.put(_doc(created_at=time.time() - 10, ttl=1))
+        assert store.get("i1").status == "EXPIRED"
+        assert store.transition("i1", "PENDING", "EXECUTING") is None
+
+    def test_list_recent_newest_first(self, store):
+        now = time.time()
+        for n in range(3):
+            store.put(_doc(intent_id=f"i{n}", created_at=now + n))
+        store.put(_doc(intent_id="v", resource_type="video"))
+        assert [d.intent_id for d in store.list_recent("image", limit=2)] == ["i2", "i1"]
+
+
+class TestRedisIntentStore:
+    def test_index_is_trimmed_without_scanning(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        client = fakeredis.FakeRedis()
+        store = RedisIntentStore(client)
+        ancient = time.time() - intents._MAX_RECORD_AGE - 60
+        client.zadd(store._index_key("image"), {"gone": ancient})
+        client.zadd(store._index_key("video"), {"gone-too": ancient})
+        store.put(_doc())
+        assert client.zrange(store._index_key("image"), 0, -1) == [b"i1"]
+        assert store.cleanup_expired() == 1
+        assert client.zcard(store._index_key("video")) == 0
+
+
+class TestCall:
+    @pytest.mark.asyncio
+    async def test_blocking_stores_run_off_the_event_loop(self, monkeypatch, tmp_path):
+        loop_thread = threading.get_ident()
+        store = SQLiteIntentStore(str(tmp_path / "intents.sqlite3"))
+        seen = []
+        original = store.get
+        monkeypatch.setattr(store, "get", lambda intent_id: seen.append(threading.get_ident()) or original(intent_id))
+        monkeypatch.setattr(intents, "intent_store", store)
+        await intents.call("put", _doc())
+        assert (await intents.call("get", "i1")).intent_id == "i1"
+        assert seen and seen[0] != loop_thread
+
+    @pytest.mark.asyncio
+    async def test_memory_store_is_called_inline(self, monkeypatch):
+        store = MemoryIntentStore()
+        monkeypatch.setattr(intents, "intent_store", store)
+        monkeypatch.setattr(intents.state, "run_io", MagicMock(side_effect=AssertionError("offloaded")))
+        await intents.call("put", _doc())
+        assert (await intents.call("transition", "i1", "PENDING", "EXECUTING")).status == "EXECUTING"
+
+    @pytest.mark.asyncio
+    async def test_cleanup_runs_in_background(self, monkeypatch):
+        store = MemoryIntentStore()
+        store.put(_doc(created_at=time.time() - 10, ttl=1))
+        monkeypatch.setattr(intents, "intent_store", store)
+        intents.start(interval=0.01)
+        try:
+            for _ in range(100):
+                if not store._store:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await intents.stop()
+        assert store._store == {}
+        assert intents._cleanup_task is None
+
+
+class TestSQLiteIntentStore:
+    def test_cleanup_expired(self, tmp_path):
+        store = SQLiteIntentStore(str(tmp_path / "intents.sqlite3"))
+        old = time.time() - 8 * 24 * 3600
+        store.put(_doc("stale", created_at=time.time() - 10, ttl=1))
+        store.put(_doc("old", status="EXECUTED", created_at=old))
+        store.put(_doc("fresh"))
+        assert store.cleanup_expired() == 2
+        assert store.get("fresh") is not None
+        assert store.get("old") is None
+
+    def test_diff_is_stored_compressed(self, tmp_path):
+        store = SQLiteIntentStore(str(tmp_path / "intents.sqlite3"))
+        store.put(_doc())
+        (blob,) = store._conn.execute("SELECT doc FROM intents").fetchone()
+        assert len(blob) < len(repr(_doc().diff)) / 4
+
+    def test_only_one_worker_claims_an_intent(self, tmp_path):
+        path = str(tmp_path / "intents.sqlite3")
+        SQLiteIntentStore(path).put(_doc())
+        # Separate connections stand in for separate worker processes.
+        workers = [SQLiteIntentStore(path) for _ in range(8)]
+        results = []
+        barrier = threading.Barrier(len(workers))
+
+        def claim(worker):
+            barrier.wait()
+            results.append(worker.transition("i1", "PENDING", "EXECUTING"))
+
+        threads = [threading.Thread(target=claim, args=(w,)) for w in workers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert sum(r is not None for r in results) == 1
+
+
+class TestConfigure:
+    def test_memory_keeps_installed_store(self, monkeypatch):
+        installed = MemoryIntentStore()
+        monkeypatch.setattr(intents, "intent_store", installed)
+        monkeypatch.setattr(intents, "INTENT_STORE", installed)
+        assert intents.configure("memory") is installed
+
+    def test_sqlite(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(intents, "intent_store", intents.intent_store)
+        monkeypatch.setattr(intents, "INTENT_STORE", intents.INTENT_STORE)
+        monkeypatch.setattr(intents.config, "INTENT_STORE_SQLITE_PATH", str(tmp_path / "i.sqlite3"))
+        store = intents.configure("sqlite")
+        assert isinstance(store, SQLiteIntentStore)
+        assert intents.INTENT_STORE is store
+
+    def test_redis_without_package_falls_back(self, monkeypatch):
+        installed = MemoryIntentStore()
+        monkeypatch.setattr(intents, "intent_store", installed)
+        monkeypatch.setattr(intents, "INTENT_STORE", installed)
+        monkeypatch.setattr(intents, "redis", None)
+        assert intents.configure("redis") is installed
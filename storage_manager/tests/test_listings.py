@@ -0,0 +1,297 @@
+"""
+Pytest suite for the precomputed shader listing (``storage_manager.listings``).
+
+Covers the per-SortBy views, the category inverted index, cursor pagination
+and the ``limit``/``cursor`` envelope on ``GET /api/shaders``.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the app (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+import sys
+import types
+
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+import storage_manager.app as app_module
+from storage_manager.app import app
+from storage_manager.indexes import ResidentIndex
+from storage_manager.listings import ShaderListing, shader_listing
+from storage_manager.models import SortBy
+
+from .test_index_store import FakeIndexBucket
+
+_SHADERS = [
+    {"id": "a", "name": "Zeta", "date": "2024-01-03", "stars": 3.0, "play_count": 5,
+     "tags": ["generative"], "description": "", "thumbnail": "a.png"},
+    {"id": "b", "name": "alpha", "date": "2024-01-01", "stars": 5.0, "play_count": 1,
+     "tags": [], "description": "A Generative swirl", "coordinate": 2},
+    {"id": "c", "name": "Mid", "date": "2024-01-02", "stars": 4.0, "play_count": 9,
+     "tags": ["distortion"], "description": "", "coordinate": 1, "last_played": "2024-02-01"},
+    {"id": "d", "name": "beta", "date": "2024-01-04"},
+]
+
+
+def _index() -> ResidentIndex:
+    return ResidentIndex("shader", "shaders/_shaders.json", [dict(s) for s in _SHADERS], 1)
+
+
+@pytest.fixture(autouse=True)
+def bucket():
+    mock = MagicMock()
+    mock.blob.side_effect = lambda path: MagicMock(public_url=f"https://cdn.example/{path}")
+    app_module.bucket = mock
+    yield mock
+
+
+# ---------------------------------------------------------------------------
+# Unit tests: ShaderListing
+# ---------------------------------------------------------------------------
+
+
+class TestShaderListingViews:
+    @pytest.mark.parametrize("sort_by, expected", [
+        (SortBy.rating, ["b", "c", "a", "d"]),
+        (SortBy.date, ["d", "a", "c", "b"]),
+        (SortBy.name, ["b", "d", "c", "a"]),
+        (SortBy.coordinate, ["c", "b", "a", "d"]),
+        (SortBy.plays, ["c", "a", "b", "d"]),
+        (SortBy.last_played, ["c", "a", "b", "d"]),
+    ])
+    def test_views_are_presorted(self, sort_by, expected):
+        rows, total, _ = ShaderListing(_index()).page(sort_by)
+        assert [r["id"] for r in rows] == expected
+        assert total == 4
+
+    def test_null_coordinates_sort_last(self):
+        idx = _index()
+        idx.upsert({"id": "e", "name": "E", "coordinate": None})
+        idx.upsert({"id": "f", "name": "F", "coordinate": None})
+        rows, _, _ = ShaderListing(idx).page(SortBy.coordinate)
+        assert [r["id"] for r in rows][:2] == ["c", "b"]
+        assert {r["id"] for r in rows[2:]} == {"a", "d", "e", "f"}
+
+    def test_rows_carry_defaults_and_thumbnail_url(self):
+        listing = ShaderListing(_index())
+        assert listing.rows["d"]["stars"] == 0.0
+        assert listing.rows["d"]["play_count"] == 0
+        assert listing.rows["a"]["thumbnail_url"] == "https://cdn.example/shaders/a.png"
+        assert "thumbnail_url" not in listing.rows["b"]
+
+    def test_category_matches_tags_and_descriptions(self):
+        rows, total, _ = ShaderListing(_index()).page(SortBy.rating, category="generative")
+        assert [r["id"] for r in rows] == ["b", "a"]
+        assert total == 2
+
+    def test_min_stars_filter_and_count(self):
+        listing = ShaderListing(_index())
+        rows, total, _ = listing.page(SortBy.name, min_stars=4.0)
+        assert [r["id"] for r in rows] == ["b", "c"]
+        assert total == 2
+        assert listing.count("generative", 4.0) == 1
+
+    def test_listing_is_rebuilt_only_after_mutation(self):
+        idx = _index()
+        first = shader_listing(idx)
+        assert shader_listing(idx) is first
+        idx.get("d")["stars"] = 5.0
+        idx.touch("d")
+        rebuilt = shader_listing(idx)
+        assert rebuilt is not first
+        assert rebuilt.page(SortBy.rating)[0][0]["id"] in {"b", "d"}
+
+
+class TestShaderListingPagination:
+    def test_cursor_walks_every_row_once(self):
+        listing = ShaderListing(_index())
+        seen, cursor = [], None
+        while True:
+            rows, _, cursor = listing.page(SortBy.date, limit=3, cursor=cursor)
+            seen.extend(r["id"] for r in rows)
+            if cursor is None:
+                break
+        assert seen == ["d", "a", "c", "b"]
+
+    def test_last_page_has_no_cursor(self):
+        _, _, cursor = ShaderListing(_index()).page(SortBy.rating, category="generative", limit=2)
+        assert cursor is None
+
+    def test_cursor_survives_insertions(self):
+        idx = _index()
+        _, _, cursor = shader_listing(idx).page(SortBy.date, limit=2)
+        idx.upsert({"id": "e", "name": "Newest", "date": "2024-12-31"})
+        rows, _, _ = shader_listing(idx).page(SortBy.date, limit=5, cursor=cursor)
+        assert [r["id"] for r in rows] == ["c", "b"]
+
+    def test_invalid_cursor_is_rejected(self):
+        from fastapi import HTTPException
+
+        with pytest.raises(HTTPException) as exc:
+            ShaderListing(_index()).page(SortBy.date, limit=2, cursor="not-a-cursor")
+        assert exc.value.status_code == 400
+
+
+# ---------------------------------------------------------------------------
+# Integration tests: GET /api/shaders
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture()
+def client(bucket):
+    from fastapi.testclient import TestClient
+
+    gcs_client = MagicMock()
+    gcs_client.bucket.return_value.blob.return_value.exists.return_value = False
+    app_module.io_executor = ThreadPoolExecutor(max_workers=2)
+
+    with patch("storage_manager.app.get_gcs_client", return_value=gcs_client):
+        with TestClient(app, raise_server_exceptions=True) as c:
+            fake = FakeIndexBucket({"shaders/_shaders.json": [dict(s) for s in _SHADERS]})
+            app_module.bucket = fake.mock
+            yield c
+
+
+class TestListShadersRoute:
+    def test_without_limit_returns_plain_list(self, client):
+        data = client.get("/api/shaders", params={"sort_by": "name"}).json()
+        assert [s["id"] for s in data] == ["b", "d", "c", "a"]
+
+    def test_with_limit_returns_page_envelope(self, client):
+        first = client.get("/api/shaders", params={"sort_by": "rating", "limit": 3}).json()
+        assert first["total"] == 4
+        assert [s["id"] for s in first["shaders"]] == ["b", "c", "a"]
+        second = client.get(
+            "/api/shaders", params={"sort_by": "rating", "limit": 3, "cursor": first["next_cursor"]}
+        ).json()
+        assert [s["id"] for s in second["shaders"]] == ["d"]
+        assert second["next_cursor"] is None
+
+    def test_category_filter(self, client):
+        data = client.get("/api/shaders", params={"category": "distortion"}).json()
+        assert [s["id"] for s in data] == ["c"]
+
+    def test_bad_cursor_returns_400(self, client):
+        resp = client.get("/api/shaders", params={"limit": 2, "cursor": "%%%"})
+        assert resp.status_code == 400
+
+
+# ---------------------------------------------------------------------------
+# Integration tests: GET /api/library fan-out and k-way merge
+# ---------------------------------------------------------------------------
+
+
+_LIBRARY = {
+    "songs/_songs.json": [
+        {"id": "s1", "name": "Song 1", "date": "2024-03-01", "rating": 7, "genre": "ambient"},
+        {"id": "s2", "name": "Song 2", "date": "2024-01-01", "rating": 2},
+    ],
+    "images/_images.json": [
+        {"id": "i1", "name": "Image 1", "date": "2024-02-01", "rating": 9},
+        {"id": "i2", "name": "Image 2"},
+    ],
+    "shaders/_shaders.json": [
+        {"id": "h1", "name": "Shader 1", "date": "2024-04-01", "thumbnail": "h1.png"},
+    ],
+}
+
+
+@pytest.fixture()
+def library_client(bucket):
+    import threading
+    import time
+    from fastapi.testclient import TestClient
+
+    gcs_client = MagicMock()
+    gcs_client.bucket.return_value.blob.return_value.exists.return_value = False
+    app_module.io_executor = ThreadPoolExecutor(max_workers=8)
+
+    with patch("storage_manager.app.get_gcs_client", return_value=gcs_client):
+        with TestClient(app, raise_server_exceptions=True) as c:
+            fake = FakeIndexBucket({k: [dict(e) for e in v] for k, v in _LIBRARY.items()})
+            stats = {"in_flight": 0, "peak": 0}
+            lock = threading.Lock()
+            make_blob = fake._blob
+
+            def _slow_blob(path):
+                b = make_blob(path)
+                exists = b.exists.side_effect
+
+                def _exists():
+                    with lock:
+                        stats["in_flight"] += 1
+                        stats["peak"] = max(stats["peak"], stats["in_flight"])
+                    time.sleep(0.05)
+                    with lock:
+                        stats["in_flight"] -= 1
+                    return exists()
+
+                b.exists.side_effect = _exists
+                b.public_url = f"https://cdn.example/{path}"
+                return b
+
+            fake.mock.blob.side_effect = _slow_blob
+            app_module.bucket = fake.mock
+            yield c, stats
+
+
+class TestLibraryListing:
+    def test_all_types_are_loaded_concurrently(self, library_client):
+        c, stats = library_client
+        assert c.get("/api/library").status_code == 200
+        assert stats["peak"] > 1
+
+    def test_merge_matches_global_sort(self, library_client):
+        c, _ = library_client
+        data = c.get("/api/library").json()
+        # Same ordering as the old concatenate-then-sort: missing values sort
+        # first when descending, and ties keep type order.
+        assert [r["id"] for r in data] == ["i2", "h1", "s1", "i1", "s2"]
+        assert data[1]["thumbnail_url"] == "https://cdn.example/shaders/h1.png"
+
+        by_rating = c.get("/api/library", params={"sort_by": "rating", "sort_desc": False}).json()
+        assert [r["id"] for r in by_rating] == ["s2", "s1", "i1", "h1", "i2"]
+
+    def test_pagination_and_filters(self, library_client):
+        c, _ = library_client
+        page = c.get("/api/library", params={"limit": 2, "offset": 2}).json()
+        assert [r["id"] for r in page] == ["s1", "i1"]
+        rated = c.get("/api/library", params={"min_rating": 5}).json()
+        assert [r["id"] for r in rated] == ["s1", "i1"]
+        ambient = c.get("/api/library", params={"genre": "ambient"}).json()
+        assert [r["id"] for r in ambient] == ["s1"]
+
+    def test_unknown_type_is_rejected_without_loading(self, library_client):
+        from storage_manager import indexes
+
+        c, _ = library_client
+        for path in ("/api/library", "/api/items/s1/meta", "/api/items/s1"):
+            resp = c.get(path, params={"type": "nope-123"})
+            assert resp.status_code == 400, path
+        assert "nope-123" not in indexes.index_store._indexes
+        assert c.get("/api/library", params={"type": "song"}).status_code == 200
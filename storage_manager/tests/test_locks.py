@@ -0,0 +1,160 @@
+"""
+Pytest suite for the resource lock providers (``storage_manager.locks``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sys
+import types
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import HTTPException
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the package (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+from storage_manager import backends, locks, state
+from storage_manager.backends import LocalBackend
+from storage_manager.locks import GcsLockProvider, LocalLockProvider, LockTimeout, RedisLockProvider, ResourceLock
+
+
+@pytest.fixture()
+def local_storage(tmp_path, monkeypatch):
+    backend = LocalBackend(str(tmp_path), "")
+    monkeypatch.setattr(backends, "local_backend", backend)
+    return backend
+
+
+async def _lost_update_race(make_lock, workers=4, rounds=5):
+    """Each worker does read-sleep-write on a shared counter under its own lock object."""
+    counter = {"value": 0}
+
+    async def worker(lock):
+        for _ in range(rounds):
+            async with lock:
+                value = counter["value"]
+                await asyncio.sleep(0)
+                counter["value"] = value + 1
+
+    await asyncio.gather(*(worker(make_lock()) for _ in range(workers)))
+    return counter["value"]
+
+
+class TestResourceLock:
+    @pytest.mark.asyncio
+    async def test_serialises_within_process_and_counts_contention(self):
+        lock = ResourceLock("shader", LocalLockProvider())
+        assert await _lost_update_race(lambda: lock) == 20
+        assert lock.stats.acquisitions == 20
+        assert lock.stats.contended > 0
+
+    @pytest.mark.asyncio
+    async def test_timeout_is_a_503(self):
+        lock = ResourceLock("shader", LocalLockProvider(), timeout=0.05)
+        async with lock:
+            with pytest.raises(HTTPException) as exc:
+                async with lock:
+                    pass
+        assert exc.value.status_code == 503
+        assert lock.stats.timeouts == 1
+
+    def test_state_hands_out_one_lock_per_resource(self):
+        locks.configure("local")
+        assert state.get_resource_lock("image") is state.get_resource_lock("image")
+        assert isinstance(state.get_resource_lock("image"), ResourceLock)
+        assert "image" in locks.stats()
+
+
+class TestGcsLockProvider:
+    @pytest.mark.asyncio
+    async def test_excludes_other_workers_until_released(self, local_storage):
+        a, b = GcsLockProvider(lease_seconds=30), GcsLockProvider(lease_seconds=30)
+        lease = await a.acquire("shader", timeout=1)
+        with pytest.raises(LockTimeout):
+            await b.acquire("shader", timeout=0.1)
+        await a.release(lease)
+        second = await b.acquire("shader", timeout=1)
+        assert second.token > lease.token
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_is_taken_over_and_old_holder_cannot_renew(self, local_storage):
+        a, b = GcsLockProvider(lease_seconds=0.01), GcsLockProvider(lease_seconds=30)
+        stale = await a.acquire("shader", timeout=1)
+        await asyncio.sleep(0.02)
+        fresh = await b.acquire("shader", timeout=1)
+        assert fresh.token > stale.token
+        assert await a.renew(stale) is False
+        # Releasing a lost lease must not free the new holder's lock.
+        await a.release(stale)
+        data, _ = await local_storage.read_json_generation("_locks/shader.lock")
+        assert data["owner"] == fresh.owner
+
+    @pytest.mark.asyncio
+    async def test_lost_lease_is_counted_and_not_released(self, local_storage):
+        lock = ResourceLock("shader", GcsLockProvider(lease_seconds=30), timeout=1)
+        async with lock as lease:
+            lease.lost = True
+        assert lock.stats.lost == 1
+        data, _ = await local_storage.read_json_generation("_locks/shader.lock")
+        assert data["owner"] == lease.owner and data["expires_at"] > 0
+
+    @pytest.mark.asyncio
+    async def test_workers_do_not_lose_updates(self, local_storage):
+        # One ResourceLock per worker: only the lock object coordinates them.
+        total = await _lost_update_race(lambda: ResourceLock("shader", GcsLockProvider(lease_seconds=30), timeout=10))
+        assert total == 20
+
+
+class TestRedisLockProvider:
+    @pytest.fixture()
+    def client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        return fakeredis.FakeAsyncRedis()
+
+    @pytest.mark.asyncio
+    async def test_lease_and_token(self, client):
+        a, b = RedisLockProvider(client, lease_seconds=30), RedisLockProvider(client, lease_seconds=30)
+        lease = await a.acquire("shader", timeout=1)
+        with pytest.raises(LockTimeout):
+            await b.acquire("shader", timeout=0.1)
+        await a.release(lease)
+        second = await b.acquire("shader", timeout=1)
+        assert second.token == lease.token + 1
+        assert await a.renew(lease) is False
+        assert await b.renew(second) is True
+
+
+class TestConfigure:
+    def test_redis_without_package_falls_back_to_local(self, monkeypatch):
+        monkeypatch.setattr(locks, "aioredis", None)
+        assert isinstance(locks.configure("redis"), LocalLockProvider)
+
+    def test_gcs(self):
+        try:
+            assert isinstance(locks.configure("gcs"), GcsLockProvider)
+        finally:
+            locks.configure("local")
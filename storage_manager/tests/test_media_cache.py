@@ -0,0 +1,157 @@
+"""
+Pytest suite for the on-disk media cache tier (``storage_manager.media_cache``).
+
+Objects come from a LocalBackend in a temporary directory, so fills and hits
+exercise real files without GCS.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the app (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+import sys
+import types
+
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+import storage_manager.app as app_module
+from storage_manager import backends, media_cache
+from storage_manager.app import app
+from storage_manager.backends import LocalBackend
+from storage_manager.media_cache import MediaDiskCache
+
+
+@pytest.fixture()
+def storage(tmp_path):
+    return LocalBackend(str(tmp_path / "bucket"), "")
+
+
+def _cache(tmp_path, **kwargs) -> MediaDiskCache:
+    kwargs.setdefault("max_bytes", 1000)
+    kwargs.setdefault("max_object_bytes", 500)
+    kwargs.setdefault("admit_after", 2)
+    return MediaDiskCache(str(tmp_path / "cache"), **kwargs)
+
+
+async def _request(cache: MediaDiskCache, storage, path: str):
+    """One proxied request: a hit returns the cached bytes, a miss counts toward admission."""
+    info = await storage.stat(path, checksum=False)
+    fh = await cache.open(storage.name, path, info.generation, info.size)
+    if fh is None:
+        cache.admit(storage, path, info.generation, info.size)
+        await asyncio.gather(*cache._tasks)
+        return None
+    return b"".join([c async for c in media_cache.iter_file(fh, 0, info.size - 1, 64)])
+
+
+class TestMediaDiskCache:
+    @pytest.mark.asyncio
+    async def test_admits_after_repeated_requests_then_hits(self, tmp_path, storage):
+        await storage.upload_bytes("videos/a.mp4", b"a" * 300)
+        cache = _cache(tmp_path)
+        assert await _request(cache, storage, "videos/a.mp4") is None
+        assert len(cache) == 0
+        assert await _request(cache, storage, "videos/a.mp4") is None
+        assert len(cache) == 1
+        assert await _request(cache, storage, "videos/a.mp4") == b"a" * 300
+        assert cache.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_new_generation_is_a_miss(self, tmp_path, storage):
+        await storage.upload_bytes("videos/a.mp4", b"a" * 300)
+        cache = _cache(tmp_path, admit_after=1)
+        await _request(cache, storage, "videos/a.mp4")
+        await storage.upload_bytes("videos/a.mp4", b"b" * 300)
+        assert await _request(cache, storage, "videos/a.mp4") is None
+        assert await _request(cache, storage, "videos/a.mp4") == b"b" * 300
+
+    @pytest.mark.asyncio
+    async def test_evicts_least_recently_used_within_budget(self, tmp_path, storage):
+        cache = _cache(tmp_path, admit_after=1)
+        for name in ("a", "b", "c", "d"):
+            await storage.upload_bytes(f"videos/{name}.mp4", name.encode() * 300)
+            await _request(cache, storage, f"videos/{name}.mp4")
+            if name == "b":
+                assert await _request(cache, storage, "videos/a.mp4") is not None
+        assert cache.nbytes <= 1000
+        assert await _request(cache, storage, "videos/a.mp4") == b"a" * 300
+        assert await _request(cache, storage, "videos/d.mp4") == b"d" * 300
+        assert sum(len(files) for _, _, files in os.walk(tmp_path / "cache")) == 3
+
+    @pytest.mark.asyncio
+    async def test_large_objects_are_not_cached(self, tmp_path, storage):
+        await storage.upload_bytes("videos/big.mp4", b"x" * 600)
+        cache = _cache(tmp_path, admit_after=1)
+        await _request(cache, storage, "videos/big.mp4")
+        assert len(cache) == 0
+
+    @pytest.mark.asyncio
+    async def test_restart_adopts_existing_files(self, tmp_path, storage):
+        await storage.upload_bytes("videos/a.mp4", b"a" * 300)
+        await _request(_cache(tmp_path, admit_after=1), storage, "videos/a.mp4")
+        cache = _cache(tmp_path)
+        assert await _request(cache, storage, "videos/a.mp4") == b"a" * 300
+
+    def test_disabled_without_directory(self):
+        assert MediaDiskCache("").enabled is False
+
+
+@pytest.fixture()
+def cached_client(tmp_path):
+    from fastapi.testclient import TestClient
+
+    with patch.object(backends.config, "STORAGE_BACKEND", "local"), \
+            patch.object(backends.config, "LOCAL_STORAGE_ROOT", str(tmp_path / "bucket")), \
+            patch.object(media_cache.config, "MEDIA_CACHE_DIR", str(tmp_path / "cache")), \
+            patch.object(media_cache.config, "MEDIA_CACHE_ADMIT_AFTER", 1), \
+            patch.object(app_module, "bucket", None), \
+            patch("storage_manager.app.get_gcs_client", side_effect=AssertionError("GCS used")):
+        with TestClient(app, raise_server_exceptions=True) as c:
+            yield c, tmp_path / "bucket"
+    backends.configure("gcs")
+    media_cache.media_cache = MediaDiskCache(root="")
+
+
+class TestProxyUsesDiskCache:
+    def test_range_requests_are_served_from_cache(self, cached_client):
+        c, root = cached_client
+        (root / "videos").mkdir(parents=True)
+        (root / "videos" / "v.mp4").write_bytes(bytes(range(64)))
+        (root / "videos" / "_videos.json").write_text(json.dumps([{"id": "v1", "name": "V", "filename": "v.mp4"}]))
+
+        assert c.get("/api/videos/v1", follow_redirects=False).content == bytes(range(64))
+        cache = media_cache.media_cache
+        c.portal.call(lambda: asyncio.gather(*cache._tasks))
+        assert len(cache) == 1
+
+        resp = c.get("/api/videos/v1", headers={"Range": "bytes=8-15"}, follow_redirects=False)
+        assert resp.status_code == 206
+        assert resp.content == bytes(range(8, 16))
+        assert resp.headers["content-range"] == "bytes 8-15/64"
+        assert cache.hits == 1
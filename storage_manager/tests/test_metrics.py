@@ -0,0 +1,167 @@
+"""
+Pytest suite for the Prometheus registry (``storage_manager.metrics``) and
+the instrumentation behind ``GET /metrics``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sys
+import types
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the app (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+import storage_manager.app as app_module
+from storage_manager import backends, config, locks, metrics, state
+from storage_manager.app import app
+from storage_manager.metrics import Registry
+
+
+def _sample(text: str, line_prefix: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(line_prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{line_prefix} not in output")
+
+
+class TestRegistry:
+    def test_counter_and_histogram_exposition(self):
+        registry = Registry()
+        hits = registry.counter("t_hits_total", "Hits.", ("cache",))
+        latency = registry.histogram("t_seconds", "Latency.", ("op",), buckets=(0.1, 1.0))
+        hits.inc(cache='a"b')
+        hits.inc(2, cache='a"b')
+        for value in (0.05, 0.5, 5.0):
+            latency.observe(value, op="read")
+
+        text = registry.render()
+        assert "# TYPE t_hits_total counter" in text
+        assert 't_hits_total{cache="a\\"b"} 3' in text
+        assert "# TYPE t_seconds histogram" in text
+        assert 't_seconds_bucket{op="read",le="0.1"} 1' in text
+        assert 't_seconds_bucket{op="read",le="1.0"} 2' in text
+        assert 't_seconds_bucket{op="read",le="+Inf"} 3' in text
+        assert 't_seconds_count{op="read"} 3' in text
+        assert _sample(text, 't_seconds_sum{op="read"}') == pytest.approx(5.55)
+
+    def test_labels_must_match(self):
+        counter = Registry().counter("t_total", "T.", ("a",))
+        with pytest.raises(ValueError):
+            counter.inc(b="x")
+
+    def test_collectors_are_read_at_render(self):
+        registry = Registry()
+        depth = [0]
+        registry.collector(lambda: [("t_depth", "gauge", "Depth.", [("t_depth", {}, depth[0])])])
+        depth[0] = 7
+        assert "t_depth 7" in registry.render()
+
+
+class TestInstrumentation:
+    @pytest.mark.asyncio
+    async def test_run_io_records_latency_and_queue_wait(self):
+        def lookup_thing():
+            return 42
+
+        before = metrics.IO_QUEUE_WAIT_SECONDS.count(pool="io")
+        assert await state.run_io(lookup_thing) == 42
+        assert metrics.IO_SECONDS.count(pool="io", op="lookup_thing") >= 1
+        assert metrics.IO_QUEUE_WAIT_SECONDS.count(pool="io") == before + 1
+
+    @pytest.mark.asyncio
+    async def test_state_cache_counts_hits_and_misses(self):
+        misses = metrics.CACHE_REQUESTS.value(cache="state", result="miss")
+        hits = metrics.CACHE_REQUESTS.value(cache="state", result="hit")
+        await state.cache.set("metrics-test", "v")
+        assert await state.cache.get("metrics-test") == "v"
+        assert await state.cache.get("metrics-test-missing") is None
+        assert metrics.CACHE_REQUESTS.value(cache="state", result="hit") == hits + 1
+        assert metrics.CACHE_REQUESTS.value(cache="state", result="miss") == misses + 1
+
+    @pytest.mark.asyncio
+    async def test_lock_wait_is_observed(self):
+        lock = locks.ResourceLock("metrics-test", locks.LocalLockProvider())
+        async with lock:
+            pass
+        assert metrics.LOCK_WAIT_SECONDS.count(resource="metrics-test") == 1
+
+    @pytest.mark.asyncio
+    async def test_backend_ops_are_timed(self, tmp_path):
+        storage = backends.LocalBackend(str(tmp_path), "")
+        await storage.upload_bytes("a/b.txt", b"x")
+        assert await storage.stat("a/b.txt") is not None
+        with pytest.raises(FileNotFoundError):
+            await storage.download_bytes("a/missing.txt")
+        assert metrics.STORAGE_OP_SECONDS.count(backend="local", op="upload_bytes") >= 1
+        assert metrics.STORAGE_OP_ERRORS.value(backend="local", op="download_bytes") >= 1
+
+
+@pytest.fixture()
+def local_client(tmp_path):
+    from fastapi.testclient import TestClient
+
+    asyncio.run(app_module.cache.clear())
+    with patch.object(backends.config, "STORAGE_BACKEND", "local"), \
+            patch.object(backends.config, "LOCAL_STORAGE_ROOT", str(tmp_path)), \
+            patch.object(app_module, "bucket", None), \
+            patch("storage_manager.app.get_gcs_client", side_effect=AssertionError("GCS used")):
+        with TestClient(app, raise_server_exceptions=True) as c:
+            yield c, tmp_path
+    backends.configure("gcs")
+
+
+class TestMetricsEndpoint:
+    def test_scrape_reports_hot_paths(self, local_client):
+        c, root = local_client
+        (root / "videos").mkdir()
+        (root / "videos" / "v.mp4").write_bytes(bytes(range(64)))
+        (root / "videos" / "_videos.json").write_text(json.dumps([{"id": "v1", "name": "V", "filename": "v.mp4"}]))
+        assert c.get("/api/videos/v1", headers={"Range": "bytes=0-15"}).status_code == 206
+        c.get("/api/shaders")
+        c.get("/api/shaders")
+
+        resp = c.get("/metrics")
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+        text = resp.text
+        for family in (
+            "storage_manager_io_seconds", "storage_manager_io_queue_depth", "storage_manager_storage_op_seconds",
+            "storage_manager_cache_requests_total", "storage_manager_media_semaphore_wait_seconds",
+            "storage_manager_lock_acquisitions_total", "storage_manager_rate_limit_decisions_total",
+        ):
+            assert f"# TYPE {family} " in text
+        assert _sample(text, 'storage_manager_media_responses_total{source="storage",status="206"}') >= 1
+        assert _sample(text, "storage_manager_media_proxied_bytes_total") >= 16
+        assert _sample(text, 'storage_manager_cache_requests_total{cache="response_body",result="hit"}') >= 1
+        assert _sample(text, 'storage_manager_io_queue_depth{pool="io"}') == 0
+
+    def test_can_be_disabled(self, local_client, monkeypatch):
+        c, _ = local_client
+        monkeypatch.setattr(config, "METRICS_ENABLED", False)
+        assert c.get("/metrics").status_code == 404
@@ -0,0 +1,177 @@
+"""
+Pytest suite for the rate limiter (``storage_manager.ratelimit``) and its middleware.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import types
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the package (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+from storage_manager import ratelimit
+from storage_manager.middleware import RateLimitMiddleware
+from storage_manager.ratelimit import MemoryRateLimiter, RedisRateLimiter, Rule, RuleSet
+
+
+class _Clock:
+    def __init__(self, now: float = 1000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRules:
+    def test_parse(self):
+        rules = ratelimit.parse_rules(" /api/admin/sync=20/60, bogus, /api/videos/=600/30 ")
+        assert rules == [Rule("/api/admin/sync", 20, 60.0), Rule("/api/videos/", 600, 30.0)]
+
+    def test_longest_prefix_wins_and_default_applies(self):
+        rules = RuleSet(
+            [Rule("/api/admin", 5, 60), Rule("/api/admin/sync", 2, 60)],
+            Rule("", 100, 60),
+            ["/api"],
+        )
+        assert rules.match("/api/admin/sync-images/plan").requests == 2
+        assert rules.match("/api/admin/rescan-shaders").requests == 5
+        assert rules.match("/api/shaders").requests == 100
+        assert rules.match("/ratings") is None
+
+
+class TestMemoryRateLimiter:
+    def test_token_bucket_refills(self):
+        clock = _Clock()
+        limiter = MemoryRateLimiter(clock=clock)
+        rule = Rule("", 2, 10)
+        assert limiter.hit_now("k", rule).allowed
+        assert limiter.hit_now("k", rule).allowed
+        denied = limiter.hit_now("k", rule)
+        assert not denied.allowed and denied.retry_after == 5
+        clock.now += 5
+        assert limiter.hit_now("k", rule).allowed
+
+    def test_idle_buckets_are_swept(self):
+        clock = _Clock()
+        limiter = MemoryRateLimiter(sweep_interval=10, clock=clock)
+        rule = Rule("", 5, 10)
+        for n in range(50):
+            limiter.hit_now(f"ip{n}", rule)
+        assert len(limiter) == 50
+        clock.now += 11
+        limiter.hit_now("fresh", rule)
+        assert len(limiter) == 1
+
+    def test_key_count_is_capped(self):
+        limiter = MemoryRateLimiter(max_keys=10, clock=_Clock())
+        for n in range(100):
+            limiter.hit_now(f"ip{n}", Rule("", 5, 10))
+        assert len(limiter) == 10
+
+
+class TestRedisRateLimiter:
+    @pytest.mark.asyncio
+    async def test_sliding_window(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        clock = _Clock(1000.0)
+        limiter = RedisRateLimiter(fakeredis.FakeAsyncRedis(), clock=clock)
+        rule = Rule("", 3, 10)
+        for _ in range(3):
+            assert (await limiter.hit("k", rule)).allowed
+        assert not (await limiter.hit("k", rule)).allowed
+        # Halfway into the next window half of the previous count still applies.
+        clock.now = 1015.0
+        assert (await limiter.hit("k", rule)).allowed
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_local_buckets_when_redis_fails(self):
+        client = MagicMock()
+        client.pipeline.side_effect = ConnectionError("down")
+        limiter = RedisRateLimiter(client, clock=_Clock())
+        assert (await limiter.hit("k", Rule("", 1, 10))).allowed
+        assert not (await limiter.hit("k", Rule("", 1, 10))).allowed
+
+
+class TestMiddleware:
+    def _client(self, **kwargs):
+        app = FastAPI()
+
+        @app.get("/api/videos/{video_id}")
+        async def video(video_id: str):
+            return {"id": video_id}
+
+        @app.get("/api/shaders")
+        async def shaders():
+            return []
+
+        @app.get("/api/stream")
+        async def stream():
+            async def chunks():
+                for n in range(3):
+                    yield f"chunk{n};".encode()
+
+            return StreamingResponse(chunks(), media_type="application/octet-stream")
+
+        app.add_middleware(RateLimitMiddleware, **kwargs)
+        return TestClient(app)
+
+    def test_routes_have_separate_budgets(self):
+        client = self._client(requests=1, window=60, rules=[Rule("/api/videos/", 3, 60)])
+        assert client.get("/api/shaders").status_code == 200
+        limited = client.get("/api/shaders")
+        assert limited.status_code == 429
+        assert int(limited.headers["Retry-After"]) >= 1
+        for _ in range(3):
+            response = client.get("/api/videos/a")
+            assert response.status_code == 200
+        assert response.headers["X-RateLimit-Limit"] == "3"
+        assert response.headers["X-RateLimit-Remaining"] == "0"
+        assert client.get("/api/videos/a").status_code == 429
+
+    def test_streamed_bodies_pass_through_with_headers(self):
+        client = self._client(requests=5, window=60, rules=[])
+        response = client.get("/api/stream")
+        assert response.content == b"chunk0;chunk1;chunk2;"
+        assert response.headers["X-RateLimit-Remaining"] == "4"
+
+    def test_paths_outside_the_limit_are_untouched(self):
+        app = FastAPI()
+
+        @app.get("/ratings")
+        async def ratings():
+            return {}
+
+        app.add_middleware(RateLimitMiddleware, requests=1, window=60, rules=[])
+        client = TestClient(app)
+        for _ in range(3):
+            response = client.get("/ratings")
+            assert response.status_code == 200
+            assert "X-RateLimit-Limit" not in response.headers
@@ -0,0 +1,130 @@
+"""
+Pytest suite for the signed-URL cache (``storage_manager.signed_urls``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+# ---------------------------------------------------------------------------
+# Stub GCS before importing the app (mirrors test_sync_endpoints)
+# ---------------------------------------------------------------------------
+import sys
+import types
+
+_gcs_stub = types.ModuleType("google.cloud.storage")
+_gcs_stub.Client = MagicMock()
+_google_stub = types.ModuleType("google")
+_cloud_stub = types.ModuleType("google.cloud")
+_auth_stub = types.ModuleType("google.oauth2")
+_creds_stub = types.ModuleType("google.oauth2.service_account")
+_creds_stub.Credentials = MagicMock()
+
+for mod_name, mod in [
+    ("google", _google_stub),
+    ("google.cloud", _cloud_stub),
+    ("google.cloud.storage", _gcs_stub),
+    ("google.oauth2", _auth_stub),
+    ("google.oauth2.service_account", _creds_stub),
+]:
+    sys.modules.setdefault(mod_name, mod)
+
+os.environ.setdefault("GCP_BUCKET_NAME", "test-bucket")
+os.environ.setdefault("GCP_CREDENTIALS", "")
+
+from storage_manager.signed_urls import SignedUrlCache
+
+
+class _FakeStorage:
+    """Backend double that counts existence checks and signing calls."""
+
+    def __init__(self, objects=("images/a.png",), signing=True, delay=0.0) -> None:
+        self.objects = set(objects)
+        self.signing = signing
+        self.delay = delay
+        self.exists_calls = 0
+        self.sign_calls = 0
+
+    def can_sign(self) -> bool:
+        return self.signing
+
+    async def exists(self, path: str) -> bool:
+        self.exists_calls += 1
+        return path in self.objects
+
+    async def signed_url(self, path: str, expires_seconds: int):
+        self.sign_calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return f"https://signed/{path}?n={self.sign_calls}"
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture()
+def clock():
+    return _Clock()
+
+
+class TestSignedUrlCache:
+    @pytest.mark.asyncio
+    async def test_signs_once_per_window(self, clock):
+        cache, storage = SignedUrlCache(refresh_fraction=0.5, clock=clock), _FakeStorage()
+        urls = {await cache.get(storage, "images/a.png", 3600) for _ in range(5)}
+        assert urls == {"https://signed/images/a.png?n=1"}
+        assert storage.sign_calls == 1
+        assert storage.exists_calls == 1
+
+    @pytest.mark.asyncio
+    async def test_resigns_after_refresh_fraction(self, clock):
+        cache, storage = SignedUrlCache(refresh_fraction=0.5, clock=clock), _FakeStorage()
+        await cache.get(storage, "images/a.png", 3600)
+        clock.now += 1799
+        assert await cache.get(storage, "images/a.png", 3600) == "https://signed/images/a.png?n=1"
+        clock.now += 2
+        assert await cache.get(storage, "images/a.png", 3600) == "https://signed/images/a.png?n=2"
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_signing_call(self, clock):
+        cache, storage = SignedUrlCache(clock=clock), _FakeStorage(delay=0.01)
+        urls = await asyncio.gather(*(cache.get(storage, "images/a.png", 60) for _ in range(20)))
+        assert set(urls) == {"https://signed/images/a.png?n=1"}
+        assert storage.sign_calls == 1
+
+    @pytest.mark.asyncio
+    async def test_missing_object_is_not_cached(self, clock):
+        cache, storage = SignedUrlCache(clock=clock), _FakeStorage(objects=())
+        for _ in range(2):
+            with pytest.raises(FileNotFoundError):
+                await cache.get(storage, "images/a.png", 60)
+        assert storage.exists_calls == 2
+        assert storage.sign_calls == 0
+        assert len(cache) == 0
+
+    @pytest.mark.asyncio
+    async def test_unsigned_backend_skips_existence_check(self, clock):
+        cache, storage = SignedUrlCache(clock=clock), _FakeStorage(signing=False)
+        assert await cache.get(storage, "images/a.png", 60) is None
+        assert storage.exists_calls == 0
+
+    @pytest.mark.asyncio
+    async def test_lru_bound_and_invalidate(self, clock):
+        cache = SignedUrlCache(max_entries=2, clock=clock)
+        storage = _FakeStorage(objects=("a", "b", "c"))
+        for path in ("a", "b", "c"):
+            await cache.get(storage, path, 60)
+        assert len(cache) == 2
+        cache.invalidate("c")
+        assert len(cache) == 1
+        await cache.get(storage, "c", 60)
+        assert storage.sign_calls == 4
@@ -140,14 +140,14 @@ _VIDEO_ENTRY = {
 
 @pytest.fixture(autouse=True)
 def reset_rate_limiter():
-    """Reset RateLimitMiddleware counters before each test to prevent
+    """Reset RateLimitMiddleware buckets before each test to prevent
     cross-test rate-limit interference."""
     from storage_manager.app import RateLimitMiddleware
 
     mw = app.middleware_stack
     while mw is not None:
         if isinstance(mw, RateLimitMiddleware):
-            mw.counters.clear()
+            mw.limiter.reset()
             break
         mw = getattr(mw, "app", None)
     yield
@@ -206,6 +206,8 @@ def _configure_for_image(mock_bucket: MagicMock, image_blob: MagicMock) -> None:
         return b
 
     mock_bucket.blob.side_effect = _blob
+    # get_blob returns the blob with metadata loaded, or None when it is missing.
+    mock_bucket.get_blob.side_effect = lambda path: (lambda b: b if b.exists() else None)(_blob(path))
 
 
 def _configure_for_video(mock_bucket: MagicMock, video_blob: MagicMock) -> None:
@@ -224,6 +226,8 @@ def _configure_for_video(mock_bucket: MagicMock, video_blob: MagicMock) -> None:
         return b
 
     mock_bucket.blob.side_effect = _blob
+    # get_blob returns the blob with metadata loaded, or None when it is missing.
+    mock_bucket.get_blob.side_effect = lambda path: (lambda b: b if b.exists() else None)(_blob(path))
 
 
 # ---------------------------------------------------------------------------
@@ -591,3 +595,137 @@ class TestProxyRangeRequests:
 
         resp = c.get("/api/images/img-001", follow_redirects=False)
         assert resp.headers.get("accept-ranges") == "bytes"
+
+
+# ---------------------------------------------------------------------------
+# Tests: proxy fallback — chunked streaming, suffix / open-ended ranges
+# ---------------------------------------------------------------------------
+
+
+def _make_sliced_video_blob(data: bytes) -> MagicMock:
+    """Video blob whose ranged downloads return the matching slice of *data*."""
+    blob = _make_video_blob(size=len(data))
+    blob.download_as_bytes.side_effect = lambda start=0, end=None, **_: data[start:end]
+    return blob
+
+
+class TestProxyChunkedStreaming:
+    DATA = bytes(range(256)) * 40  # 10240 bytes
+
+    def test_body_is_read_in_bounded_chunks(self, client_no_sign):
+        blob = _make_sliced_video_blob(self.DATA)
+        _configure_for_video(app_module.bucket, blob)
+
+        with patch.object(app_module, "MEDIA_STREAM_CHUNK_BYTES", 4096):
+            resp = client_no_sign.get("/api/videos/vid-001", follow_redirects=False)
+
+        assert resp.status_code == 200
+        assert resp.content == self.DATA
+        assert resp.headers["content-length"] == str(len(self.DATA))
+        spans = [(c.kwargs["start"], c.kwargs["end"]) for c in blob.download_as_bytes.call_args_list]
+        assert spans == [(0, 4096), (4096, 8192), (8192, 10240)]
+
+    def test_suffix_range(self, client_no_sign):
+        blob = _make_sliced_video_blob(self.DATA)
+        _configure_for_video(app_module.bucket, blob)
+
+        resp = client_no_sign.get("/api/videos/vid-001", headers={"Range": "bytes=-100"}, follow_redirects=False)
+
+        assert resp.status_code == 206
+        assert resp.headers["content-range"] == "bytes 10140-10239/10240"
+        assert resp.content == self.DATA[-100:]
+
+    def test_open_ended_range(self, client_no_sign):
+        blob = _make_sliced_video_blob(self.DATA)
+        _configure_for_video(app_module.bucket, blob)
+
+        resp = client_no_sign.get("/api/videos/vid-001", headers={"Range": "bytes=10000-"}, follow_redirects=False)
+
+        assert resp.status_code == 206
+        assert resp.headers["content-range"] == "bytes 10000-10239/10240"
+        assert resp.headers["content-length"] == "240"
+        assert resp.content == self.DATA[10000:]
+
+    def test_end_past_object_is_clamped(self, client_no_sign):
+        blob = _make_sliced_video_blob(self.DATA)
+        _configure_for_video(app_module.bucket, blob)
+
+        resp = client_no_sign.get("/api/videos/vid-001", headers={"Range": "bytes=10200-99999"}, follow_redirects=False)
+
+        assert resp.status_code == 206
+        assert resp.headers["content-range"] == "bytes 10200-10239/10240"
+
+    def test_unsatisfiable_range_returns_416(self, client_no_sign):
+        blob = _make_sliced_video_blob(self.DATA)
+        _configure_for_video(app_module.bucket, blob)
+
+        resp = client_no_sign.get("/api/videos/vid-001", headers={"Range": "bytes=20000-"}, follow_redirects=False)
+
+        assert resp.status_code == 416
+        assert resp.headers["content-range"] == "bytes */10240"
+        blob.download_as_bytes.assert_not_called()
+
+
+class TestParseRangeHeader:
+    @pytest.mark.parametrize("header,expected", [
+        ("bytes=0-4", (0, 4)),
+        ("bytes=5-", (5, 99)),
+        ("bytes=-10", (90, 99)),
+        ("bytes=-500", (0, 99)),
+        ("bytes=50-500", (50, 99)),
+        ("bytes=0-1,5-6", None),
+        ("bytes=9-3", None),
+        ("bytes=abc", None),
+        ("items=0-4", None),
+        (None, None),
+    ])
+    def test_parse(self, header, expected):
+        assert app_module._parse_range_header(header, 100) == expected
+
+    @pytest.mark.parametrize("header", ["bytes=100-", "bytes=-0"])
+    def test_unsatisfiable(self, header):
+        with pytest.raises(app_module.RangeNotSatisfiable):
+            app_module._parse_range_header(header, 100)
+
+
+# ---------------------------------------------------------------------------
+# Tests: signed URLs are cached per object
+# ---------------------------------------------------------------------------
+
+
+class TestSignedUrlCaching:
+    def test_repeat_requests_sign_and_check_existence_once(self, client_signed):
+        c = client_signed
+        blob = _make_image_blob()
+        _configure_for_image(app_module.bucket, blob)
+
+        for _ in range(5):
+            resp = c.get("/api/images/img-001", follow_redirects=False)
+            assert resp.status_code == 302
+            assert resp.headers["location"] == "https://storage.googleapis.com/signed/img.png"
+
+        blob.generate_signed_url.assert_called_once()
+        blob.exists.assert_called_once()
+
+
+class TestProxyUnknownSize:
+    def test_streams_to_eof_when_size_is_unknown(self, client_no_sign):
+        data = b"x" * 10
+        blob = _make_sliced_video_blob(data)
+        blob.size = None
+
+        def _ranged(start=0, end=None, **_):
+            if start >= len(data):
+                raise type("RequestRangeNotSatisfiable", (Exception,), {"code": 416})()
+            return data[start:end]
+
+        blob.download_as_bytes.side_effect = _ranged
+        _configure_for_video(app_module.bucket, blob)
+
+        with patch.object(app_module, "MEDIA_STREAM_CHUNK_BYTES", 5):
+            resp = client_no_sign.get("/api/videos/vid-001", headers={"Range": "bytes=0-3"}, follow_redirects=False)
+
+        assert resp.status_code == 200
+        assert "content-length" not in resp.headers
+        assert resp.content == data
+        assert blob.download_as_bytes.call_count == 3
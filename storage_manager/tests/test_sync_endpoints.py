@@ -57,6 +57,7 @@ os.environ.setdefault("GCP_CREDENTIALS", "")
 # Now import app internals
 # ---------------------------------------------------------------------------
 import storage_manager.app as app_module
+from storage_manager import signed_urls
 
 from storage_manager.app import (
     DIFF_PREVIEW_CAP,
@@ -113,6 +114,21 @@ def fresh_intent_store():
     yield fresh
 
 
+@pytest.fixture(autouse=True)
+def reset_rate_limiter():
+    """Reset RateLimitMiddleware buckets so the admin sync budget does not
+    leak between tests."""
+    from storage_manager.app import RateLimitMiddleware
+
+    mw = app.middleware_stack
+    while mw is not None:
+        if isinstance(mw, RateLimitMiddleware):
+            mw.limiter.reset()
+            break
+        mw = getattr(mw, "app", None)
+    yield
+
+
 @pytest.fixture()
 def client(fresh_intent_store):
     """FastAPI TestClient with GCS fully mocked.
@@ -377,6 +393,13 @@ class TestPlanSyncImages:
         assert doc.status == "PENDING"
         assert doc.resource_type == "image"
 
+    def test_plan_does_not_sweep_intents(self, client, fresh_intent_store):
+        c, mock_bucket = client
+        _configure_bucket_for_images(mock_bucket, [], [])
+        with patch.object(fresh_intent_store, "cleanup_expired") as cleanup:
+            assert c.post("/api/admin/sync-images/plan").status_code == 200
+        cleanup.assert_not_called()
+
 
 # ---------------------------------------------------------------------------
 # Integration tests: plan endpoint (videos)
@@ -423,6 +446,16 @@ class TestApplySyncImages:
         assert data["status"] == "EXECUTED"
         assert data["changes_applied"] is True
 
+    def test_apply_invalidates_signed_urls_of_changed_objects(self, client):
+        c, mock_bucket = client
+        index = [{"id": "old", "filename": "gone.png"}]
+        intent_id = self._plan(c, mock_bucket, gcs_files=[{"filename": "new.png"}], index_content=index)
+        _configure_bucket_for_images(mock_bucket, [{"filename": "new.png"}], index)
+        with patch.object(signed_urls.signed_url_cache, "invalidate") as invalidate:
+            resp = c.post("/api/admin/sync-images/apply", json={"intent_id": intent_id})
+        assert resp.status_code == 200
+        assert {call.args[0] for call in invalidate.call_args_list} == {"images/gone.png", "images/new.png"}
+
     def test_apply_idempotent_returns_200(self, client, fresh_intent_store):
         c, mock_bucket = client
         intent_id = self._plan(c, mock_bucket)
@@ -634,6 +667,41 @@ class TestPerResourceLocks:
             assert acquired
 
 
+# ---------------------------------------------------------------------------
+# Unit tests: apply edits the resident index instead of rewriting the blob
+# ---------------------------------------------------------------------------
+
+
+class TestApplyToIndex:
+    def _index(self, entries):
+        from storage_manager.indexes import ResidentIndex
+
+        return ResidentIndex("image", "images/_images.json", entries, 1)
+
+    def test_keeps_unflushed_counter_updates(self):
+        from storage_manager.routes.sync import _apply_to_index
+
+        idx = self._index([{"id": "a", "filename": "a.png", "play_count": 1}, {"id": "b", "filename": "b.png"}])
+        idx.apply("a", lambda e: e.update(play_count=e["play_count"] + 2))
+        _apply_to_index(idx, {"b.png"}, [{"id": "n1", "filename": "n1.png"}, {"id": "n2", "filename": "n2.png"}])
+        assert [e["id"] for e in idx.entries] == ["n2", "n1", "a"]
+        assert idx.get("a")["play_count"] == 3
+        assert not idx.full_rewrite
+
+        # A conflicting flush still replays the counter update on the remote copy.
+        idx.merge_remote([{"id": "a", "filename": "a.png", "play_count": 10}, {"id": "b", "filename": "b.png"}], 2)
+        assert [e["id"] for e in idx.entries] == ["n2", "n1", "a"]
+        assert idx.get("a")["play_count"] == 12
+
+    def test_entries_without_id_fall_back_to_rewrite(self):
+        from storage_manager.routes.sync import _apply_to_index
+
+        idx = self._index([{"filename": "legacy.png"}, {"id": "a", "filename": "a.png"}])
+        _apply_to_index(idx, {"legacy.png"}, [{"id": "n1", "filename": "n1.png"}])
+        assert [e.get("id") for e in idx.entries] == ["n1", "a"]
+        assert idx.full_rewrite
+
+
 # ---------------------------------------------------------------------------
 # Unit tests: _write_json_atomic_sync backup & rollback path
 # ---------------------------------------------------------------------------
@@ -689,6 +757,95 @@ class TestWriteJsonAtomicSync:
         assert backup == ""
 
 
+# ---------------------------------------------------------------------------
+# Sync manifest: plan keeps its listing, apply compares against it
+# ---------------------------------------------------------------------------
+
+
+class _ManifestBucket:
+    """Mock bucket with an in-memory blob store and a countable listing."""
+
+    def __init__(self, files: Dict[str, int]) -> None:
+        self.files = dict(files)
+        self.store: Dict[str, str] = {}
+        self.listed = 0
+        self.mock = _make_test_bucket()
+        self.mock.list_blobs.side_effect = self._list_blobs
+        self.mock.blob.side_effect = self._blob
+
+    def _list_blobs(self, prefix="", **kwargs):
+        for name, size in self.files.items():
+            if name.startswith(prefix):
+                self.listed += 1
+                yield _make_blob(name, size)
+
+    def _blob(self, path):
+        b = MagicMock()
+        b.exists.side_effect = lambda: path in self.store
+        b.download_as_text.side_effect = lambda: self.store[path]
+        b.upload_from_string.side_effect = lambda data, content_type=None: self.store.__setitem__(path, data)
+        return b
+
+
+class TestSyncManifest:
+    CFG = {"folder": "images/", "index": "images/_images.json"}
+    EXTS = (".png",)
+
+    @pytest.fixture(autouse=True)
+    def _fresh_manifests(self):
+        app_module._sync_manifests.clear()
+        yield
+        app_module._sync_manifests.clear()
+
+    def _plan(self, bucket: _ManifestBucket) -> str:
+        with patch.object(app_module, "bucket", bucket.mock):
+            _, gcs_sha, _ = _compute_sync_diff_sync(self.CFG, self.EXTS, [])
+        return gcs_sha
+
+    def _unchanged(self, bucket: _ManifestBucket, gcs_sha: str) -> bool:
+        from storage_manager.app import _sync_snapshot_unchanged_sync
+
+        with patch.object(app_module, "bucket", bucket.mock):
+            return _sync_snapshot_unchanged_sync(self.CFG, self.EXTS, gcs_sha)
+
+    def test_plan_keeps_manifest_in_process(self):
+        bucket = _ManifestBucket({"images/a.png": 10, "images/b.png": 20})
+        gcs_sha = self._plan(bucket)
+        manifest = app_module._sync_manifests["images/"]
+        assert manifest["gcs_sha"] == gcs_sha
+        assert manifest["objects"] == {"a.png": 10, "b.png": 20}
+        assert bucket.store == {}
+        bucket.mock.blob.assert_not_called()
+
+    def test_apply_check_stops_at_first_new_blob(self):
+        bucket = _ManifestBucket({f"images/{i:03d}.png": i for i in range(50)})
+        gcs_sha = self._plan(bucket)
+        bucket.files = {"images/000-new.png": 1, **bucket.files}
+        bucket.listed = 0
+        assert self._unchanged(bucket, gcs_sha) is False
+        assert bucket.listed == 1
+
+    def test_apply_check_detects_deletion_and_resize(self):
+        bucket = _ManifestBucket({"images/a.png": 10, "images/b.png": 20})
+        gcs_sha = self._plan(bucket)
+        assert self._unchanged(bucket, gcs_sha) is True
+        bucket.files = {"images/a.png": 10}
+        assert self._unchanged(bucket, gcs_sha) is False
+        bucket.files = {"images/a.png": 10, "images/b.png": 21}
+        assert self._unchanged(bucket, gcs_sha) is False
+
+    def test_another_worker_falls_back_to_snapshot_sha(self):
+        bucket = _ManifestBucket({"images/a.png": 10, "images/b.png": 20})
+        gcs_sha = self._plan(bucket)
+        app_module._sync_manifests.clear()
+        bucket.listed = 0
+        assert self._unchanged(bucket, gcs_sha) is True
+        assert bucket.listed == 2
+        bucket.files = {"images/a.png": 10}
+        assert self._unchanged(bucket, gcs_sha) is False
+        assert bucket.store == {}
+
+
 # ---------------------------------------------------------------------------
 # Shader-list rescanning endpoint
 # ---------------------------------------------------------------------------
@@ -768,33 +925,29 @@ class TestRescanShaders:
 
 
 # ---------------------------------------------------------------------------
-# Cache consistency: invalidation happens inside the lock during apply
+# Cache consistency: listings follow the resident index after apply
 # ---------------------------------------------------------------------------
 
 
 class TestCacheConsistency:
-    def test_apply_invalidates_cache_keys(self, client, fresh_intent_store):
-        """cache.delete must be called with both library keys after apply."""
+    def test_apply_refreshes_listing_without_shared_cache_round_trips(self, client, fresh_intent_store):
+        """Listings key on the resident index token, so apply needs no cache invalidation."""
         c, mock_bucket = client
-        _configure_bucket_for_images(mock_bucket, [], [])
-        plan_resp = c.post("/api/admin/sync-images/plan")
-        intent_id = plan_resp.json()["intent_id"]
-
-        deleted_keys: List[str] = []
-        original_delete = app_module.cache.delete
-
-        async def tracking_delete(key):
-            deleted_keys.append(key)
-            return await original_delete(key)
-
-        app_module.cache.delete = tracking_delete
+        _configure_bucket_for_images(mock_bucket, [{"filename": "new.png"}], [])
+        assert c.get("/api/library", params={"type": "image"}).json() == []
+        intent_id = c.post("/api/admin/sync-images/plan").json()["intent_id"]
 
-        # Same GCS state for apply
-        _configure_bucket_for_images(mock_bucket, [], [])
-        resp = c.post("/api/admin/sync-images/apply", json={"intent_id": intent_id})
+        cache_mock = AsyncMock()
+        with patch.object(app_module.cache, "increment", cache_mock), patch.object(app_module.cache, "clear", cache_mock):
+            resp = c.post("/api/admin/sync-images/apply", json={"intent_id": intent_id})
         assert resp.status_code == 200
+        cache_mock.assert_not_awaited()
+        assert [r["filename"] for r in c.get("/api/library", params={"type": "image"}).json()] == ["new.png"]
 
-        app_module.cache.delete = original_delete
-
-        assert "library:image" in deleted_keys
-        assert "library:all" in deleted_keys
+    @pytest.mark.asyncio
+    async def test_invalidation_never_scans_keys(self):
+        cache = app_module.cache
+        await cache.set("library:image", ["kept"])
+        with patch.object(cache, "clear", side_effect=AssertionError("cache cleared")):
+            await app_module.clear_cache_for_type("location")
+        assert await cache.get("library:image") == ["kept"]
@@ -1,20 +1,20 @@
 # storage_manager/utils.py
-import io
 import os
 import json
 import uuid
 import base64
 import hashlib
 import logging
+import time
 import subprocess
-from ftplib import FTP
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
-from fastapi.responses import StreamingResponse
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
 
-from . import config, state
+from . import config, state, backups, ftp_pool, metrics
 
 # --- GCS I/O HELPERS ---
 def _read_json_sync(blob_path: str):
@@ -32,6 +32,31 @@ def _write_json_sync(blob_path: str, data):
     )
 
 
+def _read_json_generation_sync(blob_path: str):
+    """Return ``(data, generation)`` for *blob_path*; generation is 0 when absent."""
+    blob = state.bucket.blob(blob_path)
+    if blob.exists():
+        data = json.loads(blob.download_as_text())
+        return data, blob.generation or 0
+    return [], 0
+
+
+def _write_json_generation_sync(blob_path: str, payload: bytes, if_generation_match):
+    """Upload pre-serialised JSON only if the live generation still matches.
+
+    Raises the client's ``PreconditionFailed`` (HTTP 412) when another writer
+    replaced the blob since *if_generation_match* was observed.  Returns the
+    generation of the newly written object.
+    """
+    blob = state.bucket.blob(blob_path)
+    blob.upload_from_string(
+        payload,
+        content_type="application/json",
+        if_generation_match=if_generation_match,
+    )
+    return blob.generation
+
+
 # --- SHARED CHAIN VALIDATION (mirrors src/services/layerChainShare.ts) ---
 MAX_SHARED_SLOTS = 6
 SHARED_CHAIN_VERSION = 1
@@ -97,19 +122,27 @@ def _decode_shared_chain(chain_str: str) -> Optional[dict]:
     return {"v": SHARED_CHAIN_VERSION, "slots": valid_slots}
 
 
+def _backup_blob_sync(blob_path: str) -> str:
+    """Server-side copy *blob_path* to ``BACKUP_PREFIX``; returns "" when it does not exist."""
+    main_blob = state.bucket.blob(blob_path)
+    if not main_blob.exists():
+        return ""
+    backup_path = backups.backup_path(blob_path)
+    state.bucket.copy_blob(main_blob, state.bucket, backup_path)
+    return backup_path
+
+
 def _write_json_atomic_sync(blob_path: str, data) -> str:
     """Atomically overwrite *blob_path* with *data* and return the backup path.
 
     Steps:
     1. Upload JSON to ``<blob_path>.tmp.<uuid>``
-    2. If the current blob exists, copy it to ``<blob_path>.backup.<ts>``
+    2. If the current blob exists, copy it to ``BACKUP_PREFIX<blob_path>.backup.<ts>``
     3. Upload the new content directly to ``<blob_path>`` (GCS upload is atomic)
     4. Delete the temp blob
     Returns the backup blob path (or "" when no prior blob existed).
     """
     tmp_path = f"{blob_path}.tmp.{uuid.uuid4().hex}"
-    ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    backup_path = f"{blob_path}.backup.{ts}"
     json_bytes = json.dumps(data).encode()
 
     # Upload to tmp
@@ -117,13 +150,10 @@ def _write_json_atomic_sync(blob_path: str, data) -> str:
     tmp_blob.upload_from_string(json_bytes, content_type="application/json")
 
     # Backup current blob if it exists
-    main_blob = state.bucket.blob(blob_path)
-    actual_backup = ""
-    if main_blob.exists():
-        state.bucket.copy_blob(main_blob, state.bucket, backup_path)
-        actual_backup = backup_path
+    actual_backup = _backup_blob_sync(blob_path)
 
     # Overwrite main blob (GCS upload is server-side atomic)
+    main_blob = state.bucket.blob(blob_path)
     main_blob.upload_from_string(json_bytes, content_type="application/json")
 
     # Remove temp blob
@@ -135,41 +165,112 @@ def _write_json_atomic_sync(blob_path: str, data) -> str:
     return actual_backup
 
 
-def _compute_sync_diff_sync(cfg: dict, allowed_extensions: tuple, existing_index: list) -> Tuple[dict, str, str]:
-    """Stream-iterate GCS blobs and compute a three-way diff vs *existing_index*.
+# Only the fields the sync engine reads; keeps listing pages small.
+_SYNC_LIST_FIELDS = "items(name,size),nextPageToken"
 
-    Returns ``(diff_full, gcs_snapshot_sha, index_snapshot_sha)`` where
-    *diff_full* contains the complete (uncapped) diff arrays.
-    """
-    index_map = {item["filename"]: item for item in existing_index}
-    index_sha = hashlib.sha256(
-        json.dumps(existing_index, sort_keys=True).encode()
-    ).hexdigest()
+# folder -> listing behind this process's latest plan.  Never persisted: a
+# plan applied on another worker falls back to the snapshot SHA.
+_sync_manifests: Dict[str, dict] = {}
 
-    gcs_blobs: List[dict] = []          # lightweight: name + size + url only
-    gcs_name_size: List[Tuple[str, int]] = []     # for deterministic SHA
 
+def _iter_sync_blobs(cfg: dict, allowed_extensions: tuple):
+    """Yield the syncable media blobs under ``cfg["folder"]`` with a projected listing."""
     index_folder = cfg["index"].split("/")[-1]  # e.g. "_images.json"
-
-    for blob in state.bucket.list_blobs(prefix=cfg["folder"]):
+    for blob in state.bucket.list_blobs(prefix=cfg["folder"], fields=_SYNC_LIST_FIELDS):
         fname = blob.name[len(cfg["folder"]):]
         if not fname or fname == index_folder or blob.name == cfg["index"]:
             continue
-        # Skip backup/tmp blobs created by _write_json_atomic_sync
+        # Skip tmp blobs from _write_json_atomic_sync and backups written
+        # next to the index before backups moved to BACKUP_PREFIX
         if ".backup." in fname or ".tmp." in fname:
             continue
         if not any(fname.lower().endswith(ext) for ext in allowed_extensions):
             continue
-        gcs_blobs.append({"filename": fname, "name": fname, "size": blob.size, "url": blob.public_url})
-        gcs_name_size.append((fname, blob.size))
+        yield fname, blob
+
 
-    # Deterministic SHA over sorted (name, size) pairs
+def _snapshot_sha(name_sizes) -> str:
+    """Deterministic SHA over sorted (name, size) pairs."""
     hasher = hashlib.sha256()
-    for pair in sorted(gcs_name_size):
-        hasher.update(f"{pair[0]}:{pair[1]}\n".encode())
-    gcs_sha = hasher.hexdigest()
+    for name, size in sorted(name_sizes):
+        hasher.update(f"{name}:{size}\n".encode())
+    return hasher.hexdigest()
+
+
+def _index_snapshot_sha(existing_index: list) -> str:
+    return hashlib.sha256(json.dumps(existing_index, sort_keys=True).encode()).hexdigest()
+
+
+def _load_sync_manifest_sync(cfg: dict, gcs_sha: str) -> Optional[dict]:
+    """The manifest this process recorded for snapshot *gcs_sha*, if any."""
+    manifest = _sync_manifests.get(cfg["folder"])
+    if manifest is None or manifest.get("gcs_sha") != gcs_sha:
+        return None
+    return manifest
+
+
+def _save_sync_manifest_sync(cfg: dict, objects: Dict[str, int], gcs_sha: str) -> dict:
+    """Remember the (name -> size) listing behind *gcs_sha* for this folder."""
+    previous = _sync_manifests.get(cfg["folder"])
+    if previous is not None and previous.get("gcs_sha") == gcs_sha:
+        return previous
+    manifest = {"folder": cfg["folder"], "gcs_sha": gcs_sha, "objects": objects}
+    _sync_manifests[cfg["folder"]] = manifest
+    if previous is not None:
+        old = previous.get("objects") or {}
+        state._log_event(
+            "sync_manifest_delta",
+            folder=cfg["folder"],
+            added=sum(1 for name in objects if name not in old),
+            removed=sum(1 for name in old if name not in objects),
+            changed=sum(1 for name, size in objects.items() if name in old and old[name] != size),
+        )
+    return manifest
+
+
+def _sync_snapshot_unchanged_sync(cfg: dict, allowed_extensions: tuple, gcs_sha: str) -> bool:
+    """Whether the folder still matches the planned snapshot *gcs_sha*.
+
+    When this process made the plan, the listing is compared object by
+    object against its manifest and stops at the first new or resized
+    blob; only an unchanged folder (or a deletion) needs the complete
+    listing.  Otherwise the snapshot SHA is recomputed as before.
+    """
+    manifest = _load_sync_manifest_sync(cfg, gcs_sha)
+    if manifest is None:
+        return _snapshot_sha((fname, blob.size) for fname, blob in _iter_sync_blobs(cfg, allowed_extensions)) == gcs_sha
+    expected = manifest["objects"]
+    seen = 0
+    for fname, blob in _iter_sync_blobs(cfg, allowed_extensions):
+        entry = expected.get(fname)
+        if entry is None or entry != blob.size:
+            return False
+        seen += 1
+    return seen == len(expected)
+
+
+def _compute_sync_diff_sync(cfg: dict, allowed_extensions: tuple, existing_index: list) -> Tuple[dict, str, str]:
+    """Stream-iterate GCS blobs and compute a three-way diff vs *existing_index*.
+
+    Returns ``(diff_full, gcs_snapshot_sha, index_snapshot_sha)`` where
+    *diff_full* contains the complete (uncapped) diff arrays.  The listing
+    is kept as the folder's in-process sync manifest for the apply-time
+    check.
+    """
+    index_map = {item["filename"]: item for item in existing_index}
+    index_sha = _index_snapshot_sha(existing_index)
 
-    gcs_filename_set = {b["filename"] for b in gcs_blobs}
+    gcs_blobs: List[dict] = []          # lightweight: name + size + url only
+    objects: Dict[str, int] = {}        # manifest: name -> size
+
+    for fname, blob in _iter_sync_blobs(cfg, allowed_extensions):
+        gcs_blobs.append({"filename": fname, "name": fname, "size": blob.size, "url": blob.public_url})
+        objects[fname] = blob.size
+
+    gcs_sha = _snapshot_sha(objects.items())
+    _save_sync_manifest_sync(cfg, objects, gcs_sha)
+
+    gcs_filename_set = set(objects)
     to_add: List[dict] = []
     divergent: List[dict] = []
     unchanged_count = 0
@@ -348,118 +449,146 @@ def _rescan_shader_lists_sync(pull_latest: bool = True) -> dict:
     }
 
 
+class RangeNotSatisfiable(Exception):
+    """The Range header cannot overlap the object (answered with 416)."""
+
+
 def _parse_range_header(range_header: str, total_size: int) -> Optional[Tuple[int, int]]:
-    """Parse a 'bytes=start-end' Range header.
+    """Parse a single-range ``bytes=`` Range header.
 
-    Returns (start, end) integers (inclusive, 0-based) or None if the header
-    is absent, malformed, or unsatisfiable.  ``end`` may be ``total_size - 1``
-    when not specified by the client.
+    Accepts ``start-end``, open-ended ``start-`` and suffix ``-N`` (the last
+    N bytes) forms.  Returns (start, end) integers (inclusive, 0-based) with
+    ``end`` clamped to the object, or None if the header is absent, malformed
+    or asks for several ranges, in which case the whole object is served.
+    Raises ``RangeNotSatisfiable`` when the range lies beyond the object.
     """
     if not range_header or not range_header.startswith("bytes="):
         return None
+    spec = range_header[6:].strip()
+    if "," in spec:
+        return None
+    start_str, sep, end_str = spec.partition("-")
+    if not sep:
+        return None
     try:
-        byte_range = range_header[6:]
-        start_str, _, end_str = byte_range.partition("-")
-        start = int(start_str) if start_str else 0
-        end = int(end_str) if end_str else total_size - 1
-        if start < 0 or end >= total_size or start > end:
-            return None
-        return start, end
-    except (ValueError, AttributeError):
+        if not start_str.strip():
+            suffix = int(end_str)
+            if suffix <= 0 or total_size == 0:
+                raise RangeNotSatisfiable(range_header)
+            return max(total_size - suffix, 0), total_size - 1
+        start = int(start_str)
+        end = int(end_str) if end_str.strip() else total_size - 1
+    except ValueError:
+        return None
+    if start < 0 or (end_str.strip() and end < start):
         return None
+    if start >= total_size:
+        raise RangeNotSatisfiable(range_header)
+    return start, min(end, total_size - 1)
+
+
+async def _bounded_chunks(chunks):
+    """Re-yield *chunks*, holding ``_media_semaphore`` only while each one is read.
+
+    The semaphore caps concurrent storage reads rather than open streams, so
+    a slow client does not hold a slot while its socket drains.
+    """
+    iterator = chunks.__aiter__()
+    try:
+        while True:
+            t0 = time.perf_counter()
+            async with state._media_semaphore:
+                t1 = time.perf_counter()
+                metrics.MEDIA_SEMAPHORE_WAIT_SECONDS.observe(t1 - t0)
+                try:
+                    chunk = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+                metrics.MEDIA_CHUNK_SECONDS.observe(time.perf_counter() - t1)
+            metrics.MEDIA_PROXIED_BYTES.inc(len(chunk))
+            yield chunk
+    finally:
+        await iterator.aclose()
 
 
 async def _proxy_media_response(
-    blob,
+    path: str,
     media_type: str,
     filename: str,
     range_header: Optional[str],
-) -> StreamingResponse:
-    """Hardened proxy fallback: download blob bytes in a bounded thread, return
-    a StreamingResponse (200) or partial-content response (206 for Range requests).
-
-    Uses ``_media_semaphore`` to cap concurrent proxy threads so a small VPS
-    cannot be overwhelmed.  The GCS client's built-in ``DEFAULT_RETRY`` is
-    applied to the download, so transient auth/network hiccups are retried
-    automatically without hand-rolled refresh logic.
+    disposition: str = "inline",
+) -> Response:
+    """Hardened proxy fallback: stream the object through the storage backend
+    as a 200, or as a partial-content 206 for Range requests (416 when the
+    range cannot be satisfied).
+
+    The body is read in ``MEDIA_STREAM_CHUNK_BYTES`` ranged reads that are
+    pulled only as fast as the client consumes them, so memory per stream is
+    one chunk whatever the file size.  Objects held by the media disk cache
+    are served from local disk instead.  ``_media_semaphore`` caps concurrent
+    reads so a small VPS cannot be overwhelmed.  On GCS, ranged reads are
+    retried on transient failures by either client (``DEFAULT_RETRY`` on the
+    sync client, exponential backoff on the aiohttp one).
     """
-    from google.cloud.storage.retry import DEFAULT_RETRY
-
-    blob_size = blob.size  # may be None if metadata not loaded
-
-    range_parsed = None
-    if range_header and blob_size is not None:
-        range_parsed = _parse_range_header(range_header, blob_size)
-
-    async with state._media_semaphore:
-        if range_parsed is not None:
-            start, end = range_parsed
-            # GCS download_as_bytes end is *exclusive*
-            data = await state.run_io(
-                blob.download_as_bytes,
-                start=start,
-                end=end + 1,
-                retry=DEFAULT_RETRY,
-            )
-        else:
-            data = await state.run_io(blob.download_as_bytes, retry=DEFAULT_RETRY)
+    from . import backends, media_cache
 
-    if range_parsed is not None:
-        start, end = range_parsed
-        content_length = end - start + 1
-        headers = {
-            "Content-Disposition": f'inline; filename="{filename}"',
-            "Accept-Ranges": "bytes",
-            "Content-Range": f"bytes {start}-{end}/{blob_size}",
-            "Content-Length": str(content_length),
-            "Cache-Control": "private, max-age=0",
-        }
-        return StreamingResponse(
-            iter([data]),
-            status_code=206,
-            media_type=media_type,
-            headers=headers,
-        )
+    storage = backends.current()
+    info = await storage.stat(path, checksum=False)
+    if info is None:
+        raise HTTPException(404, "File missing")
+    blob_size = info.size
 
     headers = {
-        "Content-Disposition": f'inline; filename="{filename}"',
+        "Content-Disposition": f'{disposition}; filename="{filename}"',
         "Accept-Ranges": "bytes",
         "Cache-Control": "private, max-age=0",
     }
+    if blob_size is None:
+        # Size unknown: no ranges and no Content-Length; iter_bytes reads to EOF.
+        return StreamingResponse(
+            _bounded_chunks(storage.iter_bytes(path, chunk_size=config.MEDIA_STREAM_CHUNK_BYTES)),
+            media_type=media_type,
+            headers=headers,
+        )
+
+    try:
+        range_parsed = _parse_range_header(range_header, blob_size) if range_header else None
+    except RangeNotSatisfiable:
+        return Response(
+            status_code=416,
+            headers={"Content-Range": f"bytes */{blob_size}", "Accept-Ranges": "bytes"},
+        )
+
+    status_code = 200
+    start, end = 0, blob_size - 1
+    if range_parsed is not None:
+        status_code = 206
+        start, end = range_parsed
+        headers["Content-Range"] = f"bytes {start}-{end}/{blob_size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    disk_cache = media_cache.media_cache
+    cached = await disk_cache.open(storage.name, path, info.generation, blob_size)
+    if cached is not None:
+        body = media_cache.iter_file(cached, start, end, config.MEDIA_STREAM_CHUNK_BYTES)
+    else:
+        disk_cache.admit(storage, path, info.generation, blob_size)
+        body = _bounded_chunks(storage.iter_bytes(path, start, end, chunk_size=config.MEDIA_STREAM_CHUNK_BYTES))
+    metrics.MEDIA_RESPONSES.inc(source="disk" if cached is not None else "storage", status=str(status_code))
+
     return StreamingResponse(
-        iter([data]),
+        body,
+        status_code=status_code,
         media_type=media_type,
         headers=headers,
     )
 
 
 def _fetch_ftp_file_sync(filename: str) -> str:
-    """Connect to FTP, download a .wgsl file, return as UTF-8 string."""
-    ftp = FTP(config.FTP_HOST)
-    try:
-        ftp.login(config.FTP_USER, config.FTP_PASS)
-        ftp.cwd(config.FTP_DIR)
-        buffer = io.BytesIO()
-        ftp.retrbinary(f"RETR {filename}", buffer.write)
-        buffer.seek(0)
-        return buffer.read().decode("utf-8")
-    finally:
-        try:
-            ftp.quit()
-        except Exception:
-            ftp.close()
+    """Download a .wgsl file from FTP over a pooled session, return as UTF-8 string."""
+    return ftp_pool.fetch_text(filename)
 
 
 def _list_ftp_files_sync() -> list:
     """List all .wgsl files on the FTP server."""
-    ftp = FTP(config.FTP_HOST)
-    try:
-        ftp.login(config.FTP_USER, config.FTP_PASS)
-        ftp.cwd(config.FTP_DIR)
-        files = ftp.nlst()
-        return [f for f in files if f.endswith(".wgsl")]
-    finally:
-        try:
-            ftp.quit()
-        except Exception:
-            ftp.close()
+    return [f for f in ftp_pool.list_names() if f.endswith(".wgsl")]